@@ -0,0 +1,57 @@
+/* Clientside rendering of the spike activity heatmap frames (see plots.plotting.spike_activity_frame_data) */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    meadash: Object.assign({}, (window.dash_clientside || {}).meadash, {
+        _decoded: {bdata: null, counts: null},
+
+        _counts: function(frames) {
+            // Decode the base64 count matrix once per dataset, not once per frame
+            var cache = window.dash_clientside.meadash._decoded;
+            if (cache.bdata !== frames.bdata) {
+                var binary = atob(frames.bdata);
+                var bytes = new Uint8Array(binary.length);
+                for (var i = 0; i < binary.length; i++) {
+                    bytes[i] = binary.charCodeAt(i);
+                }
+                cache.counts = new Int32Array(bytes.buffer);
+                cache.bdata = frames.bdata;
+            }
+            return cache.counts;
+        },
+
+        renderActivityFrame: function(frameIndex, frames) {
+            if (!frames) {
+                return window.dash_clientside.no_update;
+            }
+            var counts = window.dash_clientside.meadash._counts(frames);
+            var nFrames = frames.shape[0], nChannels = frames.shape[1];
+            var rows = frames.grid_shape[0], cols = frames.grid_shape[1];
+            var frame = Math.max(0, Math.min(frameIndex || 0, nFrames - 1));
+
+            var flat = new Array(rows * cols).fill(null);
+            for (var channel = 0; channel < nChannels; channel++) {
+                flat[frames.grid_index[channel]] = counts[frame * nChannels + channel];
+            }
+            var z = [];
+            for (var row = 0; row < rows; row++) {
+                z.push(flat.slice(row * cols, (row + 1) * cols));
+            }
+
+            var figure = frames.figure;
+            var trace = Object.assign({}, figure.data[0], {z: z});
+            var title = (figure.layout.title && figure.layout.title.text) || '';
+            var layout = Object.assign({}, figure.layout, {title: {text: title + ' [' + frame + ']'}});
+            return {data: [trace], layout: layout};
+        },
+
+        advanceActivityFrame: function(nIntervals, frameIndex, maxIndex) {
+            return (frameIndex || 0) >= (maxIndex || 0) ? 0 : (frameIndex || 0) + 1;
+        },
+
+        toggleActivityPlayback: function(nClicks, disabled) {
+            if (!nClicks) {
+                return window.dash_clientside.no_update;
+            }
+            return !disabled;
+        }
+    })
+});
@@ -1,53 +1,560 @@
-from dash import dcc, html, callback, Output, Input, State
-from app import server, layouts
+import os
+from dash import dcc, html, callback, ctx, no_update, ClientsideFunction, Output, Input, State, Patch
+from dash.exceptions import PreventUpdate
+import dash_bootstrap_components as dbc
+from app import server, layouts, perf, transport
+from app.jobs import JobQueue
+from app.sessions import SessionRegistry, new_session, recording_spec, clamp_parameter, THRESHOLD_RANGE
 from plots.plotting import *
 from data_processing.data_processor import DataProcessor
 
 
-def update_channel_plot(data_processor, channel_info, value, plot_type):
+# Number of min/max buckets sent for the channel trace, roughly the plot width in pixels
+CHANNEL_PLOT_WIDTH_PX = 2000
+
+def relayout_x_range(relayout_data):
+    """
+    Extracts the x-axis range of a zoom or pan from a graph's relayoutData.
+
+    Returns:
+    - (start, stop) in axis units for a zoom, None when the axis was reset, or False when the x-axis did not change.
+    """
+    if not relayout_data:
+        return False
+    if relayout_data.get('xaxis.autorange'):
+        return None
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        return float(relayout_data['xaxis.range[0]']), float(relayout_data['xaxis.range[1]'])
+    if 'xaxis.range' in relayout_data:
+        return tuple(float(x) for x in relayout_data['xaxis.range'])
+    return False
+
+def spike_window(data_processor, time_range=None):
+    """
+    Retrieves the spikes of a time range.
+
+    Parameters:
+    - data_processor (DataProcessor): The processor.
+    - time_range (list): The (start, stop) time range in seconds, or None for the whole recording.
+
+    Returns:
+    - spikes (SpikeTrains): The spikes of the range, indexed from its first sample.
+    - start (int): The recording sample of the first sample of the range.
+    """
+    start, stop = data_processor.sample_range(*(time_range or (None, None)))
+    return data_processor.spikes.window(start, stop), start
+
+def update_channel_plot(data_processor, channel_info, value, plot_type, relayout_data=None, time_range=None):
     channel_idx = value
-    time_vec = np.arange(data_processor.initial_signal[0].shape[0]) / data_processor.sampling_rate
     if value is not None:
         if plot_type == 'initial':
-            return plot_signal(data_processor.initial_signal[channel_idx, :], time_vector=time_vec)
+            # Only the envelope at plot resolution is sent; zooming re-fetches the visible range
+            x_range = relayout_x_range(relayout_data) or time_range
+            t_start, t_stop = x_range if x_range else (None, None)
+            time_vec, signal = data_processor.get_signal_envelope(channel_idx, t_start, t_stop,
+                                                                  n_points=CHANNEL_PLOT_WIDTH_PX)
+            fig = plot_signal(signal, time_vector=time_vec)
+            fig.update_layout(uirevision=channel_idx)
+            if x_range:
+                fig.update_xaxes(range=list(x_range))
+            return fig
         elif plot_type == 'raster':
-            return plot_single_channel_raster(data_processor.raster, channel_idx, time_vector=time_vec)
+            spikes, start = spike_window(data_processor, time_range)
+            if spikes.n_samples == 0:
+                return go.Figure()
+            return plot_single_channel_raster(spikes, channel_idx, data_processor.sampling_rate, start)
     return go.Figure()
 
-def update_spike_frequency_heatmap(data_processor):
-    aggregated_spikes = data_processor.aggregate_raster_spike_counts(total=True)
+def update_raster_plot(data_processor, relayout_data=None, time_range=None):
+    # Rebuilt on zoom so only the spikes of the visible range are decimated to the plot resolution again
+    x_range = relayout_x_range(relayout_data) or time_range
+    spikes, start = spike_window(data_processor, x_range)
+    if spikes.n_samples == 0:
+        return go.Figure(layout={'uirevision': 'raster'})
+    fig = plot_raster(spikes, data_processor.sampling_rate, start, x_range=x_range)
+    fig.update_layout(uirevision='raster')
+    return fig
+
+def update_spike_frequency_heatmap(data_processor, time_range=None):
+    t_start, t_stop = time_range or (None, None)
+    aggregated_spikes = data_processor.aggregate_raster_spike_counts(total=True, t_start=t_start, t_stop=t_stop)
     return plot_spike_frequency_heatmap(aggregated_spikes, data_processor.channel_info)
 
-def update_spike_activity_heatmap(data_processor, n_clicks, time_value=1):
+def update_spike_activity_heatmap(data_processor, n_clicks, time_value=1, time_range=None):
+    """
+    Returns the frame data of the spike activity heatmap and the index of its last frame.
+
+    The frames are rendered by a clientside callback, so the counts are sent once instead of as one figure per frame.
+    """
     if n_clicks is not None and time_value is not None:
-        aggregated_spikes = data_processor.aggregate_raster_spike_counts(time_value=float(time_value), total=False)
-        return plot_spike_activity_heatmap(aggregated_spikes)
-    return go.Figure()
+        t_start, t_stop = time_range or (None, None)
+        aggregated_spikes = data_processor.aggregate_raster_spike_counts(time_value=float(time_value), total=False,
+                                                                         t_start=t_start, t_stop=t_stop)
+        if aggregated_spikes.shape[1] > 0:
+            return spike_activity_frame_data(aggregated_spikes), aggregated_spikes.shape[1] - 1
+    return None, 0
+
+def session_spec(registry, session, detection=None):
+    """
+    Resolves the validated recording spec a session views.
+
+    Parameters:
+    - registry (SessionRegistry): The processor registry of the server.
+    - session (dict): The session state from the 'session' store.
+    - detection (dict): The spike detection of the session from the 'spike-detection' store, or None for the
+      spikes of the recording.
+
+    Returns:
+    - spec (dict): The canonical recording spec, which also keys the background jobs of the session.
+    """
+    if not session:
+        raise PreventUpdate
+    try:
+        threshold = (detection or {}).get('threshold')
+        return registry.validate(dict(session.get('recording') or recording_spec(), threshold=threshold))
+    except (AttributeError, TypeError, ValueError, PermissionError):
+        # A session state the server did not issue, e.g. a forged recording path
+        raise PreventUpdate
+
+def session_processor(registry, session, detection=None):
+    """
+    Resolves the DataProcessor a session views.
+
+    Parameters:
+    - registry (SessionRegistry): The processor registry of the server.
+    - session (dict): The session state from the 'session' store.
+    - detection (dict): The spike detection of the session from the 'spike-detection' store, or None for the
+      spikes of the recording.
+
+    Returns:
+    - data_processor (DataProcessor): The processor, shared with the sessions viewing the same recording.
+    """
+    spec = session_spec(registry, session, detection)
+    try:
+        return registry.get(spec)
+    except LookupError:
+        # No recording was opened in this session yet
+        raise PreventUpdate
+
+def detect_spikes(registry, session, threshold):
+    """
+    Re-detects the spikes of the session's recording with the given threshold.
+
+    The spikes of the recording are left untouched: the re-detected spikes get their own processor, shared by
+    every session detecting at the same threshold, and the new 'spike-detection' state refreshes the spike plots.
+
+    Returns:
+    - The spike detection state of the session and a status message.
+    """
+    if not threshold or threshold <= 0:
+        raise PreventUpdate
+    detection = {'threshold': clamp_parameter(threshold, THRESHOLD_RANGE)}
+    spikes = session_processor(registry, session, detection).spikes
+    return detection, f"Detected {spikes.n_spikes} spikes at {detection['threshold']:g} x noise level."
+
+def open_recording_job(job, registry, session, file_path, sampling_rate):
+    """
+    Opens a recording for a session, converting it into the native store on its first use.
+
+    Returns:
+    - The new session state, the reset spike detection and time range, a status message and the page to show.
+    """
+    job.report(0.1, f'Opening {os.path.basename(file_path)}')
+    spec = registry.open_path(file_path, sampling_rate)
+    session = dict(session, recording=spec)
+    return session, None, None, f"Opened {os.path.basename(spec['file_path'])}.", '/page-1'
 
-def update_spiking_rate_plot(data_processor, windowsize):
-    convolved_sig = data_processor.convolve_signal(windowsize, 'boxcar')
-    conv_sum = np.sum(convolved_sig, axis=0)
+def update_spiking_rate_plot(data_processor, windowsize, time_range=None):
+    t_start, t_stop = time_range or (None, None)
+    conv_sum = data_processor.convolve_signal(windowsize, 'boxcar', sum_channels=True, t_start=t_start, t_stop=t_stop)
     conv_sum_spikepersecond = conv_sum / windowsize
-    sampleindices = np.arange(conv_sum.shape[0])
+    sampleindices = np.arange(conv_sum.shape[0]) + data_processor.sample_range(t_start, t_stop)[0]
     timeinseconds_vec = sampleindices / data_processor.sampling_rate
-    return plot_firing_rate(conv_sum_spikepersecond, timeinseconds_vec, title=r"Spiking Rate - window size: " + str(windowsize) + " s")
+    _, network_bursts = data_processor.detect_bursts(t_start=t_start, t_stop=t_stop)
+    burst_times = np.column_stack((network_bursts['start'], network_bursts['stop'])) / data_processor.sampling_rate
+    return plot_firing_rate(conv_sum_spikepersecond, timeinseconds_vec, title=r"Spiking Rate - window size: " + str(windowsize) + " s"
+                            + f" - {len(network_bursts)} network bursts", bursts=burst_times)
 
-def update_psd_plot(data_processor, windowsize):
-    convolved_sig = data_processor.convolve_signal(windowsize, 'boxcar')
-    conv_sum = np.sum(convolved_sig, axis=0)
+def update_psd_plot(data_processor, windowsize, time_range=None):
+    t_start, t_stop = time_range or (None, None)
+    conv_sum = data_processor.convolve_signal(windowsize, 'boxcar', sum_channels=True, t_start=t_start, t_stop=t_stop)
     frequencies, pxx, center_frequency = data_processor.estimate_power_spectral_density(conv_sum)
     return plot_psd(frequencies, pxx, center_frequency)
 
-def register_callbacks(server, data_processor: DataProcessor, channel_info, debug=False):
+def rate_plots_job(job, data_processor, windowsize, time_range=None):
+    # The firing rate and its PSD share the convolution, so both plots are built by one job. It only reports
+    # twice, so a superseded job finishes its current step before it stops (see app/jobs.py)
+    job.report(0.05, 'Convolving spike trains')
+    rate_fig = update_spiking_rate_plot(data_processor, windowsize, time_range)
+    job.report(0.6, 'Estimating power spectral density')
+    psd_fig = update_psd_plot(data_processor, windowsize, time_range)
+    return rate_fig, psd_fig
+
+def activity_frames_job(job, data_processor, n_clicks, time_value, time_range=None):
+    job.report(0.1, 'Binning spikes')
+    return update_spike_activity_heatmap(data_processor, n_clicks, time_value, time_range)
+
+def raster_plot_job(job, data_processor, x_range, time_range=None):
+    job.report(0.1, 'Building raster')
+    relayout_data = {'xaxis.range': list(x_range)} if x_range else {'xaxis.autorange': True}
+    return update_raster_plot(data_processor, relayout_data, time_range)
+
+def register_job_callbacks(app, jobs, name, outputs, inputs, states, submit, prevent_initial_call=False):
+    """
+    Registers a computation that runs in the background job queue instead of inside the request.
+
+    The first callback submits the job and starts polling it; the second one polls the job, shows its progress
+    in the '<name>-progress' bar and fills ``outputs`` once it is done. The layout provides the components from
+    ``layouts.job_components(name)``.
+
+    Jobs live in the process that submitted them. A poll served by another server worker (or after a restart)
+    does not find the job, so it resubmits it through the '<name>-resubmit' store, with the trigger of the
+    original submission.
+
+    Parameters:
+    - app (dash.Dash): The Dash app.
+    - jobs (JobQueue): The job queue.
+    - name (str): The prefix of the job components.
+    - outputs (list): The outputs filled with the result of the job.
+    - inputs (list): The inputs starting a job.
+    - states (list): Further state passed to ``submit``.
+    - submit (callable): Called with the id of the input that triggered the job, then the input and state values;
+      returns the submitted Job or raises PreventUpdate.
+    - prevent_initial_call (bool): Whether to skip the job on page load. Defaults to False.
+    """
+    @app.callback(
+        Output(f'{name}-job', 'data'),
+        Output(f'{name}-poll', 'disabled'),
+        inputs + [Input(f'{name}-resubmit', 'data')],
+        states + [State(f'{name}-job', 'data')],
+        prevent_initial_call=prevent_initial_call
+    )
+    def submit_job(*values):
+        values, previous = list(values[:-1]), values[-1]
+        # The resubmit count sits between the input and the state values
+        del values[len(inputs)]
+        trigger = ctx.triggered_id
+        if trigger == f'{name}-resubmit':
+            if not previous:
+                raise PreventUpdate
+            trigger = previous['trigger']
+        return {'id': submit(trigger, *values).id, 'trigger': trigger}, False
+
+    # Figures of the result are sent like those of ``register_figure_callback``
+    figures = any(output.component_property == 'figure' for output in outputs)
+
+    @app.callback(
+        outputs + [
+            Output(f'{name}-poll', 'disabled', allow_duplicate=True),
+            Output(f'{name}-progress', 'value'),
+            Output(f'{name}-progress', 'label'),
+            Output(f'{name}-progress', 'style'),
+            Output(f'{name}-resubmit', 'data'),
+        ] + ([Output(transport.FIGURE_HASHES_ID, 'data', allow_duplicate=True)] if figures else []),
+        Input(f'{name}-poll', 'n_intervals'),
+        State(f'{name}-job', 'data'),
+        State(f'{name}-resubmit', 'data'),
+        [State(transport.FIGURE_HASHES_ID, 'data')] if figures else [],
+        prevent_initial_call=True
+    )
+    def poll_job(n_intervals, submission, resubmits, *hashes):
+        job = jobs.get(submission['id']) if submission else None
+        pending = [no_update] * len(outputs)
+        unchanged = [no_update] if figures else []
+        if job is None:
+            # Unknown to this process: stop polling until the resubmitted job restarts it
+            return pending + [True, 0, 'Unknown job, resubmitting', {'display': 'flex'}, (resubmits or 0) + 1] + \
+                unchanged
+        if not job.finished:
+            return pending + [False, int(job.progress * 100), job.message, {'display': 'flex'}, no_update] + \
+                unchanged
+        result = jobs.fetch(job.id)
+        if job.state == 'done' and result is None:
+            # Already taken by an earlier poll, e.g. from another tab of the session
+            return pending + [True, 100, '', {'display': 'none'}, no_update] + unchanged
+        if job.state == 'done':
+            result = list(result) if len(outputs) > 1 else [result]
+            if figures:
+                result, hash_update = transport.send_figures(result, outputs, hashes[0])
+                unchanged = [hash_update]
+            return result + [True, 100, '', {'display': 'none'}, no_update] + unchanged
+        message = job.error if job.state == 'error' else 'Cancelled'
+        return pending + [True, 100, message, {'display': 'flex'}, no_update] + unchanged
+
+def register_figure_callback(app, outputs, inputs, states, function, prevent_initial_call=False):
+    """
+    Registers a callback whose figures are sent as typed arrays and skipped when the browser already shows them.
+
+    The figures are encoded with ``transport.encode_figure`` and compared with the digests in the page's
+    'figure-hashes' store (``layouts.figure_hashes_store``), which the callback updates with the figures it sends.
+
+    Parameters:
+    - app (dash.Dash): The Dash app.
+    - outputs (list): The outputs of the callback.
+    - inputs (list): The inputs of the callback.
+    - states (list): Further state passed to ``function``.
+    - function (callable): Called with the input and state values; returns the output values (one value for a
+      single output).
+    - prevent_initial_call (bool): Whether to skip the callback on page load. Defaults to False.
+    """
+    def figure_callback(*values):
+        result = function(*values[:-1])
+        result = list(result) if len(outputs) > 1 else [result]
+        sent, hashes = transport.send_figures(result, outputs, values[-1])
+        return sent + [hashes]
+
+    # Named after the wrapped function, so the profiler tells the callbacks apart
+    figure_callback.__name__ = function.__name__
+    app.callback(
+        outputs + [Output(transport.FIGURE_HASHES_ID, 'data', allow_duplicate=True)],
+        inputs,
+        states + [State(transport.FIGURE_HASHES_ID, 'data')],
+        prevent_initial_call=prevent_initial_call or 'initial_duplicate'
+    )(figure_callback)
+
+def update_channel_psd_plots(data_processor, channel_info, time_range=None):
+    t_start, t_stop = time_range or (None, None)
+    frequencies, pxx, peak_frequencies = data_processor.estimate_channel_psd(source='rate', t_start=t_start,
+                                                                             t_stop=t_stop)
+    psd_fig = plot_channel_psd(frequencies, pxx, title='Firing Rate PSD per Channel')
+    peak_fig = plot_spike_frequency_heatmap(peak_frequencies, channel_info, title='Peak Frequency (Hz)', vmin=0)
+    return psd_fig, peak_fig
+
+def update_correlation_matrix(data_processor, method, bin_width, time_range=None):
+    t_start, t_stop = time_range or (None, None)
+    correlation_matrix = data_processor.compute_correlation_matrix(time_value=float(bin_width), method=method,
+                                                                   t_start=t_start, t_stop=t_stop)
+    label = 'Pearson' if method == 'pearson' else 'STTC'
+    return plot_correlation_heatmap(correlation_matrix, title=f"{label} correlation - {float(bin_width):g} s")
+
+def update_cross_correlogram(data_processor, click_data, time_range=None):
+    # The clicked cell is (target channel, reference channel); the first two channels are shown by default
+    channel_a, channel_b = 0, 1
+    if click_data and click_data.get('points'):
+        point = click_data['points'][0]
+        channel_a, channel_b = int(point['y']), int(point['x'])
+    t_start, t_stop = time_range or (None, None)
+    edges, counts = data_processor.compute_cross_correlogram(channel_a, channel_b, t_start=t_start, t_stop=t_stop)
+    return plot_cross_correlogram(edges, counts, title=f"Cross-correlogram: channel {channel_a} -> {channel_b}")
+
+# Points kept by the live plots; older points are dropped by extendData
+LIVE_RATE_POINTS = 6000
+LIVE_RASTER_POINTS = 20000
+# Min/max bucket of the live signal trace in seconds
+LIVE_SIGNAL_BUCKET = 0.005
+
+def update_live_plots(stream, cursor, channel):
+    """
+    Builds the delta updates of the live page from what the stream received since the page's cursor.
+
+    Parameters:
+    - stream (StreamingProcessor): The live stream.
+    - cursor (dict): The cursor of the page, or None on its first refresh.
+    - channel (int): The channel of the signal trace.
+
+    Returns:
+    - The extendData of the rate, raster and signal plots, the patch of the activity heatmap (or no_update),
+      the new cursor and a status message.
+    """
+    bucket = max(int(LIVE_SIGNAL_BUCKET * stream.sampling_rate), 1)
+    if cursor is None:
+        # Only what the plots keep is sent on the first refresh
+        cursor = {'rate': stream.rate.total - LIVE_RATE_POINTS, 'spikes': stream.spikes.total - LIVE_RASTER_POINTS,
+                  'signal': stream.signal.start}
+    updates = stream.updates_since(cursor)
+    new_cursor = updates['cursor']
+
+    rate_times, rate = updates['rate']
+    spike_times, spike_channels = updates['spikes']
+    signal_times, signal = updates['signal']
+    # Only whole buckets are sent; the rest is sent with the next refresh
+    n_buckets = signal.shape[1] // bucket
+    new_cursor['signal'] = int(np.round(signal_times[0] * stream.sampling_rate)) + n_buckets * bucket \
+        if signal_times.size else cursor.get('signal', 0)
+    buckets = signal[channel, :n_buckets * bucket].reshape(n_buckets, bucket)
+    extremes = np.stack((buckets.min(axis=1), buckets.max(axis=1)), axis=1).ravel()
+    extreme_times = np.repeat(signal_times[:n_buckets * bucket:bucket], 2)
+
+    signal_points = 2 * int(stream.signal.capacity // bucket)
+    rate_extend = (dict(x=[rate_times], y=[rate]), [0], LIVE_RATE_POINTS)
+    raster_extend = (dict(x=[spike_times], y=[spike_channels]), [0], LIVE_RASTER_POINTS)
+    signal_extend = (dict(x=[extreme_times], y=[extremes]), [0], signal_points)
+
+    heatmap = no_update
+    if updates['activity'] is not None:
+        grid = make_grid_layout(updates['activity'].astype(np.float64))
+        heatmap = Patch()
+        heatmap['data'][0]['z'] = [[None if np.isnan(v) else v for v in row] for row in grid.tolist()]
+        heatmap['data'][0]['zmax'] = max(float(updates['activity'].max()), 1.0)
+    status = f"{stream.duration:.1f} s acquired, {int(updates['spike_counts'].sum())} spikes"
+    if stream.noise_levels is None:
+        status += " (estimating noise levels)"
+    return rate_extend, raster_extend, signal_extend, heatmap, new_cursor, status
+
+def register_live_callbacks(app, stream):
+    """
+    Registers the callbacks of the live page, which extend its plots with the new data of the stream.
+
+    Parameters:
+    - app (dash.Dash): The Dash app.
+    - stream (StreamingProcessor): The live stream.
+    """
+    @app.callback(
+        Output('live-rate-plot', 'extendData'),
+        Output('live-raster-plot', 'extendData'),
+        Output('live-signal-plot', 'extendData'),
+        Output('live-activity-heatmap', 'figure'),
+        Output('live-cursor', 'data'),
+        Output('live-status', 'children'),
+        Input('live-interval', 'n_intervals'),
+        State('live-cursor', 'data'),
+        State('live-channel-dropdown', 'value')
+    )
+    def update_live_plots_callback(n_intervals, cursor, channel):
+        return update_live_plots(stream, cursor, channel or 0)
+
+    @app.callback(
+        Output('live-signal-plot', 'figure'),
+        Output('live-cursor', 'data', allow_duplicate=True),
+        Input('live-channel-dropdown', 'value'),
+        State('live-cursor', 'data'),
+        prevent_initial_call=True
+    )
+    def select_live_channel(channel, cursor):
+        # The trace of another channel starts over from the buffered signal
+        figure = go.Figure(go.Scatter(x=[], y=[], mode='lines'))
+        figure.update_layout(title=f'Channel {channel}', xaxis_title='Time (s)', uirevision=channel)
+        return figure, dict(cursor or {}, signal=stream.signal.start)
+
+def _perf_table(rows, columns):
+    # columns: (header, key, format) with format applied to non-None values
+    header = html.Thead(html.Tr([html.Th(title) for title, _, _ in columns]))
+    body = html.Tbody([html.Tr([html.Td('' if row[key] is None else fmt(row[key])) for _, key, fmt in columns])
+                       for row in rows])
+    return dbc.Table([header, body], bordered=True, hover=True, size='sm', striped=True)
+
+def update_perf_tables(recorder):
+    """
+    Builds the tables of the profiling page from the records of the instrumentation.
+
+    Parameters:
+    - recorder (PerfRecorder): The recorder of the enabled instrumentation.
+
+    Returns:
+    - list: The breakdown per callback and job, and the statistics per stage.
+    """
+    def ms(value):
+        return f'{value:.1f}'
+
+    def kib(value):
+        return f'{value / 1024:.1f}'
+
+    breakdown = _perf_table(recorder.breakdown(), [
+        ('Callback / job', 'name', str), ('Calls', 'calls', str), ('Compute (ms)', 'compute_ms', ms),
+        ('Figure (ms)', 'figure_ms', ms), ('Serialize (ms)', 'serialize_ms', ms), ('Request (ms)', 'request_ms', ms),
+        ('JSON (KiB)', 'json_bytes', kib), ('Wire (KiB)', 'wire_bytes', kib),
+    ])
+    stages = _perf_table(recorder.summary(), [
+        ('Stage', 'stage', str), ('Name', 'name', str), ('Calls', 'calls', str), ('Total (ms)', 'total_ms', ms),
+        ('Mean (ms)', 'mean_ms', ms), ('p95 (ms)', 'p95_ms', ms), ('Own (ms)', 'self_ms', ms),
+        ('Allocated (KiB)', 'alloc_bytes', kib), ('Payload (KiB)', 'payload_bytes', kib),
+        ('Cache hits', 'cache_hit_ratio', lambda ratio: f'{ratio:.0%}'),
+    ])
+    return [html.H5("Per callback and job"), breakdown, html.H5("Per stage"), stages]
+
+def register_perf_callbacks(app):
+    """
+    Registers the refresh of the profiling page; registered before the callbacks are instrumented, so the page does
+    not profile itself.
+
+    Parameters:
+    - app (dash.Dash): The Dash app.
+    """
+    @app.callback(
+        Output('perf-tables', 'children'),
+        Input('perf-interval', 'n_intervals')
+    )
+    def update_perf_tables_callback(n_intervals):
+        recorder = perf.recorder()
+        if recorder is None:
+            raise PreventUpdate
+        return update_perf_tables(recorder)
+
+def register_callbacks(server, registry, channel_info, debug=False, stream=None):
     """
     Register callbacks for updating the app's components based on user interactions.
 
+    Every callback resolves the DataProcessor of the requesting session from the 'session' and 'spike-detection'
+    stores, so one server serves many users viewing different recordings.
+
     Args:
         server (dash.Dash): The Dash server instance.
-        data_processor (DataProcessor): An instance of the DataProcessor class.
+        registry (SessionRegistry): The processor registry of the server. A DataProcessor is served to every
+            session as the only recording.
         channel_info (dict): Information about the channels.
         debug (bool, optional): Flag to enable debug mode. Defaults to False.
+        stream (StreamingProcessor, optional): The live stream shown on the live page. Defaults to None.
     """
+    if isinstance(registry, DataProcessor):
+        registry = SessionRegistry(channel_info, default=registry)
+    if perf.enabled():
+        def registry_gauges():
+            stats = registry.stats()
+            return {'meadash_open_processors': stats['processors'], 'meadash_resident_bytes': stats['resident_nbytes']}
+
+        # Every callback registered below is timed; see app/perf.py
+        register_perf_callbacks(server.app)
+        perf.instrument_app(server.app, gauges=registry_gauges)
+    # Long computations run in background threads so they never block a request; see app/jobs.py
+    jobs = JobQueue()
+
+    def job_group(name, session):
+        # Jobs are superseded per session, so users do not cancel each other's plots
+        return f"{name}:{session['id']}"
+
+    @server.app.callback(
+        Output('session', 'data'),
+        Input('url', 'pathname'),
+        State('session', 'data')
+    )
+    def start_session(pathname, session):
+        if session and session.get('id'):
+            return no_update
+        return new_session()
+
+    @server.app.callback(
+        Output('time-range-slider', 'max'),
+        Output('time-range-slider', 'value'),
+        Input('session', 'data'),
+        State('time-range', 'data')
+    )
+    def update_time_range_slider(session, time_range):
+        data_processor = session_processor(registry, session)
+        duration = np.ceil(data_processor.n_samples / data_processor.sampling_rate / layouts.TIME_RANGE_STEP) * \
+            layouts.TIME_RANGE_STEP
+        return duration, list(time_range) if time_range else [0, duration]
+
+    @server.app.callback(
+        Output('time-range', 'data'),
+        Input('time-range-slider', 'value'),
+        State('time-range-slider', 'max'),
+        prevent_initial_call=True
+    )
+    def select_time_range(value, duration):
+        # The whole recording is stored as None, so unchanged analyses keep their cached results
+        if not value or (value[0] <= 0 and value[1] >= duration):
+            return None
+        return [float(value[0]), float(value[1])]
+
+    @server.app.callback(
+        Output('time-range-slider', 'value', allow_duplicate=True),
+        Input('time-range-reset', 'n_clicks'),
+        State('time-range-slider', 'max'),
+        prevent_initial_call=True
+    )
+    def reset_time_range(n_clicks, duration):
+        return [0, duration]
+
     @server.app.callback(
         Output('sidebar', 'children'),
         [Input('url', 'pathname')]
@@ -56,69 +563,203 @@ def register_callbacks(server, data_processor: DataProcessor, channel_info, debu
         return layouts.generate_sidebar(pathname, channel_info)
 
 
-    @server.app.callback(
-        Output('channel-plot', 'figure'),
-        Input('channel-dropdown', 'value'),
-        Input('plot-type-selector', 'value')
-    )
-    def update_channel_plot_callback(value, plot_type):
-        return update_channel_plot(data_processor, channel_info, value, plot_type)
+    def update_channel_plot_callback(value, plot_type, relayout_data, detection, time_range, session):
+        if ctx.triggered_id == 'channel-plot':
+            # Zoom/pan: re-fetch the signal trace only when the x-range actually changed
+            if plot_type != 'initial' or relayout_x_range(relayout_data) is False:
+                raise PreventUpdate
+        else:
+            relayout_data = None
+        data_processor = session_processor(registry, session, detection)
+        return update_channel_plot(data_processor, channel_info, value, plot_type, relayout_data, time_range)
+
+    register_figure_callback(server.app, [Output('channel-plot', 'figure')],
+                             [Input('channel-dropdown', 'value'), Input('plot-type-selector', 'value'),
+                              Input('channel-plot', 'relayoutData'), Input('spike-detection', 'data'),
+                              Input('time-range', 'data')],
+                             [State('session', 'data')], update_channel_plot_callback)
    
     
-    @server.app.callback(
-        Output('spike-frequency-heatmap', 'figure'),
-        Input('channel-dropdown', 'value')
-    )
-    def update_spike_frequency_heatmap_callback(selected_channel):
-        return update_spike_frequency_heatmap(data_processor)
+    def submit_raster_plot(trigger, relayout_data, detection, time_range, session):
+        x_range = relayout_x_range(relayout_data)
+        if x_range is False and trigger == 'raster-plot':
+            raise PreventUpdate
+        if trigger != 'raster-plot':
+            # A new selection replaces the zoom
+            x_range = None
+        spec = session_spec(registry, session, detection)
+        return jobs.submit(job_group('raster', session), (spec, x_range or None, time_range), raster_plot_job,
+                           session_processor(registry, session, detection), x_range or None, time_range)
+
+    register_job_callbacks(server.app, jobs, 'raster', [Output('raster-plot', 'figure')],
+                           [Input('raster-plot', 'relayoutData'), Input('spike-detection', 'data'),
+                            Input('time-range', 'data')],
+                           [State('session', 'data')], submit_raster_plot)
+
+    # Independent of the selected channel, so it is only redrawn when the spikes or the time range change
+    def update_spike_frequency_heatmap_callback(detection, time_range, session):
+        return update_spike_frequency_heatmap(session_processor(registry, session, detection), time_range)
+
+    register_figure_callback(server.app, [Output('spike-frequency-heatmap', 'figure')],
+                             [Input('spike-detection', 'data'), Input('time-range', 'data')],
+                             [State('session', 'data')], update_spike_frequency_heatmap_callback)
     
+    def submit_spike_activity_frames(trigger, n_clicks, detection, time_range, time_value, session):
+        # Only whether the button was clicked matters, so repeated clicks coalesce into one job
+        spec = session_spec(registry, session, detection)
+        return jobs.submit(job_group('activity', session), (spec, n_clicks and 1, time_value, time_range),
+                           activity_frames_job, session_processor(registry, session, detection), n_clicks and 1,
+                           time_value, time_range)
+
+    register_job_callbacks(server.app, jobs, 'activity',
+                           [Output('spike-activity-frames', 'data'), Output('spike-activity-slider', 'max')],
+                           [Input('confirm-button', 'n_clicks'), Input('spike-detection', 'data'),
+                            Input('time-range', 'data')],
+                           [State('time-value-input', 'value'), State('session', 'data')],
+                           submit_spike_activity_frames)
+
     @server.app.callback(
+        Output('spike-detection', 'data'),
+        Output('detection-status', 'children'),
+        Input('detect-button', 'n_clicks'),
+        State('detection-threshold-input', 'value'),
+        State('session', 'data'),
+        prevent_initial_call=True
+    )
+    def detect_spikes_callback(n_clicks, threshold, session):
+        return detect_spikes(registry, session, threshold)
+
+    server.app.clientside_callback(
+        ClientsideFunction(namespace='meadash', function_name='renderActivityFrame'),
         Output('spike-activity-heatmap', 'figure'),
-        Input('confirm-button', 'n_clicks'),
-        State('time-value-input', 'value')
+        Input('spike-activity-slider', 'value'),
+        Input('spike-activity-frames', 'data')
     )
-    def update_spike_activity_heatmap_callback(n_clicks, time_value=1):
-        return update_spike_activity_heatmap(data_processor,n_clicks, time_value)
-    
-    
-    @server.app.callback(
-        Output('firing-rate-plot', 'figure'),
-        Input('apply-button', 'n_clicks'),
-        State('window-size-input', 'value')
+
+    server.app.clientside_callback(
+        ClientsideFunction(namespace='meadash', function_name='advanceActivityFrame'),
+        Output('spike-activity-slider', 'value'),
+        Input('spike-activity-interval', 'n_intervals'),
+        State('spike-activity-slider', 'value'),
+        State('spike-activity-slider', 'max'),
+        prevent_initial_call=True
     )
-    def update_spiking_rate_plot_callback(n_clicks, windowsize):
-        return update_spiking_rate_plot(data_processor, windowsize)
-    
-    @server.app.callback(
-        Output('power-spectral-density-plot', 'figure'),
-        Input('apply-button', 'n_clicks'),
-        State('window-size-input', 'value')
+
+    server.app.clientside_callback(
+        ClientsideFunction(namespace='meadash', function_name='toggleActivityPlayback'),
+        Output('spike-activity-interval', 'disabled'),
+        Input('spike-activity-play', 'n_clicks'),
+        State('spike-activity-interval', 'disabled')
     )
-    def update_psd_plot_callback(n_clicks, windowsize):
-        return update_psd_plot(data_processor, windowsize)
     
+    
+    def submit_rate_plots(trigger, n_clicks, detection, time_range, windowsize, session):
+        if not windowsize or windowsize <= 0:
+            raise PreventUpdate
+        spec = session_spec(registry, session, detection)
+        return jobs.submit(job_group('rate', session), (spec, float(windowsize), time_range), rate_plots_job,
+                           session_processor(registry, session, detection), float(windowsize), time_range)
+
+    register_job_callbacks(server.app, jobs, 'rate',
+                           [Output('firing-rate-plot', 'figure'), Output('power-spectral-density-plot', 'figure')],
+                           [Input('apply-button', 'n_clicks'), Input('spike-detection', 'data'),
+                            Input('time-range', 'data')],
+                           [State('window-size-input', 'value'), State('session', 'data')], submit_rate_plots)
+    
+    def update_channel_psd_plots_callback(n_clicks, detection, time_range, session):
+        return update_channel_psd_plots(session_processor(registry, session, detection), channel_info, time_range)
+
+    register_figure_callback(server.app,
+                             [Output('channel-psd-heatmap', 'figure'),
+                              Output('channel-peak-frequency-heatmap', 'figure')],
+                             [Input('apply-button', 'n_clicks'), Input('spike-detection', 'data'),
+                              Input('time-range', 'data')],
+                             [State('session', 'data')], update_channel_psd_plots_callback)
+
+    def update_correlation_matrix_callback(n_clicks, method, detection, time_range, bin_width, session):
+        if not bin_width or bin_width <= 0:
+            raise PreventUpdate
+        return update_correlation_matrix(session_processor(registry, session, detection), method, bin_width,
+                                         time_range)
+
+    register_figure_callback(server.app, [Output('correlation-matrix-plot', 'figure')],
+                             [Input('correlation-apply-button', 'n_clicks'),
+                              Input('correlation-method-selector', 'value'), Input('spike-detection', 'data'),
+                              Input('time-range', 'data')],
+                             [State('correlation-bin-input', 'value'), State('session', 'data')],
+                             update_correlation_matrix_callback)
+
+    def update_cross_correlogram_callback(click_data, detection, time_range, session):
+        return update_cross_correlogram(session_processor(registry, session, detection), click_data, time_range)
+
+    register_figure_callback(server.app, [Output('cross-correlogram-plot', 'figure')],
+                             [Input('correlation-matrix-plot', 'clickData'), Input('spike-detection', 'data'),
+                              Input('time-range', 'data')],
+                             [State('session', 'data')], update_cross_correlogram_callback)
+
+    def submit_open_recording(trigger, n_clicks, upload_contents, file_path, sampling_rate, upload_filename,
+                              session):
+        if not session or not sampling_rate or sampling_rate <= 0:
+            raise PreventUpdate
+        if trigger == 'recording-upload':
+            if not upload_contents:
+                raise PreventUpdate
+            # Saved within the request, so the job is keyed by the (content-addressed) path, not the upload
+            try:
+                file_path = registry.save_upload(upload_filename, upload_contents)
+            except ValueError:
+                raise PreventUpdate
+        elif not file_path:
+            raise PreventUpdate
+        return jobs.submit(job_group('open', session), (file_path, float(sampling_rate)), open_recording_job,
+                           registry, session, file_path, float(sampling_rate))
+
+    register_job_callbacks(server.app, jobs, 'open',
+                           [Output('session', 'data', allow_duplicate=True),
+                            Output('spike-detection', 'data', allow_duplicate=True),
+                            Output('time-range', 'data', allow_duplicate=True),
+                            Output('open-status', 'children'),
+                            Output('url', 'pathname')],
+                           [Input('open-button', 'n_clicks'), Input('recording-upload', 'contents')],
+                           [State('recording-path-input', 'value'), State('open-sampling-rate-input', 'value'),
+                            State('recording-upload', 'filename'), State('session', 'data')],
+                           submit_open_recording, prevent_initial_call=True)
+
+    if stream is not None:
+        register_live_callbacks(server.app, stream)
+
+    link_pages = ["/page-1", "/page-2", "/page-3", "/page-4", "/open", "/live"]
+
     @server.app.callback(
-        [Output(f"page-{i}-link", "active") for i in range(1, 4)],
+        [Output(f"{page.strip('/')}-link", "active") for page in link_pages],
         [Input("url", "pathname")]
     )
     def toggle_active_links(pathname):
-        if pathname in ["/", "/page-1"]:
-            return True, False, False
-        elif pathname == "/page-2":
-            return False, True, False
-        elif pathname == "/page-3":
-            return False, False, True
-        return False, False, False
+        pathname = "/page-1" if pathname == "/" else pathname
+        return [pathname == page for page in link_pages]
     
     @server.app.callback(
         Output('page-content', 'children'),
-        [Input('url', 'pathname')]
+        [Input('url', 'pathname'), Input('session', 'data')],
+        State('spike-detection', 'data'),
+        State('time-range', 'data')
     )
-    def render_page_content(pathname):
+    def render_page_content(pathname, session, detection, time_range):
+        if not session:
+            # Rendered once the session has started
+            raise PreventUpdate
+        if pathname == '/live':
+            return layouts.live_layout(stream, channel_info)
+        if pathname == '/debug/perf':
+            return layouts.perf_layout(perf.enabled())
+        if pathname == '/open' or (not session.get('recording') and registry.default is None):
+            return layouts.open_layout(registry.data_roots)
         if not pathname or pathname == '/' or pathname == '/page-1':
             return layouts.page_1_layout()
         elif pathname == '/page-2':
-            return layouts.page_2_layout(data_processor)
+            return layouts.page_2_layout()
         elif pathname == '/page-3':
-            return layouts.page_3_layout(data_processor)
-        return '404 Page Not Found'
\ No newline at end of file
+            return layouts.page_3_layout(session_processor(registry, session, detection), time_range)
+        elif pathname == '/page-4':
+            return layouts.page_4_layout()
+        return '404 Page Not Found'
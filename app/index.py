@@ -1,8 +1,47 @@
 from data_processing.data_processor import DataProcessor
 from app.callbacks import register_callbacks
-from app import server, layouts
+from app.sessions import SessionRegistry, DEFAULT_MEMORY_BUDGET, max_request_bytes
+from app import server, layouts, perf
+from app.transport import enable_compression
 
-def start_dash(data_processor: DataProcessor, channel_info, debug=False):
-    server.app.layout = layouts.create_layout(data_processor, channel_info)
-    register_callbacks(server, data_processor, channel_info)
-    server.app.run_server(debug=debug)
\ No newline at end of file
+def create_dash(channel_info, data_processor: DataProcessor = None, data_roots=None,
+                memory_budget=DEFAULT_MEMORY_BUDGET, debug=False, stream=None, profile=False,
+                trace_allocations=False, compress=True):
+    """
+    Sets up the layout and callbacks of the dashboard for a multi-user server.
+
+    Parameters:
+    - channel_info (numpy.ndarray): Information about the channels.
+    - data_processor (DataProcessor): The recording shown to sessions that did not open one. Defaults to None.
+    - data_roots (list): The server directories sessions may open recordings from by path. Defaults to none.
+    - memory_budget (int): The private memory budget of the open recordings in bytes. Defaults to 2 GiB.
+    - debug (bool): Flag to enable debug mode. Defaults to False.
+    - stream (StreamingProcessor): The live stream shown on the live page. Defaults to None.
+    - profile (bool): Whether to instrument the callbacks and DataProcessor methods (see app/perf.py); the timings
+      are shown on /debug/perf and served at /metrics. Defaults to False.
+    - trace_allocations (bool): Whether profiling also measures peak allocations, which slows down
+      allocation-heavy code. Defaults to False.
+    - compress (bool): Whether responses are compressed with brotli or gzip (needs flask-compress). Defaults to
+      True.
+
+    Returns:
+    - app (dash.Dash): The Dash app; ``app.server`` is the WSGI application.
+    """
+    if profile:
+        perf.enable(trace_allocations=trace_allocations)
+    # Uploads are limited on the server too; dcc.Upload(max_size=...) only stops honest browsers
+    server.app.server.config['MAX_CONTENT_LENGTH'] = max_request_bytes()
+    registry = SessionRegistry(channel_info, memory_budget=memory_budget, data_roots=data_roots,
+                               default=data_processor)
+    server.app.layout = layouts.create_layout()
+    register_callbacks(server, registry, channel_info, debug, stream=stream)
+    if compress:
+        # After the profiling hooks, so that they record the compressed response sizes
+        enable_compression(server.app.server)
+    return server.app
+
+def start_dash(data_processor: DataProcessor, channel_info, debug=False, data_roots=None, host='127.0.0.1',
+               port=8050, stream=None, profile=False, trace_allocations=False):
+    app = create_dash(channel_info, data_processor, data_roots=data_roots, debug=debug, stream=stream,
+                      profile=profile, trace_allocations=trace_allocations)
+    app.run_server(debug=debug, host=host, port=port)
@@ -0,0 +1,246 @@
+# standard imports
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from data_processing.cache import make_key
+
+JOB_STATES = ('pending', 'running', 'done', 'error', 'cancelled')
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when the job was superseded or cancelled."""
+
+
+class Job:
+    """
+    A computation submitted to a ``JobQueue``.
+
+    The job function receives the job as its first argument and reports progress through ``report``, which also
+    raises ``JobCancelled`` once the job has been superseded. Cancellation is best-effort: a running job is not
+    interrupted, it stops at its next ``report`` (a job function that reports twice keeps computing until its
+    next step), and the result of a job cancelled after its last report is discarded.
+
+    Attributes:
+        id (str): The job id, safe to store in the browser.
+        group (str): The group of the job; a newer job of the same group supersedes it.
+        key (tuple): The hashed parameters of the job.
+        state (str): 'pending', 'running', 'done', 'error' or 'cancelled'.
+        progress (float): The reported progress between 0 and 1.
+        message (str): The reported progress message.
+        result: The return value of the job function once done, until it is fetched or superseded.
+        error (str): The error message if the job failed.
+        fetched (bool): Whether the result was taken with ``JobQueue.fetch``.
+
+    """
+
+    def __init__(self, job_id, group, key):
+        self.id = job_id
+        self.group = group
+        self.key = key
+        self.state = 'pending'
+        self.progress = 0.0
+        self.message = 'Queued'
+        self.result = None
+        self.error = None
+        self.fetched = False
+        self.future = None
+        self.submitted_at = time.time()
+        self._cancel = threading.Event()
+
+    @property
+    def finished(self):
+        """bool: Whether the job has stopped (done, failed or cancelled)."""
+        return self.state in ('done', 'error', 'cancelled')
+
+    @property
+    def cancelled(self):
+        """bool: Whether the job was asked to stop."""
+        return self._cancel.is_set()
+
+    def report(self, progress, message=None):
+        """
+        Reports the progress of the job.
+
+        Args:
+            progress (float): The progress between 0 and 1.
+            message (str): The progress message. Default keeps the previous message.
+
+        Raises:
+            JobCancelled: If the job was cancelled.
+
+        """
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    def cancel(self):
+        """Asks the job to stop; a job that has not started yet never runs."""
+        self._cancel.set()
+        if self.future is not None and self.future.cancel():
+            self.state = 'cancelled'
+
+    def __repr__(self):
+        return "Job(id=%r, group=%r, state=%r, progress=%.2f)" % (self.id, self.group, self.state, self.progress)
+
+
+class JobQueue:
+    """
+    Runs long computations of the dashboard in a background thread pool.
+
+    Callbacks submit a job and return at once; the page polls the job with a ``dcc.Interval`` and shows its
+    progress. Submitting the same parameters while a job is pending, running or unfetched returns the existing
+    job (coalescing repeated clicks), and submitting different parameters to the same group cancels the older job
+    (superseding stale requests; see ``Job`` for the limits of cancellation).
+
+    Jobs are coalesced on a key of plain parameters given by the caller, never on the job arguments, and finished
+    jobs only keep their result until it is fetched or superseded, so the queue does not keep processors (or
+    figures) alive that the session registry has already evicted.
+
+    Args:
+        max_workers (int): The number of worker threads. Default is 2.
+        max_finished (int): The number of finished jobs kept for polling. Default is 64.
+
+    """
+
+    def __init__(self, max_workers=2, max_finished=64):
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='meadash-job')
+        self._jobs = OrderedDict()
+        self._by_key = {}
+        self._latest = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, group, parameters, function, *args, **kwargs):
+        """
+        Submits ``function(job, *args, **kwargs)``, or returns the job already computing the same parameters.
+
+        Args:
+            group (str): The group of the job, e.g. one per plot.
+            parameters: The plain values identifying the result (e.g. the recording spec and the plot settings);
+                they form the coalescing key. The arguments are not part of the key and are not kept once the
+                job has run.
+            function (callable): The job function.
+            *args: Positional arguments of the function.
+            **kwargs: Keyword arguments of the function.
+
+        Returns:
+            Job: The submitted or coalesced job.
+
+        """
+        key = make_key(group, {'parameters': parameters})
+        with self._lock:
+            existing = self._jobs.get(self._by_key.get(key))
+            if existing is not None and existing.state not in ('error', 'cancelled'):
+                self._latest[group] = existing.id
+                return existing
+            previous = self._jobs.get(self._latest.get(group))
+            if previous is not None:
+                if previous.finished:
+                    self._release(previous)
+                else:
+                    previous.cancel()
+            job = Job('%s-%d' % (group, next(self._ids)), group, key)
+            self._jobs[job.id] = job
+            self._by_key[key] = job.id
+            self._latest[group] = job.id
+            self._prune()
+        job.future = self._executor.submit(self._run, job, function, args, kwargs)
+        return job
+
+    def _run(self, job, function, args, kwargs):
+        if job.cancelled:
+            job.state = 'cancelled'
+            return
+        job.state = 'running'
+        try:
+            result = function(job, *args, **kwargs)
+            if job.cancelled:
+                # Superseded after its last report: the result is no longer wanted
+                raise JobCancelled()
+            job.result = result
+            job.progress, job.message = 1.0, 'Done'
+            job.state = 'done'
+        except JobCancelled:
+            job.state = 'cancelled'
+        except Exception as e:
+            job.error = '%s: %s' % (type(e).__name__, e)
+            job.state = 'error'
+
+    def _release(self, job):
+        # Drops the result of a finished job, which then no longer coalesces new submissions
+        job.result = None
+        if self._by_key.get(job.key) == job.id:
+            del self._by_key[job.key]
+
+    def _prune(self):
+        # Drops the oldest finished jobs beyond max_finished; running jobs are never dropped
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            self._release(self._jobs.pop(job_id))
+
+    def get(self, job_id):
+        """
+        Returns a job by id.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            Job: The job, or None if it is unknown or was pruned.
+
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def fetch(self, job_id):
+        """
+        Takes the result of a finished job; the queue keeps only its state, so it is fetched once.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            The result, or None if the job is unknown, not done or was already fetched.
+
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.finished or job.fetched:
+                return None
+            result = job.result
+            job.fetched = True
+            self._release(job)
+            return result
+
+    def is_latest(self, job):
+        """
+        Returns whether the job is the newest of its group, i.e. its result is still wanted.
+
+        Args:
+            job (Job): The job.
+
+        Returns:
+            bool: Whether no newer job of the group was submitted.
+
+        """
+        with self._lock:
+            return self._latest.get(job.group) == job.id
+
+    def invalidate(self):
+        """Forgets all finished results, e.g. after the spikes changed; running jobs keep running."""
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items() if job.finished]:
+                self._release(self._jobs.pop(job_id))
+
+    def shutdown(self):
+        """Cancels pending jobs and stops the worker threads."""
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel()
+        self._executor.shutdown(wait=False)
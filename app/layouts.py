@@ -2,6 +2,8 @@ from dash import html, dcc
 import dash_bootstrap_components as dbc
 from plots.plotting import *
 from data_processing.data_processor import DataProcessor
+from app.transport import FIGURE_HASHES_ID, encode_figure
+from app.sessions import UPLOAD_MAX_BYTES
 import numpy as np
 
 def generate_sidebar(pathname, channel_info):
@@ -19,9 +21,12 @@ def generate_sidebar(pathname, channel_info):
     sidebar_common = [
         dbc.Nav(
             [
+                dbc.NavLink("Open recording", href="/open", id="open-link", active="exact"),
                 dbc.NavLink("Channel activity", href="/page-1", id="page-1-link", active="exact"),
                 dbc.NavLink("Raster plot", href="/page-2", id="page-2-link", active="exact"),
                 dbc.NavLink("Spiking rate/Firing Rate", href="/page-3", id="page-3-link", active="exact"),
+                dbc.NavLink("Correlation", href="/page-4", id="page-4-link", active="exact"),
+                dbc.NavLink("Live acquisition", href="/live", id="live-link", active="exact"),
             ],
             vertical=True,
             pills=True,
@@ -55,6 +60,13 @@ def generate_sidebar(pathname, channel_info):
                 dbc.Input(id='time-value-input', type='number', min=0, step=0.1, value=1, style={'width': '100px'}),
                 dbc.Button("Confirm", id='confirm-button', n_clicks=1, color="primary", className="ml-2", style={'width': '100px'}),
             ], className="input-group"),
+            html.Br(),
+            dbc.InputGroup([
+                dbc.Label("Detection threshold (x noise level):", className="mr-2"),
+                dbc.Input(id='detection-threshold-input', type='number', min=0, step=0.5, value=5, style={'width': '100px'}),
+                dbc.Button("Detect spikes", id='detect-button', n_clicks=0, color="primary", className="ml-2", style={'width': '100px'}),
+            ], className="input-group"),
+            html.Div(id='detection-status'),
             html.Br()
         ]
     elif pathname == "/page-2":
@@ -73,19 +85,150 @@ def generate_sidebar(pathname, channel_info):
                     ),
                 ])
         ]
+    elif pathname == "/page-4":
+        # Page with the correlation matrix and cross-correlograms
+        page_specific = [
+            dcc.RadioItems(
+                id='correlation-method-selector',
+                options=[
+                    {'label': 'Pearson (binned counts)', 'value': 'pearson'},
+                    {'label': 'Spike time tiling coefficient', 'value': 'sttc'}
+                ],
+                value='pearson'
+            ),
+            html.Br(),
+            dbc.InputGroup([
+                dbc.Label("Bin width / coincidence window (s):", className="mr-2"),
+                dbc.Input(id='correlation-bin-input', type='number', min=0.001, step=0.001, value=0.01, style={'width': '100px'}),
+                dbc.Button("Apply", id='correlation-apply-button', n_clicks=1, color="primary", className="ml-2", style={'width': '100px'}),
+            ], className="input-group"),
+            html.Br()
+        ]
+    elif pathname == "/live":
+        # Page following a recording while it is acquired
+        page_specific = [
+            dcc.Dropdown(
+                id='live-channel-dropdown',
+                value=0,
+                options=[{'label': f'Channel {i}', 'value': i} for i in range(len(channel_info))],
+                clearable=False
+            ),
+            html.Br()
+        ]
     else:
         page_specific = []
     sidebar_components = sidebar_common + page_specific
     return sidebar_components
 
+def time_range_selector():
+    """
+    Creates the time range selector shared by all pages.
+
+    The selected range is kept in the 'time-range' store (None for the whole recording) and every plot only
+    processes the spikes and samples of that range.
+
+    Returns:
+    - components (html.Div): The range slider and its reset button.
+    """
+    return html.Div([
+        html.Hr(style={'border': 'none', 'border-top': '1px solid', 'margin': '10px 0'}),
+        dbc.Label("Time range (s):"),
+        dcc.RangeSlider(id='time-range-slider', min=0, max=1, step=TIME_RANGE_STEP, value=[0, 1], allowCross=False,
+                        updatemode='mouseup', tooltip={'placement': 'bottom'}),
+        dbc.Button("Whole recording", id='time-range-reset', n_clicks=0, color="secondary", size="sm"),
+    ])
+
+# Resolution of the time range selector in seconds
+TIME_RANGE_STEP = 0.1
+
+# Poll period of background jobs (see app/jobs.py) in milliseconds
+JOB_POLL_INTERVAL_MS = 300
+
+def job_components(name):
+    """
+    Creates the components through which a page follows a background job.
+
+    Parameters:
+    - name (str): The prefix of the job, as passed to ``callbacks.register_job_callbacks``.
+
+    Returns:
+    - components (list): The job store, the resubmission store, the poll interval and the progress bar.
+    """
+    return [
+        # The id of the job and the input that triggered it
+        dcc.Store(id=f'{name}-job'),
+        # Counts the resubmissions of jobs that the polling server process does not know
+        dcc.Store(id=f'{name}-resubmit'),
+        dcc.Interval(id=f'{name}-poll', interval=JOB_POLL_INTERVAL_MS, disabled=True),
+        dbc.Progress(id=f'{name}-progress', value=0, striped=True, animated=True, style={'display': 'none'}),
+    ]
+
+def figure_hashes_store():
+    """
+    Creates the store of the digests of the figures a page shows (see ``transport.send_figures``).
+
+    It is part of the page content, so it starts empty whenever the page is rendered again.
+
+    Returns:
+    - store (dcc.Store): The store.
+    """
+    return dcc.Store(id=FIGURE_HASHES_ID, data={})
+
+def open_layout(data_roots):
+    """
+    Creates the page on which a session opens a recording.
+
+    Parameters:
+    - data_roots (list): The server directories recordings may be opened from by path.
+
+    Returns:
+    - layout (dbc.Col): The page layout.
+    """
+    if data_roots:
+        hint = "Recordings can be opened from: " + ", ".join(data_roots)
+    else:
+        hint = "This server only opens uploaded recordings."
+    return dbc.Col([
+        html.H4("Open a recording", style={'textAlign': 'left', 'margin': '20px'}),
+        dbc.InputGroup([
+            dbc.Input(id='recording-path-input', type='text', placeholder='Path of a .mat/.npy/.bin recording'),
+            dbc.Button("Open", id='open-button', n_clicks=0, color="primary", style={'width': '100px'}),
+        ], className="input-group"),
+        html.Small(hint),
+        html.Br(),
+        html.Br(),
+        dcc.Upload(
+            id='recording-upload',
+            children=html.Div(["Drag and drop or ", html.A("select a recording")]),
+            max_size=UPLOAD_MAX_BYTES,
+            style={'borderWidth': '1px', 'borderStyle': 'dashed', 'borderRadius': '5px', 'textAlign': 'center',
+                   'padding': '20px'}
+        ),
+        html.Br(),
+        dbc.InputGroup([
+            dbc.Label("Sampling rate (Hz):", className="mr-2"),
+            dbc.Input(id='open-sampling-rate-input', type='number', min=1, value=30000, style={'width': '100px'}),
+        ], className="input-group"),
+        html.Div(id='open-status'),
+    ] + job_components('open'), width=10)
+
 def page_1_layout():
     return dbc.Col(
         [   
             html.H4("Neural Signal Analysis Dashboard [60 MEA]", style={'textAlign': 'left', 'margin': '20px'}),
+            figure_hashes_store(),
             dcc.Graph(id='channel-plot'),
             dbc.Row(
                 [
-                    dbc.Col(dcc.Graph(id='spike-activity-heatmap'), 
+                    dbc.Col([
+                                dcc.Graph(id='spike-activity-heatmap'),
+                                # Frames are rendered in the browser from the count matrix in the store
+                                dcc.Store(id='spike-activity-frames'),
+                                dbc.Button("Play/Pause", id='spike-activity-play', color="secondary", size="sm"),
+                                dcc.Slider(id='spike-activity-slider', min=0, max=0, step=1, value=0, marks=None,
+                                           tooltip={'placement': 'bottom'}),
+                                dcc.Interval(id='spike-activity-interval', interval=200, disabled=True),
+                            ] + job_components('activity'),
                             style={'resize': 'both', 'paddingLeft': '150px', 'overflow': 'auto'}, 
                             align="center"),
                     dbc.Col(dcc.Graph(id='spike-frequency-heatmap'))
@@ -94,36 +237,137 @@ def page_1_layout():
         ]
     )
 
-def page_2_layout(data_processor):
-    time_vec = np.arange(data_processor.initial_signal[0].shape[0]) / data_processor.sampling_rate
-    raster_plot_figure = plot_raster(data_processor.raster, time_vector=time_vec)
+def page_2_layout():
+    # The raster is built by a background job once the page is shown
     return dbc.Col([
         html.H4("Neural Signal Analysis Dashboard [60 MEA]", style={'textAlign': 'left', 'margin': '20px'}),
-        dcc.Graph(id='raster-plot', figure=raster_plot_figure)], width=10)
+        figure_hashes_store(),
+        dcc.Graph(id='raster-plot', figure=go.Figure(layout={'uirevision': 'raster'}))]
+        + job_components('raster'), width=10)
 
-def page_3_layout(data_processor):
-    average_spiking_rate_figure = plot_average_spiking_rate(np.sum(data_processor.aggregate_raster_spike_counts(
-        total=False), axis=0))
+def page_3_layout(data_processor, time_range=None):
+    # Read from the summary index of the recording once it is built (see data_processing/summary.py)
+    t_start, t_stop = time_range or (None, None)
+    counts = data_processor.aggregate_raster_spike_counts(total=False, t_start=t_start, t_stop=t_stop)
+    summary = data_processor.summary
+    envelope = summary.envelope(*data_processor.sample_range(t_start, t_stop)) if summary is not None else None
+    average_spiking_rate_figure = encode_figure(plot_average_spiking_rate(np.sum(counts, axis=0),
+                                                                          envelope=envelope))
     return dbc.Col([
         html.H4("Neural Signal Analysis Dashboard [60 MEA]", style={'textAlign': 'left', 'margin': '20px'}),
+        figure_hashes_store(),
         dbc.Row([
             dbc.Col(dcc.Graph(id='average-spiking-rate-plot', figure=average_spiking_rate_figure)),
         ]),
+        dbc.Row(job_components('rate')),
         dbc.Row([
             dbc.Col(dcc.Graph(id='firing-rate-plot')),
         ]),
         dbc.Row([
             dbc.Col(dcc.Graph(id='power-spectral-density-plot')),
         ]),
+        dbc.Row([
+            dbc.Col(dcc.Graph(id='channel-psd-heatmap'), width=8),
+            dbc.Col(dcc.Graph(id='channel-peak-frequency-heatmap'), width=4),
+        ]),
     ],  width=10)
         
-def create_layout(channel_info, data_processor):
+def page_4_layout():
+    return dbc.Col([
+        html.H4("Neural Signal Analysis Dashboard [60 MEA]", style={'textAlign': 'left', 'margin': '20px'}),
+        figure_hashes_store(),
+        dbc.Row([
+            dbc.Col(dcc.Graph(id='correlation-matrix-plot'), width=6),
+            # Clicking a cell of the matrix shows the cross-correlogram of that pair
+            dbc.Col(dcc.Graph(id='cross-correlogram-plot'), width=6),
+        ]),
+    ],  width=10)
+
+# Refresh period of the live page in milliseconds
+LIVE_INTERVAL_MS = 1000
+
+def live_layout(stream, channel_info):
+    """
+    Creates the live acquisition page; its plots are extended with the new data of every refresh.
+
+    Parameters:
+    - stream (StreamingProcessor): The live stream of the server, or None.
+    - channel_info (numpy.ndarray): The channel information.
+
+    Returns:
+    - layout (dbc.Col): The page layout.
+    """
+    title = html.H4("Live acquisition", style={'textAlign': 'left', 'margin': '20px'})
+    if stream is None:
+        return dbc.Col([title, html.P("This server has no live source; start the dashboard with --live.")],
+                       width=10)
+    rate_figure = go.Figure(go.Scatter(x=[], y=[], mode='lines'))
+    rate_figure.update_layout(title='Aggregate Firing Rate', xaxis_title='Time (s)',
+                              yaxis_title='Firing Rate (spikes/second)', uirevision='live')
+    raster_figure = go.Figure(go.Scattergl(x=[], y=[], mode='markers', marker=dict(symbol='line-ns-open', size=5)))
+    raster_figure.update_layout(title='Recent spikes', xaxis_title='Time (s)', yaxis_title='Channel',
+                                yaxis=dict(range=[-0.5, len(channel_info) - 0.5]), uirevision='live', height=600)
+    return dbc.Col([
+        title,
+        html.Div(id='live-status'),
+        dcc.Interval(id='live-interval', interval=LIVE_INTERVAL_MS),
+        # What the page has already received from the stream (see StreamingProcessor.updates_since)
+        dcc.Store(id='live-cursor'),
+        dbc.Row([
+            dbc.Col(dcc.Graph(id='live-rate-plot', figure=rate_figure), width=8),
+            dbc.Col(dcc.Graph(id='live-activity-heatmap',
+                              figure=plot_spike_frequency_heatmap(np.zeros(len(channel_info)), channel_info,
+                                                                  title='Latest activity bin', vmin=0)), width=4),
+        ]),
+        dcc.Graph(id='live-signal-plot', figure=go.Figure(layout={'uirevision': 'live'})),
+        dcc.Graph(id='live-raster-plot', figure=raster_figure),
+    ], width=10)
+
+# Refresh interval of the profiling page in milliseconds
+PERF_INTERVAL_MS = 2000
+
+def perf_layout(enabled):
+    """
+    Creates the hidden profiling page (/debug/perf), which shows where the time of the callbacks goes.
+
+    Parameters:
+    - enabled (bool): Whether the instrumentation is enabled.
+
+    Returns:
+    - layout (dbc.Col): The page layout.
+    """
+    title = html.H4("Performance", style={'textAlign': 'left', 'margin': '20px'})
+    if not enabled:
+        return dbc.Col([title, html.P("Profiling is disabled; start the dashboard with --profile.")], width=10)
+    return dbc.Col([
+        title,
+        html.P("Mean time per call of the latest recorded requests and jobs. Compute is the time in DataProcessor "
+               "methods, figure the rest of the callback (or job), serialize the JSON encoding of its outputs and "
+               "request the remaining Flask and Dash overhead. Prometheus metrics are served at /metrics."),
+        dcc.Interval(id='perf-interval', interval=PERF_INTERVAL_MS),
+        html.Div(id='perf-tables'),
+    ], width=10)
+
+def create_layout():
+    """
+    Creates the page frame shared by all sessions; the sidebar and pages are filled in by the callbacks from the
+    recording of each session.
+
+    Returns:
+    - layout (html.Div): The layout of the app.
+    """
     return html.Div(
         [
             dcc.Location(id='url', refresh=False),
+            # The session and its recording live in the browser, so any server worker can serve any session
+            dcc.Store(id='session', storage_type='session'),
+            # The spike detection threshold of the session, or None for the spikes of the recording
+            dcc.Store(id='spike-detection', storage_type='session'),
+            # The selected (start, stop) time range in seconds, or None for the whole recording
+            dcc.Store(id='time-range', storage_type='session'),
             dbc.Row(
                 [
-                    dbc.Col(id='sidebar', className="sidebar", width=2),
+                    dbc.Col([html.Div(id='sidebar'), time_range_selector()], className="sidebar", width=2),
                     dbc.Col(id='page-content', className="content", width=10)
                 ],
                 className="g-0",
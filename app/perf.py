@@ -0,0 +1,465 @@
+# standard imports
+import functools
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+# third party imports
+import flask
+import numpy as np
+
+from data_processing.data_processor import DataProcessor
+from data_processing.streaming import RingBuffer
+from app.jobs import JobQueue
+
+PERF_RECORD_DTYPE = np.dtype([
+    ('time', np.float64),
+    ('stage', 'U8'),
+    ('parent', 'U8'),
+    ('name', 'U48'),
+    ('root', 'U48'),
+    ('wall', np.float64),
+    ('self', np.float64),
+    ('alloc', np.int64),
+    ('cache_hits', np.int32),
+    ('cache_misses', np.int32),
+    ('payload', np.int64),
+])
+
+# Upper bounds of the wall time histogram buckets of the Prometheus endpoint, in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_recorder = None
+_originals = {}
+_local = threading.local()
+
+
+class PerfRecorder:
+    """
+    Collects the timing records of the instrumented stages.
+
+    Every finished stage is appended to a ring buffer of the latest ``capacity`` records (for the /debug/perf page)
+    and added to cumulative per-stage counters (for the Prometheus endpoint). The stages are:
+
+    - 'request': a Dash callback request in Flask; its payload is the response body size on the wire.
+    - 'response': the Dash callback dispatch, i.e. the callback and the JSON serialization of its outputs; its
+      payload is the serialized JSON size.
+    - 'callback': the callback function itself; its own time is figure construction and glue code.
+    - 'compute': a DataProcessor method, with the analysis cache hits and misses it caused.
+    - 'job': a background job of the JobQueue.
+
+    Args:
+        capacity (int): The number of records kept. Default is 10000.
+        trace_allocations (bool): Whether to measure the peak allocation of every stage with ``tracemalloc``, which
+            slows down allocation-heavy code. Default is False.
+
+    """
+
+    def __init__(self, capacity=10000, trace_allocations=False):
+        self.trace_allocations = trace_allocations
+        self._records = RingBuffer((), capacity, dtype=PERF_RECORD_DTYPE)
+        # Per (stage, name): calls, wall, own time, allocations, payload, cache hits, cache misses, bucket counts
+        self._totals = defaultdict(lambda: np.zeros(7 + len(LATENCY_BUCKETS), dtype=np.float64))
+        self._lock = threading.Lock()
+
+    def record(self, stage, parent, name, root, wall, self_time, alloc=-1, cache_hits=0, cache_misses=0,
+               payload=-1):
+        """
+        Adds one finished stage.
+
+        Args:
+            stage (str): The stage.
+            parent (str): The stage it ran in, or '' at the top level.
+            name (str): The callback, method or job name.
+            root (str): The name of the outermost stage it ran in.
+            wall (float): The wall time in seconds.
+            self_time (float): The wall time not spent in nested stages in seconds.
+            alloc (int): The peak allocation in bytes, or -1 if not traced. Default is -1.
+            cache_hits (int): The analysis cache hits. Default is 0.
+            cache_misses (int): The analysis cache misses. Default is 0.
+            payload (int): The payload size in bytes, or -1 if there is none. Default is -1.
+
+        """
+        entry = np.array([(time.time(), stage, parent, name[:48], root[:48], wall, self_time, alloc, cache_hits,
+                           cache_misses, payload)], dtype=PERF_RECORD_DTYPE)
+        with self._lock:
+            self._records.append(entry)
+            totals = self._totals[(stage, name)]
+            totals[:7] += (1, wall, self_time, max(alloc, 0), max(payload, 0), cache_hits, cache_misses)
+            totals[7:] += wall <= np.asarray(LATENCY_BUCKETS)
+
+    def records(self):
+        """
+        Returns the records kept in the ring buffer, oldest first.
+
+        Returns:
+            numpy.ndarray: The records as a ``PERF_RECORD_DTYPE`` array.
+
+        """
+        with self._lock:
+            return self._records.latest()
+
+    def summary(self):
+        """
+        Summarizes the kept records per stage and name.
+
+        Returns:
+            list: One dict per (stage, name) with the number of calls, the mean and 95th percentile wall time and
+            the mean own time in milliseconds, the mean peak allocation and payload in bytes (None if not
+            measured) and the analysis cache hit ratio (None without cache lookups), slowest total first.
+
+        """
+        records = self.records()
+        rows = []
+        for stage, name in sorted(set(zip(records['stage'], records['name']))):
+            group = records[(records['stage'] == stage) & (records['name'] == name)]
+            lookups = int(group['cache_hits'].sum() + group['cache_misses'].sum())
+            rows.append({
+                'stage': str(stage),
+                'name': str(name),
+                'calls': int(group.size),
+                'total_ms': float(group['wall'].sum() * 1000),
+                'mean_ms': float(group['wall'].mean() * 1000),
+                'p95_ms': float(np.percentile(group['wall'], 95) * 1000),
+                'self_ms': float(group['self'].mean() * 1000),
+                'alloc_bytes': float(group['alloc'].mean()) if (group['alloc'] >= 0).all() else None,
+                'payload_bytes': float(group['payload'].mean()) if (group['payload'] >= 0).all() else None,
+                'cache_hit_ratio': float(group['cache_hits'].sum() / lookups) if lookups else None,
+            })
+        return sorted(rows, key=lambda row: -row['total_ms'])
+
+    def breakdown(self):
+        """
+        Splits the time of every callback and job into its stages, from the kept records.
+
+        Returns:
+            list: One dict per callback or job with the number of calls and the mean time per call in milliseconds
+            spent in DataProcessor computation, in the callback itself (figure construction), in the JSON
+            serialization and in the rest of the request, with the mean JSON and wire payload in bytes.
+
+        """
+        records = self.records()
+        rows = []
+        for root in sorted(set(records['root'])):
+            group = records[records['root'] == root]
+            calls = max(int(np.isin(group['stage'], ('response', 'job')).sum()), 1)
+
+            def mean(mask, field='self'):
+                return float(group[field][mask].sum() / calls)
+
+            # Only the outermost DataProcessor calls count; nested ones are part of their time
+            compute = (group['stage'] == 'compute') & (group['parent'] != 'compute')
+            rows.append({
+                'name': str(root),
+                'calls': calls,
+                'compute_ms': mean(compute, 'wall') * 1000,
+                'figure_ms': mean(np.isin(group['stage'], ('callback', 'job'))) * 1000,
+                'serialize_ms': mean(group['stage'] == 'response') * 1000,
+                'request_ms': mean(group['stage'] == 'request') * 1000,
+                'json_bytes': mean(group['stage'] == 'response', 'payload'),
+                'wire_bytes': mean(group['stage'] == 'request', 'payload'),
+            })
+        return rows
+
+    def prometheus(self, gauges=None):
+        """
+        Renders the cumulative counters in the Prometheus text exposition format.
+
+        Args:
+            gauges (dict): Further gauge values by metric name, e.g. the registry memory. Default is None.
+
+        Returns:
+            str: The metrics.
+
+        """
+        def labels(stage, name, extra=''):
+            name = name.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            return '{stage="%s",name="%s"%s}' % (stage, name, extra)
+
+        with self._lock:
+            totals = {key: value.copy() for key, value in self._totals.items()}
+        stages = sorted(totals)
+        lines = ['# HELP meadash_stage_seconds Wall time of the instrumented stages.',
+                 '# TYPE meadash_stage_seconds histogram']
+        for stage, name in stages:
+            values = totals[(stage, name)]
+            for bound, count in zip(LATENCY_BUCKETS, values[7:]):
+                lines.append('meadash_stage_seconds_bucket%s %d' % (labels(stage, name, ',le="%g"' % bound), count))
+            lines.append('meadash_stage_seconds_bucket%s %d' % (labels(stage, name, ',le="+Inf"'), values[0]))
+            lines.append('meadash_stage_seconds_sum%s %.9g' % (labels(stage, name), values[1]))
+            lines.append('meadash_stage_seconds_count%s %d' % (labels(stage, name), values[0]))
+        for metric, column, help_text in (
+                ('meadash_stage_self_seconds_total', 2, 'Wall time of the stages outside their nested stages.'),
+                ('meadash_stage_allocated_bytes_total', 3, 'Peak allocations of the stages (if traced).'),
+                ('meadash_stage_payload_bytes_total', 4, 'Payload sizes of the request and response stages.')):
+            lines += ['# HELP %s %s' % (metric, help_text), '# TYPE %s counter' % metric]
+            lines += ['%s%s %.9g' % (metric, labels(stage, name), totals[(stage, name)][column])
+                      for stage, name in stages]
+        lines += ['# HELP meadash_cache_lookups_total Analysis cache lookups of the DataProcessor methods.',
+                  '# TYPE meadash_cache_lookups_total counter']
+        for stage, name in stages:
+            if stage == 'compute':
+                lines += ['meadash_cache_lookups_total%s %d' % (labels(stage, name, ',result="%s"' % result),
+                                                                totals[(stage, name)][column])
+                          for result, column in (('hit', 5), ('miss', 6))]
+        for metric, value in (gauges or {}).items():
+            lines += ['# TYPE %s gauge' % metric, '%s %.9g' % (metric, value)]
+        return '\n'.join(lines) + '\n'
+
+
+class _Frame:
+    __slots__ = ('stage', 'name', 'started', 'child', 'alloc_start', 'alloc_peak')
+
+    def __init__(self, stage, name):
+        self.stage = stage
+        self.name = name
+        self.child = 0.0
+        self.alloc_start = self.alloc_peak = 0
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _enter(stage, name):
+    stack = _stack()
+    frame = _Frame(stage, name)
+    if _recorder.trace_allocations and tracemalloc.is_tracing():
+        # The peak is reset per stage; the enclosing stage keeps the peak it had reached so far
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1].alloc_peak = max(stack[-1].alloc_peak, peak)
+        tracemalloc.reset_peak()
+        frame.alloc_start = frame.alloc_peak = current
+    stack.append(frame)
+    frame.started = time.perf_counter()
+    return frame
+
+
+def _exit(frame, payload=-1, cache_hits=0, cache_misses=0):
+    wall = time.perf_counter() - frame.started
+    stack = _stack()
+    while stack and stack.pop() is not frame:
+        # Frames left open by an exception in between
+        pass
+    if stack:
+        stack[-1].child += wall
+    alloc = -1
+    if _recorder.trace_allocations and tracemalloc.is_tracing():
+        alloc = max(frame.alloc_peak, tracemalloc.get_traced_memory()[1]) - frame.alloc_start
+    _recorder.record(frame.stage, stack[-1].stage if stack else '', frame.name, stack[0].name if stack else frame.name,
+                     wall, wall - frame.child, alloc, cache_hits, cache_misses, payload)
+
+
+def _instrument_method(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = self.cache
+        hits, misses = cache.hits, cache.misses
+        frame = _enter('compute', method.__name__)
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            # Counter deltas; concurrent requests on the same processor can blur them
+            _exit(frame, cache_hits=cache.hits - hits, cache_misses=cache.misses - misses)
+    return wrapper
+
+
+def _instrument_job_run(run):
+    @functools.wraps(run)
+    def wrapper(self, job, function, args, kwargs):
+        frame = _enter('job', 'job:' + job.group.split(':')[0])
+        try:
+            return run(self, job, function, args, kwargs)
+        finally:
+            _exit(frame)
+    return wrapper
+
+
+def enabled():
+    """
+    Returns whether the instrumentation is enabled.
+
+    Returns:
+        bool: Whether ``enable`` was called.
+
+    """
+    return _recorder is not None
+
+
+def recorder():
+    """
+    Returns the recorder of the enabled instrumentation.
+
+    Returns:
+        PerfRecorder: The recorder, or None if the instrumentation is disabled.
+
+    """
+    return _recorder
+
+
+def enable(capacity=10000, trace_allocations=False):
+    """
+    Enables the instrumentation of the DataProcessor methods and the background jobs.
+
+    The methods are wrapped in place, so nothing is wrapped (and nothing costs anything) while the instrumentation
+    is disabled. Callbacks are only instrumented when ``instrument_app`` runs while it is enabled.
+
+    Args:
+        capacity (int): The number of records kept. Default is 10000.
+        trace_allocations (bool): Whether to measure the peak allocation of every stage. Default is False.
+
+    Returns:
+        PerfRecorder: The recorder.
+
+    """
+    global _recorder
+    if _recorder is not None:
+        return _recorder
+    _recorder = PerfRecorder(capacity, trace_allocations)
+    if trace_allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    for name, member in vars(DataProcessor).items():
+        # Public methods only; properties, classmethods and helpers are left alone
+        if callable(member) and not name.startswith('_') and not isinstance(member, (classmethod, staticmethod)):
+            _originals[(DataProcessor, name)] = member
+            setattr(DataProcessor, name, _instrument_method(member))
+    _originals[(JobQueue, '_run')] = JobQueue._run
+    JobQueue._run = _instrument_job_run(JobQueue._run)
+    return _recorder
+
+
+def disable():
+    """Restores the uninstrumented methods; callbacks instrumented in the meantime keep their wrappers."""
+    global _recorder
+    for (owner, name), member in _originals.items():
+        setattr(owner, name, member)
+    _originals.clear()
+    if _recorder is not None and _recorder.trace_allocations and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _recorder = None
+
+
+def _instrument_response(dispatch, name):
+    @functools.wraps(dispatch)
+    def wrapper(*args, **kwargs):
+        if _recorder is None:
+            return dispatch(*args, **kwargs)
+        stack = _stack()
+        if stack and stack[-1].stage == 'request':
+            # The request is named after its callback
+            stack[-1].name = name
+        frame = _enter('response', name)
+        response = None
+        try:
+            response = dispatch(*args, **kwargs)
+            return response
+        finally:
+            _exit(frame, payload=len(response) if isinstance(response, (str, bytes)) else 0)
+    return wrapper
+
+
+def _instrument_callback(function, name):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _recorder is None:
+            return function(*args, **kwargs)
+        frame = _enter('callback', name)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _exit(frame)
+    return wrapper
+
+
+def _callback_decorator(app, register):
+    names = set()
+
+    @functools.wraps(register)
+    def callback(*args, **kwargs):
+        existing = set(app.callback_map)
+        decorator = register(*args, **kwargs)
+
+        def wrap(function):
+            keys = sorted(set(app.callback_map) - existing)
+            name = function.__name__
+            if name in names and keys:
+                # Callbacks defined by a shared helper (e.g. the job callbacks) are told apart by their first output
+                name = '%s[%s]' % (name, keys[0].strip('.').split('.')[0])
+            names.add(name)
+            registered = decorator(_instrument_callback(function, name))
+            # The dispatch entry Dash created runs the callback and serializes its outputs
+            for key in keys:
+                entry = app.callback_map[key]
+                entry['callback'] = _instrument_response(entry['callback'], name)
+            return registered
+        return wrap
+    return callback
+
+
+def instrument_app(app, gauges=None):
+    """
+    Instruments the callbacks registered on a Dash app from now on, and serves the metrics.
+
+    Does nothing while the instrumentation is disabled. Otherwise, ``app.callback`` is replaced so that every
+    callback registered afterwards is timed as a 'callback' stage and its dispatch (including the JSON
+    serialization) as a 'response' stage, Flask times every callback request as a 'request' stage, and
+    ``/metrics`` serves the Prometheus text format.
+
+    Args:
+        app (dash.Dash): The Dash app.
+        gauges (callable): Returns further gauge values by metric name for the metrics endpoint. Default is None.
+
+    Returns:
+        bool: Whether the app was instrumented.
+
+    """
+    if _recorder is None:
+        return False
+    if getattr(app, '_perf_instrumented', False):
+        return True
+    app._perf_instrumented = True
+    app.callback = _callback_decorator(app, app.callback)
+
+    flask_server = app.server
+
+    @flask_server.before_request
+    def start_request_timer():
+        if _recorder is not None and flask.request.path.endswith('_dash-update-component'):
+            flask.g.perf_frame = _enter('request', '')
+
+    def finish_request(frame, payload=-1):
+        if not frame.name:
+            # Callbacks registered before the instrumentation (such as the profiling page) are not recorded
+            stack = _stack()
+            if frame in stack:
+                del stack[stack.index(frame):]
+        elif _recorder is not None:
+            _exit(frame, payload=payload)
+
+    @flask_server.after_request
+    def stop_request_timer(response):
+        frame = flask.g.pop('perf_frame', None)
+        if frame is not None:
+            finish_request(frame, response.calculate_content_length() or 0)
+        return response
+
+    @flask_server.teardown_request
+    def drop_request_timer(error=None):
+        # A request that failed before after_request still closes its stage
+        frame = flask.g.pop('perf_frame', None)
+        if frame is not None:
+            finish_request(frame)
+
+    @flask_server.route('/metrics')
+    def perf_metrics():
+        if _recorder is None:
+            flask.abort(404)
+        return flask.Response(_recorder.prometheus(gauges() if gauges else None),
+                              mimetype='text/plain; version=0.0.4')
+
+    return True
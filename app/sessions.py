@@ -0,0 +1,352 @@
+# standard imports
+import base64
+import hashlib
+import math
+import os
+import threading
+import time
+import uuid
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from data_processing.data_processor import DataProcessor
+from data_processing.store import default_store_root
+
+DEFAULT_MEMORY_BUDGET = 2 * 2 ** 30
+
+# Recording specs come from the browser, so their numbers are clamped to these bounds before anything is opened
+SAMPLING_RATE_RANGE = (1.0, 1e6)
+THRESHOLD_RANGE = (1.0, 50.0)
+
+# Largest recording accepted by upload; larger recordings are opened by their path on the server
+UPLOAD_MAX_BYTES = 512 * 2 ** 20
+
+
+def max_request_bytes(upload_max_bytes=UPLOAD_MAX_BYTES):
+    """
+    Returns the largest request body the server accepts: an upload of the largest size, base64-encoded in a
+    callback request.
+
+    Args:
+        upload_max_bytes (int): The largest upload in bytes. Default is UPLOAD_MAX_BYTES.
+
+    Returns:
+        int: The request size limit in bytes.
+
+    """
+    return 4 * (upload_max_bytes + 2) // 3 + 2 ** 20
+
+
+def _is_within(path, root):
+    try:
+        return os.path.commonpath([path, root]) == root
+    except ValueError:
+        # Paths on different drives (Windows)
+        return False
+
+
+def new_session():
+    """
+    Creates the browser-side state of a new session.
+
+    The state holds the session id and the recording spec, so every server worker can serve any session:
+    the recording is re-opened from the memory-mapped store on whichever worker handles the request.
+
+    Returns:
+        dict: The session state with an 'id' and no recording.
+
+    """
+    return {'id': uuid.uuid4().hex, 'recording': None}
+
+
+def recording_spec(file_path=None, sampling_rate=None, threshold=None):
+    """
+    Describes which processor a session views.
+
+    Args:
+        file_path (str): The path of the recording. Default is None (the server's default recording).
+        sampling_rate (float): The sampling rate of the signal in Hz.
+        threshold (float): The spike detection threshold if the spikes were re-detected. Default is None
+            (the spike timestamps of the recording).
+
+    Returns:
+        dict: The recording spec, stored in the browser.
+
+    """
+    return {'file_path': file_path, 'sampling_rate': sampling_rate, 'threshold': threshold}
+
+
+def clamp_parameter(value, bounds):
+    """
+    Converts a client-supplied number to a float within bounds.
+
+    Args:
+        value (float): The value.
+        bounds (tuple): The (minimum, maximum) of the value.
+
+    Returns:
+        float: The clamped value.
+
+    Raises:
+        ValueError: If the value is not a finite number.
+
+    """
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError("%r is not a finite number." % value)
+    return min(max(value, bounds[0]), bounds[1])
+
+
+class SessionRegistry:
+    """
+    A per-process registry of the DataProcessors that the sessions of a shared server view.
+
+    Processors are keyed by their recording spec, so sessions viewing the same recording (and the same spike
+    detection) share one processor and its analysis cache. Recordings are opened through the native store, whose
+    signal and spikes are memory-mapped: opening takes milliseconds, and the pages are shared between all server
+    worker processes through the OS page cache. Only private memory (analysis caches, envelope pyramids, in-memory
+    signals) counts towards the memory budget; when it is exceeded, the least recently used processors are dropped
+    and transparently re-opened on their next use.
+
+    Recording specs are kept in the browser, so every spec is checked again before it is opened: its path must be
+    within the data directories or the upload directory, and its sampling rate and threshold are clamped to
+    ``SAMPLING_RATE_RANGE`` and ``THRESHOLD_RANGE``.
+
+    Every processor builds its summary index (see ``data_processing.summary``) in a background thread as soon as
+    it is opened, so the pages that start from the spike counts and channel PSDs load without computing them. The
+    summary is stored next to the recording, so later opens only read it.
+
+    Args:
+        channel_info (numpy.ndarray): Information about the channels.
+        memory_budget (int): The private memory budget of all processors in bytes. Default is 2 GiB.
+        idle_timeout (float): Processors unused for this many seconds are dropped. Default is 1800.
+        store_root (str): The store directory. Default is ``store.default_store_root()``.
+        data_roots (list): The directories recordings may be opened from by path. Default is none (only uploads).
+        upload_dir (str): The directory uploads are saved to. Default is 'uploads' under the store root.
+        default (DataProcessor): The recording shown to sessions that did not open one. Default is None.
+        upload_max_bytes (int): The largest upload accepted by ``save_upload`` in bytes. Default is
+            UPLOAD_MAX_BYTES.
+
+    """
+
+    def __init__(self, channel_info, memory_budget=DEFAULT_MEMORY_BUDGET, idle_timeout=1800.0, store_root=None,
+                 data_roots=None, upload_dir=None, default=None, upload_max_bytes=UPLOAD_MAX_BYTES):
+        self.channel_info = channel_info
+        self.memory_budget = memory_budget
+        self.idle_timeout = idle_timeout
+        self.store_root = store_root
+        self.data_roots = [os.path.realpath(root) for root in (data_roots or [])]
+        self.upload_dir = upload_dir or os.path.join(store_root or default_store_root(), 'uploads')
+        self.default = default
+        self.upload_max_bytes = upload_max_bytes
+        self._processors = OrderedDict()
+        self._last_used = {}
+        self._lock = threading.RLock()
+        self._summaries = ThreadPoolExecutor(max_workers=1, thread_name_prefix='meadash-summary')
+        self.evictions = 0
+        if default is not None:
+            self._summarize(default)
+
+    @staticmethod
+    def _key(spec):
+        return (spec.get('file_path'), spec.get('sampling_rate'), spec.get('threshold'))
+
+    def _is_allowed(self, real_path):
+        allowed = self.data_roots + [os.path.realpath(self.upload_dir)]
+        return any(_is_within(real_path, root) for root in allowed)
+
+    def validate(self, spec):
+        """
+        Checks a recording spec received from the browser and returns it in canonical form.
+
+        Args:
+            spec (dict): The recording spec, or None for the default recording.
+
+        Returns:
+            dict: The spec with the real path of the recording and the clamped sampling rate and threshold.
+
+        Raises:
+            PermissionError: If the path is outside the data directories and the upload directory.
+            ValueError: If the spec is malformed, the sampling rate is missing or a number is not finite.
+
+        """
+        spec = spec or recording_spec()
+        if not isinstance(spec, dict):
+            raise ValueError("Invalid recording spec %r." % (spec,))
+        file_path, sampling_rate = spec.get('file_path'), None
+        if file_path is not None:
+            if not isinstance(file_path, str):
+                raise ValueError("Invalid recording path %r." % (file_path,))
+            file_path = os.path.realpath(file_path)
+            if not self._is_allowed(file_path):
+                raise PermissionError("%s is outside the data directories of this server." % spec['file_path'])
+            if spec.get('sampling_rate') is None:
+                raise ValueError("The sampling rate of %s is missing." % spec['file_path'])
+            sampling_rate = clamp_parameter(spec['sampling_rate'], SAMPLING_RATE_RANGE)
+        threshold = spec.get('threshold')
+        if threshold is not None:
+            threshold = clamp_parameter(threshold, THRESHOLD_RANGE)
+        return recording_spec(file_path, sampling_rate, threshold)
+
+    def _open(self, spec):
+        if spec.get('threshold') is not None:
+            # Re-detected spikes get their own processor over the same (shared) signal
+            base = self.get(recording_spec(spec.get('file_path'), spec.get('sampling_rate')))
+            processor = DataProcessor(base.initial_signal, base.spikes, base.sampling_rate, base.channel_info,
+                                      cache_bytes=base.cache.max_bytes, remap=False, precision=base.precision)
+            processor.store_path = base.store_path
+            processor.detect_spikes(threshold=spec['threshold'])
+            return processor
+        if spec.get('file_path') is None:
+            if self.default is None:
+                raise LookupError("No recording was opened in this session.")
+            return self.default
+        return DataProcessor.from_recording(spec['file_path'], spec['sampling_rate'], self.channel_info,
+                                            self.store_root)
+
+    def get(self, spec):
+        """
+        Returns the processor of a recording spec, opening it if it is not open in this process.
+
+        Args:
+            spec (dict): The recording spec, or None for the default recording.
+
+        Returns:
+            DataProcessor: The processor.
+
+        Raises:
+            LookupError: If the spec is None and there is no default recording.
+            PermissionError: If the path is outside the data directories and the upload directory.
+            ValueError: If the sampling rate is missing or a number is not finite.
+
+        """
+        spec = self.validate(spec)
+        key = self._key(spec)
+        with self._lock:
+            processor = self._processors.get(key)
+        opened = processor is None
+        if opened:
+            # Opened outside the lock, so a first-time conversion does not stall the other sessions
+            processor = self._open(spec)
+        with self._lock:
+            opened = opened and key not in self._processors
+            processor = self._processors.setdefault(key, processor)
+            if opened:
+                self._summarize(processor)
+            self._processors.move_to_end(key)
+            self._last_used[key] = time.monotonic()
+            self._evict(keep=key)
+            return processor
+
+    def _summarize(self, processor):
+        if processor.summary is not None:
+            return
+
+        def report(future):
+            if future.exception() is not None:
+                warnings.warn("The summary index could not be built: %r" % future.exception())
+
+        self._summaries.submit(processor.build_summary).add_done_callback(report)
+
+    def _evict(self, keep):
+        now = time.monotonic()
+        for key in [key for key, used in self._last_used.items() if key != keep and now - used > self.idle_timeout]:
+            self._drop(key)
+        while self.resident_nbytes() > self.memory_budget:
+            candidates = [key for key in self._processors if key != keep]
+            if not candidates:
+                # A single processor over budget only keeps what its own cache budget allows
+                break
+            self._drop(candidates[0])
+
+    def _drop(self, key):
+        processor = self._processors.pop(key)
+        del self._last_used[key]
+        if processor is not self.default:
+            processor.cache.clear()
+        self.evictions += 1
+
+    def resident_nbytes(self):
+        """
+        Returns the private memory held by all open processors.
+
+        Returns:
+            int: The memory in bytes.
+
+        """
+        with self._lock:
+            return sum(processor.resident_nbytes for processor in self._processors.values())
+
+    def open_path(self, file_path, sampling_rate):
+        """
+        Opens a recording on the server by path and returns its spec.
+
+        Args:
+            file_path (str): The path of the recording.
+            sampling_rate (float): The sampling rate of the signal in Hz.
+
+        Returns:
+            dict: The recording spec.
+
+        Raises:
+            PermissionError: If the path is outside the allowed data directories.
+            FileNotFoundError: If the recording does not exist.
+
+        """
+        spec = self.validate(recording_spec(file_path, sampling_rate))
+        if not os.path.isfile(spec['file_path']):
+            raise FileNotFoundError("%s does not exist." % file_path)
+        self.get(spec)
+        return spec
+
+    def save_upload(self, filename, contents):
+        """
+        Saves an uploaded recording (a dcc.Upload data URL) into the upload directory.
+
+        Uploads are named after their content digest, so uploading the same file twice reuses its store.
+
+        Args:
+            filename (str): The name of the uploaded file.
+            contents (str): The 'data:<type>;base64,<data>' contents.
+
+        Returns:
+            str: The path of the saved file.
+
+        Raises:
+            ValueError: If the upload is larger than ``upload_max_bytes`` or not a base64 data URL.
+
+        """
+        if ',' not in contents:
+            raise ValueError("The upload is not a base64 data URL.")
+        encoded = contents.split(',', 1)[1]
+        # Checked before decoding, so an oversized upload is never decoded into memory
+        if len(encoded) > 4 * (self.upload_max_bytes + 2) // 3:
+            raise ValueError("Uploads are limited to %d MiB." % (self.upload_max_bytes // 2 ** 20))
+        data = base64.b64decode(encoded, validate=True)
+        if len(data) > self.upload_max_bytes:
+            raise ValueError("Uploads are limited to %d MiB." % (self.upload_max_bytes // 2 ** 20))
+        digest = hashlib.blake2b(data, digest_size=8).hexdigest()
+        os.makedirs(self.upload_dir, exist_ok=True)
+        path = os.path.join(self.upload_dir, '%s_%s' % (digest, os.path.basename(filename)))
+        if not os.path.exists(path):
+            with open(path + '.part', 'wb') as f:
+                f.write(data)
+            os.replace(path + '.part', path)
+        return path
+
+    def stats(self):
+        """
+        Returns the registry statistics.
+
+        Returns:
+            dict: The number of open processors, their private memory, the budget and the evictions so far.
+
+        """
+        with self._lock:
+            return {
+                'processors': len(self._processors),
+                'resident_nbytes': self.resident_nbytes(),
+                'memory_budget': self.memory_budget,
+                'evictions': self.evictions,
+            }
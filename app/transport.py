@@ -0,0 +1,187 @@
+"""
+Compact transport of figures and responses from the server to the browser.
+
+- The numeric arrays of a figure are sent as base64-encoded typed arrays (the plotly.js typed array spec,
+  ``{'dtype': 'f4', 'bdata': ...}``) instead of JSON lists of numbers, which are several times larger and slow to
+  build on the server and to parse in the browser.
+- Figure callbacks skip figures whose content hash equals that of the figure the browser already shows. The hashes
+  of the figures of a page live in the page's 'figure-hashes' store, so a page that is rendered again starts with
+  no hashes, and a response that the browser discards never records its hash.
+- Responses are compressed with brotli or gzip when flask-compress is installed.
+"""
+# standard imports
+import base64
+import hashlib
+import json
+import warnings
+
+# third party imports
+import numpy as np
+import plotly.graph_objects as go
+from dash import no_update, Patch
+
+FIGURE_HASHES_ID = 'figure-hashes'
+
+# The dtypes plotly.js decodes from typed array specs, by numpy dtype name
+TYPED_ARRAY_DTYPES = {
+    'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2', 'int32': 'i4', 'uint32': 'u4',
+    'float32': 'f4', 'float64': 'f8',
+}
+# Shorter arrays stay JSON lists; their encoding would not be smaller
+MIN_TYPED_ARRAY_LENGTH = 32
+
+# Compression of the responses (see flask-compress); brotli is preferred over gzip by browsers that accept it
+COMPRESS_ALGORITHMS = ['br', 'gzip']
+COMPRESS_MIN_SIZE = 1024
+
+
+def _narrow_integers(array):
+    # plotly.js has no 64-bit integer typed arrays; the smallest integer dtype holding the values is used instead
+    low, high = array.min(), array.max()
+    for dtype in ((np.int8, np.int16, np.int32) if array.dtype.kind == 'i' else (np.uint8, np.uint16, np.uint32)):
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return array.astype(dtype)
+    return array.astype(np.float64)
+
+
+def typed_array(values, min_length=MIN_TYPED_ARRAY_LENGTH):
+    """
+    Encodes a numeric array as a plotly.js typed array spec.
+
+    Parameters:
+    - values (numpy.ndarray or list): The values; nested lists are read as a 2-D array.
+    - min_length (int): The smallest number of values that is encoded. Defaults to MIN_TYPED_ARRAY_LENGTH.
+
+    Returns:
+    - spec (dict): The 'dtype', base64 'bdata' and, for 2-D arrays, 'shape' of the array; None if the values are
+      not a numeric array of at least ``min_length`` values.
+    """
+    if isinstance(values, (list, tuple)):
+        if len(values) < min_length and not (values and isinstance(values[0], (list, tuple))):
+            return None
+        if values and isinstance(values[0], (dict, str)):
+            return None
+    try:
+        array = np.asarray(values)
+    except ValueError:
+        # Ragged nested lists
+        return None
+    if array.size < min_length or array.ndim > 2 or array.dtype.kind not in 'biuf':
+        return None
+    if array.dtype.kind == 'b':
+        array = array.astype(np.uint8)
+    elif array.dtype.kind in 'iu' and array.dtype.itemsize == 8:
+        array = _narrow_integers(array)
+    elif array.dtype.kind == 'f' and array.dtype.itemsize < 4:
+        array = array.astype(np.float32)
+    array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<'))
+    spec = {'dtype': TYPED_ARRAY_DTYPES[array.dtype.name], 'bdata': base64.b64encode(array).decode('ascii')}
+    if array.ndim > 1:
+        spec['shape'] = ', '.join(str(n) for n in array.shape)
+    return spec
+
+
+def _encode(value, min_length):
+    # min_length None only converts numpy values to JSON types
+    if isinstance(value, dict):
+        return {key: _encode(item, min_length) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        spec = None if min_length is None else typed_array(value, min_length)
+        if spec is not None:
+            return spec
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        return [_encode(item, min_length) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def encode_figure(figure, min_length=MIN_TYPED_ARRAY_LENGTH):
+    """
+    Converts a figure to its JSON dict with the numeric arrays of its traces and frames as typed array specs.
+
+    Parameters:
+    - figure (plotly.graph_objects.Figure or dict): The figure.
+    - min_length (int): The smallest number of values that is encoded. Defaults to MIN_TYPED_ARRAY_LENGTH.
+
+    Returns:
+    - figure (dict): The figure, made of JSON types only.
+    """
+    if isinstance(figure, go.Figure):
+        figure = figure.to_plotly_json()
+    # Only trace attributes are encoded; the layout (tick values, ranges) is kept as plain JSON
+    return {key: _encode(value, min_length if key in ('data', 'frames') else None) for key, value in figure.items()}
+
+
+def figure_digest(figure):
+    """
+    Hashes the content of an encoded figure.
+
+    Parameters:
+    - figure (dict): The figure from ``encode_figure``.
+
+    Returns:
+    - digest (str): The hex digest.
+    """
+    payload = json.dumps(figure, sort_keys=True, separators=(',', ':'), allow_nan=True)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def send_figures(values, outputs, hashes):
+    """
+    Prepares the return values of a callback: encodes its figures and skips those the browser already shows.
+
+    Parameters:
+    - values (list): The return values, one per output.
+    - outputs (list): The Dash outputs; the values of 'figure' outputs are encoded and deduplicated.
+    - hashes (dict): The 'figure-hashes' store of the page, mapping an output id to the digest of its figure.
+
+    Returns:
+    - values (list): The values to return, with unchanged figures replaced by ``no_update``.
+    - patch (dash.Patch or no_update): The update of the 'figure-hashes' store.
+    """
+    hashes = hashes or {}
+    patch = Patch()
+    changed = False
+    sent = []
+    for value, output in zip(values, outputs):
+        if output.component_property != 'figure' or value is no_update or value is None:
+            sent.append(value)
+            continue
+        figure = encode_figure(value)
+        digest = figure_digest(figure)
+        key = str(output)
+        if hashes.get(key) == digest:
+            sent.append(no_update)
+            continue
+        patch[key] = digest
+        changed = True
+        sent.append(figure)
+    return sent, patch if changed else no_update
+
+
+def enable_compression(flask_server, algorithms=None, min_size=COMPRESS_MIN_SIZE):
+    """
+    Compresses the responses of the server with flask-compress, if it is installed.
+
+    Callback responses, the index page and the JavaScript bundles are compressed. Enable it after any other
+    after_request hook that should see the compressed size (Flask runs the hooks in reverse order).
+
+    Parameters:
+    - flask_server (flask.Flask): The server.
+    - algorithms (list): The encodings in order of preference. Defaults to COMPRESS_ALGORITHMS.
+    - min_size (int): Smaller responses are sent uncompressed. Defaults to COMPRESS_MIN_SIZE.
+
+    Returns:
+    - enabled (bool): Whether compression was enabled.
+    """
+    try:
+        from flask_compress import Compress
+    except ImportError:
+        warnings.warn("Responses are sent uncompressed; install flask-compress to compress them.")
+        return False
+    flask_server.config.update(COMPRESS_ALGORITHM=list(algorithms or COMPRESS_ALGORITHMS),
+                               COMPRESS_MIN_SIZE=min_size)
+    Compress(flask_server)
+    return True
@@ -0,0 +1,27 @@
+"""
+WSGI entry point of a shared dashboard server, e.g.::
+
+    MEADASH_DATA_DIRS=/data/recordings gunicorn --workers 1 --threads 8 app.wsgi:server
+
+Environment variables:
+- MEADASH_DATA_DIRS: The directories recordings may be opened from by path, separated by ``os.pathsep``.
+- MEADASH_MEMORY_BUDGET_MB: The private memory budget of the open recordings per worker in MiB.
+- MEADASH_STORE_DIR: The directory of the native recording stores (see ``data_processing.store``).
+- MEADASH_PROFILE: '1' instruments the callbacks (see ``app.perf``), 'allocations' also traces peak allocations.
+- MEADASH_PRECISION: 'compact' (default) or 'float64', the dtypes of the signals, rasters and analyses (see
+  ``data_processing.precision``).
+"""
+# standard imports
+import os
+
+from app.index import create_dash
+from app.sessions import DEFAULT_MEMORY_BUDGET
+from data_processing.utils import load_channel_info_from_json
+
+data_roots = [root for root in os.environ.get('MEADASH_DATA_DIRS', '').split(os.pathsep) if root]
+profile = os.environ.get('MEADASH_PROFILE', '').lower()
+memory_budget = int(os.environ.get('MEADASH_MEMORY_BUDGET_MB', DEFAULT_MEMORY_BUDGET // 2 ** 20)) * 2 ** 20
+
+app = create_dash(load_channel_info_from_json(), data_roots=data_roots, memory_budget=memory_budget,
+                  profile=profile not in ('', '0', 'false'), trace_allocations=profile == 'allocations')
+server = app.server
@@ -0,0 +1,389 @@
+"""
+Headless batch analysis of many recordings.
+
+Every recording is analysed in its own worker process (spike counts, active channels, firing rate, PSD and
+bursts), and the results are written as summary tables and static figures::
+
+    python batch_analysis.py "recordings/*.mat" --sampling-rate 30000 --output-dir results --workers 8
+
+The output directory holds ``summary.csv``/``summary.json`` with one row per recording, ``run.json`` with the
+throughput of the run, and one directory per recording with its per-channel table and figures.
+"""
+# standard imports
+import argparse
+import csv
+import errno
+import glob
+import json
+import math
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+
+# third party imports
+import numpy as np
+
+from data_processing.data_processor import DataProcessor
+from data_processing.precision import PRECISION_POLICIES
+from data_processing.utils import load_channel_info_from_json, load_recording
+from plots.plotting import plot_firing_rate, plot_psd, plot_spike_frequency_heatmap, plot_channel_psd
+
+FIGURE_FORMATS = ('html', 'png', 'svg', 'none')
+
+SUMMARY_FIELDS = [
+    'recording', 'status', 'duration_s', 'n_spikes', 'n_active_channels', 'mean_rate_hz', 'peak_rate_hz',
+    'center_frequency_hz', 'n_channel_bursts', 'channel_bursts_per_minute', 'n_network_bursts',
+    'network_bursts_per_minute', 'network_burst_duration_s', 'network_burst_rate_hz', 'network_burst_interval_s',
+    'network_burst_interval_cv', 'elapsed_s', 'error',
+]
+
+CHANNEL_FIELDS = ['channel', 'electrode', 'n_spikes', 'rate_hz', 'active', 'peak_frequency_hz', 'n_bursts',
+                  'burst_rate_hz']
+
+
+def parse_size(value):
+    """
+    Parses a memory size such as '4G', '512M' or '1073741824' into bytes.
+
+    Args:
+        value (str): The size.
+
+    Returns:
+        int: The size in bytes.
+
+    """
+    units = {'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30, 'T': 2 ** 40}
+    value = value.strip().upper().rstrip('B')
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def expand_recordings(patterns):
+    """
+    Expands glob patterns into a sorted list of unique recording paths.
+
+    Args:
+        patterns (list): Paths or glob patterns ('**' matches directories recursively).
+
+    Returns:
+        list: The recording paths.
+
+    """
+    paths = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True)
+        paths.update(os.path.abspath(path) for path in (matches or ([pattern] if os.path.exists(pattern) else [])))
+    return sorted(path for path in paths if os.path.isfile(path))
+
+
+def output_names(paths):
+    """
+    Assigns every recording a unique output directory name based on its file name.
+
+    Args:
+        paths (list): The recording paths.
+
+    Returns:
+        list: The names, parallel to ``paths``.
+
+    """
+    names, seen = [], {}
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        names.append(stem if seen[stem] == 1 else '%s_%d' % (stem, seen[stem]))
+    return names
+
+
+def _limit_worker_memory(max_bytes):
+    # Caps the private (heap and anonymous) memory of a worker, so one oversized recording fails with a
+    # MemoryError instead of pushing the machine into swap. RLIMIT_AS would also count the memory-mapped
+    # stores and reject any recording larger than the limit, although their pages are not private.
+    # Enforced on Linux 4.7+; not available on Windows.
+    if max_bytes:
+        try:
+            import resource
+        except ImportError:
+            return
+        resource.setrlimit(resource.RLIMIT_DATA, (max_bytes, max_bytes))
+
+
+def _is_out_of_memory(error):
+    # Allocations beyond the limit raise MemoryError, failed mappings OSError(ENOMEM)
+    return isinstance(error, MemoryError) or isinstance(error, OSError) and error.errno == errno.ENOMEM
+
+
+def _write_figure(fig, path, figure_format):
+    if figure_format == 'html':
+        fig.write_html(path + '.html', include_plotlyjs='cdn', full_html=True)
+    else:
+        # Requires the optional kaleido package
+        fig.write_image(path + '.' + figure_format)
+
+
+def _write_csv(path, fields, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _json_value(value):
+    if isinstance(value, (np.integer, np.floating)):
+        value = value.item()
+    return None if isinstance(value, float) and not math.isfinite(value) else value
+
+
+def analyze_recording(file_path, output_dir, sampling_rate, channel_info, window_size=0.2,
+                      active_channel_threshold=5, figure_format='html', store_root=None, use_store=True,
+                      cache_bytes=256 * 2 ** 20, precision=None):
+    """
+    Runs the analysis pipeline on one recording and writes its per-channel table, summary and figures.
+
+    Args:
+        file_path (str): The path of the recording.
+        output_dir (str): The directory for the outputs of this recording.
+        sampling_rate (float): The sampling rate of the signal in Hz.
+        channel_info (numpy.ndarray): Information about the channels.
+        window_size (float): The firing rate window in seconds. Default is 0.2.
+        active_channel_threshold (int): The spike count of an active channel. Default is 5.
+        figure_format (str): 'html', 'png', 'svg' or 'none'. Default is 'html'.
+        store_root (str): The store directory. Default is ``store.default_store_root()``.
+        use_store (bool): Whether to open the recording through the native store. Default is True.
+        cache_bytes (int): The analysis cache budget of the processor. Default is 256 MiB.
+        precision (str): The precision policy of the processor. Default is $MEADASH_PRECISION, or 'compact'.
+
+    Returns:
+        dict: The summary row of the recording.
+
+    """
+    started = time.perf_counter()
+    if use_store:
+        data_processor = DataProcessor.from_recording(file_path, sampling_rate, channel_info, store_root,
+                                                      cache_bytes=cache_bytes, precision=precision)
+    else:
+        signal, spike_timestamps = load_recording(file_path)
+        data_processor = DataProcessor(signal, spike_timestamps, sampling_rate, channel_info,
+                                       cache_bytes=cache_bytes, precision=precision)
+    spikes = data_processor.spikes
+    duration = data_processor.n_samples / sampling_rate
+    os.makedirs(output_dir, exist_ok=True)
+
+    counts = data_processor.aggregate_raster_spike_counts(total=True)
+    active_channels = data_processor.get_active_channels(active_channel_threshold)
+    firing_rate = data_processor.convolve_signal(window_size, 'boxcar', sum_channels=True) / window_size
+    frequencies, pxx, center_frequency = data_processor.estimate_power_spectral_density(firing_rate * window_size)
+    channel_frequencies, channel_pxx, peak_frequencies = data_processor.estimate_channel_psd()
+    channel_bursts, network_bursts = data_processor.detect_bursts()
+    bursts = data_processor.summarize_bursts()
+
+    channel_rows = []
+    burst_counts = np.bincount(channel_bursts['channel'], minlength=spikes.n_channels)
+    for channel in range(spikes.n_channels):
+        in_channel = channel_bursts['channel'] == channel
+        channel_rows.append({
+            'channel': channel,
+            'electrode': _json_value(channel_info[channel]) if channel < len(channel_info) else None,
+            'n_spikes': int(counts[channel]),
+            'rate_hz': counts[channel] / duration if duration > 0 else None,
+            'active': bool(channel in active_channels),
+            'peak_frequency_hz': _json_value(peak_frequencies[channel]),
+            'n_bursts': int(burst_counts[channel]),
+            'burst_rate_hz': _json_value(channel_bursts['rate'][in_channel].mean()) if in_channel.any() else None,
+        })
+    _write_csv(os.path.join(output_dir, 'channels.csv'), CHANNEL_FIELDS, channel_rows)
+
+    summary = {
+        'recording': file_path,
+        'status': 'ok',
+        'duration_s': duration,
+        'n_spikes': int(spikes.n_spikes),
+        'n_active_channels': int(active_channels.size),
+        'mean_rate_hz': float(firing_rate.mean()) if firing_rate.size else None,
+        'peak_rate_hz': float(firing_rate.max()) if firing_rate.size else None,
+        'center_frequency_hz': float(center_frequency),
+        'n_channel_bursts': bursts['channel']['n_bursts'],
+        'channel_bursts_per_minute': bursts['channel']['bursts_per_minute'],
+        'n_network_bursts': bursts['network']['n_bursts'],
+        'network_bursts_per_minute': bursts['network']['bursts_per_minute'],
+        'network_burst_duration_s': bursts['network']['mean_duration'],
+        'network_burst_rate_hz': bursts['network']['mean_rate'],
+        'network_burst_interval_s': bursts['network']['mean_interval'],
+        'network_burst_interval_cv': bursts['network']['cv_interval'],
+    }
+
+    if figure_format != 'none':
+        burst_times = np.column_stack((network_bursts['start'], network_bursts['stop'])) / sampling_rate
+        # The full-rate trace is decimated to ~10k points so the exported figures stay small
+        step = max(firing_rate.size // 10000, 1)
+        time_vector = np.arange(0, firing_rate.size, step) / sampling_rate
+        figures = {
+            'firing_rate': plot_firing_rate(firing_rate[::step], time_vector, bursts=burst_times,
+                                            title='Firing Rate - window size: %g s' % window_size),
+            'psd': plot_psd(frequencies, pxx, center_frequency),
+            'channel_psd': plot_channel_psd(channel_frequencies, channel_pxx),
+            'spike_counts': plot_spike_frequency_heatmap(counts, channel_info),
+        }
+        for name, fig in figures.items():
+            _write_figure(fig, os.path.join(output_dir, name), figure_format)
+
+    summary['elapsed_s'] = time.perf_counter() - started
+    summary = {key: _json_value(value) for key, value in summary.items()}
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def _analyze_safely(file_path, output_dir, *args, **kwargs):
+    # A failing recording is reported in the summary instead of aborting the batch
+    started = time.perf_counter()
+    try:
+        return analyze_recording(file_path, output_dir, *args, **kwargs)
+    except Exception as e:
+        if _is_out_of_memory(e):
+            error = 'MemoryError: the recording exceeds the worker memory limit'
+        else:
+            error = '%s: %s' % (type(e).__name__, e)
+            traceback.print_exc()
+    return {'recording': file_path, 'status': 'error', 'error': error, 'elapsed_s': time.perf_counter() - started}
+
+
+def run_batch(recordings, output_dir, sampling_rate, channel_info, workers=None, max_memory=None,
+              tasks_per_worker=1, **kwargs):
+    """
+    Analyses recordings in a process pool, one recording per task.
+
+    Workers are replaced after ``tasks_per_worker`` recordings, so memory fragmented by one recording is
+    returned to the OS before the next one (Python 3.11+). When a worker dies, the recordings lost with its
+    pool are retried in a fresh pool and then one at a time; a recording that still kills its worker gets
+    an 'error' row.
+
+    Args:
+        recordings (list): The recording paths.
+        output_dir (str): The output directory.
+        sampling_rate (float): The sampling rate of the signals in Hz.
+        channel_info (numpy.ndarray): Information about the channels.
+        workers (int): The number of worker processes. Default is the number of CPUs.
+        max_memory (int): The private memory limit of every worker in bytes; memory-mapped recordings do not
+            count towards it. Default is no limit.
+        tasks_per_worker (int): The recordings analysed by a worker before it is replaced. Default is 1.
+        **kwargs: Further arguments for ``analyze_recording``.
+
+    Returns:
+        list: The summary rows, in the order of ``recordings``.
+        dict: The run statistics (wall time, throughput in recordings/hour).
+
+    """
+    workers = workers or os.cpu_count() or 1
+    names = output_names(recordings)
+    pool_kwargs = {'max_workers': min(workers, max(len(recordings), 1)), 'initializer': _limit_worker_memory,
+                   'initargs': (max_memory,)}
+    if tasks_per_worker and sys.version_info >= (3, 11):
+        pool_kwargs.update(max_tasks_per_child=tasks_per_worker, mp_context=multiprocessing.get_context('spawn'))
+
+    started = time.perf_counter()
+    rows = [None] * len(recordings)
+    done = 0
+
+    def analyze(indices, pool_kwargs):
+        # Runs one pool over the recordings; returns those lost because a worker died and broke the pool
+        nonlocal done
+        broken = []
+        with ProcessPoolExecutor(**pool_kwargs) as executor:
+            futures = {executor.submit(_analyze_safely, recordings[i], os.path.join(output_dir, names[i]),
+                                       sampling_rate, channel_info, **kwargs): i for i in indices}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    rows[i] = future.result()
+                except BrokenProcessPool:
+                    broken.append(i)
+                    continue
+                done += 1
+                print("[%d/%d] %s: %s (%.1f s)" % (done, len(recordings), names[i], rows[i]['status'],
+                                                    rows[i]['elapsed_s']), flush=True)
+        return sorted(broken)
+
+    broken = analyze(range(len(recordings)), pool_kwargs)
+    if broken:
+        # A worker killed by the OS (e.g. out of memory) or crashed fails every recording left in its pool
+        print("A worker process died; retrying %d recordings in a fresh pool" % len(broken), flush=True)
+        broken = analyze(broken, pool_kwargs)
+    for i in broken:
+        # Still failing: run every recording alone, so the one killing its worker is known
+        retry_started = time.perf_counter()
+        if analyze([i], dict(pool_kwargs, max_workers=1)):
+            rows[i] = {'recording': recordings[i], 'status': 'error',
+                       'error': 'BrokenProcessPool: the worker process died (killed by the OS or crashed)',
+                       'elapsed_s': time.perf_counter() - retry_started}
+            done += 1
+            print("[%d/%d] %s: error (worker died)" % (done, len(recordings), names[i]), flush=True)
+    wall = time.perf_counter() - started
+
+    succeeded = sum(row['status'] == 'ok' for row in rows)
+    run = {
+        'recordings': len(rows),
+        'succeeded': succeeded,
+        'failed': len(rows) - succeeded,
+        'workers': pool_kwargs['max_workers'],
+        'wall_time_s': wall,
+        'recordings_per_hour': succeeded / wall * 3600 if wall > 0 else None,
+        'mean_recording_time_s': float(np.mean([row['elapsed_s'] for row in rows])) if rows else None,
+    }
+    return rows, run
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyse many recordings without the dashboard.')
+    parser.add_argument('recordings', nargs='+', help='Recordings or glob patterns (quote them; ** is recursive).')
+    parser.add_argument('--sampling-rate', type=float, required=True, help='Sampling rate of the signals in Hz.')
+    parser.add_argument('--output-dir', default='results', help='Output directory (default: results).')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: number of CPUs).')
+    parser.add_argument('--max-memory', type=parse_size, default=None,
+                        help='Private memory limit per worker, e.g. 4G; memory-mapped recordings do not count '
+                             '(default: no limit).')
+    parser.add_argument('--tasks-per-worker', type=int, default=1,
+                        help='Recordings per worker process before it is replaced; 0 keeps workers (default: 1).')
+    parser.add_argument('--window-size', type=float, default=0.2, help='Firing rate window in seconds.')
+    parser.add_argument('--active-threshold', type=int, default=5, help='Spike count of an active channel.')
+    parser.add_argument('--figures', choices=FIGURE_FORMATS, default='html',
+                        help='Figure export format; png/svg need kaleido (default: html).')
+    parser.add_argument('--store-root', default=None, help='Store directory for converted recordings.')
+    parser.add_argument('--no-store', action='store_true', help='Load recordings directly instead of via the store.')
+    parser.add_argument('--precision', choices=sorted(PRECISION_POLICIES), default=None,
+                        help='Precision policy of the analyses (default: $MEADASH_PRECISION or compact).')
+    args = parser.parse_args()
+
+    if args.figures in ('png', 'svg'):
+        try:
+            import kaleido  # noqa: F401
+        except ImportError:
+            parser.error('--figures %s needs the kaleido package; use --figures html instead' % args.figures)
+    recordings = expand_recordings(args.recordings)
+    if not recordings:
+        parser.error('no recordings match %s' % ' '.join(args.recordings))
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    rows, run = run_batch(recordings, args.output_dir, args.sampling_rate, load_channel_info_from_json(),
+                          workers=args.workers, max_memory=args.max_memory,
+                          tasks_per_worker=args.tasks_per_worker, window_size=args.window_size,
+                          active_channel_threshold=args.active_threshold, figure_format=args.figures,
+                          store_root=args.store_root, use_store=not args.no_store, precision=args.precision)
+
+    _write_csv(os.path.join(args.output_dir, 'summary.csv'), SUMMARY_FIELDS, rows)
+    with open(os.path.join(args.output_dir, 'summary.json'), 'w') as f:
+        json.dump(rows, f, indent=2)
+    with open(os.path.join(args.output_dir, 'run.json'), 'w') as f:
+        json.dump(run, f, indent=2)
+    print("%d/%d recordings in %.1f s with %d workers: %.1f recordings/hour" % (
+        run['succeeded'], run['recordings'], run['wall_time_s'], run['workers'], run['recordings_per_hour'] or 0))
+    return 0 if run['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
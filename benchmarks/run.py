@@ -0,0 +1,520 @@
+"""
+Benchmarks of the DataProcessor analyses and the plotly figure builders on synthetic recordings.
+
+Every recording length of the sweep is benchmarked in a fresh worker process, so its peak RSS is not inflated by
+the previous, shorter recordings::
+
+    python -m benchmarks.run --durations 10 30 60 --output results.json
+    python -m benchmarks.run --durations 10 30 60 --compare results.json
+
+Each benchmark reports the median and minimum wall time of ``--repeat`` runs and the peak memory allocated during
+the untimed warm-up run; figure builders also report the time to serialize the figure to JSON (what Dash sends to the
+browser) and its size. The analysis cache and the signal pyramid are cleared before every run, so cold costs are
+measured. The results are written as JSON together with the scaling exponent of every benchmark over the sweep
+(1 for linear in the recording length), and ``--compare`` reports the ratios against an earlier result file.
+
+The benchmarks run under the precision policy of ``--precision`` (see ``data_processing.precision``). Unless
+``--no-accuracy`` is given, the binning, convolution and PSD results are also checked against a processor under the
+float64 reference policy, and the memory of the data and results of both policies is reported.
+"""
+# standard imports
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+# third party imports
+import numpy as np
+import plotly
+import plotly.io as pio
+
+from benchmarks.synthetic import synthetic_recording
+from data_processing.data_processor import DataProcessor
+from data_processing.precision import PRECISION_POLICIES
+from data_processing.utils import load_channel_info_from_json
+from plots import plotting
+
+# The dense raster of the whole recording does not fit in memory for long recordings
+RASTER_WINDOW = 10.0
+RATE_WINDOW = 0.2
+# Benchmarks faster than this are dominated by timer noise and never reported as regressions
+MIN_COMPARE_TIME = 0.01
+# The largest error relative to the peak of the float64 reference that an accuracy check accepts
+ACCURACY_TOLERANCE = 1e-4
+
+
+def _restore(data_processor, spikes):
+    # Replacing the signal resets the pyramid and noise levels; replacing the spikes clears the cache
+    data_processor.initial_signal = data_processor.initial_signal
+    data_processor.spikes = spikes
+
+
+def _analysis_benchmarks():
+    # (name, prepare, run): prepare(dp) -> inputs is not timed, run(dp, inputs) is
+    return [
+        ('create_raster', None, lambda dp, _: dp.create_raster(0, int(RASTER_WINDOW * dp.sampling_rate))),
+        ('get_spike_window', None, lambda dp, _: dp.get_spike_window(dp.n_samples / dp.sampling_rate / 4,
+                                                                     dp.n_samples / dp.sampling_rate * 3 / 4)),
+        ('detect_spikes', None, lambda dp, _: dp.detect_spikes()),
+        ('get_signal_envelope', None, lambda dp, _: dp.get_signal_envelope(0)),
+        ('extract_spike_waveforms', None, lambda dp, _: dp.extract_spike_waveforms(0.001, 0.002)),
+        ('downsample_raster_to_binary_presence', None, lambda dp, _: dp.downsample_raster_to_binary_presence(1.0)),
+        ('aggregate_raster_spike_counts', None, lambda dp, _: dp.aggregate_raster_spike_counts(1)),
+        ('aggregate_raster_spike_counts[total]', None, lambda dp, _: dp.aggregate_raster_spike_counts(total=True)),
+        ('get_active_channels', None, lambda dp, _: dp.get_active_channels()),
+        ('convolve_signal[boxcar]', None, lambda dp, _: dp.convolve_signal(RATE_WINDOW, 'boxcar', sum_channels=True)),
+        ('convolve_signal[gaussian]', None,
+         lambda dp, _: dp.convolve_signal(RATE_WINDOW, 'gaussian', sum_channels=True)),
+        ('estimate_power_spectral_density', lambda dp: dp.convolve_signal(RATE_WINDOW, 'boxcar', sum_channels=True),
+         lambda dp, conv_sum: dp.estimate_power_spectral_density(conv_sum)),
+        ('estimate_channel_psd', None, lambda dp, _: dp.estimate_channel_psd()),
+        ('estimate_channel_spectrogram', None, lambda dp, _: dp.estimate_channel_spectrogram()),
+        ('compute_correlation_matrix[pearson]', None, lambda dp, _: dp.compute_correlation_matrix(method='pearson')),
+        ('compute_correlation_matrix[sttc]', None, lambda dp, _: dp.compute_correlation_matrix(method='sttc')),
+        ('compute_cross_correlogram', None, lambda dp, _: dp.compute_cross_correlogram(0, 1)),
+        ('detect_bursts', None, lambda dp, _: dp.detect_bursts()),
+        ('summarize_bursts', None, lambda dp, _: dp.summarize_bursts()),
+        ('build_summary', None, lambda dp, _: dp.build_summary()),
+    ]
+
+
+def _accuracy_checks():
+    # (name, compute, tolerance): compute(dp) -> array, compared against a float64 reference processor
+    window = lambda dp: dict(t_start=0.0, t_stop=min(RASTER_WINDOW, dp.n_samples / dp.sampling_rate))
+    return [
+        ('create_raster', lambda dp: dp.create_raster(0, int(RASTER_WINDOW * dp.sampling_rate)), 0),
+        ('downsample_raster_to_binary_presence', lambda dp: dp.downsample_raster_to_binary_presence(0.01), 0),
+        ('aggregate_raster_spike_counts', lambda dp: dp.aggregate_raster_spike_counts(0.01), 0),
+        ('aggregate_raster_spike_counts[total]', lambda dp: dp.aggregate_raster_spike_counts(total=True), 0),
+        ('convolve_signal[boxcar]', lambda dp: dp.convolve_signal(RATE_WINDOW, 'boxcar', sum_channels=True), 0),
+        ('convolve_signal[boxcar, channels]',
+         lambda dp: dp.convolve_signal(RATE_WINDOW, 'boxcar', **window(dp)), 0),
+        ('convolve_signal[gaussian]', lambda dp: dp.convolve_signal(RATE_WINDOW, 'gaussian', sum_channels=True),
+         ACCURACY_TOLERANCE),
+        ('convolve_signal[gaussian, channels]',
+         lambda dp: dp.convolve_signal(RATE_WINDOW, 'gaussian', **window(dp)), ACCURACY_TOLERANCE),
+        ('convolve_signal[dual_exp]', lambda dp: dp.convolve_signal(RATE_WINDOW, 'dual_exp', sum_channels=True),
+         ACCURACY_TOLERANCE),
+        ('estimate_power_spectral_density',
+         lambda dp: dp.estimate_power_spectral_density(dp.convolve_signal(RATE_WINDOW, 'boxcar',
+                                                                          sum_channels=True))[1],
+         ACCURACY_TOLERANCE),
+        ('estimate_channel_psd', lambda dp: dp.estimate_channel_psd()[1], ACCURACY_TOLERANCE),
+        ('estimate_channel_spectrogram', lambda dp: dp.estimate_channel_spectrogram()[2], ACCURACY_TOLERANCE),
+    ]
+
+
+def check_accuracy(data_processor, reference, tolerance=None):
+    """
+    Checks the results of a processor against a processor over the same recording under the float64 policy.
+
+    Args:
+        data_processor (DataProcessor): The processor under test.
+        reference (DataProcessor): The float64 reference processor.
+        tolerance (float): Overrides the tolerance of every check. Default is None (the tolerance of the check:
+            0 for exact results such as counts, ``ACCURACY_TOLERANCE`` otherwise).
+
+    Returns:
+        dict: Per check, the dtype of the result and of the reference, the largest error relative to the peak of
+        the reference, the result and reference sizes in bytes and whether the check passed.
+
+    """
+    checks = {}
+    for name, compute, check_tolerance in _accuracy_checks():
+        result, expected = compute(data_processor), compute(reference)
+        scale = float(np.max(np.abs(expected))) if expected.size else 0.0
+        error = float(np.max(np.abs(result.astype(np.float64) - expected))) if expected.size else 0.0
+        relative_error = error / scale if scale > 0 else error
+        check_tolerance = check_tolerance if tolerance is None else tolerance
+        checks[name] = {
+            'dtype': str(result.dtype),
+            'reference_dtype': str(expected.dtype),
+            'relative_error': relative_error,
+            'nbytes': int(result.nbytes),
+            'reference_nbytes': int(expected.nbytes),
+            'passed': result.shape == expected.shape and relative_error <= check_tolerance,
+        }
+    return checks
+
+
+def _time_vector(dp):
+    return np.arange(dp.n_samples) / dp.sampling_rate
+
+
+def _firing_rate_inputs(dp):
+    rate = dp.convolve_signal(RATE_WINDOW, 'boxcar', sum_channels=True) / RATE_WINDOW
+    _, network_bursts = dp.detect_bursts()
+    bursts = np.column_stack((network_bursts['start'], network_bursts['stop'])) / dp.sampling_rate
+    return rate, _time_vector(dp), bursts
+
+
+def _figure_benchmarks():
+    # The inputs are prepared as the dashboard callbacks prepare them
+    return [
+        ('plot_single_channel_raster', lambda dp: (dp.spikes, dp.sampling_rate),
+         lambda dp, inputs: plotting.plot_single_channel_raster(inputs[0], 0, inputs[1])),
+        ('plot_raster[auto]', lambda dp: (dp.spikes, dp.sampling_rate),
+         lambda dp, inputs: plotting.plot_raster(*inputs)),
+        ('plot_raster[image]', lambda dp: (dp.spikes, dp.sampling_rate),
+         lambda dp, inputs: plotting.plot_raster(*inputs, render='image')),
+        ('plot_signal', lambda dp: dp.get_signal_envelope(0),
+         lambda dp, inputs: plotting.plot_signal(inputs[1], inputs[0])),
+        ('plot_spike_frequency_heatmap', lambda dp: dp.aggregate_raster_spike_counts(total=True),
+         lambda dp, counts: plotting.plot_spike_frequency_heatmap(counts, dp.channel_info)),
+        ('plot_spike_activity_heatmap', lambda dp: dp.aggregate_raster_spike_counts(1),
+         lambda dp, counts: plotting.plot_spike_activity_heatmap(counts)),
+        ('spike_activity_frame_data', lambda dp: dp.aggregate_raster_spike_counts(1),
+         lambda dp, counts: plotting.spike_activity_frame_data(counts)),
+        ('plot_correlation_heatmap', lambda dp: dp.compute_correlation_matrix(),
+         lambda dp, matrix: plotting.plot_correlation_heatmap(matrix)),
+        ('plot_correlation_matrix', lambda dp: dp.compute_correlation_matrix(),
+         lambda dp, matrix: plotting.plot_correlation_matrix(matrix)),
+        ('plot_cross_correlogram', lambda dp: dp.compute_cross_correlogram(0, 1),
+         lambda dp, inputs: plotting.plot_cross_correlogram(*inputs)),
+        ('plot_average_spiking_rate', lambda dp: dp.aggregate_raster_spike_counts(1).sum(axis=0),
+         lambda dp, rate: plotting.plot_average_spiking_rate(rate)),
+        ('plot_firing_rate', _firing_rate_inputs,
+         lambda dp, inputs: plotting.plot_firing_rate(inputs[0], inputs[1], bursts=inputs[2])),
+        ('plot_psd', lambda dp: dp.estimate_power_spectral_density(
+            dp.convolve_signal(RATE_WINDOW, 'boxcar', sum_channels=True)),
+         lambda dp, inputs: plotting.plot_psd(*inputs)),
+        ('plot_channel_psd', lambda dp: dp.estimate_channel_psd()[:2],
+         lambda dp, inputs: plotting.plot_channel_psd(*inputs)),
+    ]
+
+
+def _to_json(result):
+    # Plotly figures as Dash serializes them; dcc.Store payloads holding a figure go through the plotly encoder
+    if hasattr(result, 'to_plotly_json'):
+        return pio.to_json(result, validate=False)
+    if isinstance(result, dict):
+        return json.dumps(result, cls=plotly.utils.PlotlyJSONEncoder)
+    # Matplotlib figures are rendered by the server and have no JSON form
+    return None
+
+
+def _close(result):
+    if type(result).__module__.startswith('matplotlib'):
+        import matplotlib.pyplot as plt
+        plt.close(result)
+
+
+def peak_rss_bytes():
+    """
+    Returns the peak resident set size of this process.
+
+    Returns:
+        int: The peak RSS in bytes, or None where the ``resource`` module is not available (Windows).
+
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def measure(data_processor, prepare, run, repeat=3, trace_memory=True, figure=False):
+    """
+    Times one benchmark on a processor with a cold analysis cache.
+
+    Args:
+        data_processor (DataProcessor): The processor.
+        prepare (callable): Computes the untimed inputs ``prepare(data_processor)``, or None.
+        run (callable): The timed call ``run(data_processor, inputs)``.
+        repeat (int): The number of timed runs. Default is 3.
+        trace_memory (bool): Whether to trace the peak allocation of the untimed warm-up run. Default is True.
+        figure (bool): Whether the result is a figure to serialize. Default is False.
+
+    Returns:
+        dict: The median and minimum time in seconds, the peak allocation in bytes and, for figures, the
+        serialization time and the JSON size in bytes.
+
+    """
+    spikes = data_processor.spikes
+    # The untimed first run warms up imports and lazily built state, and is traced when measuring memory
+    _restore(data_processor, spikes)
+    inputs = prepare(data_processor) if prepare is not None else None
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        result = run(data_processor, inputs)
+        peak_alloc = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    _close(result)
+    del result
+
+    times, serialize_times, json_bytes = [], [], None
+    for _ in range(repeat):
+        _restore(data_processor, spikes)
+        inputs = prepare(data_processor) if prepare is not None else None
+        started = time.perf_counter()
+        result = run(data_processor, inputs)
+        times.append(time.perf_counter() - started)
+        if figure:
+            started = time.perf_counter()
+            serialized = _to_json(result)
+            serialize_times.append(time.perf_counter() - started)
+            json_bytes = len(serialized.encode()) if serialized is not None else None
+            _close(result)
+        del result
+
+    _restore(data_processor, spikes)
+
+    measurement = {'median_s': float(np.median(times)), 'min_s': float(np.min(times)), 'runs': repeat,
+                   'peak_alloc_bytes': peak_alloc}
+    if figure:
+        measurement.update({'serialize_s': float(np.median(serialize_times)), 'json_bytes': json_bytes})
+    return measurement
+
+
+def run_point(duration, sampling_rate=30000, rate=5.0, burst_rate=0.1, seed=0, repeat=3, trace_memory=True,
+              selected=None, precision=None, accuracy=True):
+    """
+    Generates one synthetic recording and runs every selected benchmark on it.
+
+    Args:
+        duration (float): The duration of the recording in seconds.
+        sampling_rate (float): The sampling rate in Hz. Default is 30000.
+        rate (float): The mean background firing rate per channel in spikes/s. Default is 5.
+        burst_rate (float): The number of network bursts per second. Default is 0.1.
+        seed (int): The random seed. Default is 0.
+        repeat (int): The number of timed runs per benchmark. Default is 3.
+        trace_memory (bool): Whether to measure peak allocations. Default is True.
+        selected (list): Substrings of the benchmark names to run. Default is None (all benchmarks).
+        precision (str): The precision policy of the benchmarked processor. Default is $MEADASH_PRECISION, or
+            'compact'.
+        accuracy (bool): Whether to check the results against the float64 reference policy. Default is True.
+
+    Returns:
+        dict: The recording, the results per benchmark, the accuracy checks and the peak RSS of the process.
+
+    """
+    started = time.perf_counter()
+    signal, spikes = synthetic_recording(duration, sampling_rate, rate=rate, burst_rate=burst_rate, seed=seed)
+    generate_s = time.perf_counter() - started
+    data_processor = DataProcessor(signal, spikes, sampling_rate, load_channel_info_from_json(), remap=False,
+                                   precision=precision)
+    spikes = data_processor.spikes
+
+    accuracy_checks = {}
+    if accuracy:
+        reference = DataProcessor(signal, spikes, sampling_rate, data_processor.channel_info, remap=False,
+                                  precision='float64')
+        accuracy_checks = check_accuracy(data_processor, reference)
+        del reference
+        failed = [name for name, check in accuracy_checks.items() if not check['passed']]
+        print('  %6.1f s  accuracy against float64: %s' % (duration, 'FAILED %s' % ', '.join(failed) if failed
+                                                                  else 'ok'), flush=True)
+        data_processor.cache.clear()
+
+    benchmarks = {}
+    for kind, entries in (('analysis', _analysis_benchmarks()), ('figure', _figure_benchmarks())):
+        for name, prepare, run in entries:
+            if selected and not any(pattern in name for pattern in selected):
+                continue
+            benchmarks[name] = dict(kind=kind, **measure(data_processor, prepare, run, repeat, trace_memory,
+                                                         figure=kind == 'figure'))
+            print('  %6.1f s  %-40s %10.4f s' % (duration, name, benchmarks[name]['median_s']), flush=True)
+    return {
+        'duration_s': duration,
+        'n_samples': data_processor.n_samples,
+        'n_spikes': int(spikes.n_spikes),
+        'precision': data_processor.precision.name,
+        'signal_nbytes': int(data_processor.initial_signal.nbytes),
+        'spikes_nbytes': int(spikes.nbytes),
+        'generate_s': generate_s,
+        'peak_rss_bytes': peak_rss_bytes(),
+        'benchmarks': benchmarks,
+        'accuracy': accuracy_checks,
+    }
+
+
+def scaling_exponents(points):
+    """
+    Fits how every benchmark scales with the recording length.
+
+    Args:
+        points (list): The results of ``run_point`` for different durations.
+
+    Returns:
+        dict: The log-log slope of the median time (and of the JSON size for figures) over the duration per
+        benchmark; 1 means linear in the recording length. Benchmarks with fewer than two points are left out.
+
+    """
+    exponents = {}
+    names = sorted({name for point in points for name in point['benchmarks']})
+    for name in names:
+        for field in ('median_s', 'json_bytes'):
+            pairs = [(point['duration_s'], point['benchmarks'][name].get(field)) for point in points
+                     if name in point['benchmarks']]
+            pairs = [(x, y) for x, y in pairs if y]
+            if len(pairs) > 1 and len({x for x, _ in pairs}) > 1:
+                x, y = np.log(np.array(pairs, dtype=float)).T
+                exponents.setdefault(name, {})['time' if field == 'median_s' else 'json_bytes'] = \
+                    round(float(np.polyfit(x, y, 1)[0]), 3)
+    return exponents
+
+
+def compare_results(baseline, current, threshold=0.25):
+    """
+    Compares two result files benchmark by benchmark.
+
+    Args:
+        baseline (dict): The earlier results.
+        current (dict): The new results.
+        threshold (float): The relative slowdown (or growth of the JSON size or peak RSS) reported as a
+            regression. Default is 0.25. Times below ``MIN_COMPARE_TIME`` are compared but never regressions.
+
+    Returns:
+        list: One (duration, name, metric, baseline, current, ratio, regression) tuple per compared value.
+
+    """
+    rows = []
+    baseline_points = {point['duration_s']: point for point in baseline['points']}
+    for point in current['points']:
+        previous = baseline_points.get(point['duration_s'])
+        if previous is None:
+            continue
+        values = [('peak_rss', 'peak_rss_bytes', previous, point)]
+        values += [(name, metric, previous['benchmarks'][name], result)
+                   for name, result in point['benchmarks'].items() if name in previous['benchmarks']
+                   for metric in ('median_s', 'json_bytes')]
+        for name, metric, before, after in values:
+            if before.get(metric) and after.get(metric) is not None:
+                ratio = after[metric] / before[metric]
+                noisy = metric == 'median_s' and max(before[metric], after[metric]) < MIN_COMPARE_TIME
+                rows.append((point['duration_s'], name, metric, before[metric], after[metric], ratio,
+                             ratio > 1 + threshold and not noisy))
+    return rows
+
+
+def _git_revision():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return revision + ('-dirty' if dirty else '')
+
+
+def run_sweep(durations, in_process=False, **kwargs):
+    """
+    Runs the benchmarks for every recording length, each in a fresh worker process.
+
+    Args:
+        durations (list): The recording lengths in seconds.
+        in_process (bool): Whether to run in this process instead (peak RSS is then cumulative). Default is False.
+        **kwargs: Further arguments for ``run_point``.
+
+    Returns:
+        dict: The run metadata, the results per recording length and the scaling exponents.
+
+    """
+    points = []
+    for duration in durations:
+        if in_process:
+            points.append(run_point(duration, **kwargs))
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            points.append(executor.submit(run_point, duration, **kwargs).result())
+    return {
+        'meta': {
+            'revision': _git_revision(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'plotly': plotly.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'parameters': dict(kwargs, durations=list(durations)),
+        },
+        'points': points,
+        'scaling': scaling_exponents(points),
+    }
+
+
+def _print_comparison(rows, threshold):
+    print('\n%8s  %-40s %-10s %12s %12s %7s' % ('duration', 'benchmark', 'metric', 'baseline', 'current', 'ratio'))
+    for duration, name, metric, before, after, ratio, regression in rows:
+        print('%8.1f  %-40s %-10s %12.4g %12.4g %6.2fx%s' % (duration, name, metric.split('_')[0], before, after,
+                                                             ratio, '  REGRESSION' if regression else ''))
+    regressions = sum(row[-1] for row in rows)
+    print('\n%d of %d values regressed by more than %d%%.' % (regressions, len(rows), threshold * 100))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the meaDash analyses and figures on synthetic "
+                                                 "recordings.")
+    parser.add_argument('--durations', type=float, nargs='+', default=[5.0, 10.0, 20.0, 40.0],
+                        help="The recording lengths of the sweep in seconds (default: 5 10 20 40).")
+    parser.add_argument('--sampling-rate', type=float, default=30000, help="The sampling rate in Hz.")
+    parser.add_argument('--rate', type=float, default=5.0, help="The mean firing rate per channel in spikes/s.")
+    parser.add_argument('--burst-rate', type=float, default=0.1,
+                        help="The network bursts per second (0 for Poisson spikes only).")
+    parser.add_argument('--seed', type=int, default=0, help="The random seed of the recordings.")
+    parser.add_argument('--repeat', type=int, default=3, help="The number of timed runs per benchmark.")
+    parser.add_argument('--filter', nargs='+', default=None, help="Only run benchmarks containing these names.")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the traced peak allocation runs.")
+    parser.add_argument('--in-process', action='store_true', help="Run all lengths in this process.")
+    parser.add_argument('--output', default=None,
+                        help="The JSON result file (default: benchmarks/results/<revision>.json).")
+    parser.add_argument('--compare', default=None, help="An earlier result file to compare against.")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="The relative increase reported as a regression (default: 0.25).")
+    parser.add_argument('--precision', choices=sorted(PRECISION_POLICIES), default=None,
+                        help="The precision policy benchmarked (default: $MEADASH_PRECISION or compact).")
+    parser.add_argument('--no-accuracy', action='store_true', help="Skip the checks against the float64 policy.")
+    args = parser.parse_args(argv)
+
+    results = run_sweep(args.durations, in_process=args.in_process, sampling_rate=args.sampling_rate,
+                        rate=args.rate, burst_rate=args.burst_rate, seed=args.seed, repeat=args.repeat,
+                        trace_memory=not args.no_memory, selected=args.filter, precision=args.precision,
+                        accuracy=not args.no_accuracy)
+    output = args.output or os.path.join('benchmarks', 'results', '%s.json' % (results['meta']['revision'] or
+                                                                                 'results'))
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('\nScaling exponents over %s s:' % ', '.join('%g' % d for d in args.durations))
+    for name, exponents in results['scaling'].items():
+        print('  %-40s %s' % (name, '  '.join('%s %.2f' % item for item in exponents.items())))
+    print('Results written to %s' % output)
+
+    failed = 0
+    for point in results['points']:
+        if not point['accuracy']:
+            continue
+        print('\nAccuracy against float64 at %g s (%s):' % (point['duration_s'], point['precision']))
+        for name, check in point['accuracy'].items():
+            failed += not check['passed']
+            print('  %-40s %-8s %10.2e  %8.1fx smaller%s' % (
+                name, check['dtype'], check['relative_error'],
+                check['reference_nbytes'] / check['nbytes'] if check['nbytes'] else 1.0,
+                '' if check['passed'] else '  FAILED'))
+    if failed:
+        return 1
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if _print_comparison(compare_results(baseline, results, args.threshold), args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
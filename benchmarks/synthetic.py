@@ -0,0 +1,148 @@
+"""
+Synthetic MEA recordings for benchmarking.
+
+Spikes are drawn as independent Poisson trains per channel, optionally overlaid with network bursts in which a
+random subset of the channels fires at a high rate, and the signal is Gaussian noise with a spike waveform added
+at every spike. Recordings are already in 60MEA layout, so they are passed to ``DataProcessor`` with
+``remap=False``.
+"""
+# third party imports
+import numpy as np
+
+from data_processing.spikes import SpikeTrains
+
+
+def synthetic_spikes(duration, sampling_rate, n_channels=60, rate=5.0, rate_spread=0.5, burst_rate=0.0,
+                     burst_duration=0.1, burst_channel_rate=150.0, burst_participation=0.5,
+                     refractory_period=0.001, seed=None):
+    """
+    Draws Poisson spike trains with optional network bursts.
+
+    Args:
+        duration (float): The duration of the recording in seconds.
+        sampling_rate (float): The sampling rate in Hz.
+        n_channels (int): The number of channels. Default is 60.
+        rate (float): The mean background firing rate per channel in spikes/s. Default is 5.
+        rate_spread (float): The standard deviation of the log-normal spread of the channel rates around ``rate``.
+            Default is 0.5; 0 gives every channel the same rate.
+        burst_rate (float): The number of network bursts per second. Default is 0 (no bursts).
+        burst_duration (float): The duration of every burst in seconds. Default is 0.1.
+        burst_channel_rate (float): The firing rate of a participating channel within a burst in spikes/s.
+            Default is 150.
+        burst_participation (float): The probability of a channel taking part in a burst. Default is 0.5.
+        refractory_period (float): Spikes closer than this to the previous spike of their channel are dropped.
+            Default is 1 ms.
+        seed (int): The random seed. Default is None.
+
+    Returns:
+        SpikeTrains: The spike store.
+
+    """
+    rng = np.random.default_rng(seed)
+    n_samples = int(round(duration * sampling_rate))
+    channel_rates = rate * rng.lognormal(-rate_spread ** 2 / 2, rate_spread, n_channels)
+    counts = rng.poisson(channel_rates * duration)
+    channels = [np.repeat(np.arange(n_channels), counts)]
+    samples = [rng.integers(0, n_samples, counts.sum())]
+
+    burst_starts = np.sort(rng.uniform(0, max(duration - burst_duration, 0), rng.poisson(burst_rate * duration)))
+    if burst_starts.size:
+        # One (burst, channel) pair per participating channel, each with its own Poisson spike count
+        burst_idx, burst_channels = np.nonzero(rng.random((burst_starts.size, n_channels)) < burst_participation)
+        burst_counts = rng.poisson(burst_channel_rate * burst_duration, burst_idx.size)
+        offsets = rng.uniform(0, burst_duration, burst_counts.sum())
+        channels.append(np.repeat(burst_channels, burst_counts))
+        samples.append(((np.repeat(burst_starts[burst_idx], burst_counts) + offsets) * sampling_rate).astype(np.int64))
+
+    spikes = SpikeTrains.from_channel_samples(np.concatenate(channels), np.minimum(np.concatenate(samples),
+                                                                                  n_samples - 1),
+                                              n_channels, n_samples)
+    # Drops spikes within the refractory period of the preceding spike of the same channel
+    channel_ids = spikes.channel_ids()
+    keep = np.ones(spikes.n_spikes, dtype=bool)
+    keep[1:] = (np.diff(spikes.indices) >= refractory_period * sampling_rate) | (np.diff(channel_ids) != 0)
+    return SpikeTrains.from_channel_samples(channel_ids[keep], spikes.indices[keep], n_channels, n_samples)
+
+
+def spike_waveform(sampling_rate, amplitude=8.0, duration=0.0015):
+    """
+    Returns a biphasic extracellular spike waveform: a sharp negative peak followed by a slower rebound.
+
+    Args:
+        sampling_rate (float): The sampling rate in Hz.
+        amplitude (float): The depth of the negative peak. Default is 8.
+        duration (float): The duration of the waveform in seconds. Default is 1.5 ms.
+
+    Returns:
+        numpy.ndarray: The waveform samples.
+        int: The index of the negative peak.
+
+    """
+    t = np.arange(max(int(duration * sampling_rate), 1)) / sampling_rate
+    waveform = -np.exp(-0.5 * ((t - 0.0004) / 0.0001) ** 2) + 0.3 * np.exp(-0.5 * ((t - 0.0008) / 0.0002) ** 2)
+    return amplitude * waveform, int(np.argmin(waveform))
+
+
+def synthetic_signal(spikes, sampling_rate, noise_std=1.0, spike_amplitude=8.0, dtype=np.float32, seed=None):
+    """
+    Generates a signal of Gaussian noise with a spike waveform at every spike.
+
+    Args:
+        spikes (SpikeTrains): The spikes.
+        sampling_rate (float): The sampling rate in Hz.
+        noise_std (float): The standard deviation of the noise. Default is 1.
+        spike_amplitude (float): The depth of the spike waveforms. Default is 8, well above a 5 MAD threshold.
+        dtype (numpy.dtype): The dtype of the signal. Default is float32.
+        seed (int): The random seed. Default is None.
+
+    Returns:
+        numpy.ndarray: The signal with shape (channels, samples).
+
+    """
+    rng = np.random.default_rng(seed)
+    signal = np.empty((spikes.n_channels, spikes.n_samples), dtype=dtype)
+    for channel in range(spikes.n_channels):
+        # Drawn row by row into the output, without a float64 temporary of the whole recording
+        if np.dtype(dtype) in (np.float32, np.float64):
+            rng.standard_normal(spikes.n_samples, dtype=dtype, out=signal[channel])
+        else:
+            signal[channel] = rng.standard_normal(spikes.n_samples)
+    if noise_std != 1.0:
+        signal *= noise_std
+
+    waveform, peak = spike_waveform(sampling_rate, spike_amplitude * noise_std)
+    flat = signal.reshape(-1)
+    positions = spikes.indices - peak
+    bases = spikes.channel_ids() * spikes.n_samples
+    for k, value in enumerate(waveform):
+        # The spikes of a channel are distinct samples, so every offset touches each sample at most once
+        shifted = positions + k
+        inside = (shifted >= 0) & (shifted < spikes.n_samples)
+        flat[bases[inside] + shifted[inside]] += value
+    return signal
+
+
+def synthetic_recording(duration=60.0, sampling_rate=30000, n_channels=60, rate=5.0, burst_rate=0.0, seed=0,
+                        dtype=np.float32, **kwargs):
+    """
+    Generates a synthetic recording in 60MEA layout.
+
+    Args:
+        duration (float): The duration of the recording in seconds. Default is 60.
+        sampling_rate (float): The sampling rate in Hz. Default is 30000.
+        n_channels (int): The number of channels. Default is 60.
+        rate (float): The mean background firing rate per channel in spikes/s. Default is 5.
+        burst_rate (float): The number of network bursts per second. Default is 0 (Poisson spikes only).
+        seed (int): The random seed. Default is 0.
+        dtype (numpy.dtype): The dtype of the signal. Default is float32.
+        **kwargs: Further arguments for ``synthetic_spikes``.
+
+    Returns:
+        numpy.ndarray: The signal with shape (channels, samples).
+        SpikeTrains: The spikes.
+
+    """
+    spikes = synthetic_spikes(duration, sampling_rate, n_channels=n_channels, rate=rate, burst_rate=burst_rate,
+                              seed=seed, **kwargs)
+    signal = synthetic_signal(spikes, sampling_rate, dtype=dtype, seed=None if seed is None else seed + 1)
+    return signal, spikes
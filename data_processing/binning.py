@@ -0,0 +1,129 @@
+# third party imports
+import numpy as np
+
+from data_processing.spikes import SpikeTrains
+
+BIN_OUTPUTS = ('count', 'presence')
+
+
+def _normalize_bin_size(bin_size):
+    # fs * seconds is often a float like 3000.0000000000005; treat near-integers as integers
+    if bin_size <= 0:
+        raise ValueError("Bin size must be positive, got %r." % bin_size)
+    rounded = round(bin_size)
+    if abs(bin_size - rounded) < 1e-9:
+        return int(rounded)
+    return float(bin_size)
+
+
+def num_bins(n_samples, bin_size, include_partial=False):
+    """
+    Computes the number of bins covering a number of samples.
+
+    Args:
+        n_samples (int): The number of samples.
+        bin_size (float): The bin width in samples; need not be an integer.
+        include_partial (bool): Whether a trailing partial bin is counted. Default is False.
+
+    Returns:
+        int: The number of bins.
+
+    """
+    bin_size = _normalize_bin_size(bin_size)
+    full = int(n_samples // bin_size)
+    if include_partial and full * bin_size < n_samples:
+        return full + 1
+    return full
+
+
+def bin_edges(n_samples, bin_size, include_partial=False):
+    """
+    Computes the first sample of every bin.
+
+    Args:
+        n_samples (int): The number of samples.
+        bin_size (float): The bin width in samples; need not be an integer.
+        include_partial (bool): Whether a trailing partial bin is included. Default is False.
+
+    Returns:
+        numpy.ndarray: The integer start sample of each bin.
+
+    """
+    bin_size = _normalize_bin_size(bin_size)
+    n_bins = num_bins(n_samples, bin_size, include_partial)
+    return np.ceil(np.arange(n_bins) * bin_size).astype(np.int64)
+
+
+def bin_spikes(spikes, bin_size, include_partial=False, output='count', dtype=np.int64, n_samples=None):
+    """
+    Bins spikes into fixed-width time buckets for all channels at once.
+
+    Sparse input is binned with a single ``np.bincount`` over (channel, bucket) keys, so the
+    cost depends on the number of spikes rather than on the length of the recording. Dense
+    input is binned with a reshape (integer widths) or ``np.add.reduceat`` (fractional widths
+    and partial buckets).
+
+    Args:
+        spikes (SpikeTrains or numpy.ndarray): The spike store, or a dense (channels, samples) raster.
+        bin_size (float): The bucket width in samples; need not be an integer.
+        include_partial (bool): Whether to keep a trailing partial bucket. Default is False.
+        output (str): 'count' for spike counts or 'presence' for 0/1 spike presence. Default is 'count'.
+        dtype (numpy.dtype): The dtype of the result. Default is int64.
+        n_samples (int): The number of samples to bin. Default is the length of the recording.
+
+    Returns:
+        numpy.ndarray: The binned spikes with shape (channels, buckets).
+
+    Raises:
+        ValueError: If the output type is invalid or the bin size is not positive.
+
+    """
+    if output not in BIN_OUTPUTS:
+        raise ValueError("Invalid output type %r. Supported types are %s." % (output, ', '.join(BIN_OUTPUTS)))
+    bin_size = _normalize_bin_size(bin_size)
+    if isinstance(spikes, SpikeTrains):
+        return _bin_sparse(spikes, bin_size, include_partial, output, dtype, n_samples)
+    return _bin_dense(np.asarray(spikes), bin_size, include_partial, output, dtype, n_samples)
+
+
+def _bin_sparse(spikes, bin_size, include_partial, output, dtype, n_samples):
+    n_samples = spikes.n_samples if n_samples is None else n_samples
+    n_bins = num_bins(n_samples, bin_size, include_partial)
+    buckets = spikes.indices // bin_size
+    if isinstance(bin_size, float):
+        buckets = buckets.astype(np.int64)
+    in_range = buckets < n_bins
+    if n_samples < spikes.n_samples:
+        # A trailing partial bucket must not reach past n_samples
+        in_range &= spikes.indices < n_samples
+    keys = spikes.channel_ids()[in_range] * n_bins + buckets[in_range]
+    if output == 'presence':
+        binned = np.zeros(spikes.n_channels * n_bins, dtype=dtype)
+        binned[keys] = 1
+    else:
+        binned = np.bincount(keys, minlength=spikes.n_channels * n_bins).astype(dtype, copy=False)
+    return binned.reshape(spikes.n_channels, n_bins)
+
+
+def _bin_dense(raster, bin_size, include_partial, output, dtype, n_samples):
+    n_samples = raster.shape[1] if n_samples is None else n_samples
+    n_bins = num_bins(n_samples, bin_size, include_partial)
+    if output == 'presence':
+        raster = raster != 0
+    if isinstance(bin_size, int) and n_bins * bin_size <= n_samples:
+        binned = raster[:, :n_bins * bin_size].reshape(raster.shape[0], n_bins, bin_size).sum(axis=2)
+    elif n_bins == 0:
+        binned = np.zeros((raster.shape[0], 0))
+    else:
+        edges = bin_edges(n_samples, bin_size, include_partial)
+        # A fractional trailing partial bucket may start past the last sample, and is then empty
+        filled = edges < n_samples
+        binned = np.zeros((raster.shape[0], n_bins), dtype=np.int64)
+        binned[:, filled] = np.add.reduceat(raster[:, :n_samples], edges[filled], axis=1, dtype=np.int64)
+        if not include_partial:
+            # reduceat runs the last bucket to the end of the array; drop the leftover samples
+            last_stop = int(np.ceil(n_bins * bin_size))
+            binned[:, -1] -= raster[:, last_stop:n_samples].sum(axis=1, dtype=np.int64)
+    if output == 'presence':
+        binned = binned > 0
+    return binned.astype(dtype, copy=False)
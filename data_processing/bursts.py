@@ -0,0 +1,149 @@
+# third party imports
+import numpy as np
+
+CHANNEL_BURST_DTYPE = np.dtype([
+    ('channel', np.int64),
+    ('start', np.int64),
+    ('stop', np.int64),
+    ('n_spikes', np.int64),
+    ('rate', np.float64),
+])
+
+
+def network_burst_dtype(n_channels):
+    """
+    Returns the structured dtype of network bursts for a recording with ``n_channels`` channels.
+
+    Args:
+        n_channels (int): The number of channels.
+
+    Returns:
+        numpy.dtype: The dtype with the start, stop (exclusive) sample, the number of participating channels,
+        the number of spikes, the intra-burst rate in spikes/s and the participation mask of every channel.
+
+    """
+    return np.dtype([
+        ('start', np.int64),
+        ('stop', np.int64),
+        ('n_channels', np.int64),
+        ('n_spikes', np.int64),
+        ('rate', np.float64),
+        ('channels', np.bool_, (n_channels,)),
+    ])
+
+
+def detect_channel_bursts(spikes, sampling_rate, max_isi=0.1, min_spikes=5):
+    """
+    Detects single-channel bursts as runs of spikes whose inter-spike intervals are at most ``max_isi``.
+
+    All channels are processed in one linear pass over the flat, per-channel sorted spike buffer.
+
+    Args:
+        spikes (SpikeTrains): The spike store.
+        sampling_rate (float): The sampling rate in Hz.
+        max_isi (float): The largest inter-spike interval within a burst in seconds. Default is 0.1.
+        min_spikes (int): The smallest number of spikes of a burst. Default is 5.
+
+    Returns:
+        numpy.ndarray: The bursts as a ``CHANNEL_BURST_DTYPE`` array ordered by channel and start; ``stop`` is
+        one sample past the last spike.
+
+    """
+    indices = spikes.indices
+    channels = spikes.channel_ids()
+    # linked[i]: spike i + 1 continues the burst of spike i
+    linked = (np.diff(indices) <= max_isi * sampling_rate) & (channels[1:] == channels[:-1])
+    edges = np.diff(np.concatenate(([0], linked.astype(np.int8), [0])))
+    first = np.flatnonzero(edges == 1)
+    last = np.flatnonzero(edges == -1)
+    keep = last - first + 1 >= min_spikes
+
+    bursts = np.empty(int(keep.sum()), dtype=CHANNEL_BURST_DTYPE)
+    first, last = first[keep], last[keep]
+    bursts['channel'] = channels[first]
+    bursts['start'] = indices[first]
+    bursts['stop'] = indices[last] + 1
+    bursts['n_spikes'] = last - first + 1
+    bursts['rate'] = bursts['n_spikes'] / ((bursts['stop'] - bursts['start']) / sampling_rate)
+    return bursts
+
+
+def detect_network_bursts(spikes, sampling_rate, channel_bursts, min_channels=3):
+    """
+    Detects network bursts as groups of overlapping channel bursts in which at least ``min_channels`` channels
+    burst at the same time.
+
+    Overlapping channel bursts are chained into groups spanning their union, and the peak number of
+    simultaneously bursting channels of every group is found in one sweep over the burst starts and stops.
+
+    Args:
+        spikes (SpikeTrains): The spike store.
+        sampling_rate (float): The sampling rate in Hz.
+        channel_bursts (numpy.ndarray): The single-channel bursts from ``detect_channel_bursts``.
+        min_channels (int): The smallest number of simultaneously bursting channels. Default is 3.
+
+    Returns:
+        numpy.ndarray: The network bursts as a ``network_burst_dtype(spikes.n_channels)`` array ordered by start.
+
+    """
+    if channel_bursts.size == 0:
+        return np.empty(0, dtype=network_burst_dtype(spikes.n_channels))
+    bursts = channel_bursts[np.argsort(channel_bursts['start'], kind='stable')]
+    # A burst starting after every earlier burst has stopped opens a new group
+    opens = np.concatenate(([True], bursts['start'][1:] >= np.maximum.accumulate(bursts['stop'])[:-1]))
+    group = np.cumsum(opens) - 1
+    n_groups = int(group[-1]) + 1
+
+    # +1 at every burst start and -1 at every stop; stops sort before starts at the same sample
+    times = np.concatenate((bursts['start'], bursts['stop']))
+    steps = np.concatenate((np.ones(bursts.size, np.int64), -np.ones(bursts.size, np.int64)))
+    order = np.lexsort((steps, times))
+    peak_channels = np.zeros(n_groups, dtype=np.int64)
+    np.maximum.at(peak_channels, np.concatenate((group, group))[order], np.cumsum(steps[order]))
+
+    network_bursts = np.zeros(n_groups, dtype=network_burst_dtype(spikes.n_channels))
+    network_bursts['start'] = bursts['start'][opens]
+    network_bursts['stop'] = np.maximum.reduceat(bursts['stop'], np.flatnonzero(opens))
+    network_bursts['channels'][group, bursts['channel']] = True
+    network_bursts = network_bursts[peak_channels >= min_channels]
+
+    network_bursts['n_channels'] = network_bursts['channels'].sum(axis=1)
+    for channel in range(spikes.n_channels):
+        train = spikes.channel(channel)
+        network_bursts['n_spikes'] += np.searchsorted(train, network_bursts['stop']) - \
+            np.searchsorted(train, network_bursts['start'])
+    network_bursts['rate'] = network_bursts['n_spikes'] / (
+        (network_bursts['stop'] - network_bursts['start']) / sampling_rate)
+    return network_bursts
+
+
+def summarize_bursts(bursts, sampling_rate, duration):
+    """
+    Summarizes a burst array into the statistics reported per recording.
+
+    Args:
+        bursts (numpy.ndarray): Channel or network bursts.
+        sampling_rate (float): The sampling rate in Hz.
+        duration (float): The duration of the recording in seconds.
+
+    Returns:
+        dict: The number of bursts, bursts per minute, mean duration (s), mean intra-burst rate (spikes/s),
+        mean inter-burst interval (s) and its coefficient of variation (NaN where undefined).
+
+    """
+    durations = (bursts['stop'] - bursts['start']) / sampling_rate
+    if 'channel' in bursts.dtype.names:
+        # Channel bursts are ordered by channel and start; intervals are only taken within a channel
+        same_channel = bursts['channel'][1:] == bursts['channel'][:-1]
+        intervals = np.diff(bursts['start'])[same_channel] / sampling_rate
+    else:
+        intervals = np.diff(np.sort(bursts['start'])) / sampling_rate
+    mean_interval = intervals.mean() if intervals.size else np.nan
+    return {
+        'n_bursts': int(bursts.size),
+        'bursts_per_minute': float(bursts.size / duration * 60) if duration > 0 else np.nan,
+        'mean_duration': float(durations.mean()) if bursts.size else np.nan,
+        'mean_rate': float(bursts['rate'].mean()) if bursts.size else np.nan,
+        'mean_interval': float(mean_interval),
+        'cv_interval': float(intervals.std() / mean_interval) if intervals.size > 1 and mean_interval > 0 else np.nan,
+    }
@@ -0,0 +1,208 @@
+# standard imports
+import functools
+import hashlib
+import inspect
+import threading
+from collections import OrderedDict
+
+# third party imports
+import numpy as np
+
+
+def result_nbytes(value):
+    """
+    Estimates the memory held by an analysis result.
+
+    Args:
+        value: A numpy array, a scalar, or a tuple/list/dict nesting them.
+
+    Returns:
+        int: The estimated size in bytes.
+
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(result_nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(result_nbytes(item) for item in value.values())
+    return 64
+
+
+def _freeze(value):
+    # Cached results are shared between callers, so they must not be mutated in place
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            _freeze(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _freeze(item)
+    return value
+
+
+def _key_part(value):
+    if isinstance(value, np.ndarray):
+        digest = hashlib.blake2b(np.ascontiguousarray(value).view(np.uint8), digest_size=16).hexdigest()
+        return ('ndarray', value.shape, value.dtype.str, digest)
+    if isinstance(value, (tuple, list)):
+        return tuple(_key_part(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _key_part(v)) for k, v in value.items()))
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def make_key(method_name, arguments):
+    """
+    Builds a hashable cache key from a method name and its bound arguments.
+
+    Arrays are keyed by shape, dtype and a content digest.
+
+    Args:
+        method_name (str): The name of the method.
+        arguments (dict): The bound arguments, including defaults.
+
+    Returns:
+        tuple: The cache key.
+
+    """
+    return (method_name,) + tuple((name, _key_part(value)) for name, value in arguments.items())
+
+
+class AnalysisCache:
+    """
+    A thread-safe LRU cache for analysis results, bounded by the bytes it holds.
+
+    Args:
+        max_bytes (int): The memory budget in bytes. Default is 512 MiB.
+
+    Attributes:
+        max_bytes (int): The memory budget in bytes.
+        nbytes (int): The memory currently held in bytes.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that had to compute.
+        evictions (int): The number of entries evicted to stay within the budget.
+        generation (int): The number of ``clear`` calls; results computed under an older generation are stale.
+
+    """
+
+    def __init__(self, max_bytes=512 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """
+        Looks up a result and marks it as most recently used.
+
+        Args:
+            key (tuple): The cache key.
+            default: The value returned on a miss. Default is None.
+
+        Returns:
+            The cached result, or ``default``.
+
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value, generation=None):
+        """
+        Stores a result, evicting least recently used entries to stay within the budget.
+
+        Results larger than the whole budget are not stored, and neither are results of a computation that
+        started before the last ``clear`` (they were computed from the data the cache was cleared for).
+
+        Args:
+            key (tuple): The cache key.
+            value: The result to store.
+            generation (int): The ``generation`` read before the result was computed. Default is the current one.
+
+        Returns:
+            The stored (read-only) result.
+
+        """
+        size = result_nbytes(value)
+        value = _freeze(value)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return value
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return value
+            while self._entries and self.nbytes + size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.nbytes -= evicted_size
+                self.evictions += 1
+            self._entries[key] = (value, size)
+            self.nbytes += size
+        return value
+
+    def clear(self):
+        """Drops all entries, e.g. when the underlying data changes. The counters are kept."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: The entries, bytes held, budget, hits, misses and evictions.
+
+        """
+        with self._lock:
+            return {'entries': len(self._entries), 'nbytes': self.nbytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+_MISSING = object()
+
+
+def cached_analysis(method):
+    """
+    Memoizes a method in the ``cache`` attribute (an AnalysisCache) of its instance.
+
+    The key is the method name plus all arguments bound to the signature with defaults applied, so
+    ``f(1)`` and ``f(time_value=1)`` share one entry. Results are returned read-only; a result whose computation
+    overlapped a ``clear`` of the cache is returned but not stored.
+
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        arguments.pop(next(iter(signature.parameters)))
+        key = make_key(method.__name__, arguments)
+        generation = self.cache.generation
+        result = self.cache.get(key, _MISSING)
+        if result is _MISSING:
+            result = self.cache.put(key, method(self, *args, **kwargs), generation)
+        return result
+
+    return wrapper
@@ -0,0 +1,132 @@
+# third party imports
+import numpy as np
+import scipy.signal as ssignal
+
+CONV_TYPES = ('boxcar', 'dual_exp', 'gaussian')
+
+
+def _spike_trains_to_dense(spikes, sum_channels, dtype):
+    if sum_channels:
+        # convolution is linear, so the channel sum of the output is the convolution of the summed train
+        return np.bincount(spikes.indices, minlength=spikes.n_samples)[np.newaxis, :spikes.n_samples].astype(dtype)
+    return spikes.to_dense(dtype=dtype)
+
+
+def boxcar_filter(trains, width, accumulator=None):
+    """
+    Applies a boxcar of ``width`` samples along the last axis as a difference of cumulative sums.
+
+    The output is aligned like ``scipy.signal.convolve(..., mode='same')``: sample ``n`` holds the
+    sum over ``[n - width // 2, n + (width - 1) // 2]``.
+
+    Args:
+        trains (numpy.ndarray): The input with shape (..., samples).
+        width (int): The boxcar width in samples.
+        accumulator (numpy.dtype): The dtype of the cumulative sums. Default is float64 for floating-point input
+            and int64 otherwise; int32 halves the working set when no running sum can reach 2**31.
+
+    Returns:
+        numpy.ndarray: The filtered input, same shape as ``trains``, in the accumulator dtype.
+
+    """
+    n = trains.shape[-1]
+    if accumulator is None:
+        accumulator = np.float64 if trains.dtype.kind == 'f' else np.int64
+    cumulative = np.zeros(trains.shape[:-1] + (n + 1,), dtype=accumulator)
+    np.cumsum(trains, axis=-1, out=cumulative[..., 1:])
+    positions = np.arange(n)
+    upper = np.minimum(positions + (width - 1) // 2 + 1, n)
+    lower = np.maximum(positions - width // 2, 0)
+    return cumulative[..., upper] - cumulative[..., lower]
+
+
+def dual_exp_filter(trains, tau_decay, tau_rise, area):
+    """
+    Applies a causal difference-of-exponentials kernel along the last axis.
+
+    Each exponential is a one-pole recursive filter, so the cost is linear in the number of samples
+    and independent of the time constants.
+
+    Args:
+        trains (numpy.ndarray): The input with shape (..., samples).
+        tau_decay (float): The decay time constant in samples.
+        tau_rise (float): The rise time constant in samples; must be smaller than ``tau_decay``.
+        area (float): The area (sum) of the kernel.
+
+    Returns:
+        numpy.ndarray: The filtered input, same shape as ``trains``.
+
+    """
+    if not 0 < tau_rise < tau_decay:
+        raise ValueError("The dual_exp kernel needs 0 < tau_rise < tau_decay.")
+    decay = np.exp(-1.0 / tau_decay)
+    rise = np.exp(-1.0 / tau_rise)
+    scale = area / (1.0 / (1.0 - decay) - 1.0 / (1.0 - rise))
+    # Coefficients in the dtype of the input, so float32 trains are filtered in float32
+    coefficients = np.array([scale, 1.0, -decay, -rise], dtype=np.result_type(trains.dtype, np.float32))
+    filtered = ssignal.lfilter(coefficients[:1], coefficients[1:3], trains, axis=-1)
+    filtered -= ssignal.lfilter(coefficients[:1], coefficients[[1, 3]], trains, axis=-1)
+    return filtered
+
+
+def gaussian_filter(trains, fwhm, area):
+    """
+    Applies a centered Gaussian kernel along the last axis with overlap-add FFT convolution.
+
+    Args:
+        trains (numpy.ndarray): The input with shape (..., samples).
+        fwhm (float): The full width at half maximum of the kernel in samples.
+        area (float): The area (sum) of the kernel.
+
+    Returns:
+        numpy.ndarray: The filtered input, same shape as ``trains``.
+
+    """
+    sigma = fwhm / (2 * np.sqrt(2 * np.log(2)))
+    half_width = max(int(np.ceil(4 * sigma)), 1)
+    kernel = ssignal.windows.gaussian(2 * half_width + 1, std=max(sigma, 1e-12))
+    kernel *= area / kernel.sum()
+    kernel = kernel.astype(np.result_type(trains.dtype, np.float32)).reshape((1,) * (trains.ndim - 1) + (-1,))
+    return ssignal.oaconvolve(trains, kernel, mode='same', axes=-1)
+
+
+def convolve_spike_trains(spikes, width, conv_type='boxcar', sum_channels=False, tau_rise=None, dtype=np.float64):
+    """
+    Convolves the spike trains of all channels with a kernel in one vectorized pass.
+
+    Every kernel has the same area as a boxcar of ``width`` samples, so dividing the output by the
+    window duration yields a rate in spikes per second regardless of the kernel shape.
+
+    Args:
+        spikes (SpikeTrains): The spike store.
+        width (int): The kernel width in samples: the boxcar length, the dual_exp decay time constant
+            or the gaussian full width at half maximum.
+        conv_type (str): The type of kernel: 'boxcar', 'dual_exp' or 'gaussian'. Default is 'boxcar'.
+        sum_channels (bool): Whether to return only the sum over channels. Default is False.
+        tau_rise (float): The dual_exp rise time constant in samples. Default is ``width / 10``.
+        dtype (numpy.dtype): The dtype of the result. Default is float64.
+
+    Returns:
+        numpy.ndarray: The convolved trains with shape (channels, samples), or (samples,) if summed.
+
+    Raises:
+        ValueError: If the convolution type is invalid or the width is shorter than one sample.
+
+    """
+    if conv_type not in CONV_TYPES:
+        raise ValueError("Invalid convolution type. Supported types are %s." % ', '.join(map(repr, CONV_TYPES)))
+    if width < 1:
+        raise ValueError("The convolution window must span at least one sample.")
+    if conv_type == 'boxcar':
+        # No running sum exceeds the number of spikes, so the sums fit in int32 for all but huge stores
+        accumulator = np.int32 if spikes.n_spikes < 2 ** 31 else np.int64
+        counts = _spike_trains_to_dense(spikes, sum_channels, accumulator if sum_channels else np.int8)
+        convolved = boxcar_filter(counts, int(width), accumulator).astype(dtype)
+    elif conv_type == 'dual_exp':
+        trains = _spike_trains_to_dense(spikes, sum_channels, dtype)
+        tau_rise = width / 10.0 if tau_rise is None else tau_rise
+        convolved = dual_exp_filter(trains, width, tau_rise, area=width).astype(dtype, copy=False)
+    else:
+        trains = _spike_trains_to_dense(spikes, sum_channels, dtype)
+        convolved = gaussian_filter(trains, width, area=width).astype(dtype, copy=False)
+    return convolved[0] if sum_channels else convolved
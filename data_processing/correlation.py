@@ -0,0 +1,121 @@
+# third party imports
+import numpy as np
+
+CORRELATION_METHODS = ('pearson', 'sttc')
+
+
+def pearson_matrix(counts):
+    """
+    Computes the Pearson correlation between all pairs of channels in one matrix product.
+
+    Args:
+        counts (numpy.ndarray): The binned spike counts with shape (channels, bins).
+
+    Returns:
+        numpy.ndarray: The (channels, channels) correlation matrix; rows and columns of channels without
+        variance are NaN.
+
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    centered = counts - counts.mean(axis=1, keepdims=True)
+    covariance = centered @ centered.T
+    std = np.sqrt(np.diag(covariance))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = covariance / np.outer(std, std)
+    correlation[std == 0, :] = np.nan
+    correlation[:, std == 0] = np.nan
+    return np.clip(correlation, -1, 1)
+
+
+def _tiled_fraction(train, dt, n_samples):
+    # The fraction of the recording within +-dt of a spike of the (sorted) train
+    if train.size == 0:
+        return 0.0
+    starts = np.maximum(train - dt, 0)
+    ends = np.minimum(train + dt, n_samples)
+    # Consecutive windows overlap when the next one starts before the current one ends
+    covered = np.minimum(ends[:-1], starts[1:]) - starts[:-1]
+    return (covered.sum() + ends[-1] - starts[-1]) / n_samples
+
+
+def _coincidence_fractions(spikes, dt):
+    # P[a, b]: the fraction of the spikes of channel a within +-dt of a spike of channel b
+    indices = spikes.indices
+    counts = spikes.counts()
+    fractions = np.full((spikes.n_channels, spikes.n_channels), np.nan)
+    starts = spikes.offsets[:-1][counts > 0]
+    for b in range(spikes.n_channels):
+        train = spikes.channel(b)
+        if train.size == 0 or indices.size == 0:
+            continue
+        # One sweep over the spikes of every channel against the sorted train of channel b
+        position = np.searchsorted(train, indices)
+        nearest = np.minimum(np.abs(indices - train[np.clip(position - 1, 0, train.size - 1)]),
+                             np.abs(train[np.clip(position, 0, train.size - 1)] - indices))
+        coincident = (nearest <= dt).astype(np.int64)
+        fractions[counts > 0, b] = np.add.reduceat(coincident, starts) / counts[counts > 0]
+    return fractions
+
+
+def sttc_matrix(spikes, dt):
+    """
+    Computes the spike time tiling coefficient (Cutts & Eglen, 2014) between all pairs of channels.
+
+    Unlike the Pearson correlation of binned counts, the STTC does not depend on the firing rates or on
+    the bin grid. Coincidences are found with one ``searchsorted`` sweep of all spikes per channel.
+
+    Args:
+        spikes (SpikeTrains): The spike store.
+        dt (int): The coincidence window in samples.
+
+    Returns:
+        numpy.ndarray: The symmetric (channels, channels) STTC matrix; NaN for channels without spikes.
+
+    """
+    tiling = np.array([_tiled_fraction(spikes.channel(i), dt, spikes.n_samples) for i in range(spikes.n_channels)])
+    fractions = _coincidence_fractions(spikes, dt)
+    t_a, t_b = tiling[:, np.newaxis], tiling[np.newaxis, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sttc = 0.5 * ((fractions - t_b) / (1 - fractions * t_b) + (fractions.T - t_a) / (1 - fractions.T * t_a))
+    return sttc
+
+
+def cross_correlogram(train_a, train_b, max_lag, bin_size, autocorrelation=False, chunk_spikes=2 ** 16):
+    """
+    Histograms the lags of all spike pairs of two sorted trains within +-``max_lag``.
+
+    The pairs are found with a ``searchsorted`` sweep, so the cost depends on the number of pairs within
+    the window rather than on the length of the recording. With ``autocorrelation=True`` the trains are the
+    same train and the zero-lag pair of every spike with itself is excluded, which gives the autocorrelogram;
+    two different channels keep their synchronous (zero-lag) pairs even if their trains are identical.
+
+    Args:
+        train_a (numpy.ndarray): The sorted spike sample indices of the reference train.
+        train_b (numpy.ndarray): The sorted spike sample indices of the target train.
+        max_lag (int): The largest lag in samples, rounded up to whole bins.
+        bin_size (int): The bin width in samples.
+        autocorrelation (bool): Whether both trains are the same channel. Default is False.
+        chunk_spikes (int): The number of reference spikes processed at once. Default is 2 ** 16.
+
+    Returns:
+        numpy.ndarray: The bin edges of the lags (target minus reference) in samples.
+        numpy.ndarray: The number of pairs per bin.
+
+    """
+    bin_size = max(int(bin_size), 1)
+    half = -(-int(max_lag) // bin_size)
+    edges = np.arange(-half, half + 1) * bin_size
+    histogram = np.zeros(2 * half, dtype=np.int64)
+    for first in range(0, train_a.size, chunk_spikes):
+        reference = train_a[first:first + chunk_spikes]
+        lo = np.searchsorted(train_b, reference + edges[0], side='left')
+        hi = np.searchsorted(train_b, reference + edges[-1], side='left')
+        n_pairs = hi - lo
+        # Expand every reference spike into its window of target spikes without a Python loop
+        pair_starts = np.repeat(lo - np.cumsum(n_pairs) + n_pairs, n_pairs)
+        targets = train_b[pair_starts + np.arange(n_pairs.sum())]
+        lags = targets - np.repeat(reference, n_pairs)
+        if autocorrelation:
+            lags = lags[lags != 0]
+        histogram += np.bincount((lags - edges[0]) // bin_size, minlength=2 * half)[:2 * half]
+    return edges, histogram
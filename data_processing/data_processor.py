@@ -1,66 +1,351 @@
 # standard imports
 import os
+import threading
 from data_processing.utils import convert_to_60MEA_mapping
+from data_processing.spikes import SpikeTrains
+from data_processing.lazy_signal import LazySignal, read_block
+from data_processing.binning import bin_spikes
+from data_processing.convolution import convolve_spike_trains
+from data_processing.cache import AnalysisCache, cached_analysis
+from data_processing.precision import get_precision_policy
+from data_processing.store import open_recording
+from data_processing.decimation import MinMaxPyramid
+from data_processing.waveforms import extract_waveforms
+from data_processing.detection import detect_spikes, estimate_noise_levels
+from data_processing.spectral import welch_psd, spectrogram, peak_frequencies
+from data_processing.correlation import CORRELATION_METHODS, pearson_matrix, sttc_matrix, cross_correlogram
+from data_processing.bursts import detect_channel_bursts, detect_network_bursts, summarize_bursts
+from data_processing.summary import compute_summary, load_summary, save_summary, summary_key, summary_parameters
 
 # third party imports
 import numpy as np
 import scipy.io as sios
 import scipy.signal as ssignal
 
+# Kernel widths around a time range whose spikes are included when convolving the range
+CONVOLUTION_MARGIN = 10
+
 class DataProcessor:
     """
     A class for processing data from a 60MEA mapping.
 
     Args:
         initial_signal (numpy.ndarray): The initial signal.
-        spike_timestamps (list): The spike timestamps.
+        spike_timestamps (numpy.ndarray or SpikeTrains): The padded spike timestamps, or a spike store.
         sampling_rate (float): The sampling rate of the signal.
         channel_info (dict): Information about the channels.
+        cache_bytes (int): The memory budget of the analysis result cache in bytes. Default is 512 MiB.
+        remap (bool): Whether the signal and spikes still need the 60MEA remapping. Default is True.
+        precision (str or PrecisionPolicy): The dtypes the data is stored and analysed in, 'compact' or
+            'float64'. Default is $MEADASH_PRECISION, or 'compact' (see ``data_processing.precision``).
 
     Attributes:
         initial_signal (numpy.ndarray): The initial signal.
-        spike_timestamps (list): The spike timestamps.
+        spikes (SpikeTrains): The spike sample indices per channel in a compact CSR store.
         sampling_rate (float): The sampling rate of the signal.
         channel_info (dict): Information about the channels.
-        raster (numpy.ndarray): The raster representation of the spike timestamps.
+        precision (PrecisionPolicy): The dtypes the data is stored and analysed in.
+        store_path (str): The store directory of the recording if it was opened through the store, else None.
+        cache (AnalysisCache): LRU cache of analysis results, cleared whenever the signal, spikes or
+            sampling rate are replaced.
+        summary (RecordingSummary): The summary index once ``build_summary`` ran, else None. The spike counts,
+            active channels and channel PSDs it covers are answered from it.
+
+    Most analyses accept ``t_start`` and ``t_stop`` in seconds and then only process the spikes (found by binary
+    search) and the signal samples of that time range, so their cost depends on the range, not on the recording.
 
     Methods:
-        create_raster: Creates a raster representation of the spike timestamps.
+        sample_range: Converts a time range in seconds to a sample window.
+        get_spike_window: Retrieves the spikes within a time range.
+        create_raster: Creates a dense raster of the spikes for a window of samples.
+        detect_spikes: Re-detects the spikes from the signal with MAD-based thresholds.
+        get_signal_envelope: Retrieves one channel of the signal decimated for plotting.
+        build_summary: Loads or computes the summary index of the recording.
+        extract_spike_waveforms: Extracts the signal around every spike into one waveform matrix.
         get_spikes_by_timestamp_per_channel: Retrieves spike traces within a given time window.
         downsample_raster_to_binary_presence: Downsamples the raster to binary presence.
         aggregate_raster_spike_counts: Aggregates spike counts in fixed time intervals.
         get_active_channels: Retrieves active channels based on spike counts.
         convolve_signal: Convolves the signal with a given kernel.
         estimate_power_spectral_density: Estimates the power spectral density of the signal.
+        estimate_channel_psd: Estimates the power spectral density of every channel.
+        estimate_channel_spectrogram: Computes the spectrogram of every channel.
+        compute_correlation_matrix: Computes the pairwise correlation of all channels.
+        compute_cross_correlogram: Computes the cross-correlogram of two channels.
+        detect_bursts: Detects single-channel and network bursts.
+        summarize_bursts: Summarizes the burst statistics of the recording.
 
     """
 
-    def __init__(self, initial_signal, spike_timestamps, sampling_rate, channel_info):
+    def __init__(self, initial_signal, spike_timestamps, sampling_rate, channel_info, cache_bytes=512 * 2 ** 20,
+                 remap=True, precision=None):
+        self.cache = AnalysisCache(cache_bytes)
+        self.precision = get_precision_policy(precision)
+        self.store_path = None
+        self._summary = None
+        self._summary_lock = threading.Lock()
         # TODO: Convert the initial signal and spike_timestamps to a 60MEA mapping
-        self.initial_signal = convert_to_60MEA_mapping(initial_signal, channel_info)
-        self.spike_timestamps = convert_to_60MEA_mapping(spike_timestamps, channel_info)
+        if remap:
+            initial_signal = convert_to_60MEA_mapping(initial_signal, channel_info,
+                                                      dtype=self.precision.signal_dtype_for(initial_signal.dtype))
+        self.initial_signal = initial_signal
         self.sampling_rate = sampling_rate
         self.channel_info = channel_info
-        self.raster = self.create_raster()
+        if isinstance(spike_timestamps, SpikeTrains):
+            self.spikes = spike_timestamps
+        else:
+            if remap:
+                spike_timestamps = convert_to_60MEA_mapping(spike_timestamps, channel_info)
+            self.spikes = SpikeTrains.from_padded(spike_timestamps, self.n_samples)
+
+    @classmethod
+    def from_recording(cls, file_path, sampling_rate, channel_info, store_root=None, **kwargs):
+        """
+        Opens a recording through the native store, converting it on first use.
+
+        Later opens of the same recording (matched by ``store.recording_fingerprint``) memory-map the converted
+        store and skip parsing, remapping and spike indexing.
+
+        Args:
+            file_path (str): The path of the recording.
+            sampling_rate (float): The sampling rate of the signal.
+            channel_info (numpy.ndarray): Information about the channels.
+            store_root (str): The store directory. Default is ``store.default_store_root()``.
+            **kwargs: Further arguments for the constructor.
+
+        Returns:
+            DataProcessor: The processor over the stored recording.
+
+        """
+        recording = open_recording(file_path, sampling_rate, channel_info, store_root,
+                                   precision=kwargs.get('precision'))
+        processor = cls(recording.signal, recording.spikes, recording.sampling_rate, recording.channel_info,
+                        remap=False, **kwargs)
+        processor.store_path = recording.path
+        return processor
+
+    @property
+    def initial_signal(self):
+        """
+        numpy.ndarray: The signal in 60MEA layout, narrowed to the precision policy unless it is memory-mapped.
+        Replacing it invalidates the analysis cache.
+        """
+        return self._initial_signal
+
+    @initial_signal.setter
+    def initial_signal(self, value):
+        self._initial_signal = self.precision.cast_signal(value)
+        self._signal_pyramid = None
+        self._noise_levels = None
+        self.cache.clear()
+
+    @property
+    def signal_pyramid(self):
+        """MinMaxPyramid: The min/max envelope pyramid of the signal, built per channel on first use."""
+        if self._signal_pyramid is None:
+            self._signal_pyramid = MinMaxPyramid(self.initial_signal)
+        return self._signal_pyramid
+
+    @property
+    def spikes(self):
+        """
+        SpikeTrains: The spike store, with indices in the precision policy unless they are memory-mapped.
+        Replacing it invalidates the analysis cache.
+        """
+        return self._spikes
+
+    @spikes.setter
+    def spikes(self, value):
+        self._spikes = self.precision.cast_spikes(value)
+        self._summary = None
+        self.cache.clear()
+
+    @property
+    def sampling_rate(self):
+        """float: The sampling rate of the signal. Replacing it invalidates the analysis cache."""
+        return self._sampling_rate
+
+    @sampling_rate.setter
+    def sampling_rate(self, value):
+        self._sampling_rate = value
+        self._summary = None
+        self.cache.clear()
+
+    @property
+    def n_samples(self):
+        """int: The number of samples per channel."""
+        return self.initial_signal.shape[1]
+
+    @property
+    def resident_nbytes(self):
+        """int: The private memory held by the processor; memory-mapped data is shared and not counted."""
+        signal = self.initial_signal
+        signal_nbytes = 0 if isinstance(signal, (LazySignal, np.memmap)) else signal.nbytes
+        spikes_nbytes = sum(array.nbytes for array in (self.spikes.offsets, self.spikes.indices)
+                            if not isinstance(array, np.memmap) and not isinstance(array.base, np.memmap))
+        pyramid_nbytes = self._signal_pyramid.nbytes if self._signal_pyramid is not None else 0
+        summary_nbytes = self._summary.nbytes if self._summary is not None else 0
+        return signal_nbytes + spikes_nbytes + pyramid_nbytes + summary_nbytes + self.cache.stats()['nbytes']
+
+    @property
+    def summary(self):
+        """RecordingSummary: The summary index of the spikes, or None until ``build_summary`` ran."""
+        return self._summary
+
+    def build_summary(self, **parameters):
+        """
+        Loads the summary index of the spikes from the store directory, or computes and stores it.
+
+        Processors without a store directory keep the summary in memory only. Afterwards, the spike counts,
+        active channels and channel PSDs that the summary covers are answered from it without touching the spikes.
+
+        Args:
+            **parameters: Summary parameters overriding ``summary.DEFAULT_SUMMARY_PARAMETERS``.
+
+        Returns:
+            RecordingSummary: The summary.
+
+        """
+        parameters = summary_parameters(**parameters)
+        with self._summary_lock:
+            spikes = self._spikes
+            if self._summary is not None and self._summary.parameters == parameters:
+                return self._summary
+            key = summary_key(self, parameters)
+            summary = load_summary(self.store_path, key) if self.store_path else None
+            if summary is None:
+                summary = compute_summary(self, **parameters)
+                if self.store_path:
+                    save_summary(summary, self.store_path)
+            # Spikes replaced meanwhile (e.g. by detect_spikes) get a summary of their own
+            if self._spikes is spikes:
+                self._summary = summary
+            return summary
+
+    def sample_range(self, t_start=None, t_stop=None):
+        """
+        Converts a time range in seconds to a sample window clipped to the recording.
+
+        Args:
+            t_start (float): The start of the time range in seconds. Default is the start of the recording.
+            t_stop (float): The end of the time range in seconds. Default is the end of the recording.
+
+        Returns:
+            int: The first sample of the window.
+            int: The end of the window (exclusive).
+
+        """
+        stop = self.n_samples if t_stop is None else min(max(int(np.ceil(t_stop * self.sampling_rate)), 0),
+                                                         self.n_samples)
+        start = 0 if t_start is None else min(max(int(np.floor(t_start * self.sampling_rate)), 0), stop)
+        return start, stop
 
-    def create_raster(self):
+    def get_spike_window(self, t_start=None, t_stop=None):
         """
-        Creates a raster representation of the spike timestamps.
+        Retrieves the spikes within a time range.
+
+        Args:
+            t_start (float): The start of the time range in seconds. Default is the start of the recording.
+            t_stop (float): The end of the time range in seconds. Default is the end of the recording.
+
+        Returns:
+            SpikeTrains: The spikes of the range, with sample indices relative to the start of the range.
+
+        """
+        return self.spikes.window(*self.sample_range(t_start, t_stop))
+
+    def create_raster(self, start=0, stop=None, packed=False):
+        """
+        Creates a dense raster of the spikes for a window of samples.
+
+        The spikes are held sparsely in ``self.spikes``; only build a dense raster for the window
+        that is actually needed.
+
+        Args:
+            start (int): The first sample of the window. Default is 0.
+            stop (int): The end of the window (exclusive). Default is the end of the recording.
+            packed (bool): Whether to pack eight samples per byte (see ``SpikeTrains.to_packed``). Default is False.
 
         Returns:
-            numpy.ndarray: The raster representation of the spike timestamps.
+            numpy.ndarray: The raster with shape (channels, stop - start) in the raster dtype of the precision
+            policy, or the uint8 bit-packed raster with shape (channels, ceil((stop - start) / 8)).
+
+        """
+        if packed:
+            return self.spikes.to_packed(start, stop)
+        return self.spikes.to_dense(start, stop, dtype=self.precision.raster_dtype)
 
+    def detect_spikes(self, threshold=5.0, polarity='negative', refractory_period=0.001, chunk_duration=10.0,
+                      n_workers=None):
         """
-        raster = np.zeros_like(self.initial_signal)
-        for channel in range(len(self.spike_timestamps)):
-            for ts in self.spike_timestamps[channel]:
-                raster[channel, int(ts)] = 1
-        return raster
+        Re-detects the spikes from the signal and replaces ``self.spikes`` (invalidating cached analyses).
+
+        The per-channel noise levels are estimated once and reused, so re-detecting with another threshold only
+        repeats the chunked crossing search.
+
+        Args:
+            threshold (float): The threshold in multiples of the channel noise level (MAD-based). Default is 5.
+            polarity (str): 'negative', 'positive' or 'both'. Default is 'negative'.
+            refractory_period (float): The minimum time between two spikes of a channel in seconds. Default is 1 ms.
+            chunk_duration (float): The duration of each processed chunk in seconds. Default is 10.
+            n_workers (int): The number of worker processes. Default is None (no pool).
+
+        Returns:
+            SpikeTrains: The detected spikes.
+
+        """
+        if self._noise_levels is None:
+            self._noise_levels = estimate_noise_levels(self.initial_signal, self.sampling_rate)
+        self.spikes = detect_spikes(self.initial_signal, self.sampling_rate, threshold=threshold, polarity=polarity,
+                                    refractory_period=refractory_period, chunk_duration=chunk_duration,
+                                    n_workers=n_workers, noise_levels=self._noise_levels)
+        return self.spikes
+
+    def get_signal_envelope(self, channel, t_start=None, t_stop=None, n_points=2000):
+        """
+        Retrieves one channel of the signal decimated to roughly ``n_points`` min/max buckets.
+
+        Args:
+            channel (int): The channel index.
+            t_start (float): The start of the time range in seconds. Default is the start of the recording.
+            t_stop (float): The end of the time range in seconds. Default is the end of the recording.
+            n_points (int): The number of buckets to aim for, e.g. the plot width in pixels. Default is 2000.
+
+        Returns:
+            numpy.ndarray: The time of every point in seconds.
+            numpy.ndarray: The value of every point.
+
+        """
+        start = 0 if t_start is None else max(int(np.floor(t_start * self.sampling_rate)), 0)
+        stop = self.n_samples if t_stop is None else min(int(np.ceil(t_stop * self.sampling_rate)) + 1, self.n_samples)
+        samples, values = self.signal_pyramid.query(channel, start, stop, n_points)
+        return samples / self.sampling_rate, values
+
+    @cached_analysis
+    def extract_spike_waveforms(self, left_bound=0.2, right_bound=0.3, pad_mode='constant', dtype=np.float32):
+        """
+        Extracts the signal around every spike into one contiguous waveform matrix.
+
+        Args:
+            left_bound (float): The time before each spike in seconds. Default is 0.2.
+            right_bound (float): The time after each spike in seconds. Default is 0.3.
+            pad_mode (str): How samples outside the recording are filled: 'constant' (zeros), 'edge' or 'reflect'.
+                Default is 'constant'.
+            dtype (numpy.dtype): The dtype of the waveforms. Default is float32.
+
+        Returns:
+            Waveforms: The (n_spikes, window) waveform matrix with parallel channel and sample index arrays.
+
+        """
+        return extract_waveforms(self.initial_signal, self.spikes, int(left_bound * self.sampling_rate),
+                                 int(right_bound * self.sampling_rate), pad_mode=pad_mode, dtype=dtype)
 
     def get_spikes_by_timestamp_per_channel(self, left_bound=0.2, right_bound=0.3):
         """
         Retrieves spike traces within a given time window.
 
+        Traces reaching past the edges of the recording are zero-padded to the full window.
+
         Args:
             left_bound (float): The left bound of the time window in seconds. Default is 0.2.
             right_bound (float): The right bound of the time window in seconds. Default is 0.3.
@@ -69,64 +354,61 @@ class DataProcessor:
             dict: A dictionary containing spike traces per channel.
 
         """
-        l = -int(left_bound * self.sampling_rate)
-        r = int(right_bound * self.sampling_rate)
-        spike_traces = {}
-        for channel in range(len(self.spike_timestamps)):
-            spike_traces[channel] = {}
-            for ts in self.spike_timestamps[channel]:
-                if ts != 0:
-                    spike_trace = self.initial_signal[channel, ts + l:ts + r]
-                    spike_traces[channel][ts] = spike_trace
+        extracted = self.extract_spike_waveforms(left_bound, right_bound, dtype=self.initial_signal.dtype)
+        spike_traces = {channel: {} for channel in range(self.spikes.n_channels)}
+        for waveform, channel, ts in zip(extracted.waveforms, extracted.channels, extracted.sample_indices):
+            spike_traces[channel][ts] = waveform
         return spike_traces
 
-    def downsample_raster_to_binary_presence(self, time_per_bucket):
+    def downsample_raster_to_binary_presence(self, time_per_bucket, include_partial=False):
         """
         Downsamples the raster to binary presence.
 
         Args:
             time_per_bucket (float): The time duration per bucket in seconds.
+            include_partial (bool): Whether to keep a trailing partial bucket. Default is False.
 
         Returns:
-            numpy.ndarray: The downsampled binary presence matrix.
+            numpy.ndarray: The downsampled binary presence matrix in the raster dtype of the precision policy.
 
         """
-        samples_per_bucket = int(self.sampling_rate * time_per_bucket)
-        num_buckets = self.raster.shape[1] // samples_per_bucket
-        binary_presence = np.zeros((self.raster.shape[0], num_buckets))
-        for channel in range(self.raster.shape[0]):
-            for bucket in range(num_buckets):
-                start_index = bucket * samples_per_bucket
-                end_index = start_index + samples_per_bucket
-                binary_presence[channel, bucket] = np.any(self.raster[channel, start_index:end_index])
-        return binary_presence.astype(int)
+        return bin_spikes(self.spikes, self.sampling_rate * time_per_bucket,
+                          include_partial=include_partial, output='presence', dtype=self.precision.raster_dtype)
 
-    def aggregate_raster_spike_counts(self, time_value=1, total=False):
+    @cached_analysis
+    def aggregate_raster_spike_counts(self, time_value=1, total=False, include_partial=False, t_start=None,
+                                      t_stop=None):
         """
         Aggregates spike counts in fixed time intervals.
 
         Args:
             time_value (float): The time value for each interval in seconds. Default is 1.
             total (bool): Whether to compute the total spike count. Default is False.
+            include_partial (bool): Whether to keep a trailing partial interval. Default is False.
+            t_start (float): The start of the time range in seconds; intervals start there. Default is the start
+                of the recording.
+            t_stop (float): The end of the time range in seconds. Default is the end of the recording.
 
         Returns:
-            numpy.ndarray: The aggregated spike counts.
+            numpy.ndarray: The aggregated spike counts in the count dtype of the precision policy.
 
         Raises:
             AssertionError: If the time value exceeds the signal duration in seconds.
 
         """
-        assert time_value <= self.raster.shape[1] / self.sampling_rate, "Time value exceeds signal duration in seconds"
+        start, stop = self.sample_range(t_start, t_stop)
+        summary = self._summary
+        if summary is not None:
+            counts = summary.counts(start, stop, None if total else self.sampling_rate * time_value,
+                                    include_partial)
+            if counts is not None:
+                return counts
+        spikes = self.spikes.window(start, stop)
+        count_dtype = self.precision.count_dtype_for(spikes.n_samples)
         if total:
-            return np.sum(self.raster, axis=1)
-        bucket_size = int(self.sampling_rate * time_value)
-        num_buckets = self.raster.shape[1] // bucket_size
-        aggregated_counts = np.zeros((self.raster.shape[0], num_buckets))
-        for bucket in range(num_buckets):
-            start = bucket * bucket_size
-            end = start + bucket_size
-            aggregated_counts[:, bucket] = np.sum(self.raster[:, start:end], axis=1)
-        return aggregated_counts
+            return spikes.counts().astype(count_dtype)
+        assert time_value <= spikes.n_samples / self.sampling_rate, "Time value exceeds signal duration in seconds"
+        return bin_spikes(spikes, self.sampling_rate * time_value, include_partial=include_partial, dtype=count_dtype)
 
     def get_active_channels(self, active_channel_threshold=5):
         """
@@ -139,43 +421,59 @@ class DataProcessor:
             numpy.ndarray: The indices of the active channels.
 
         """
+        summary = self._summary
+        if summary is not None and summary.parameters['active_channel_threshold'] == active_channel_threshold:
+            return summary.active_channels
         aggregate = self.aggregate_raster_spike_counts(total=True)
-        active_channels = np.array([i for i, channel in enumerate(aggregate) if np.mean(channel) >= active_channel_threshold])
-        return active_channels
+        return np.flatnonzero(aggregate >= active_channel_threshold)
 
-    def convolve_signal(self, windowsize, conv_type='boxcar'):
+    @cached_analysis
+    def convolve_signal(self, windowsize, conv_type='boxcar', sum_channels=False, t_start=None, t_stop=None):
         """
-        Convolves the signal with a given kernel.
+        Convolves the spike trains of all channels with a given kernel.
 
         Args:
-            windowsize (float): The size of the convolution window in seconds.
-            conv_type (str): The type of convolution. Supported types are 'boxcar' and 'dual_exp'. Default is 'boxcar'.
+            windowsize (float): The size of the convolution window in seconds (the boxcar length, the dual_exp
+                decay time constant or the gaussian full width at half maximum).
+            conv_type (str): The type of convolution. Supported types are 'boxcar', 'dual_exp' and 'gaussian'.
+                Default is 'boxcar'.
+            sum_channels (bool): Whether to return only the sum over channels, without allocating a
+                (channels, samples) array. Default is False.
+            t_start (float): The start of the time range in seconds. Default is the start of the recording.
+            t_stop (float): The end of the time range in seconds. Default is the end of the recording.
 
         Returns:
-            numpy.ndarray: The convolved signal.
+            numpy.ndarray: The convolved signal with shape (channels, samples), or (samples,) if summed, covering
+            the time range, in the float dtype of the precision policy.
 
         Raises:
             ValueError: If the convolution type is invalid.
 
         """
-        if conv_type == 'boxcar':
-            kernel = ssignal.boxcar(int(windowsize * self.sampling_rate))
-        else:
-            raise ValueError("Invalid convolution type. Supported types are 'boxcar' and 'dual_exp'.")
-
-        convolved_signal = np.zeros_like(self.raster)
-        for i in range(self.raster.shape[0]):
-            f = self.raster[i]
-            fw = ssignal.convolve(f, kernel, mode='same')
-            convolved_signal[i] = fw
-        return convolved_signal
-
+        width = int(windowsize * self.sampling_rate)
+        start, stop = self.sample_range(t_start, t_stop)
+        # Spikes up to a few kernel widths outside the range still reach into it (the dual_exp tail is
+        # truncated at exp(-10)), so the padded range is convolved and then cropped
+        margin = CONVOLUTION_MARGIN * max(width, 1)
+        padded_start, padded_stop = max(start - margin, 0), min(stop + margin, self.n_samples)
+        convolved = convolve_spike_trains(self.spikes.window(padded_start, padded_stop), width, conv_type=conv_type,
+                                          sum_channels=sum_channels, dtype=self.precision.float_dtype)
+        if (padded_start, padded_stop) == (start, stop):
+            return convolved
+        # Copied, so the cached result does not hold on to the padding
+        return convolved[..., start - padded_start:stop - padded_start].copy()
+
+    # Not memoized: keying the array argument would hash every sample on each call, even on a hit; its callers
+    # pass the output of the (memoized) convolve_signal
     def estimate_power_spectral_density(self, conv_sig_sum, window_length=None, noverlap=None, nfft=None, kernel=None):
         """
         Estimates the power spectral density of a signal using Welch's method.
 
+        A (channels, samples) input is estimated for all channels in one call, with one center frequency per
+        channel.
+
         Args:
-            conv_sig_sum (numpy.ndarray): The convolved signal.
+            conv_sig_sum (numpy.ndarray): The convolved signal, (samples,) or (channels, samples).
             window_length (int): The length of the window for Welch's method. Default is None.
             noverlap (int): The number of overlapping samples between windows. Default is None.
             nfft (int): The number of points to compute the FFT. Default is None.
@@ -184,12 +482,12 @@ class DataProcessor:
         Returns:
             numpy.ndarray: The frequencies.
             numpy.ndarray: The power spectral density.
-            float: The center frequency.
+            float or numpy.ndarray: The center frequency, per channel for a (channels, samples) input.
 
         """
-        detrended = ssignal.detrend(conv_sig_sum, type='linear')
+        detrended = ssignal.detrend(conv_sig_sum, type='linear', axis=-1)
         if window_length is None:
-            window_length = len(detrended) // 8
+            window_length = detrended.shape[-1] // 8
         if nfft is None:
             nfft = (2 ** np.ceil(np.log2(window_length))) * 2
         if noverlap is None:
@@ -199,8 +497,195 @@ class DataProcessor:
 
         frequencies, pxx = ssignal.welch(detrended, fs=self.sampling_rate, window=kernel,
                                          nperseg=window_length, noverlap=noverlap, nfft=nfft, scaling='density',
-                                         axis=0, detrend=False, average='mean')
+                                         axis=-1, detrend=False, average='mean')
 
-        max_index = np.argmax(pxx)
+        max_index = np.argmax(pxx, axis=-1)
         center_frequency = frequencies[max_index]
-        return frequencies, pxx, center_frequency
\ No newline at end of file
+        return frequencies, pxx, center_frequency
+
+    def _spectral_source(self, source, bin_size, t_start=None, t_stop=None):
+        # The signal to analyse and its sampling rate: the raw signal, or the binned firing rate of every channel
+        start, stop = self.sample_range(t_start, t_stop)
+        if source == 'signal':
+            if start == 0 and stop == self.n_samples:
+                return self.initial_signal, self.sampling_rate
+            return read_block(self.initial_signal, start, stop), self.sampling_rate
+        if source == 'rate':
+            bin_samples = max(int(round(bin_size * self.sampling_rate)), 1)
+            rate_fs = self.sampling_rate / bin_samples
+            rate = bin_spikes(self.spikes.window(start, stop), bin_samples, dtype=self.precision.float_dtype)
+            rate *= rate_fs
+            return rate, rate_fs
+        raise ValueError("Invalid spectral source %r. Supported sources are rate, signal." % (source,))
+
+    @cached_analysis
+    def estimate_channel_psd(self, source='rate', bin_size=0.01, segment_duration=None, n_workers=None, t_start=None,
+                             t_stop=None):
+        """
+        Estimates the power spectral density of every channel in one batched Welch call.
+
+        Args:
+            source (str): 'rate' for the firing rate binned at ``bin_size``, or 'signal' for the raw signal.
+                Default is 'rate'.
+            bin_size (float): The bin width of the firing rate in seconds. Default is 0.01.
+            segment_duration (float): The Welch segment length in seconds. Default is an eighth of the
+                recording for 'rate' (as ``estimate_power_spectral_density``) and 1 s for 'signal'.
+            n_workers (int): The number of threads processing blocks of segments. Default is None (no pool).
+            t_start (float): The start of the time range in seconds. Default is the start of the recording.
+            t_stop (float): The end of the time range in seconds. Default is the end of the recording.
+
+        Returns:
+            numpy.ndarray: The frequencies.
+            numpy.ndarray: The power spectral density with shape (channels, frequencies).
+            numpy.ndarray: The center (peak) frequency of every channel, NaN for silent channels.
+
+        Raises:
+            ValueError: If the source is invalid.
+
+        """
+        summary = self._summary
+        if summary is not None and source == 'rate' and bin_size == summary.parameters['psd_bin_size'] and \
+                segment_duration is None and self.sample_range(t_start, t_stop) == (0, self.n_samples):
+            return summary.psd_frequencies, summary.psd, summary.psd_peak_frequencies
+        data, fs = self._spectral_source(source, bin_size, t_start, t_stop)
+        if segment_duration is None:
+            nperseg = max(data.shape[1] // 8, 1) if source == 'rate' else int(fs)
+        else:
+            nperseg = max(int(segment_duration * fs), 1)
+        frequencies, pxx = welch_psd(data, fs, nperseg, n_workers=n_workers)
+        # The DC bin is skipped so the center frequency reflects rhythmic activity, not the mean rate
+        min_frequency = frequencies[1] if frequencies.size > 1 else 0.0
+        return frequencies, pxx, peak_frequencies(frequencies, pxx, min_frequency=min_frequency)
+
+    @cached_analysis
+    def estimate_channel_spectrogram(self, source='rate', bin_size=0.01, segment_duration=1.0, n_workers=None,
+                                     t_start=None, t_stop=None):
+        """
+        Computes the spectrogram of every channel in one batched call.
+
+        Args:
+            source (str): 'rate' for the firing rate binned at ``bin_size``, or 'signal' for the raw signal.
+                Default is 'rate'.
+            bin_size (float): The bin width of the firing rate in seconds. Default is 0.01.
+            segment_duration (float): The segment length in seconds. Default is 1.
+            n_workers (int): The number of threads processing blocks of segments. Default is None (no pool).
+            t_start (float): The start of the time range in seconds. Default is the start of the recording.
+            t_stop (float): The end of the time range in seconds. Default is the end of the recording.
+
+        Returns:
+            numpy.ndarray: The frequencies.
+            numpy.ndarray: The segment centre times in seconds from the start of the recording.
+            numpy.ndarray: The power spectral density with shape (channels, frequencies, segments), float32.
+
+        Raises:
+            ValueError: If the source is invalid.
+
+        """
+        data, fs = self._spectral_source(source, bin_size, t_start, t_stop)
+        frequencies, times, sxx = spectrogram(data, fs, max(int(segment_duration * fs), 1), n_workers=n_workers)
+        return frequencies, times + self.sample_range(t_start, t_stop)[0] / self.sampling_rate, sxx
+
+    @cached_analysis
+    def compute_correlation_matrix(self, time_value=0.01, method='pearson', t_start=None, t_stop=None):
+        """
+        Computes the pairwise correlation of all channels.
+
+        Args:
+            time_value (float): The bin width in seconds for 'pearson' (counts from
+                ``aggregate_raster_spike_counts``), or the coincidence window for 'sttc'. Default is 0.01.
+            method (str): 'pearson' or 'sttc' (spike time tiling coefficient). Default is 'pearson'.
+            t_start (float): The start of the time range in seconds. Default is the start of the recording.
+            t_stop (float): The end of the time range in seconds. Default is the end of the recording.
+
+        Returns:
+            numpy.ndarray: The (channels, channels) correlation matrix; NaN for channels without spikes.
+
+        Raises:
+            ValueError: If the method is invalid.
+
+        """
+        if method == 'pearson':
+            return pearson_matrix(self.aggregate_raster_spike_counts(time_value=time_value, t_start=t_start,
+                                                                     t_stop=t_stop))
+        if method == 'sttc':
+            return sttc_matrix(self.get_spike_window(t_start, t_stop), int(round(time_value * self.sampling_rate)))
+        raise ValueError("Invalid correlation method %r. Supported methods are %s." % (
+            method, ', '.join(CORRELATION_METHODS)))
+
+    @cached_analysis
+    def compute_cross_correlogram(self, channel_a, channel_b, max_lag=0.1, bin_size=0.001, t_start=None,
+                                  t_stop=None):
+        """
+        Computes the cross-correlogram of two channels (the autocorrelogram if they are the same).
+
+        Args:
+            channel_a (int): The reference channel.
+            channel_b (int): The target channel.
+            max_lag (float): The largest lag in seconds. Default is 0.1.
+            bin_size (float): The bin width in seconds. Default is 0.001.
+            t_start (float): The start of the time range in seconds. Default is the start of the recording.
+            t_stop (float): The end of the time range in seconds. Default is the end of the recording.
+
+        Returns:
+            numpy.ndarray: The bin edges of the lags in seconds.
+            numpy.ndarray: The number of spike pairs per bin.
+
+        """
+        bin_samples = max(int(round(bin_size * self.sampling_rate)), 1)
+        spikes = self.get_spike_window(t_start, t_stop)
+        edges, counts = cross_correlogram(spikes.channel(channel_a), spikes.channel(channel_b),
+                                          int(round(max_lag * self.sampling_rate)), bin_samples,
+                                          autocorrelation=channel_a == channel_b)
+        return edges / self.sampling_rate, counts
+
+    @cached_analysis
+    def detect_bursts(self, max_isi=0.1, min_spikes=5, min_channels=3, t_start=None, t_stop=None):
+        """
+        Detects single-channel bursts (ISI threshold) and network bursts (simultaneous channel bursts).
+
+        Args:
+            max_isi (float): The largest inter-spike interval within a burst in seconds. Default is 0.1.
+            min_spikes (int): The smallest number of spikes of a channel burst. Default is 5.
+            min_channels (int): The smallest number of simultaneously bursting channels of a network burst.
+                Default is 3.
+            t_start (float): The start of the time range in seconds. Default is the start of the recording.
+            t_stop (float): The end of the time range in seconds. Default is the end of the recording.
+
+        Returns:
+            numpy.ndarray: The channel bursts (``bursts.CHANNEL_BURST_DTYPE``), in samples from the start of the
+            recording.
+            numpy.ndarray: The network bursts (``bursts.network_burst_dtype``).
+
+        """
+        start, stop = self.sample_range(t_start, t_stop)
+        spikes = self.spikes.window(start, stop)
+        channel_bursts = detect_channel_bursts(spikes, self.sampling_rate, max_isi, min_spikes)
+        network_bursts = detect_network_bursts(spikes, self.sampling_rate, channel_bursts, min_channels)
+        for bursts in (channel_bursts, network_bursts):
+            bursts['start'] += start
+            bursts['stop'] += start
+        return channel_bursts, network_bursts
+
+    def summarize_bursts(self, max_isi=0.1, min_spikes=5, min_channels=3, t_start=None, t_stop=None):
+        """
+        Summarizes the channel and network bursts of the recording.
+
+        Args:
+            max_isi (float): The largest inter-spike interval within a burst in seconds. Default is 0.1.
+            min_spikes (int): The smallest number of spikes of a channel burst. Default is 5.
+            min_channels (int): The smallest number of simultaneously bursting channels of a network burst.
+                Default is 3.
+            t_start (float): The start of the time range in seconds. Default is the start of the recording.
+            t_stop (float): The end of the time range in seconds. Default is the end of the recording.
+
+        Returns:
+            dict: The 'channel' and 'network' burst statistics (see ``bursts.summarize_bursts``).
+
+        """
+        channel_bursts, network_bursts = self.detect_bursts(max_isi, min_spikes, min_channels, t_start, t_stop)
+        start, stop = self.sample_range(t_start, t_stop)
+        duration = (stop - start) / self.sampling_rate
+        return {
+            'channel': summarize_bursts(channel_bursts, self.sampling_rate, duration),
+            'network': summarize_bursts(network_bursts, self.sampling_rate, duration),
+        }
@@ -0,0 +1,185 @@
+# standard imports
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# third party imports
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from data_processing.lazy_signal import read_block
+from data_processing.spikes import SpikeTrains
+
+POLARITIES = ('negative', 'positive', 'both')
+
+# Scale factor turning the median absolute deviation of Gaussian noise into its standard deviation
+MAD_TO_SIGMA = 1.4826
+
+
+def _rectify(block, polarity):
+    # Turns every polarity into "larger is more spike-like"
+    block = np.asarray(block, dtype=np.float32)
+    if polarity == 'negative':
+        return -block
+    if polarity == 'positive':
+        return block
+    return np.abs(block)
+
+
+def estimate_noise_levels(signal, sampling_rate, n_chunks=20, chunk_duration=1.0, seed=0):
+    """
+    Estimates the noise standard deviation of every channel from the median absolute deviation.
+
+    The estimate is computed once over ``n_chunks`` randomly placed chunks, so every detection chunk uses the
+    same per-channel thresholds.
+
+    Args:
+        signal (numpy.ndarray or LazySignal): The (channels, samples) signal.
+        sampling_rate (float): The sampling rate of the signal in Hz.
+        n_chunks (int): The number of chunks sampled. Default is 20.
+        chunk_duration (float): The duration of each chunk in seconds. Default is 1.
+        seed (int): The seed for placing the chunks. Default is 0.
+
+    Returns:
+        numpy.ndarray: The noise level of every channel.
+
+    """
+    n_samples = signal.shape[1]
+    chunk_samples = min(int(chunk_duration * sampling_rate), n_samples)
+    n_chunks = min(n_chunks, max(n_samples // max(chunk_samples, 1), 1))
+    starts = np.random.default_rng(seed).choice(n_samples - chunk_samples + 1, size=n_chunks, replace=False)
+    samples = np.concatenate([read_block(signal, start, start + chunk_samples) for start in np.sort(starts)],
+                             axis=1).astype(np.float32)
+    median = np.median(samples, axis=1, keepdims=True)
+    return MAD_TO_SIGMA * np.median(np.abs(samples - median), axis=1)
+
+
+def enforce_refractory_period(channels, samples, refractory):
+    """
+    Drops every spike that follows the previous kept spike of its channel by less than ``refractory`` samples.
+
+    Args:
+        channels (numpy.ndarray): The channel of every spike, sorted together with ``samples``.
+        samples (numpy.ndarray): The sample index of every spike, sorted within each channel.
+        refractory (int): The refractory period in samples.
+
+    Returns:
+        numpy.ndarray: The channels of the kept spikes.
+        numpy.ndarray: The sample indices of the kept spikes.
+
+    """
+    while channels.size > 1:
+        conflict = np.zeros(channels.size, dtype=bool)
+        conflict[1:] = (channels[1:] == channels[:-1]) & (np.diff(samples) < refractory)
+        if not conflict.any():
+            break
+        # Only drop spikes whose predecessor is certainly kept; chains are resolved over several passes
+        drop = conflict.copy()
+        drop[1:] &= ~conflict[:-1]
+        channels, samples = channels[~drop], samples[~drop]
+    return channels, samples
+
+
+def detect_spikes_in_block(block, thresholds, polarity, align, refractory, core_start, core_stop):
+    """
+    Detects threshold crossings in a (channels, samples) block for all channels at once.
+
+    Each crossing is aligned to the extremum within ``align`` samples after it. Only spikes whose aligned peak
+    lies in [core_start, core_stop) of the block are returned, so overlapping blocks never report a spike twice.
+
+    Args:
+        block (numpy.ndarray): The block of the signal.
+        thresholds (numpy.ndarray): The detection threshold of every channel.
+        polarity (str): 'negative', 'positive' or 'both'.
+        align (int): The length of the peak alignment window in samples.
+        refractory (int): The refractory period in samples.
+        core_start (int): The start of the block's own samples (exclusive of the leading overlap).
+        core_stop (int): The end of the block's own samples (exclusive of the trailing overlap).
+
+    Returns:
+        numpy.ndarray: The channel of every spike.
+        numpy.ndarray: The sample index of every spike, relative to the block.
+
+    """
+    rectified = _rectify(block, polarity)
+    above = rectified > thresholds[:, np.newaxis]
+    channels, onsets = np.nonzero(above[:, 1:] & ~above[:, :-1])
+    onsets += 1
+    padded = np.concatenate((rectified, np.full((rectified.shape[0], align), -np.inf, dtype=rectified.dtype)),
+                            axis=1)
+    windows = sliding_window_view(padded, max(align, 1), axis=1)
+    peaks = onsets + np.argmax(windows[channels, onsets], axis=1)
+    in_core = (peaks >= core_start) & (peaks < core_stop)
+    channels, peaks = channels[in_core], peaks[in_core]
+    order = np.lexsort((peaks, channels))
+    return enforce_refractory_period(channels[order], peaks[order], refractory)
+
+
+def _detect_chunk(block, thresholds, polarity, align, refractory, core_start, core_stop, offset):
+    channels, peaks = detect_spikes_in_block(block, thresholds, polarity, align, refractory, core_start, core_stop)
+    return channels, peaks + offset
+
+
+def detect_spikes(signal, sampling_rate, threshold=5.0, polarity='negative', refractory_period=0.001,
+                  align_window=0.0005, chunk_duration=10.0, n_workers=None, noise_levels=None):
+    """
+    Detects spikes in the signal chunk by chunk with per-channel MAD-based thresholds.
+
+    Chunks overlap by the alignment window plus the refractory period so that crossings near a chunk boundary
+    are aligned with the samples they need. With ``n_workers`` the chunks are processed in a process pool,
+    with at most two chunks per worker read ahead.
+
+    Args:
+        signal (numpy.ndarray or LazySignal): The (channels, samples) signal.
+        sampling_rate (float): The sampling rate of the signal in Hz.
+        threshold (float): The threshold in multiples of the channel noise level. Default is 5.
+        polarity (str): 'negative', 'positive' or 'both'. Default is 'negative'.
+        refractory_period (float): The minimum time between two spikes of a channel in seconds. Default is 1 ms.
+        align_window (float): The time after a crossing searched for the peak in seconds. Default is 0.5 ms.
+        chunk_duration (float): The duration of each chunk in seconds. Default is 10.
+        n_workers (int): The number of worker processes. Default is None (no pool).
+        noise_levels (numpy.ndarray): The noise level of every channel. Default is ``estimate_noise_levels``.
+
+    Returns:
+        SpikeTrains: The detected spikes.
+
+    Raises:
+        ValueError: If the polarity is invalid.
+
+    """
+    if polarity not in POLARITIES:
+        raise ValueError("Invalid polarity %r. Supported polarities are %s." % (polarity, ', '.join(POLARITIES)))
+    n_channels, n_samples = signal.shape
+    if noise_levels is None:
+        noise_levels = estimate_noise_levels(signal, sampling_rate)
+    thresholds = np.where(noise_levels > 0, threshold * np.asarray(noise_levels, dtype=np.float32), np.inf)
+    align = max(int(align_window * sampling_rate), 1)
+    refractory = int(refractory_period * sampling_rate)
+    overlap = align + refractory + 1
+    chunk_samples = max(int(chunk_duration * sampling_rate), overlap)
+
+    def tasks():
+        for start in range(0, n_samples, chunk_samples):
+            stop = min(start + chunk_samples, n_samples)
+            block_start, block_stop = max(start - overlap, 0), min(stop + overlap, n_samples)
+            # The refractory period is enforced once over all chunks, so a spike is never dropped because of a
+            # neighbour that a previous chunk will drop itself
+            yield (read_block(signal, block_start, block_stop), thresholds, polarity, align, 0,
+                   start - block_start, stop - block_start, block_start)
+
+    results = []
+    if n_workers:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            pending = deque()
+            for task in tasks():
+                pending.append(executor.submit(_detect_chunk, *task))
+                if len(pending) >= 2 * n_workers:
+                    results.append(pending.popleft().result())
+            results.extend(future.result() for future in pending)
+    else:
+        results = [_detect_chunk(*task) for task in tasks()]
+
+    channels = np.concatenate([r[0] for r in results]) if results else np.zeros(0, dtype=np.int64)
+    samples = np.concatenate([r[1] for r in results]) if results else np.zeros(0, dtype=np.int64)
+    order = np.lexsort((samples, channels))
+    channels, samples = enforce_refractory_period(channels[order], samples[order], refractory)
+    return SpikeTrains.from_channel_samples(channels, samples, n_channels, n_samples)
@@ -0,0 +1,181 @@
+# third party imports
+import numpy as np
+
+
+class _SourceHandle:
+    # Owns the open file of a source; shared by every view over it, so it closes once the last view is gone
+    def __init__(self, file):
+        self.file = file
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __del__(self):
+        self.close()
+
+
+class LazySignal:
+    """
+    A read-only, lazily paged (channels, samples) view over an on-disk signal.
+
+    The source is any array-like that supports numpy-style ``source[rows, cols]`` slicing and only reads
+    what is requested, such as an ``np.memmap`` or an ``h5py.Dataset``. Channel remapping is stored as
+    an index permutation and applied on access, so remapping never copies the recording.
+
+    Args:
+        source: The on-disk array.
+        transposed (bool): Whether the source is stored as (samples, channels), as MATLAB v7.3 files are.
+            Default is False.
+        channel_index (numpy.ndarray): Source row of every output channel, or -1 for channels without
+            data (read as zeros). Default is the identity.
+        file: The open file the source belongs to (e.g. an ``h5py.File``), closed by ``close`` or once no view
+            over the source is left. Default is None.
+
+    Attributes:
+        source: The on-disk array.
+        transposed (bool): Whether the source is stored as (samples, channels).
+        channel_index (numpy.ndarray): Source row of every output channel, or -1.
+
+    """
+
+    def __init__(self, source, transposed=False, channel_index=None, file=None):
+        self.source = source
+        self.transposed = transposed
+        self._handle = file if isinstance(file, _SourceHandle) else _SourceHandle(file)
+        n_source_channels = source.shape[1] if transposed else source.shape[0]
+        if channel_index is None:
+            channel_index = np.arange(n_source_channels)
+        self.channel_index = np.asarray(channel_index, dtype=np.int64)
+        if np.any(self.channel_index >= n_source_channels):
+            raise IndexError("Channel index out of range for a source with %d channels." % n_source_channels)
+
+    @property
+    def shape(self):
+        """tuple: The (channels, samples) shape of the view."""
+        n_samples = self.source.shape[0] if self.transposed else self.source.shape[1]
+        return (self.channel_index.size, n_samples)
+
+    @property
+    def dtype(self):
+        """numpy.dtype: The dtype of the source."""
+        return np.dtype(self.source.dtype)
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def nbytes(self):
+        """int: The size of the view if it were loaded into memory."""
+        return self.shape[0] * self.shape[1] * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def remap(self, channel_index):
+        """
+        Returns a new view whose channel ``i`` is channel ``channel_index[i]`` of this view (-1 for zeros).
+
+        Args:
+            channel_index (numpy.ndarray): The channel permutation.
+
+        Returns:
+            LazySignal: The remapped view; no data is read.
+
+        """
+        channel_index = np.asarray(channel_index, dtype=np.int64)
+        composed = np.where(channel_index >= 0, self.channel_index[np.clip(channel_index, 0, None)], -1)
+        return LazySignal(self.source, self.transposed, composed, self._handle)
+
+    def close(self):
+        """Closes the file of the source, if it has one; the views remapped from it are closed too."""
+        self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def read(self, channels, start=0, stop=None):
+        """
+        Reads a block of samples for a set of channels.
+
+        Args:
+            channels (numpy.ndarray): The channel indices of the view.
+            start (int): The first sample. Default is 0.
+            stop (int): The end of the block (exclusive). Default is the end of the recording.
+
+        Returns:
+            numpy.ndarray: The block with shape (len(channels), stop - start).
+
+        """
+        start, stop, _ = slice(start, stop).indices(self.shape[1])
+        stop = max(stop, start)
+        rows = self.channel_index[np.asarray(channels, dtype=np.int64)]
+        block = np.zeros((rows.size, stop - start), dtype=self.dtype)
+        valid = rows >= 0
+        if not valid.any():
+            return block
+        # One read per block: h5py needs increasing, unique indices, and a sample-major block is strided over all
+        # channels anyway, so it is read whole and the channels are picked in memory
+        source_rows, order = np.unique(rows[valid], return_inverse=True)
+        if self.transposed:
+            data = np.asarray(self.source[start:stop])[:, source_rows].T
+        else:
+            data = np.asarray(self.source[source_rows, start:stop])
+        block[valid] = data[order]
+        return block
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > 2:
+            raise IndexError("Too many indices for a 2-dimensional signal.")
+        rows, cols = key if len(key) == 2 else (key[0], slice(None))
+        row_indices = np.arange(self.shape[0])[rows]
+        if isinstance(cols, (int, np.integer)):
+            col = cols + self.shape[1] if cols < 0 else cols
+            block = self.read(np.atleast_1d(row_indices), col, col + 1)[:, 0]
+        elif isinstance(cols, slice):
+            start, stop, step = cols.indices(self.shape[1])
+            if step < 0:
+                block = self.read(np.atleast_1d(row_indices), stop + 1, start + 1)[:, ::-1][:, ::-step]
+            else:
+                block = self.read(np.atleast_1d(row_indices), start, stop)[:, ::step]
+        else:
+            col_indices = np.arange(self.shape[1])[cols]
+            lo = int(col_indices.min()) if col_indices.size else 0
+            hi = int(col_indices.max()) + 1 if col_indices.size else 0
+            block = self.read(np.atleast_1d(row_indices), lo, hi)[:, col_indices - lo]
+        return block[0] if np.ndim(row_indices) == 0 else block
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.read(np.arange(self.shape[0]))
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+    def __repr__(self):
+        return "LazySignal(shape=%r, dtype=%s, source=%s)" % (self.shape, self.dtype, type(self.source).__name__)
+
+
+def read_block(signal, start, stop, channels=None):
+    """
+    Reads the samples [start, stop) of a (channels, samples) signal into memory.
+
+    Args:
+        signal (numpy.ndarray or LazySignal): The signal.
+        start (int): The first sample.
+        stop (int): The end of the block (exclusive).
+        channels (numpy.ndarray): The channels to read. Default is all channels.
+
+    Returns:
+        numpy.ndarray: The block with shape (channels, stop - start).
+
+    """
+    if isinstance(signal, LazySignal):
+        return signal.read(np.arange(signal.shape[0]) if channels is None else channels, start, stop)
+    if channels is None:
+        return np.asarray(signal[:, start:stop])
+    return np.asarray(signal[np.asarray(channels), start:stop])
@@ -0,0 +1,131 @@
+# standard imports
+import json
+import os
+import threading
+
+# third party imports
+import numpy as np
+
+from data_processing.lazy_signal import LazySignal
+
+ELECTRODE_MAPPING_PATH = os.path.join('config', 'electrode_mapping.json')
+
+
+class ElectrodeMapping:
+    """
+    Maps the rows of a recording (amplifier channels) onto the electrodes of an MEA layout.
+
+    The mapping is validated once and turned into an integer gather index per ``channel_info``, so a
+    remap is one fancy-index gather for in-memory data, or a zero-copy view for a LazySignal.
+
+    Args:
+        amplifier_channel_map (dict): Maps an electrode name (e.g. '33') to its amplifier channel (row).
+        n_electrodes (int): The number of electrodes of the layout. Default is 60.
+
+    Attributes:
+        amplifier_channel_map (dict): Maps an integer electrode name to its amplifier channel.
+        n_electrodes (int): The number of electrodes of the layout.
+
+    Raises:
+        ValueError: If an entry is not an integer, is negative, or two electrodes share an amplifier channel.
+
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, amplifier_channel_map, n_electrodes=60):
+        self.n_electrodes = int(n_electrodes)
+        self.amplifier_channel_map = {}
+        for electrode, channel in amplifier_channel_map.items():
+            try:
+                electrode, channel = int(electrode), int(channel)
+            except (TypeError, ValueError):
+                raise ValueError("Invalid electrode mapping entry %r: %r" % (electrode, channel))
+            if channel < 0:
+                raise ValueError("Electrode %d maps to a negative amplifier channel %d" % (electrode, channel))
+            self.amplifier_channel_map[electrode] = channel
+        channels = list(self.amplifier_channel_map.values())
+        if len(set(channels)) != len(channels):
+            raise ValueError("Several electrodes map to the same amplifier channel")
+        self._gather_indices = {}
+
+    @classmethod
+    def from_json(cls, path=ELECTRODE_MAPPING_PATH):
+        """
+        Loads a mapping config, reusing the parsed mapping until the file changes.
+
+        The file holds the 'amplifier_channel_map' and optionally 'n_electrodes' (default 60).
+
+        Args:
+            path (str): The path of the config. Default is 'config/electrode_mapping.json'.
+
+        Returns:
+            ElectrodeMapping: The mapping.
+
+        """
+        key = (os.path.abspath(path), os.path.getmtime(path))
+        with cls._instances_lock:
+            if key not in cls._instances:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                cls._instances[key] = cls(data['amplifier_channel_map'], data.get('n_electrodes', 60))
+            return cls._instances[key]
+
+    def gather_index(self, channel_info, n_source_channels=None):
+        """
+        Computes which source row feeds every electrode.
+
+        Electrode ``i`` is named ``channel_info[i]``; names that are 0, unknown to the mapping, or map beyond
+        ``n_source_channels`` have no data.
+
+        Args:
+            channel_info (numpy.ndarray): The electrode name of every electrode of the layout.
+            n_source_channels (int): The number of rows of the recording. Default is unbounded.
+
+        Returns:
+            numpy.ndarray: The source row of every electrode (-1 where there is none), shape (n_electrodes,).
+            numpy.ndarray: The validity mask, shape (n_electrodes,).
+
+        """
+        channel_info = np.asarray(channel_info)
+        key = (channel_info.tobytes(), channel_info.dtype.str, n_source_channels)
+        if key not in self._gather_indices:
+            index = np.full(self.n_electrodes, -1, dtype=np.int64)
+            for i, name in enumerate(channel_info[:self.n_electrodes]):
+                if np.isfinite(name) and name != 0:
+                    index[i] = self.amplifier_channel_map.get(int(name), -1)
+            if n_source_channels is not None:
+                index[index >= n_source_channels] = -1
+            index.flags.writeable = False
+            self._gather_indices[key] = index
+        index = self._gather_indices[key]
+        return index, index >= 0
+
+    def apply(self, data, channel_info, dtype=None):
+        """
+        Rearranges the rows of a recording into the electrode layout.
+
+        Args:
+            data (numpy.ndarray or LazySignal): The data with shape (channels, M).
+            channel_info (numpy.ndarray): The electrode name of every electrode of the layout.
+            dtype (numpy.dtype): The dtype of the rearranged in-memory data. Default is the dtype of ``data``.
+
+        Returns:
+            numpy.ndarray or LazySignal: The data with shape (n_electrodes, M); electrodes without data are zero.
+            A LazySignal is remapped as a view without reading any data (and keeps its dtype).
+
+        """
+        index, valid = self.gather_index(channel_info, data.shape[0])
+        if isinstance(data, LazySignal):
+            return data.remap(index)
+        data = np.asarray(data)
+        if dtype is None or np.dtype(dtype) == data.dtype:
+            rearranged = data[np.where(valid, index, 0)]
+            rearranged[~valid] = 0
+            return rearranged
+        # Converted row by row, so no full-size copy in the source dtype is made
+        rearranged = np.zeros((index.size,) + data.shape[1:], dtype=dtype)
+        for row in np.flatnonzero(valid):
+            rearranged[row] = data[index[row]]
+        return rearranged
@@ -0,0 +1,156 @@
+"""
+Precision policies: the dtypes the analysis pipeline stores and computes in.
+
+The 'compact' policy (the default) keeps in-memory signals in float32, rasters and presence matrices in bool,
+spike counts and spike sample indices in int32, and convolved trains, binned rates and spectra in float32. The
+'float64' policy reproduces the wide dtypes used before and serves as the reference that the compact results are
+checked against (see ``benchmarks.run``).
+
+The default is chosen with the MEADASH_PRECISION environment variable ('compact' or 'float64').
+"""
+# standard imports
+import os
+
+# third party imports
+import numpy as np
+
+from data_processing.lazy_signal import LazySignal
+
+DEFAULT_PRECISION = 'compact'
+
+
+def _fits(dtype, bound):
+    # Whether an integer dtype holds every value in [0, bound]
+    return bound <= np.iinfo(dtype).max
+
+
+class PrecisionPolicy:
+    """
+    The dtypes a DataProcessor stores its data in and returns its analyses in.
+
+    The integer dtypes fall back to int64 for recordings with more samples than they can hold.
+
+    Args:
+        name (str): The name of the policy.
+        signal_dtype (numpy.dtype): The dtype floating-point in-memory signals are narrowed to. Integer signals,
+            memory-mapped signals and LazySignals are kept as they are.
+        float_dtype (numpy.dtype): The dtype of convolved trains and binned firing rates.
+        raster_dtype (numpy.dtype): The dtype of dense rasters and presence matrices.
+        count_dtype (numpy.dtype): The dtype of spike counts.
+        index_dtype (numpy.dtype): The dtype of spike sample indices.
+
+    """
+
+    def __init__(self, name, signal_dtype, float_dtype, raster_dtype, count_dtype, index_dtype):
+        self.name = name
+        self.signal_dtype = np.dtype(signal_dtype)
+        self.float_dtype = np.dtype(float_dtype)
+        self.raster_dtype = np.dtype(raster_dtype)
+        self.count_dtype = np.dtype(count_dtype)
+        self.index_dtype = np.dtype(index_dtype)
+
+    def index_dtype_for(self, n_samples):
+        """
+        Returns the dtype of the spike sample indices of a recording.
+
+        Args:
+            n_samples (int): The number of samples in the recording.
+
+        Returns:
+            numpy.dtype: ``index_dtype``, or int64 if it cannot hold every sample index.
+
+        """
+        return self.index_dtype if _fits(self.index_dtype, n_samples) else np.dtype(np.int64)
+
+    def count_dtype_for(self, n_samples):
+        """
+        Returns the dtype of spike counts over a number of samples (a channel spikes at most once per sample).
+
+        Args:
+            n_samples (int): The number of samples counted over.
+
+        Returns:
+            numpy.dtype: ``count_dtype``, or int64 if it cannot hold the largest possible count.
+
+        """
+        return self.count_dtype if _fits(self.count_dtype, n_samples) else np.dtype(np.int64)
+
+    def signal_dtype_for(self, dtype):
+        """
+        Returns the dtype an in-memory signal of a given dtype is stored in.
+
+        Args:
+            dtype (numpy.dtype): The dtype of the source signal.
+
+        Returns:
+            numpy.dtype: ``signal_dtype`` for floating-point sources wider than it, otherwise ``dtype``.
+
+        """
+        dtype = np.dtype(dtype)
+        if dtype.kind == 'f' and dtype.itemsize > self.signal_dtype.itemsize:
+            return self.signal_dtype
+        return dtype
+
+    def cast_signal(self, signal):
+        """
+        Narrows an in-memory signal to the policy; memory-mapped signals and LazySignals are returned as they are.
+
+        Args:
+            signal (numpy.ndarray or LazySignal): The signal.
+
+        Returns:
+            numpy.ndarray or LazySignal: The signal.
+
+        """
+        if isinstance(signal, (LazySignal, np.memmap)) or isinstance(getattr(signal, 'base', None), np.memmap):
+            return signal
+        return signal.astype(self.signal_dtype_for(signal.dtype), copy=False)
+
+    def cast_spikes(self, spikes):
+        """
+        Converts the sample indices of a spike store to the policy; memory-mapped indices are left as they are.
+
+        Args:
+            spikes (SpikeTrains): The spike store.
+
+        Returns:
+            SpikeTrains: The spike store.
+
+        """
+        if isinstance(spikes.indices, np.memmap) or isinstance(spikes.indices.base, np.memmap):
+            return spikes
+        return spikes.astype(self.index_dtype_for(spikes.n_samples))
+
+    def __repr__(self):
+        return "PrecisionPolicy(%r)" % self.name
+
+
+PRECISION_POLICIES = {
+    'compact': PrecisionPolicy('compact', np.float32, np.float32, np.bool_, np.int32, np.int32),
+    'float64': PrecisionPolicy('float64', np.float64, np.float64, np.float64, np.int64, np.int64),
+}
+
+
+def get_precision_policy(precision=None):
+    """
+    Resolves a precision policy.
+
+    Args:
+        precision (str or PrecisionPolicy): A policy, or the name of one in ``PRECISION_POLICIES``. Default is
+            $MEADASH_PRECISION, or 'compact'.
+
+    Returns:
+        PrecisionPolicy: The policy.
+
+    Raises:
+        ValueError: If the name is unknown.
+
+    """
+    if isinstance(precision, PrecisionPolicy):
+        return precision
+    if precision is None:
+        precision = os.environ.get('MEADASH_PRECISION', DEFAULT_PRECISION)
+    if precision not in PRECISION_POLICIES:
+        raise ValueError("Invalid precision %r. Supported policies are %s."
+                         % (precision, ', '.join(PRECISION_POLICIES)))
+    return PRECISION_POLICIES[precision]
@@ -0,0 +1,148 @@
+# standard imports
+from concurrent.futures import ThreadPoolExecutor
+
+# third party imports
+import numpy as np
+import scipy.signal as ssignal
+
+from data_processing.lazy_signal import read_block
+
+
+def _segment_grid(n_samples, nperseg, noverlap, default_overlap):
+    # Clamps the segment length like scipy does for short signals and returns (nperseg, noverlap, step, n_segments)
+    nperseg = min(int(nperseg), n_samples)
+    noverlap = nperseg // default_overlap if noverlap is None else min(int(noverlap), nperseg - 1)
+    step = nperseg - noverlap
+    n_segments = (n_samples - nperseg) // step + 1 if nperseg > 0 else 0
+    return nperseg, noverlap, step, n_segments
+
+
+def _segment_blocks(n_segments, step, nperseg, segments_per_block):
+    # Sample spans holding whole segments, so the blocks tile exactly the segments of the full signal
+    for first in range(0, n_segments, segments_per_block):
+        last = min(first + segments_per_block, n_segments)
+        yield first * step, (last - 1) * step + nperseg
+
+
+def _map_blocks(function, spans, n_workers):
+    if n_workers and n_workers > 1:
+        # The FFTs release the GIL, so threads share the signal without copying it to other processes
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            return list(executor.map(function, spans))
+    return [function(span) for span in spans]
+
+
+def _periodograms(signal, span, channels, sampling_rate, window, nperseg, noverlap, nfft, detrend):
+    block = read_block(signal, span[0], span[1], channels)
+    frequencies, _, sxx = ssignal.spectrogram(block, fs=sampling_rate, window=window, nperseg=nperseg,
+                                              noverlap=noverlap, nfft=nfft, detrend=detrend, scaling='density',
+                                              mode='psd', axis=-1)
+    return frequencies, sxx
+
+
+def welch_psd(signal, sampling_rate, nperseg, noverlap=None, nfft=None, window='hann', detrend='constant',
+              channels=None, segments_per_block=64, n_workers=None):
+    """
+    Estimates the power spectral density of every channel with Welch's method.
+
+    The signal is processed in blocks of ``segments_per_block`` whole segments, so memory is bounded by one
+    block per worker regardless of the recording length, and the result equals ``scipy.signal.welch`` with
+    ``average='mean'`` over the full signal.
+
+    Args:
+        signal (numpy.ndarray or LazySignal): The (channels, samples) signal.
+        sampling_rate (float): The sampling rate of the signal in Hz.
+        nperseg (int): The length of each segment in samples.
+        noverlap (int): The number of overlapping samples between segments. Default is ``nperseg // 2``.
+        nfft (int): The length of the FFT. Default is ``nperseg``.
+        window (str or tuple): The window function. Default is 'hann'.
+        detrend (str): The per-segment detrending, as in ``scipy.signal.welch``. Default is 'constant'.
+        channels (numpy.ndarray): The channels to analyse. Default is all channels.
+        segments_per_block (int): The number of segments processed per block. Default is 64.
+        n_workers (int): The number of threads processing blocks. Default is None (no pool).
+
+    Returns:
+        numpy.ndarray: The frequencies.
+        numpy.ndarray: The power spectral density with shape (channels, frequencies).
+
+    """
+    n_channels, n_samples = signal.shape
+    n_channels = n_channels if channels is None else len(channels)
+    nperseg, noverlap, step, n_segments = _segment_grid(n_samples, nperseg, noverlap, 2)
+    nfft = nperseg if nfft is None else int(nfft)
+    frequencies = np.fft.rfftfreq(nfft, 1.0 / sampling_rate)
+    if n_segments == 0:
+        return frequencies, np.full((n_channels, frequencies.size), np.nan)
+
+    def block_sum(span):
+        _, sxx = _periodograms(signal, span, channels, sampling_rate, window, nperseg, noverlap, nfft, detrend)
+        return sxx.sum(axis=-1, dtype=np.float64)
+
+    spans = _segment_blocks(n_segments, step, nperseg, segments_per_block)
+    pxx = np.sum(_map_blocks(block_sum, spans, n_workers), axis=0) / n_segments
+    return frequencies, pxx
+
+
+def spectrogram(signal, sampling_rate, nperseg, noverlap=None, nfft=None, window=('tukey', 0.25),
+                detrend='constant', channels=None, segments_per_block=64, n_workers=None, dtype=np.float32):
+    """
+    Computes the short-time power spectral density of every channel.
+
+    Blocks are processed as in ``welch_psd``; only the (channels, frequencies, segments) result is kept in
+    memory, in ``dtype``.
+
+    Args:
+        signal (numpy.ndarray or LazySignal): The (channels, samples) signal.
+        sampling_rate (float): The sampling rate of the signal in Hz.
+        nperseg (int): The length of each segment in samples.
+        noverlap (int): The number of overlapping samples between segments. Default is ``nperseg // 8``.
+        nfft (int): The length of the FFT. Default is ``nperseg``.
+        window (str or tuple): The window function. Default is ('tukey', 0.25) as in ``scipy.signal.spectrogram``.
+        detrend (str): The per-segment detrending, as in ``scipy.signal.spectrogram``. Default is 'constant'.
+        channels (numpy.ndarray): The channels to analyse. Default is all channels.
+        segments_per_block (int): The number of segments processed per block. Default is 64.
+        n_workers (int): The number of threads processing blocks. Default is None (no pool).
+        dtype (numpy.dtype): The dtype of the result. Default is float32.
+
+    Returns:
+        numpy.ndarray: The frequencies.
+        numpy.ndarray: The segment centre times in seconds.
+        numpy.ndarray: The power spectral density with shape (channels, frequencies, segments).
+
+    """
+    n_channels, n_samples = signal.shape
+    n_channels = n_channels if channels is None else len(channels)
+    nperseg, noverlap, step, n_segments = _segment_grid(n_samples, nperseg, noverlap, 8)
+    nfft = nperseg if nfft is None else int(nfft)
+    frequencies = np.fft.rfftfreq(nfft, 1.0 / sampling_rate)
+    times = (np.arange(n_segments) * step + nperseg / 2) / sampling_rate
+    sxx = np.empty((n_channels, frequencies.size, n_segments), dtype=dtype)
+
+    def block_spectrogram(span):
+        _, block_sxx = _periodograms(signal, span, channels, sampling_rate, window, nperseg, noverlap, nfft,
+                                     detrend)
+        first = span[0] // step
+        sxx[:, :, first:first + block_sxx.shape[-1]] = block_sxx
+        return block_sxx.shape[-1]
+
+    _map_blocks(block_spectrogram, _segment_blocks(n_segments, step, nperseg, segments_per_block), n_workers)
+    return frequencies, times, sxx
+
+
+def peak_frequencies(frequencies, pxx, min_frequency=0.0):
+    """
+    Returns the frequency of the largest power of every channel.
+
+    Args:
+        frequencies (numpy.ndarray): The frequencies.
+        pxx (numpy.ndarray): The power spectral density with shape (channels, frequencies).
+        min_frequency (float): Frequencies below this are ignored (e.g. to skip the DC bin). Default is 0.
+
+    Returns:
+        numpy.ndarray: The peak frequency of every channel, NaN for channels without power.
+
+    """
+    pxx = np.atleast_2d(pxx)
+    considered = frequencies >= min_frequency
+    peaks = frequencies[considered][np.argmax(pxx[:, considered], axis=1)]
+    return np.where(np.nanmax(pxx[:, considered], axis=1) > 0, peaks, np.nan)
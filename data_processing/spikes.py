@@ -0,0 +1,271 @@
+# third party imports
+import numpy as np
+
+
+class SpikeTrains:
+    """
+    A compact, per-channel spike store in CSR layout.
+
+    The sample indices of all spikes are kept in one flat integer buffer, sorted per channel.
+    Channel ``i`` owns ``indices[offsets[i]:offsets[i + 1]]``, so the store costs 4 (int32) or 8 (int64)
+    bytes per spike instead of one or more bytes per sample for a dense raster.
+
+    Args:
+        offsets (numpy.ndarray): Channel offsets into ``indices`` with shape (n_channels + 1,).
+        indices (numpy.ndarray): Sorted spike sample indices of all channels, concatenated. Signed integer
+            indices keep their dtype; anything else is converted to int64.
+        n_samples (int): The number of samples in the recording.
+
+    Attributes:
+        offsets (numpy.ndarray): Channel offsets into ``indices``.
+        indices (numpy.ndarray): Spike sample indices of all channels, concatenated.
+        n_samples (int): The number of samples in the recording.
+
+    """
+
+    def __init__(self, offsets, indices, n_samples):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.indices = np.asarray(indices)
+        if self.indices.dtype.kind != 'i':
+            self.indices = self.indices.astype(np.int64)
+        self.n_samples = int(n_samples)
+        if self.offsets.ndim != 1 or self.offsets.size == 0 or self.offsets[0] != 0 \
+                or self.offsets[-1] != self.indices.size or np.any(np.diff(self.offsets) < 0):
+            raise ValueError("Invalid offsets for a spike index buffer of size %d." % self.indices.size)
+
+    @classmethod
+    def from_padded(cls, spike_timestamps, n_samples, pad_value=0):
+        """
+        Builds the store from a padded (n_channels, max_spikes) timestamp matrix as stored in the .mat files.
+
+        Entries equal to ``pad_value``, non-finite entries and indices outside the recording are dropped,
+        and duplicate timestamps within a channel are collapsed (as they were in the dense raster).
+
+        Args:
+            spike_timestamps (numpy.ndarray): The padded spike timestamps (sample indices) per channel.
+            n_samples (int): The number of samples in the recording.
+            pad_value (float): The value used to pad the rows. Default is 0.
+
+        Returns:
+            SpikeTrains: The spike store.
+
+        """
+        spike_timestamps = np.asarray(spike_timestamps, dtype=np.float64)
+        if spike_timestamps.ndim == 1:
+            spike_timestamps = spike_timestamps[np.newaxis, :]
+        n_channels = spike_timestamps.shape[0]
+        valid = np.isfinite(spike_timestamps) & (spike_timestamps >= 0) & (spike_timestamps < n_samples)
+        if pad_value is not None:
+            valid &= spike_timestamps != pad_value
+        channels, _ = np.nonzero(valid)
+        samples = spike_timestamps[valid].astype(np.int64)
+        return cls.from_channel_samples(channels, samples, n_channels, n_samples)
+
+    @classmethod
+    def from_dense(cls, raster):
+        """
+        Builds the store from a dense (n_channels, n_samples) raster.
+
+        Args:
+            raster (numpy.ndarray): The raster, non-zero wherever a channel spiked.
+
+        Returns:
+            SpikeTrains: The spike store.
+
+        """
+        raster = np.asarray(raster)
+        channels, samples = np.nonzero(raster)
+        return cls.from_channel_samples(channels, samples, raster.shape[0], raster.shape[1])
+
+    @classmethod
+    def from_channel_samples(cls, channels, samples, n_channels, n_samples):
+        """
+        Builds the store from parallel channel and sample index arrays in any order.
+
+        Duplicate (channel, sample) pairs are collapsed.
+
+        Args:
+            channels (numpy.ndarray): The channel of every spike.
+            samples (numpy.ndarray): The sample index of every spike.
+            n_channels (int): The number of channels.
+            n_samples (int): The number of samples in the recording.
+
+        Returns:
+            SpikeTrains: The spike store.
+
+        """
+        # a single sort on the combined key orders by channel first, then by sample
+        keys = np.unique(channels.astype(np.int64) * int(n_samples) + samples)
+        channels = keys // int(n_samples)
+        offsets = np.zeros(n_channels + 1, dtype=np.int64)
+        np.cumsum(np.bincount(channels, minlength=n_channels), out=offsets[1:])
+        return cls(offsets, keys - channels * int(n_samples), n_samples)
+
+    @property
+    def n_channels(self):
+        """int: The number of channels."""
+        return self.offsets.size - 1
+
+    @property
+    def n_spikes(self):
+        """int: The total number of spikes across all channels."""
+        return self.indices.size
+
+    @property
+    def nbytes(self):
+        """int: The memory held by the store in bytes."""
+        return self.offsets.nbytes + self.indices.nbytes
+
+    def channel(self, channel):
+        """
+        Returns the sorted spike sample indices of one channel (a view into the flat buffer).
+
+        Args:
+            channel (int): The channel index.
+
+        Returns:
+            numpy.ndarray: The spike sample indices.
+
+        """
+        return self.indices[self.offsets[channel]:self.offsets[channel + 1]]
+
+    def astype(self, dtype):
+        """
+        Returns the store with its sample indices in another integer dtype.
+
+        Args:
+            dtype (numpy.dtype): The signed integer dtype of the indices.
+
+        Returns:
+            SpikeTrains: The store, ``self`` if the indices already have the dtype.
+
+        Raises:
+            ValueError: If the dtype cannot hold every sample index of the recording.
+
+        """
+        dtype = np.dtype(dtype)
+        if dtype == self.indices.dtype:
+            return self
+        if dtype.kind != 'i' or self.n_samples - 1 > np.iinfo(dtype).max:
+            raise ValueError("%s cannot hold the sample indices of %d samples." % (dtype, self.n_samples))
+        return SpikeTrains(self.offsets, self.indices.astype(dtype), self.n_samples)
+
+    def counts(self):
+        """
+        Returns the number of spikes per channel.
+
+        Returns:
+            numpy.ndarray: The spike counts with shape (n_channels,).
+
+        """
+        return np.diff(self.offsets)
+
+    def channel_ids(self):
+        """
+        Returns the channel index of every spike, parallel to ``indices``.
+
+        Returns:
+            numpy.ndarray: The channel indices with shape (n_spikes,).
+
+        """
+        return np.repeat(np.arange(self.n_channels), self.counts())
+
+    def window_bounds(self, start=0, stop=None):
+        """
+        Finds the spikes of every channel within the sample window [start, stop) by binary search.
+
+        Only ``2 * n_channels`` searches touch the index buffer, so the cost does not grow with the length
+        of the recording (and a memory-mapped buffer is only paged in around the window).
+
+        Args:
+            start (int): The first sample of the window. Default is 0.
+            stop (int): The end of the window (exclusive). Default is the end of the recording.
+
+        Returns:
+            numpy.ndarray: The position in ``indices`` of the first spike of every channel in the window.
+            numpy.ndarray: The position in ``indices`` past the last spike of every channel in the window.
+
+        """
+        stop = self.n_samples if stop is None else int(stop)
+        first = np.empty(self.n_channels, dtype=np.int64)
+        last = np.empty(self.n_channels, dtype=np.int64)
+        for channel in range(self.n_channels):
+            train = self.channel(channel)
+            first[channel] = self.offsets[channel] + np.searchsorted(train, int(start), side='left')
+            last[channel] = self.offsets[channel] + np.searchsorted(train, stop, side='left')
+        return first, last
+
+    def window(self, start=0, stop=None):
+        """
+        Returns the spikes within the sample window [start, stop) as a store of their own.
+
+        Args:
+            start (int): The first sample of the window. Default is 0.
+            stop (int): The end of the window (exclusive). Default is the end of the recording.
+
+        Returns:
+            SpikeTrains: The spikes of the window, with sample indices relative to ``start`` and
+            ``n_samples`` equal to the window length.
+
+        """
+        stop = self.n_samples if stop is None else min(int(stop), self.n_samples)
+        start = min(max(int(start), 0), stop)
+        if start == 0 and stop == self.n_samples:
+            return self
+        first, last = self.window_bounds(start, stop)
+        offsets = np.zeros(self.n_channels + 1, dtype=np.int64)
+        np.cumsum(last - first, out=offsets[1:])
+        indices = np.empty(offsets[-1], dtype=self.indices.dtype)
+        for channel in range(self.n_channels):
+            indices[offsets[channel]:offsets[channel + 1]] = self.indices[first[channel]:last[channel]]
+        return SpikeTrains(offsets, indices - start, stop - start)
+
+    def to_dense(self, start=0, stop=None, dtype=np.float64):
+        """
+        Builds a dense raster for the sample window [start, stop).
+
+        Args:
+            start (int): The first sample of the window. Default is 0.
+            stop (int): The end of the window (exclusive). Default is the end of the recording.
+            dtype (numpy.dtype): The dtype of the raster. Default is float64.
+
+        Returns:
+            numpy.ndarray: The raster with shape (n_channels, stop - start).
+
+        """
+        stop = self.n_samples if stop is None else min(int(stop), self.n_samples)
+        start = max(int(start), 0)
+        raster = np.zeros((self.n_channels, max(stop - start, 0)), dtype=dtype)
+        if stop > start:
+            spikes = self.window(start, stop)
+            raster[spikes.channel_ids(), spikes.indices] = 1
+        return raster
+
+    def to_packed(self, start=0, stop=None):
+        """
+        Builds a bit-packed raster for the sample window [start, stop), eight samples per byte.
+
+        The bits are set straight from the spike indices, so no dense raster is allocated; the layout is that
+        of ``np.packbits(raster, axis=1)`` and ``np.unpackbits(packed, axis=1, count=stop - start)`` restores it.
+
+        Args:
+            start (int): The first sample of the window. Default is 0.
+            stop (int): The end of the window (exclusive). Default is the end of the recording.
+
+        Returns:
+            numpy.ndarray: The uint8 raster with shape (n_channels, ceil((stop - start) / 8)).
+
+        """
+        stop = self.n_samples if stop is None else min(int(stop), self.n_samples)
+        start = max(int(start), 0)
+        packed = np.zeros((self.n_channels, (max(stop - start, 0) + 7) // 8), dtype=np.uint8)
+        if stop > start:
+            spikes = self.window(start, stop)
+            bits = (0x80 >> (spikes.indices & 7)).astype(np.uint8)
+            # Spikes of a channel may share a byte, so the bits are or-ed in unbuffered
+            np.bitwise_or.at(packed, (spikes.channel_ids(), spikes.indices >> 3), bits)
+        return packed
+
+    def __repr__(self):
+        return "SpikeTrains(n_channels=%d, n_spikes=%d, n_samples=%d)" % (
+            self.n_channels, self.n_spikes, self.n_samples)
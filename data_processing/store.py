@@ -0,0 +1,370 @@
+"""
+Native, memory-mappable cache format for recordings.
+
+A recording is converted once into a directory holding the signal already in 60MEA layout, the spike
+index arrays and the metadata:
+
+    <store_root>/<store key>/
+        meta.json            sampling rate, channel info, shape, dtype, source fingerprint
+        signal.npy           (channels, samples), channel-major, memory-mapped on open
+        spike_offsets.npy    SpikeTrains offsets
+        spike_indices.npy    SpikeTrains indices (int32 for recordings shorter than 2**31 samples)
+        summary-<key>.npz    summary indexes of the spikes, written on first use (see ``data_processing.summary``)
+
+The signal and spike indices are written in the dtypes of the precision policy used for the conversion (see
+``data_processing.precision``); a floating-point signal is stored in float32 under the default 'compact' policy.
+
+The directory name is derived from the fingerprint of the source files (see ``recording_fingerprint``) and
+from the channel configuration, so opening a recording that was already converted skips all parsing, even if
+the files were moved or renamed, while rewriting the recording, its header or its spike timestamps converts it
+again and removes the stores of the earlier version. A '<store key>.lock' file next to each store serializes
+its conversions across processes.
+
+Usage:
+    python -m data_processing.store recording.mat [more.mat ...] --sampling-rate 30000
+"""
+# standard imports
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# third party imports
+import numpy as np
+
+from data_processing.lazy_signal import LazySignal
+from data_processing.mapping import ELECTRODE_MAPPING_PATH
+from data_processing.precision import PRECISION_POLICIES, get_precision_policy
+from data_processing.spikes import SpikeTrains
+from data_processing.utils import load_recording, convert_to_60MEA_mapping, load_channel_info_from_json, \
+    recording_files
+
+STORE_FORMAT_VERSION = 1
+FINGERPRINT_BLOCKS = 64
+FINGERPRINT_BLOCK_SIZE = 2 ** 16
+
+StoredRecording = namedtuple('StoredRecording', ['path', 'signal', 'spikes', 'sampling_rate', 'channel_info'])
+
+
+def default_store_root():
+    """Returns the store directory: $MEADASH_STORE_DIR, or ~/.cache/meadash."""
+    return os.environ.get('MEADASH_STORE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'meadash'))
+
+
+def file_fingerprint(file_path, full=False):
+    """
+    Hashes the content of a file.
+
+    By default only the size and 64 evenly spaced 64 KiB blocks are hashed, which identifies a recording in
+    constant time regardless of its size. Pass ``full=True`` to hash every byte.
+
+    Args:
+        file_path (str): The path of the file.
+        full (bool): Whether to hash the whole file. Default is False.
+
+    Returns:
+        str: The hex digest.
+
+    """
+    size = os.path.getsize(file_path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(file_path, 'rb') as f:
+        if full or size <= FINGERPRINT_BLOCKS * FINGERPRINT_BLOCK_SIZE:
+            for block in iter(lambda: f.read(2 ** 24), b''):
+                digest.update(block)
+        else:
+            for offset in np.linspace(0, size - FINGERPRINT_BLOCK_SIZE, FINGERPRINT_BLOCKS).astype(np.int64):
+                f.seek(int(offset))
+                digest.update(f.read(FINGERPRINT_BLOCK_SIZE))
+    return digest.hexdigest()
+
+
+def recording_fingerprint(file_path):
+    """
+    Fingerprints the files a recording is read from.
+
+    The sampled content hash of ``file_fingerprint`` is combined with the size and modification time of the
+    recording and of its header and spike timestamp sidecar (see ``utils.recording_files``), so rewriting any of
+    them in place, even with the same size, gives a new fingerprint. Copying the files without preserving their
+    modification times does too; moving or renaming them does not.
+
+    Args:
+        file_path (str): The path of the recording.
+
+    Returns:
+        str: The hex digest.
+
+    """
+    digest = hashlib.blake2b(file_fingerprint(file_path).encode(), digest_size=16)
+    for path in recording_files(file_path):
+        stat = os.stat(path)
+        digest.update(('%d:%d;' % (stat.st_size, stat.st_mtime_ns)).encode())
+    return digest.hexdigest()
+
+
+def _store_key(file_path, channel_info, fingerprint=None):
+    # The stored signal is already remapped, so the channel configuration is part of the key
+    fingerprint = fingerprint or recording_fingerprint(file_path)
+    digest = hashlib.blake2b(fingerprint.encode(), digest_size=16)
+    digest.update(np.asarray(channel_info, dtype=np.int64).tobytes())
+    header_path = os.path.splitext(file_path)[0] + '.json'
+    for config_path in (ELECTRODE_MAPPING_PATH, header_path):
+        if os.path.exists(config_path):
+            with open(config_path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _read_meta(store_path):
+    # The metadata of a complete store of the current format, or None
+    try:
+        with open(os.path.join(store_path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('format_version') == STORE_FORMAT_VERSION else None
+
+
+def find_store(file_path, channel_info, store_root=None, fingerprint=None):
+    """
+    Looks up the converted store of a recording.
+
+    Args:
+        file_path (str): The path of the source recording.
+        channel_info (numpy.ndarray): The channel information used for the remapping.
+        store_root (str): The store directory. Default is ``default_store_root()``.
+        fingerprint (str): The ``recording_fingerprint`` of the recording, if already computed.
+
+    Returns:
+        str: The path of the store, or None if the recording has not been converted.
+
+    """
+    store_path = os.path.join(store_root or default_store_root(), _store_key(file_path, channel_info, fingerprint))
+    return store_path if _read_meta(store_path) is not None else None
+
+
+@contextlib.contextmanager
+def _conversion_lock(store_path):
+    # Serializes the conversions of one store across processes (gunicorn and batch workers); the OS releases the
+    # lock if its holder dies. Without fcntl (Windows) concurrent conversions still end in one complete store.
+    with open(store_path + '.lock', 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _install_store(tmp_path, store_path, store_root):
+    # Moves a converted store in place; an existing store is renamed aside first, as os.replace cannot
+    # replace a non-empty directory
+    aside = None
+    if os.path.exists(store_path):
+        aside = tempfile.mkdtemp(dir=store_root, prefix='.replaced-')
+        os.replace(store_path, os.path.join(aside, 'store'))
+    try:
+        os.replace(tmp_path, store_path)
+    except OSError:
+        # Another (unlocked) process installed the store meanwhile
+        if _read_meta(store_path) is None:
+            raise
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    if aside is not None:
+        shutil.rmtree(aside, ignore_errors=True)
+
+
+def remove_stale_stores(file_path, fingerprint, store_root=None):
+    """
+    Removes the stores converted from an earlier version of a recording.
+
+    Every rewrite of a recording gets a new store (see ``recording_fingerprint``), so the stores whose source is
+    the same path but whose fingerprint differs are deleted together with their summaries. Stores of the same
+    version with another channel configuration are kept.
+
+    Args:
+        file_path (str): The path of the recording.
+        fingerprint (str): The ``recording_fingerprint`` of its current version.
+        store_root (str): The store directory. Default is ``default_store_root()``.
+
+    Returns:
+        list: The paths of the removed stores.
+
+    """
+    store_root = store_root or default_store_root()
+    source = os.path.abspath(file_path)
+    removed = []
+    for entry in os.scandir(store_root):
+        if not entry.is_dir() or entry.name.startswith('.'):
+            continue
+        meta = _read_meta(entry.path)
+        if meta is None or meta.get('source') != source or meta.get('source_fingerprint') == fingerprint:
+            continue
+        # Open memory maps of the old store stay readable on POSIX; elsewhere the directory is kept until unused
+        shutil.rmtree(entry.path, ignore_errors=True)
+        if not os.path.exists(entry.path):
+            removed.append(entry.path)
+            try:
+                os.remove(entry.path + '.lock')
+            except OSError:
+                pass
+    return removed
+
+
+def convert_recording(file_path, sampling_rate, channel_info, store_root=None, chunk_samples=2 ** 20,
+                      precision=None, fingerprint=None, force=False):
+    """
+    Converts a recording into the native store, writing the signal in chunks to bound memory.
+
+    Conversions of the same store hold a lock file, so when several processes open a recording at once it is
+    converted once and the others use the result. Stores of earlier versions of the recording are removed (see
+    ``remove_stale_stores``).
+
+    Args:
+        file_path (str): The path of the source recording (any format ``load_recording`` accepts).
+        sampling_rate (float): The sampling rate of the signal in Hz.
+        channel_info (numpy.ndarray): The channel information used for the remapping.
+        store_root (str): The store directory. Default is ``default_store_root()``.
+        chunk_samples (int): The number of samples written per chunk. Default is 2**20.
+        precision (str or PrecisionPolicy): The policy giving the stored signal and spike index dtypes.
+            Default is ``precision.get_precision_policy()``.
+        fingerprint (str): The ``recording_fingerprint`` of the recording, if already computed.
+        force (bool): Whether to convert again if a complete store exists. Default is False.
+
+    Returns:
+        str: The path of the store.
+
+    """
+    precision = get_precision_policy(precision)
+    store_root = store_root or default_store_root()
+    os.makedirs(store_root, exist_ok=True)
+    fingerprint = fingerprint or recording_fingerprint(file_path)
+    store_path = os.path.join(store_root, _store_key(file_path, channel_info, fingerprint))
+    with _conversion_lock(store_path):
+        if force or _read_meta(store_path) is None:
+            _write_store(file_path, sampling_rate, channel_info, store_root, store_path, chunk_samples, precision,
+                         fingerprint)
+        remove_stale_stores(file_path, fingerprint, store_root)
+    return store_path
+
+
+def _write_store(file_path, sampling_rate, channel_info, store_root, store_path, chunk_samples, precision,
+                 fingerprint):
+    signal, spike_timestamps = load_recording(file_path)
+    signal = convert_to_60MEA_mapping(signal, channel_info)
+    n_channels, n_samples = signal.shape
+    spikes = SpikeTrains.from_padded(convert_to_60MEA_mapping(spike_timestamps, channel_info), n_samples)
+    spikes = spikes.astype(precision.index_dtype_for(n_samples))
+    signal_dtype = precision.signal_dtype_for(signal.dtype)
+
+    # Write into a temporary directory and move it in place, so a crash never leaves a half-written store
+    tmp_path = tempfile.mkdtemp(dir=store_root, prefix='.converting-')
+    try:
+        stored_signal = np.lib.format.open_memmap(os.path.join(tmp_path, 'signal.npy'), mode='w+',
+                                                  dtype=signal_dtype, shape=(n_channels, n_samples))
+        channels = np.arange(n_channels)
+        for start in range(0, n_samples, chunk_samples):
+            stop = min(start + chunk_samples, n_samples)
+            if isinstance(signal, LazySignal):
+                stored_signal[:, start:stop] = signal.read(channels, start, stop)
+            else:
+                stored_signal[:, start:stop] = signal[:, start:stop]
+        stored_signal.flush()
+        del stored_signal
+        np.save(os.path.join(tmp_path, 'spike_offsets.npy'), spikes.offsets)
+        np.save(os.path.join(tmp_path, 'spike_indices.npy'), spikes.indices)
+        meta = {
+            'format_version': STORE_FORMAT_VERSION,
+            'source': os.path.abspath(file_path),
+            'source_fingerprint': fingerprint,
+            'sampling_rate': sampling_rate,
+            'channel_info': np.asarray(channel_info).tolist(),
+            'n_channels': n_channels,
+            'n_samples': n_samples,
+            'dtype': signal_dtype.str,
+        }
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        _install_store(tmp_path, store_path, store_root)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    finally:
+        if isinstance(signal, LazySignal):
+            # Closes the HDF5 file of a v7.3 recording; the store is read from its own memory-mapped files
+            signal.close()
+
+
+def open_store(store_path):
+    """
+    Opens a converted store; the signal and spike arrays are memory-mapped, so this takes milliseconds.
+
+    Args:
+        store_path (str): The path of the store.
+
+    Returns:
+        StoredRecording: The store path, signal (LazySignal), spikes (SpikeTrains), sampling rate and channel info.
+
+    """
+    with open(os.path.join(store_path, 'meta.json'), 'r') as f:
+        meta = json.load(f)
+    signal = LazySignal(np.load(os.path.join(store_path, 'signal.npy'), mmap_mode='r'))
+    spikes = SpikeTrains(np.load(os.path.join(store_path, 'spike_offsets.npy'), mmap_mode='r'),
+                         np.load(os.path.join(store_path, 'spike_indices.npy'), mmap_mode='r'),
+                         meta['n_samples'])
+    return StoredRecording(store_path, signal, spikes, meta['sampling_rate'], np.asarray(meta['channel_info']))
+
+
+def open_recording(file_path, sampling_rate, channel_info, store_root=None, precision=None):
+    """
+    Opens a recording through the store, converting it first if it has not been converted yet.
+
+    Args:
+        file_path (str): The path of the source recording.
+        sampling_rate (float): The sampling rate of the signal in Hz; overrides the stored value.
+        channel_info (numpy.ndarray): The channel information used for the remapping.
+        store_root (str): The store directory. Default is ``default_store_root()``.
+        precision (str or PrecisionPolicy): The precision policy of a conversion; an existing store keeps the
+            dtypes it was converted with. Default is ``precision.get_precision_policy()``.
+
+    Returns:
+        StoredRecording: The opened store.
+
+    """
+    fingerprint = recording_fingerprint(file_path)
+    store_path = find_store(file_path, channel_info, store_root, fingerprint)
+    if store_path is None:
+        store_path = convert_recording(file_path, sampling_rate, channel_info, store_root, precision=precision,
+                                       fingerprint=fingerprint)
+    return open_store(store_path)._replace(sampling_rate=sampling_rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert recordings into the native meaDash store.')
+    parser.add_argument('recordings', nargs='+', help='Recordings to convert (.mat, .npy or raw binary).')
+    parser.add_argument('--sampling-rate', type=float, required=True, help='Sampling rate of the signals in Hz.')
+    parser.add_argument('--store-root', default=None, help='Store directory (default: %s).' % default_store_root())
+    parser.add_argument('--force', action='store_true', help='Convert again even if a store exists.')
+    parser.add_argument('--precision', choices=sorted(PRECISION_POLICIES), default=None,
+                        help='Precision policy of the stored signal and spikes (default: $MEADASH_PRECISION or '
+                             'compact).')
+    args = parser.parse_args()
+
+    channel_info = load_channel_info_from_json()
+    for file_path in args.recordings:
+        fingerprint = recording_fingerprint(file_path)
+        store_path = None if args.force else find_store(file_path, channel_info, args.store_root, fingerprint)
+        if store_path is None:
+            store_path = convert_recording(file_path, args.sampling_rate, channel_info, args.store_root,
+                                           precision=args.precision, fingerprint=fingerprint, force=args.force)
+        print("%s -> %s" % (file_path, store_path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,547 @@
+# standard imports
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+
+# third party imports
+import numpy as np
+
+from data_processing.detection import POLARITIES, detect_spikes_in_block, enforce_refractory_period, \
+    estimate_noise_levels
+from data_processing.lazy_signal import LazySignal
+from data_processing.spikes import SpikeTrains
+from data_processing.utils import convert_to_60MEA_mapping, load_recording
+
+
+class RingBuffer:
+    """
+    A fixed-memory buffer keeping the latest ``capacity`` entries along its last axis.
+
+    Entries are addressed by their absolute position since the first append, so readers can ask for
+    everything after the last entry they have seen.
+
+    Args:
+        shape (tuple): The shape of one entry, e.g. (n_channels,) for samples or () for scalars.
+        capacity (int): The number of entries kept.
+        dtype (numpy.dtype): The dtype of the entries. Default is float32.
+
+    Attributes:
+        capacity (int): The number of entries kept.
+        total (int): The number of entries appended so far.
+
+    """
+
+    def __init__(self, shape, capacity, dtype=np.float32):
+        self.capacity = int(capacity)
+        self.total = 0
+        self._data = np.zeros(tuple(shape) + (self.capacity,), dtype=dtype)
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    @property
+    def start(self):
+        """int: The absolute position of the oldest entry kept."""
+        return self.total - len(self)
+
+    @property
+    def nbytes(self):
+        """int: The memory held by the buffer in bytes."""
+        return self._data.nbytes
+
+    def append(self, block):
+        """
+        Appends entries, overwriting the oldest ones once the buffer is full.
+
+        Args:
+            block (numpy.ndarray): The entries with shape ``shape + (n,)``.
+
+        """
+        n = block.shape[-1]
+        if n > self.capacity:
+            self.total += n - self.capacity
+            block = block[..., -self.capacity:]
+            n = self.capacity
+        position = self.total % self.capacity
+        first = min(n, self.capacity - position)
+        self._data[..., position:position + first] = block[..., :first]
+        self._data[..., :n - first] = block[..., first:]
+        self.total += n
+
+    def since(self, position):
+        """
+        Returns the entries from an absolute position on, in order.
+
+        Args:
+            position (int): The absolute position of the first entry wanted; positions that were already
+                overwritten are skipped.
+
+        Returns:
+            int: The absolute position of the first returned entry.
+            numpy.ndarray: The entries with shape ``shape + (n,)``.
+
+        """
+        first = min(max(int(position), self.start), self.total)
+        indices = np.arange(first, self.total) % self.capacity
+        return first, self._data[..., indices]
+
+    def latest(self, n=None):
+        """
+        Returns the latest ``n`` entries (all kept entries by default), oldest first.
+
+        Args:
+            n (int): The number of entries. Default is all kept entries.
+
+        Returns:
+            numpy.ndarray: The entries with shape ``shape + (n,)``.
+
+        """
+        n = len(self) if n is None else min(int(n), len(self))
+        return self.since(self.total - n)[1]
+
+
+class RawFileSource:
+    """
+    Reads the frames appended to a growing sample-major (interleaved) raw binary file.
+
+    Only complete frames are returned; a partially written frame is read on the next call.
+
+    Args:
+        file_path (str): The path of the file.
+        n_channels (int): The number of channels per frame.
+        dtype (numpy.dtype): The sample dtype. Default is float32.
+        offset (int): The size of a leading header in bytes. Default is 0.
+
+    """
+
+    def __init__(self, file_path, n_channels, dtype=np.float32, offset=0):
+        self.file_path = file_path
+        self.n_channels = int(n_channels)
+        self.dtype = np.dtype(dtype)
+        self.position = int(offset)
+        self.closed = False
+        self._frame_bytes = self.dtype.itemsize * self.n_channels
+
+    @classmethod
+    def from_header(cls, file_path):
+        """
+        Opens a raw file described by a JSON header of the same name, as for ``utils.load_recording``.
+
+        Args:
+            file_path (str): The path of the .bin/.dat/.raw file.
+
+        Returns:
+            RawFileSource: The source.
+
+        Raises:
+            ValueError: If the file is not sample-major, which is the only layout that can grow.
+
+        """
+        with open(os.path.splitext(file_path)[0] + '.json', 'r') as f:
+            header = json.load(f)
+        if header.get('layout', 'channel-major') != 'sample-major':
+            raise ValueError("Only sample-major raw files can be streamed, %s is channel-major." % file_path)
+        return cls(file_path, header['n_channels'], header.get('dtype', 'float32'), header.get('offset', 0))
+
+    def read(self, max_samples=None):
+        """
+        Reads the complete frames appended since the last call.
+
+        Args:
+            max_samples (int): The largest number of frames returned. Default is all available frames.
+
+        Returns:
+            numpy.ndarray: The new samples with shape (n_channels, n).
+
+        """
+        if not os.path.exists(self.file_path):
+            return np.zeros((self.n_channels, 0), dtype=self.dtype)
+        available = (os.path.getsize(self.file_path) - self.position) // self._frame_bytes
+        if max_samples is not None:
+            available = min(available, int(max_samples))
+        if available <= 0:
+            return np.zeros((self.n_channels, 0), dtype=self.dtype)
+        with open(self.file_path, 'rb') as f:
+            f.seek(self.position)
+            frames = np.fromfile(f, dtype=self.dtype, count=available * self.n_channels)
+        self.position += available * self._frame_bytes
+        return frames.reshape(available, self.n_channels).T
+
+    def close(self):
+        self.closed = True
+
+
+class SocketSource:
+    """
+    Receives sample-major (interleaved) frames from a TCP stream, e.g. from ``replay`` standing in for the
+    acquisition system.
+
+    Args:
+        host (str): The host to connect to.
+        port (int): The port to connect to.
+        n_channels (int): The number of channels per frame.
+        dtype (numpy.dtype): The sample dtype. Default is float32.
+
+    """
+
+    def __init__(self, host, port, n_channels, dtype=np.float32):
+        self.n_channels = int(n_channels)
+        self.dtype = np.dtype(dtype)
+        self.closed = False
+        self._frame_bytes = self.dtype.itemsize * self.n_channels
+        self._pending = bytearray()
+        self._socket = socket.create_connection((host, int(port)))
+        self._socket.setblocking(False)
+
+    def read(self, max_samples=None):
+        """
+        Returns the complete frames received since the last call without blocking.
+
+        Args:
+            max_samples (int): The largest number of frames returned. Default is all received frames.
+
+        Returns:
+            numpy.ndarray: The new samples with shape (n_channels, n).
+
+        """
+        while not self.closed:
+            try:
+                data = self._socket.recv(2 ** 20)
+            except (BlockingIOError, InterruptedError):
+                break
+            if not data:
+                self.close()
+                break
+            self._pending.extend(data)
+        n = len(self._pending) // self._frame_bytes
+        if max_samples is not None:
+            n = min(n, int(max_samples))
+        frames = np.frombuffer(bytes(self._pending[:n * self._frame_bytes]), dtype=self.dtype)
+        del self._pending[:n * self._frame_bytes]
+        return frames.reshape(n, self.n_channels).T
+
+    def close(self):
+        self.closed = True
+        self._socket.close()
+
+
+def _close_bins(open_bin, open_counts, bins, rows, last_bin):
+    # Adds events (bin, row) to the open bin and returns the bins before last_bin, which can no longer change
+    n_bins = last_bin - open_bin + 1
+    counts = np.zeros((open_counts.size, n_bins), dtype=np.int64)
+    np.add.at(counts, (rows, bins - open_bin), 1)
+    counts[:, 0] += open_counts
+    return counts[:, :-1], counts[:, -1]
+
+
+class StreamingProcessor:
+    """
+    Processes a recording while it is acquired, from the new samples of every chunk only.
+
+    Every ingested chunk is remapped to the 60MEA layout and searched for spikes with fixed per-channel thresholds
+    (estimated once from the first ``noise_duration`` seconds). The spike counts, the activity bins and the
+    boxcar firing rate are advanced with the spikes of the chunk; the samples of the previous chunk needed for
+    peak alignment and the refractory period are carried over, so chunk boundaries never add or drop spikes.
+    The spikes equal those of ``detect_spikes`` over the whole recording only when both are given the same
+    ``noise_levels``: by default the thresholds come from the first ``noise_duration`` seconds, whereas
+    ``detect_spikes`` estimates them from chunks sampled across the whole recording, so the spikes differ when the
+    noise level drifts. All history is kept in ring buffers, so memory stays fixed however long the
+    acquisition runs.
+
+    Args:
+        source: An object whose ``read(max_samples)`` returns the new (channels, n) samples, e.g. a
+            ``RawFileSource`` or ``SocketSource``.
+        sampling_rate (float): The sampling rate of the signal in Hz.
+        channel_info (numpy.ndarray): Information about the channels.
+        threshold (float): The detection threshold in multiples of the channel noise level. Default is 5.
+        polarity (str): 'negative', 'positive' or 'both'. Default is 'negative'.
+        refractory_period (float): The minimum time between two spikes of a channel in seconds. Default is 1 ms.
+        align_window (float): The time after a crossing searched for the peak in seconds. Default is 0.5 ms.
+        noise_duration (float): The duration used to estimate the noise levels in seconds. Default is 2.
+        buffer_duration (float): The duration of signal and spikes kept in seconds. Default is 10.
+        bin_duration (float): The activity bin width in seconds. Default is 1.
+        rate_resolution (float): The time step of the firing rate in seconds. Default is 0.01.
+        rate_window (float): The width of the (trailing) boxcar of the firing rate in seconds. Default is 0.2.
+        history_duration (float): The duration of activity bins and firing rate kept in seconds. Default is 600.
+        max_spikes (int): The number of recent spikes kept. Default is 2 ** 18.
+        remap (bool): Whether the source channels still need the 60MEA remapping. Default is True.
+        noise_levels (numpy.ndarray): The noise level of every channel. Default is estimated from the stream.
+
+    Attributes:
+        n_samples (int): The number of samples ingested.
+        spike_counts (numpy.ndarray): The number of spikes of every channel so far.
+        signal (RingBuffer): The latest samples, (channels,) entries.
+        spikes (RingBuffer): The latest spikes as (channel, sample) entries.
+        activity (RingBuffer): The spike counts of every closed activity bin, (channels,) entries.
+        rate (RingBuffer): The summed firing rate in spikes/s at every closed rate step, scalar entries.
+
+    """
+
+    def __init__(self, source, sampling_rate, channel_info, threshold=5.0, polarity='negative',
+                 refractory_period=0.001, align_window=0.0005, noise_duration=2.0, buffer_duration=10.0,
+                 bin_duration=1.0, rate_resolution=0.01, rate_window=0.2, history_duration=600.0,
+                 max_spikes=2 ** 18, remap=True, noise_levels=None):
+        if polarity not in POLARITIES:
+            raise ValueError("Invalid polarity %r. Supported polarities are %s." % (polarity, ', '.join(POLARITIES)))
+        self.source = source
+        self.sampling_rate = sampling_rate
+        self.channel_info = channel_info
+        self.threshold = threshold
+        self.polarity = polarity
+        self.remap = remap
+        self.noise_levels = noise_levels
+        self.n_channels = len(channel_info)
+        self.n_samples = 0
+        self.spike_counts = np.zeros(self.n_channels, dtype=np.int64)
+
+        self._align = max(int(align_window * sampling_rate), 1)
+        self._refractory = int(refractory_period * sampling_rate)
+        self._overlap = self._align + self._refractory + 1
+        self._noise_samples = max(int(noise_duration * sampling_rate), 1)
+        self._bin_samples = max(int(round(bin_duration * sampling_rate)), 1)
+        self._rate_samples = max(int(round(rate_resolution * sampling_rate)), 1)
+        self._rate_steps = max(int(round(rate_window / rate_resolution)), 1)
+
+        self.signal = RingBuffer((self.n_channels,), int(buffer_duration * sampling_rate))
+        self.spikes = RingBuffer((2,), max_spikes, dtype=np.int64)
+        self.activity = RingBuffer((self.n_channels,), int(np.ceil(history_duration / bin_duration)), np.int64)
+        self.rate = RingBuffer((), int(np.ceil(history_duration / rate_resolution)), np.float64)
+
+        # Spikes before the frontier are final; the tail holds the samples from frontier - overlap on
+        self._frontier = 0
+        self._tail = np.zeros((self.n_channels, 0), dtype=np.float32)
+        self._last_spike = np.full(self.n_channels, np.iinfo(np.int64).min // 2, dtype=np.int64)
+        self._open_bin, self._open_counts = 0, np.zeros(self.n_channels, dtype=np.int64)
+        self._open_step, self._open_rate = 0, np.zeros(1, dtype=np.int64)
+        self._rate_history = np.zeros(self._rate_steps - 1, dtype=np.int64)
+        self._lock = threading.RLock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def duration(self):
+        """float: The duration ingested in seconds."""
+        return self.n_samples / self.sampling_rate
+
+    @property
+    def nbytes(self):
+        """int: The memory held by the ring buffers in bytes."""
+        return sum(buffer.nbytes for buffer in (self.signal, self.spikes, self.activity, self.rate))
+
+    def ingest(self, block):
+        """
+        Processes a chunk of new samples.
+
+        Args:
+            block (numpy.ndarray): The new samples with shape (source channels, n).
+
+        Returns:
+            int: The number of spikes that became final with this chunk.
+
+        """
+        block = np.asarray(block, dtype=np.float32)
+        if self.remap:
+            block = convert_to_60MEA_mapping(block, self.channel_info)
+        with self._lock:
+            self.signal.append(block)
+            self.n_samples += block.shape[1]
+            self._tail = np.concatenate((self._tail, block), axis=1)
+            if self.noise_levels is None:
+                if self._tail.shape[1] < self._noise_samples:
+                    return 0
+                self.noise_levels = estimate_noise_levels(self._tail, self.sampling_rate)
+            return self._detect()
+
+    def _detect(self):
+        # Peaks need align samples after their crossing, so the last align samples are not final yet
+        frontier = max(self.n_samples - self._align, self._frontier)
+        tail_start = self.n_samples - self._tail.shape[1]
+        thresholds = np.where(self.noise_levels > 0,
+                              self.threshold * np.asarray(self.noise_levels, dtype=np.float32), np.inf)
+        channels, samples = detect_spikes_in_block(self._tail, thresholds, self.polarity, self._align, 0,
+                                                   self._frontier - tail_start, frontier - tail_start)
+        samples = samples + tail_start
+
+        # The last kept spike of every channel continues the refractory period across chunks
+        channels = np.concatenate((np.arange(self.n_channels), channels))
+        samples = np.concatenate((self._last_spike, samples))
+        order = np.lexsort((samples, channels))
+        channels, samples = enforce_refractory_period(channels[order], samples[order], self._refractory)
+        first = np.ones(channels.size, dtype=bool)
+        first[1:] = channels[1:] != channels[:-1]
+        last = np.ones(channels.size, dtype=bool)
+        last[:-1] = channels[:-1] != channels[1:]
+        self._last_spike[channels[last]] = samples[last]
+        channels, samples = channels[~first], samples[~first]
+
+        order = np.argsort(samples, kind='stable')
+        channels, samples = channels[order], samples[order]
+        self.spikes.append(np.stack((channels, samples)))
+        self.spike_counts += np.bincount(channels, minlength=self.n_channels)
+
+        closed, self._open_counts = _close_bins(self._open_bin, self._open_counts, samples // self._bin_samples,
+                                                channels, frontier // self._bin_samples)
+        self.activity.append(closed)
+        self._open_bin = frontier // self._bin_samples
+
+        totals, self._open_rate = _close_bins(self._open_step, self._open_rate, samples // self._rate_samples,
+                                              np.zeros(samples.size, dtype=np.int64), frontier // self._rate_samples)
+        self._open_step = frontier // self._rate_samples
+        self._advance_rate(totals[0])
+
+        self._frontier = frontier
+        self._tail = self._tail[:, max(frontier - self._overlap - tail_start, 0):]
+        return samples.size
+
+    def _advance_rate(self, totals):
+        # Trailing boxcar over the last rate_steps steps, carried over from the previous chunk
+        if totals.size == 0:
+            return
+        history = np.concatenate((self._rate_history, totals))
+        cumulative = np.concatenate(([0], np.cumsum(history)))
+        window = cumulative[self._rate_steps:] - cumulative[:-self._rate_steps]
+        self.rate.append(window / (self._rate_steps * self._rate_samples / self.sampling_rate))
+        self._rate_history = history[history.size - (self._rate_steps - 1):]
+
+    def poll(self, max_samples=None):
+        """
+        Reads and processes the samples the source received since the last poll.
+
+        Args:
+            max_samples (int): The largest number of samples processed. Default is all available samples.
+
+        Returns:
+            int: The number of samples processed.
+
+        """
+        block = self.source.read(max_samples)
+        if block.shape[1]:
+            self.ingest(block)
+        return block.shape[1]
+
+    def start(self, poll_interval=0.1):
+        """
+        Polls the source in a background thread until ``stop`` is called or the source closes.
+
+        Args:
+            poll_interval (float): The time between polls without new samples in seconds. Default is 0.1.
+
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def run():
+            while not self._stop.is_set() and not getattr(self.source, 'closed', False):
+                if not self.poll():
+                    self._stop.wait(poll_interval)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name='meadash-stream', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the background polling."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def updates_since(self, cursor=None):
+        """
+        Returns what changed since a reader's cursor, for delta updates of live plots.
+
+        Args:
+            cursor (dict): The cursor returned by the previous call. Default is None (everything kept).
+
+        Returns:
+            dict: The new 'rate' (times in seconds, spikes/s), 'spikes' (times, channels) and 'signal' entries
+            (times, (channels, n) samples), the latest closed 'activity' bin (or None if no bin closed), and the
+            new 'cursor'.
+
+        """
+        cursor = cursor or {}
+        with self._lock:
+            rate_start, rate = self.rate.since(cursor.get('rate', 0))
+            spike_start, spikes = self.spikes.since(cursor.get('spikes', 0))
+            signal_start, signal = self.signal.since(cursor.get('signal', 0))
+            activity = self.activity.latest(1)[:, 0] if self.activity.total > cursor.get('activity', 0) else None
+            new_cursor = {'rate': self.rate.total, 'spikes': self.spikes.total, 'signal': self.signal.total,
+                          'activity': self.activity.total}
+            spike_counts = self.spike_counts.copy()
+        rate_step = self._rate_samples / self.sampling_rate
+        return {
+            'rate': ((np.arange(rate.size) + rate_start + 1) * rate_step, rate),
+            'spikes': (spikes[1] / self.sampling_rate, spikes[0]),
+            'signal': ((np.arange(signal.shape[1]) + signal_start) / self.sampling_rate, signal),
+            'activity': activity,
+            'spike_counts': spike_counts,
+            'cursor': new_cursor,
+        }
+
+    def snapshot(self):
+        """
+        Builds a DataProcessor over the buffered signal and spikes, for the analyses of the other pages.
+
+        Returns:
+            DataProcessor: The processor over the last ``buffer_duration`` seconds; sample 0 is the oldest
+            buffered sample.
+
+        """
+        from data_processing.data_processor import DataProcessor
+        with self._lock:
+            signal = self.signal.latest()
+            start = self.signal.start
+            _, spikes = self.spikes.since(0)
+        in_buffer = spikes[1] >= start
+        trains = SpikeTrains.from_channel_samples(spikes[0][in_buffer], spikes[1][in_buffer] - start,
+                                                  self.n_channels, signal.shape[1])
+        return DataProcessor(signal, trains, self.sampling_rate, self.channel_info, remap=False)
+
+
+def replay(file_path, port, sampling_rate, host='127.0.0.1', chunk_duration=0.1, speed=1.0):
+    """
+    Serves a recording over TCP in real time, standing in for the acquisition system.
+
+    The signal is sent in the source channel order as sample-major float32 frames to the first client.
+
+    Args:
+        file_path (str): The recording (any format ``utils.load_recording`` opens).
+        port (int): The port to listen on.
+        sampling_rate (float): The sampling rate of the signal in Hz.
+        host (str): The address to listen on. Default is '127.0.0.1'.
+        chunk_duration (float): The duration sent at once in seconds. Default is 0.1.
+        speed (float): The replay speed relative to real time. Default is 1.
+
+    """
+    signal, _ = load_recording(file_path)
+    chunk_samples = max(int(chunk_duration * sampling_rate), 1)
+    try:
+        with socket.create_server((host, port)) as server:
+            connection, _ = server.accept()
+            with connection:
+                started = time.monotonic()
+                for start in range(0, signal.shape[1], chunk_samples):
+                    block = np.asarray(signal[:, start:start + chunk_samples], dtype=np.float32)
+                    connection.sendall(np.ascontiguousarray(block.T).tobytes())
+                    delay = started + (start + block.shape[1]) / sampling_rate / speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+    finally:
+        if isinstance(signal, LazySignal):
+            signal.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recording over TCP as a stand-in acquisition system.')
+    parser.add_argument('recording', help='The recording to replay (.mat, .npy or raw binary).')
+    parser.add_argument('--sampling-rate', type=float, required=True, help='Sampling rate of the signal in Hz.')
+    parser.add_argument('--port', type=int, default=5555, help='Port to serve on (default: 5555).')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed relative to real time.')
+    args = parser.parse_args()
+    replay(args.recording, args.port, args.sampling_rate, speed=args.speed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+"""
+Summary index of a recording: the analyses every page starts from, computed once and persisted next to the data.
+
+The summary holds the spike count of every channel, the counts in 1 s bins, the active channels, the envelope
+(minimum and maximum per 1 s bin) of the network firing rate and the firing rate PSD of every channel with the
+default parameters of ``DataProcessor.estimate_channel_psd``. ``DataProcessor`` answers the queries it covers
+from the summary, so opening a page or redrawing a heatmap does not touch the spikes; other parameters are
+computed as before.
+
+Summaries are written into the store directory of the recording (see ``data_processing.store``) as
+
+    summary-<key>.npz
+
+where the key is a digest of the spikes, the sampling rate, the precision policy and the summary parameters, so
+re-detected spikes and changed parameters get their own file.
+"""
+# standard imports
+import hashlib
+import json
+import os
+import tempfile
+
+# third party imports
+import numpy as np
+
+from data_processing.binning import bin_edges, num_bins
+
+SUMMARY_FORMAT_VERSION = 1
+
+# The parameters of the summary, as accepted by ``compute_summary``
+DEFAULT_SUMMARY_PARAMETERS = {
+    'bin_duration': 1.0,
+    'rate_bin_size': 0.01,
+    'active_channel_threshold': 5,
+    'psd_bin_size': 0.01,
+}
+
+_ARRAYS = ('channel_counts', 'bin_counts', 'active_channels', 'rate_envelope', 'psd_frequencies', 'psd',
+           'psd_peak_frequencies')
+
+
+class RecordingSummary:
+    """
+    The summary index of a recording.
+
+    Args:
+        key (str): The digest identifying the spikes and parameters the summary was computed from.
+        n_samples (int): The number of samples of the recording.
+        bin_samples (float): The width of the count bins in samples.
+        parameters (dict): The summary parameters (see ``DEFAULT_SUMMARY_PARAMETERS``).
+        channel_counts (numpy.ndarray): The spike count of every channel.
+        bin_counts (numpy.ndarray): The spike counts with shape (channels, bins), without a trailing partial bin.
+        active_channels (numpy.ndarray): The channels with at least ``active_channel_threshold`` spikes.
+        rate_envelope (numpy.ndarray): The minimum and maximum of the network firing rate (spikes/s, binned at
+            ``rate_bin_size``) within every count bin, with shape (2, bins).
+        psd_frequencies (numpy.ndarray): The frequencies of the default firing rate PSD.
+        psd (numpy.ndarray): The default firing rate PSD with shape (channels, frequencies).
+        psd_peak_frequencies (numpy.ndarray): The peak frequency of every channel.
+
+    """
+
+    def __init__(self, key, n_samples, bin_samples, parameters, channel_counts, bin_counts, active_channels,
+                 rate_envelope, psd_frequencies, psd, psd_peak_frequencies):
+        self.key = key
+        self.n_samples = int(n_samples)
+        self.bin_samples = float(bin_samples)
+        self.parameters = dict(parameters)
+        self.channel_counts = channel_counts
+        self.bin_counts = bin_counts
+        self.active_channels = active_channels
+        self.rate_envelope = rate_envelope
+        self.psd_frequencies = psd_frequencies
+        self.psd = psd
+        self.psd_peak_frequencies = psd_peak_frequencies
+        # Shared by every caller, like the results of the analysis cache
+        for name in _ARRAYS:
+            getattr(self, name).flags.writeable = False
+
+    @property
+    def nbytes(self):
+        """int: The memory held by the summary arrays."""
+        return sum(getattr(self, name).nbytes for name in _ARRAYS)
+
+    def _aligned_bins(self, start, stop):
+        # The bins covering [start, stop) exactly, or None if the window does not start on a bin edge
+        first = start / self.bin_samples
+        if abs(first - round(first)) > 1e-9:
+            return None
+        first = int(round(first))
+        return first, first + num_bins(stop - start, self.bin_samples)
+
+    def counts(self, start, stop, bin_samples=None, include_partial=False):
+        """
+        Returns spike counts of a sample window, if the summary covers them.
+
+        Args:
+            start (int): The first sample of the window.
+            stop (int): The end of the window (exclusive).
+            bin_samples (float): The bin width in samples, or None for the total count of every channel.
+            include_partial (bool): Whether a trailing partial bin is requested. Default is False.
+
+        Returns:
+            numpy.ndarray: The counts, or None if they need to be computed from the spikes.
+
+        """
+        if bin_samples is None:
+            if (start, stop) == (0, self.n_samples):
+                return self.channel_counts
+            bins = self._aligned_bins(start, stop)
+            if bins is None or (stop - start) % self.bin_samples or bins[1] > self.bin_counts.shape[1]:
+                return None
+            return self.bin_counts[:, bins[0]:bins[1]].sum(axis=1, dtype=self.channel_counts.dtype)
+        if abs(bin_samples - self.bin_samples) > 1e-9 or bin_samples > stop - start or \
+                include_partial and (stop - start) % self.bin_samples:
+            return None
+        bins = self._aligned_bins(start, stop)
+        if bins is None or bins[1] > self.bin_counts.shape[1]:
+            return None
+        if bins == (0, self.bin_counts.shape[1]):
+            return self.bin_counts
+        return self.bin_counts[:, bins[0]:bins[1]]
+
+    def envelope(self, start, stop):
+        """
+        Returns the firing rate envelope of the count bins of a sample window, if the summary covers them.
+
+        Args:
+            start (int): The first sample of the window.
+            stop (int): The end of the window (exclusive).
+
+        Returns:
+            numpy.ndarray: The envelope with shape (2, bins), or None.
+
+        """
+        bins = self._aligned_bins(start, stop)
+        if bins is None or bins[1] > self.rate_envelope.shape[1]:
+            return None
+        return self.rate_envelope[:, bins[0]:bins[1]]
+
+    def to_arrays(self):
+        """
+        Returns the summary as named arrays, as written by ``save_summary``.
+
+        Returns:
+            dict: The arrays by name, with the metadata as a JSON string under 'meta'.
+
+        """
+        meta = {'format_version': SUMMARY_FORMAT_VERSION, 'key': self.key, 'n_samples': self.n_samples,
+                'bin_samples': self.bin_samples, 'parameters': self.parameters}
+        arrays = {name: getattr(self, name) for name in _ARRAYS}
+        arrays['meta'] = np.array(json.dumps(meta))
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Rebuilds a summary from the arrays of ``to_arrays``.
+
+        Args:
+            arrays (dict): The arrays by name.
+
+        Returns:
+            RecordingSummary: The summary, or None if it was written in another format version.
+
+        """
+        meta = json.loads(str(arrays['meta']))
+        if meta.get('format_version') != SUMMARY_FORMAT_VERSION:
+            return None
+        return cls(meta['key'], meta['n_samples'], meta['bin_samples'], meta['parameters'],
+                   **{name: np.asarray(arrays[name]) for name in _ARRAYS})
+
+    def __repr__(self):
+        return "RecordingSummary(key=%r, channels=%d, bins=%d)" % (self.key, self.bin_counts.shape[0],
+                                                                   self.bin_counts.shape[1])
+
+
+def summary_parameters(**parameters):
+    """
+    Completes summary parameters with their defaults.
+
+    Args:
+        **parameters: Any of the keys of ``DEFAULT_SUMMARY_PARAMETERS``.
+
+    Returns:
+        dict: The parameters.
+
+    Raises:
+        ValueError: If a parameter is unknown or the rate bins are not shorter than the count bins.
+
+    """
+    unknown = set(parameters) - set(DEFAULT_SUMMARY_PARAMETERS)
+    if unknown:
+        raise ValueError("Unknown summary parameters %s." % ', '.join(sorted(unknown)))
+    parameters = dict(DEFAULT_SUMMARY_PARAMETERS, **parameters)
+    if not 0 < parameters['rate_bin_size'] <= parameters['bin_duration']:
+        raise ValueError("The rate bin size must be positive and at most the bin duration.")
+    return parameters
+
+
+def summary_key(data_processor, parameters):
+    """
+    Computes the digest identifying the summary of a processor.
+
+    The whole spike store is hashed, which reads every spike once; this is done when the summary is built, not
+    when it is used.
+
+    Args:
+        data_processor (DataProcessor): The processor.
+        parameters (dict): The summary parameters.
+
+    Returns:
+        str: The hex digest.
+
+    """
+    spikes = data_processor.spikes
+    header = {'format_version': SUMMARY_FORMAT_VERSION, 'sampling_rate': float(data_processor.sampling_rate),
+              'n_samples': spikes.n_samples, 'precision': data_processor.precision.name, 'parameters': parameters}
+    digest = hashlib.blake2b(json.dumps(header, sort_keys=True).encode(), digest_size=16)
+    for array in (spikes.offsets, spikes.indices):
+        digest.update(np.ascontiguousarray(array).view(np.uint8))
+    return digest.hexdigest()
+
+
+def _rate_envelope(spikes, sampling_rate, bin_samples, n_bins, rate_bin_size, dtype):
+    # The network rate is binned from all spike indices at once, without a (channels, bins) intermediate
+    rate_bin_samples = max(int(round(rate_bin_size * sampling_rate)), 1)
+    n_rate_bins = int(n_bins * bin_samples // rate_bin_samples)
+    if n_bins == 0 or n_rate_bins == 0:
+        return np.zeros((2, n_bins), dtype=dtype)
+    rate_bins = spikes.indices // rate_bin_samples
+    rate = np.bincount(rate_bins[rate_bins < n_rate_bins], minlength=n_rate_bins).astype(dtype)
+    rate *= sampling_rate / rate_bin_samples
+    # The rate bins starting within every count bin
+    starts = np.minimum(np.ceil(bin_edges(spikes.n_samples, bin_samples)[:n_bins] / rate_bin_samples),
+                        n_rate_bins - 1).astype(np.int64)
+    return np.stack((np.minimum.reduceat(rate, starts), np.maximum.reduceat(rate, starts)))
+
+
+def compute_summary(data_processor, **parameters):
+    """
+    Computes the summary of a processor from its spikes.
+
+    Args:
+        data_processor (DataProcessor): The processor.
+        **parameters: Summary parameters overriding ``DEFAULT_SUMMARY_PARAMETERS``.
+
+    Returns:
+        RecordingSummary: The summary.
+
+    """
+    parameters = summary_parameters(**parameters)
+    spikes = data_processor.spikes
+    precision = data_processor.precision
+    bin_samples = data_processor.sampling_rate * parameters['bin_duration']
+    count_dtype = precision.count_dtype_for(spikes.n_samples)
+
+    channel_counts = spikes.counts().astype(count_dtype)
+    if spikes.n_samples >= bin_samples:
+        bin_counts = data_processor.aggregate_raster_spike_counts(time_value=parameters['bin_duration'])
+    else:
+        bin_counts = np.zeros((spikes.n_channels, 0), dtype=count_dtype)
+    rate_envelope = _rate_envelope(spikes, data_processor.sampling_rate, bin_samples, bin_counts.shape[1],
+                                   parameters['rate_bin_size'], precision.float_dtype)
+    frequencies, pxx, peaks = data_processor.estimate_channel_psd(source='rate', bin_size=parameters['psd_bin_size'])
+    return RecordingSummary(summary_key(data_processor, parameters), spikes.n_samples, bin_samples, parameters,
+                            channel_counts, np.array(bin_counts),
+                            np.flatnonzero(channel_counts >= parameters['active_channel_threshold']),
+                            rate_envelope, np.array(frequencies), np.array(pxx), np.array(peaks))
+
+
+def summary_path(directory, key):
+    """
+    Returns the file of a summary.
+
+    Args:
+        directory (str): The store directory of the recording.
+        key (str): The summary key.
+
+    Returns:
+        str: The path of the summary file.
+
+    """
+    return os.path.join(directory, 'summary-%s.npz' % key)
+
+
+def save_summary(summary, directory):
+    """
+    Writes a summary into the store directory of its recording.
+
+    The file is written under a temporary name and moved in place, so readers never see a partial summary.
+
+    Args:
+        summary (RecordingSummary): The summary.
+        directory (str): The store directory.
+
+    Returns:
+        str: The path of the summary file.
+
+    """
+    path = summary_path(directory, summary.key)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.summary-', suffix='.npz')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **summary.to_arrays())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def load_summary(directory, key):
+    """
+    Reads a summary from the store directory of its recording.
+
+    Args:
+        directory (str): The store directory.
+        key (str): The summary key.
+
+    Returns:
+        RecordingSummary: The summary, or None if it was not written yet or is unreadable.
+
+    """
+    path = summary_path(directory, key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as arrays:
+            summary = RecordingSummary.from_arrays({name: arrays[name] for name in arrays.files})
+    except (OSError, ValueError, KeyError):
+        # A summary from an interrupted or incompatible writer is computed again
+        return None
+    if summary is None or summary.key != key:
+        return None
+    return summary
@@ -1,12 +1,111 @@
 import json
+import os
 import numpy as np
 import pandas as pd
 import scipy.io as sios
+from data_processing.lazy_signal import LazySignal
+from data_processing.mapping import ElectrodeMapping
+
+RAW_EXTENSIONS = ('.bin', '.dat', '.raw')
 
 def load_data_from_mat(file_path):
     data = sios.loadmat(file_path)
     return data['filteredSignal'], data['spiketimestamps']
 
+def _is_hdf5(file_path):
+    # MATLAB v7.3 files are HDF5 files with a 512 byte user block
+    with open(file_path, 'rb') as f:
+        for offset in (0, 512):
+            f.seek(offset)
+            if f.read(8) == b'\x89HDF\r\n\x1a\n':
+                return True
+    return False
+
+def _read_header(stem):
+    if os.path.exists(stem + '.json'):
+        with open(stem + '.json', 'r') as f:
+            return json.load(f)
+    return {}
+
+def _sidecar_spike_path(stem, header):
+    # Header paths are relative to the directory of the recording (absolute paths are kept as they are)
+    spike_path = header.get('spike_timestamps', os.path.basename(stem) + '_spiketimestamps.npy')
+    return os.path.join(os.path.dirname(stem), spike_path)
+
+def _load_sidecar_spike_timestamps(stem, header):
+    spike_path = _sidecar_spike_path(stem, header)
+    if not os.path.exists(spike_path):
+        raise FileNotFoundError("Spike timestamps not found at %s" % spike_path)
+    return np.load(spike_path)
+
+def load_recording(file_path):
+    """
+    Opens a recording, memory-mapping the signal whenever the file format allows it.
+
+    Supported formats:
+    - MATLAB v7.3 (HDF5) .mat files with 'filteredSignal' and 'spiketimestamps' (needs h5py); the signal is
+      read lazily from the HDF5 dataset, whose file stays open until ``LazySignal.close`` or until no view of
+      the signal is left.
+    - NPY sidecars: a (channels, samples) .npy signal, memory-mapped.
+    - Raw binary sidecars (.bin/.dat/.raw) described by a JSON header next to it (same name, .json) with
+      'dtype', 'n_channels' and 'layout' ('channel-major' or 'sample-major', i.e. interleaved channels).
+    NPY and raw signals take their spike timestamps from '<name>_spiketimestamps.npy', or from the
+    'spike_timestamps' entry of the JSON header. Older (v5) .mat files cannot be memory-mapped and are
+    loaded into memory.
+
+    Args:
+        file_path (str): The path of the recording.
+
+    Returns:
+        LazySignal or numpy.ndarray: The signal with shape (channels, samples).
+        numpy.ndarray: The padded spike timestamps per channel.
+    """
+    stem, extension = os.path.splitext(file_path)
+    extension = extension.lower()
+    header = _read_header(stem)
+    if extension == '.mat':
+        if not _is_hdf5(file_path):
+            return load_data_from_mat(file_path)
+        try:
+            import h5py
+        except ImportError as e:
+            raise ImportError("Reading MATLAB v7.3 files requires h5py (pip install h5py)") from e
+        mat_file = h5py.File(file_path, 'r')
+        # MATLAB stores arrays column-major, so a (channels, samples) matrix appears as (samples, channels)
+        signal = LazySignal(mat_file['filteredSignal'], transposed=True, file=mat_file)
+        return signal, np.asarray(mat_file['spiketimestamps']).T
+    if extension == '.npy':
+        signal = LazySignal(np.load(file_path, mmap_mode='r'))
+    elif extension in RAW_EXTENSIONS:
+        if not header:
+            raise FileNotFoundError("Raw recordings need a JSON header at %s" % (stem + '.json'))
+        dtype = np.dtype(header.get('dtype', 'float32'))
+        n_channels = int(header['n_channels'])
+        n_samples = os.path.getsize(file_path) // (dtype.itemsize * n_channels)
+        sample_major = header.get('layout', 'channel-major') == 'sample-major'
+        shape = (n_samples, n_channels) if sample_major else (n_channels, n_samples)
+        raw = np.memmap(file_path, dtype=dtype, mode='r', offset=int(header.get('offset', 0)), shape=shape)
+        signal = LazySignal(raw, transposed=sample_major)
+    else:
+        raise ValueError("Unsupported recording format %r" % extension)
+    return signal, _load_sidecar_spike_timestamps(stem, header)
+
+def recording_files(file_path):
+    """
+    Lists the files a recording is read from: the recording, its JSON header and its spike timestamp sidecar.
+
+    Args:
+        file_path (str): The path of the recording.
+
+    Returns:
+        list: The paths of the files that exist.
+    """
+    stem, extension = os.path.splitext(file_path)
+    files = [file_path, stem + '.json']
+    if extension.lower() != '.mat':
+        files.append(_sidecar_spike_path(stem, _read_header(stem)))
+    return [path for path in files if os.path.exists(path)]
+
 # TODO: Add information about the mapping
 def load_node_mappings():
     with open(r"config/electrode_mapping.json", 'r') as f:
@@ -39,55 +138,52 @@ def generate_amplifier_mapping(amplifier_channel_data):
         mapping[custom_channel_name] = i
     return mapping
 
+def _grid_flat_index():
+    # Electrode order of the 60MEA grid: an 8x8 grid without the four corners, filled row by row
+    grid = np.arange(64).reshape(8, 8)
+    mask = np.ones((8, 8), dtype=bool)
+    mask[[0, 0, 7, 7], [0, 7, 0, 7]] = False
+    return grid[mask]
+
+# Flat position in the 8x8 grid of every electrode, in channel order
+GRID_SHAPE = (8, 8)
+GRID_FLAT_INDEX = _grid_flat_index()
+
 def make_grid_layout(grid_array):
-    layout = np.full((8, 8), np.nan)
-    idx = 0
-    for col in range(1, 7):
-        layout[0, col] = grid_array[idx]
-        idx += 1
-    for col in range(0, 8):
-        layout[1, col] = grid_array[idx]
-        idx += 1
-    for row in range(2, 7):
-        for col in range(0, 8):
-            layout[row, col] = grid_array[idx]
-            idx += 1
-    for col in range(1, 7):
-        layout[7, col] = grid_array[idx]
-        idx += 1
-    return layout
+    layout = np.full(GRID_SHAPE[0] * GRID_SHAPE[1], np.nan)
+    layout[GRID_FLAT_INDEX] = np.asarray(grid_array)[:GRID_FLAT_INDEX.size]
+    return layout.reshape(GRID_SHAPE)
+
+def make_grid_layouts(grid_arrays):
+    """
+    Scatters a (60, frames) array into one 8x8 grid layout per frame in a single gather.
+
+    Args:
+        grid_arrays (numpy.ndarray): The per-channel values of every frame with shape (60, frames).
+
+    Returns:
+        numpy.ndarray: The grid layouts with shape (frames, 8, 8); positions without an electrode are NaN.
+    """
+    grid_arrays = np.asarray(grid_arrays)
+    layouts = np.full((grid_arrays.shape[1], GRID_SHAPE[0] * GRID_SHAPE[1]), np.nan)
+    layouts[:, GRID_FLAT_INDEX] = grid_arrays[:GRID_FLAT_INDEX.size].T
+    return layouts.reshape((-1,) + GRID_SHAPE)
 
 #TODO: Update how the mapping is used (allow mapping to be in seperate config file)
 #TODO: Channel info can be custom, so can the mapping
 # Custom mapping is hard since we need amplifier data to get correct channel map, adding a mapping on top would be ok
-def convert_to_60MEA_mapping(initial_signal, channel_info):
+def convert_to_60MEA_mapping(initial_signal, channel_info, dtype=None):
     """
     Convert the initial signal data to match the 60MEA layout based on the channel information.
 
     Args:
         initial_signal (numpy.ndarray): The initial signal data with shape (N, M), where N is the number of channels and M is the number of samples.
         channel_info (numpy.ndarray): The channel information array with shape (N,) indicating the mapping of each channel.
+        dtype (numpy.dtype): The dtype of the rearranged data. Default is the dtype of the initial signal.
 
     Returns:
-        numpy.ndarray: The rearranged data with shape (60, M) that matches the 60MEA layout.
+        numpy.ndarray: The rearranged data with shape (60, M) that matches the 60MEA layout. For a LazySignal
+        the result is a remapped view and no data is read.
 
     """
-    mapping = load_node_mappings()
-    rearranged_data = np.zeros((60, initial_signal.shape[1]))
-    channel_info = np.where(channel_info == 0, np.nan, channel_info)
-    channel_MEA_map = channel_info.copy()
-    for i in range(len(channel_info)):
-        try:
-            channel_MEA_map[i] = mapping[str(int(channel_info[i]))]
-        except:
-            channel_MEA_map[i] = np.nan
-
-    # rearrange data to match 60MEA layout
-    for i, channel in enumerate(channel_MEA_map):
-        try:
-            if not np.isnan(channel):
-                rearranged_data[i] = initial_signal[int(channel)]
-        except IndexError:
-            pass
-    return rearranged_data
-
+    return ElectrodeMapping.from_json().apply(initial_signal, channel_info, dtype=dtype)
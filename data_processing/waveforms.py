@@ -0,0 +1,128 @@
+# standard imports
+from collections import namedtuple
+
+# third party imports
+import numpy as np
+
+from data_processing.lazy_signal import LazySignal
+
+PAD_MODES = ('constant', 'edge', 'reflect')
+
+Waveforms = namedtuple('Waveforms', ['waveforms', 'channels', 'sample_indices'])
+Waveforms.__doc__ = """
+Spike waveform snippets in one contiguous matrix.
+
+Attributes:
+    waveforms (numpy.ndarray): The snippets with shape (n_spikes, pre + post).
+    channels (numpy.ndarray): The channel of every snippet.
+    sample_indices (numpy.ndarray): The spike sample index of every snippet.
+"""
+
+
+def _window_indices(sample_indices, pre, post, n_samples, pad_mode):
+    # (n_spikes, window) sample positions, mapped into [0, n_samples) according to the padding mode
+    positions = sample_indices[:, np.newaxis] + np.arange(-pre, post)[np.newaxis, :]
+    outside = (positions < 0) | (positions >= n_samples)
+    if pad_mode == 'reflect' and n_samples > 1:
+        period = 2 * (n_samples - 1)
+        positions = np.abs(positions) % period
+        positions = np.where(positions >= n_samples, period - positions, positions)
+    else:
+        positions = np.clip(positions, 0, n_samples - 1)
+    return positions, outside
+
+
+def _gather(row, positions, outside, pad_mode, pad_value, dtype):
+    waveforms = row[positions].astype(dtype, copy=False)
+    if pad_mode == 'constant':
+        waveforms[outside] = pad_value
+    return waveforms
+
+
+def iter_channel_waveforms(signal, spikes, pre, post, pad_mode='constant', pad_value=0.0, dtype=np.float32,
+                           channels=None):
+    """
+    Extracts waveform snippets one channel at a time, reading only the span of the signal each channel needs.
+
+    This is the streaming mode for signals that do not fit in memory.
+
+    Args:
+        signal (numpy.ndarray or LazySignal): The (channels, samples) signal.
+        spikes (SpikeTrains): The spike store.
+        pre (int): The number of samples before each spike.
+        post (int): The number of samples from each spike onwards.
+        pad_mode (str): How samples outside the recording are filled: 'constant' (``pad_value``), 'edge' or
+            'reflect'. Default is 'constant'.
+        pad_value (float): The fill value of the 'constant' mode. Default is 0.
+        dtype (numpy.dtype): The dtype of the snippets. Default is float32.
+        channels (list): The channels to extract. Default is all channels.
+
+    Yields:
+        Waveforms: The snippets of one channel.
+
+    """
+    if pad_mode not in PAD_MODES:
+        raise ValueError("Invalid pad mode %r. Supported modes are %s." % (pad_mode, ', '.join(PAD_MODES)))
+    n_samples = signal.shape[1]
+    for channel in range(spikes.n_channels) if channels is None else channels:
+        sample_indices = spikes.channel(channel)
+        positions, outside = _window_indices(sample_indices, pre, post, n_samples, pad_mode)
+        if sample_indices.size == 0:
+            waveforms = np.zeros((0, pre + post), dtype=dtype)
+        else:
+            first, last = int(positions.min()), int(positions.max()) + 1
+            if isinstance(signal, LazySignal):
+                row = signal.read([channel], first, last)[0]
+            else:
+                row = np.asarray(signal[channel, first:last])
+            waveforms = _gather(row, positions - first, outside, pad_mode, pad_value, dtype)
+        yield Waveforms(waveforms, np.full(sample_indices.size, channel, dtype=np.int64), sample_indices)
+
+
+def extract_waveforms(signal, spikes, pre, post, pad_mode='constant', pad_value=0.0, dtype=np.float32,
+                      chunked=None):
+    """
+    Extracts the waveform snippet around every spike into one contiguous (n_spikes, pre + post) matrix.
+
+    In-memory signals are gathered for all channels in a single strided fancy-index; LazySignals (or
+    ``chunked=True``) are processed channel by channel, reading only the spans that contain spikes.
+    Snippets reaching past the recording edges are padded according to ``pad_mode``, never truncated.
+
+    Args:
+        signal (numpy.ndarray or LazySignal): The (channels, samples) signal.
+        spikes (SpikeTrains): The spike store.
+        pre (int): The number of samples before each spike.
+        post (int): The number of samples from each spike onwards.
+        pad_mode (str): How samples outside the recording are filled: 'constant' (``pad_value``), 'edge' or
+            'reflect'. Default is 'constant'.
+        pad_value (float): The fill value of the 'constant' mode. Default is 0.
+        dtype (numpy.dtype): The dtype of the snippets. Default is float32.
+        chunked (bool): Whether to process channel by channel. Default is True for LazySignals only.
+
+    Returns:
+        Waveforms: The snippets, ordered by channel and then by time, with parallel channel and sample index
+        arrays.
+
+    Raises:
+        ValueError: If the pad mode is invalid.
+
+    """
+    if pad_mode not in PAD_MODES:
+        raise ValueError("Invalid pad mode %r. Supported modes are %s." % (pad_mode, ', '.join(PAD_MODES)))
+    if chunked is None:
+        chunked = isinstance(signal, LazySignal)
+    if chunked:
+        waveforms = np.empty((spikes.n_spikes, pre + post), dtype=dtype)
+        for waveform_block in iter_channel_waveforms(signal, spikes, pre, post, pad_mode, pad_value, dtype):
+            if waveform_block.channels.size:
+                channel = waveform_block.channels[0]
+                waveforms[spikes.offsets[channel]:spikes.offsets[channel + 1]] = waveform_block.waveforms
+        return Waveforms(waveforms, spikes.channel_ids(), spikes.indices)
+
+    signal = np.asarray(signal)
+    positions, outside = _window_indices(spikes.indices, pre, post, signal.shape[1], pad_mode)
+    channels = spikes.channel_ids()
+    waveforms = signal[channels[:, np.newaxis], positions].astype(dtype, copy=False)
+    if pad_mode == 'constant':
+        waveforms[outside] = pad_value
+    return Waveforms(np.ascontiguousarray(waveforms), channels, spikes.indices)
@@ -1,47 +1,62 @@
 from plots.plotting import *
-from data_processing.utils import load_data_from_mat, convert_to_60MEA_mapping
+from data_processing.utils import convert_to_60MEA_mapping
 from data_processing.data_processor import DataProcessor
 from data_processing.utils import load_channel_info_from_json
 import numpy as np
 
-import tkinter as tk
-from tkinter import filedialog, messagebox, simpledialog
-import scipy.io as sio
+import argparse
+import os
 
 from app.index import start_dash
+from data_processing.streaming import StreamingProcessor, RawFileSource, SocketSource
 
-# Global data dictionary to store data that needs to be shared between functions
 # Custom channel_info can be provided
-global_data = {'initial_signal': None, 'spiketimestamps':None, 'sampling_rate': 30000, 'channel_info': load_channel_info_from_json()}
-processor = None
-
-def get_data_file():
-  root = tk.Tk()
-  root.withdraw()
-  file_path = filedialog.askopenfilename(title='Select a file', filetypes=[('MAT files', '*.mat')])
-  if file_path:
-    data = load_data_from_mat(file_path)
-    if data is not None:
-      global_data['initial_signal'], global_data['spiketimestamps'] = data
-      # Prompt the user to enter the sampling rate in a visual window
-      sampling_rate = simpledialog.askinteger("Sampling Rate", "Enter the sampling rate (Hz):")
-      root.destroy()
-      if sampling_rate is not None:
-        global_data['sampling_rate'] = sampling_rate
-        return True
-  root.destroy()
-  return False
-  
-  
-
-def main():
-    isLoaded = get_data_file()
-    if isLoaded:
-        data_processor = DataProcessor(global_data['initial_signal'], global_data['spiketimestamps'], 
-                                       global_data['sampling_rate'], global_data['channel_info'])
-        start_dash(data_processor, global_data['channel_info'])
-    else:
-        exit()
+channel_info = load_channel_info_from_json()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the meaDash dashboard.")
+    parser.add_argument('recording', nargs='?',
+                        help="A recording shown to every session (.mat, .npy or raw binary). Without it, every "
+                             "session opens its own recording on the 'Open recording' page.")
+    parser.add_argument('--sampling-rate', type=float, default=30000, help="Sampling rate in Hz (default: 30000).")
+    parser.add_argument('--data-dir', action='append', default=[],
+                        help="A directory sessions may open recordings from by path; may be repeated.")
+    parser.add_argument('--live', default=None,
+                        help="Follow a recording while it is acquired: a growing sample-major raw file with a JSON "
+                             "header, or HOST:PORT of a TCP stream (e.g. python -m data_processing.streaming).")
+    parser.add_argument('--live-channels', type=int, default=60,
+                        help="Number of channels of a TCP stream (default: 60).")
+    parser.add_argument('--live-threshold', type=float, default=5.0,
+                        help="Spike detection threshold of the live stream in multiples of the noise level.")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to serve on; 0.0.0.0 serves the network.")
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--profile', action='store_true',
+                        help="Time the callbacks and analyses; see /debug/perf and /metrics.")
+    parser.add_argument('--profile-allocations', action='store_true',
+                        help="Also measure the peak allocation of every stage (slower).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data_processor = None
+    if args.recording:
+        # Converted recordings are cached by their fingerprint, so only the first launch parses the file
+        data_processor = DataProcessor.from_recording(args.recording, args.sampling_rate, channel_info)
+    stream = None
+    if args.live:
+        if os.path.exists(args.live):
+            source = RawFileSource.from_header(args.live)
+        else:
+            live_host, live_port = args.live.rsplit(':', 1)
+            source = SocketSource(live_host, int(live_port), args.live_channels)
+        stream = StreamingProcessor(source, args.sampling_rate, channel_info, threshold=args.live_threshold)
+        stream.start()
+    start_dash(data_processor, channel_info, debug=args.debug, data_roots=args.data_dir, host=args.host,
+               port=args.port, stream=stream, profile=args.profile or args.profile_allocations,
+               trace_allocations=args.profile_allocations)
 
 if __name__ == '__main__':
-   main()
\ No newline at end of file
+   main()
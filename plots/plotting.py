@@ -1,67 +1,118 @@
+import base64
 import numpy as np
-from data_processing.utils import make_grid_layout
+from data_processing.utils import make_grid_layout, make_grid_layouts, GRID_FLAT_INDEX, GRID_SHAPE
+from data_processing.spikes import SpikeTrains
 import sciplotlib.style as splstyle
 import matplotlib.pyplot as plt
 import plotly.graph_objects as go
 
-def plot_single_channel_raster(boolean_signal, channel_idx, time_vector, title="Channel Raster Plot", xlabel="Time"):
+def _as_spike_trains(spikes):
+    # Dense rasters are still accepted, but the figures are built from spike indices
+    if isinstance(spikes, SpikeTrains):
+        return spikes
+    return SpikeTrains.from_dense(spikes)
+
+def _sample_times(samples, sampling_rate, start):
+    # Spike times in seconds; no per-sample time vector is built for the range
+    return (start + np.asarray(samples, dtype=np.float64)) / sampling_rate
+
+def plot_single_channel_raster(spikes, channel_idx, sampling_rate, start=0, title="Channel Raster Plot",
+                               xlabel="Time"):
     """
     Plots a raster plot for a single channel.
 
     Parameters:
-    boolean_signal (numpy.ndarray): The boolean signal indicating spike activity.
+    spikes (SpikeTrains or numpy.ndarray): The spike store, or a boolean signal indicating spike activity.
     channel_idx (int): The index of the channel to plot.
-    time_vector: Ranges the time in seconds for the signal
+    sampling_rate (float): The sampling rate of the signal in Hz.
+    start (int, optional): The recording sample of the first sample of ``spikes``. Defaults to 0.
     title (str, optional): The title of the plot. Defaults to "Channel Raster Plot".
     xlabel (str, optional): The label for the x-axis. Defaults to "Time".
 
     Returns:
     plotly.graph_objects.Figure: The generated plotly figure.
     """
-    spike_times = np.where(boolean_signal[channel_idx])[0]
-    spike_time_secs = time_vector[spike_times]
+    spikes = _as_spike_trains(spikes)
+    spike_times = spikes.channel(channel_idx)
+    spike_time_secs = _sample_times(spike_times, sampling_rate, start)
     scatter_trace = go.Scatter(
         x=spike_time_secs,
-        y=[0] * len(spike_times),
+        y=np.zeros(len(spike_times), dtype=np.uint8),
         mode='markers',
         marker=dict(symbol='line-ns-open', size=100),
     )
 
     layout = go.Layout(
         title=title,
-        xaxis=dict(title=xlabel, range=[time_vector[0], time_vector[-1]]),
+        xaxis=dict(title=xlabel, range=list(_sample_times([0, spikes.n_samples - 1], sampling_rate, start))),
         yaxis=dict(visible=False),
     )
     fig = go.Figure(data=[scatter_trace], layout=layout)
     return fig
 
-def plot_raster(boolean_signal, time_vector, title="Channel Raster Plot", xlabel="Time", ylabel="Channel"):
+# Spike counts above which the raster is drawn as an image layer instead of markers
+RASTER_IMAGE_THRESHOLD = 2000000
+
+def plot_raster(spikes, sampling_rate, start=0, title="Channel Raster Plot", xlabel="Time", ylabel="Channel",
+                render='auto', x_range=None, width_px=2000, max_points=200000):
     """
     Plots a raster plot for multiple channels.
 
+    All channels are drawn as one WebGL (Scattergl) trace built directly from the spike indices. When
+    more than ``max_points`` spikes are visible they are decimated to one marker per channel and pixel
+    column, and very dense rasters can be drawn as a single image (heatmap) layer instead.
+
     Parameters:
-    boolean_signal (numpy.ndarray): The boolean signal indicating spike activity.
+    spikes (SpikeTrains or numpy.ndarray): The spike store, or a boolean signal indicating spike activity.
+    sampling_rate (float): The sampling rate of the signal in Hz.
+    start (int, optional): The recording sample of the first sample of ``spikes``. Defaults to 0.
     title (str, optional): The title of the plot. Defaults to "Channel Raster Plot".
     xlabel (str, optional): The label for the x-axis. Defaults to "Time".
     ylabel (str, optional): The label for the y-axis. Defaults to "Channel".
+    render (str, optional): 'webgl', 'image', or 'auto' to use the image layer above RASTER_IMAGE_THRESHOLD
+        visible spikes. Defaults to 'auto'.
+    x_range (tuple, optional): The visible (start, stop) time range in seconds. Defaults to the whole signal.
+    width_px (int, optional): The number of pixel columns used for decimation. Defaults to 2000.
+    max_points (int, optional): The number of markers above which spikes are decimated. Defaults to 200000.
 
     Returns:
     plotly.graph_objects.Figure: The generated plotly figure.
     """
-    num_channels, num_time_points = boolean_signal.shape
-    fig = go.Figure()
-    
-    for channel_idx in range(num_channels):
-        spike_times = np.where(boolean_signal[channel_idx])[0]
-        spike_times_sec = time_vector[spike_times]
-        fig.add_trace(go.Scatter(x=spike_times_sec, y=[channel_idx]*len(spike_times), mode='markers', marker=dict(symbol='line-ns-open', size=5)))
-
+    spikes = _as_spike_trains(spikes)
+    num_channels = spikes.n_channels
+    t_start, t_stop = x_range if x_range is not None else _sample_times([0, spikes.n_samples - 1], sampling_rate,
+                                                                        start)
+    t_span = max(t_stop - t_start, np.finfo(float).eps)
+
+    times = _sample_times(spikes.indices, sampling_rate, start)
+    channels = spikes.channel_ids()
+    visible = (times >= t_start) & (times <= t_stop)
+    times, channels = times[visible], channels[visible]
+    columns = np.minimum(((times - t_start) / t_span * width_px).astype(np.int64), width_px - 1)
+    column_centers = t_start + (np.arange(width_px) + 0.5) * t_span / width_px
+
+    if render == 'auto':
+        render = 'image' if times.size > RASTER_IMAGE_THRESHOLD else 'webgl'
+    if render == 'image':
+        presence = np.bincount(channels * width_px + columns, minlength=num_channels * width_px) > 0
+        trace = go.Heatmap(z=presence.reshape(num_channels, width_px).astype(np.uint8), x=column_centers,
+                           y=np.arange(num_channels), colorscale=[[0, 'white'], [1, 'black']], showscale=False)
+    elif render == 'webgl':
+        if times.size > max_points:
+            keys = np.unique(channels * width_px + columns)
+            channels, times = keys // width_px, column_centers[keys % width_px]
+        trace = go.Scattergl(x=times, y=channels, mode='markers', marker=dict(symbol='line-ns-open', size=5))
+    else:
+        raise ValueError("Invalid render mode %r. Supported modes are 'auto', 'webgl' and 'image'." % render)
+
+    fig = go.Figure(data=[trace])
     fig.update_layout(
         title=title,
         xaxis_title=xlabel,
         yaxis_title=ylabel,
         yaxis=dict(range=[-0.5, num_channels - 0.5], tickvals=list(range(num_channels))),
-        xaxis=dict(range=[time_vector[0], time_vector[-1]]),
+        xaxis=dict(range=[t_start, t_stop]),
+        showlegend=False,
         height=1000
     )
     return fig
@@ -99,7 +150,7 @@ def plot_spike_frequency_heatmap(aggregated_spikes, channel_info, title='Total S
     plotly.graph_objects.Figure: The generated plotly figure.
     """
     layout = make_grid_layout(aggregated_spikes)
-    vmax = np.max(aggregated_spikes)
+    vmax = np.nanmax(aggregated_spikes)
 
     # Create heatmap
     fig = go.Figure(data=go.Heatmap(
@@ -117,29 +168,28 @@ def plot_spike_frequency_heatmap(aggregated_spikes, channel_info, title='Total S
         width=500
     )
     channel_layout = make_grid_layout(channel_info)
-    for i in range(channel_layout.shape[0]):
-        for j in range(channel_layout.shape[1]):
-            if not np.isnan(channel_layout[i, j]):
-                fig.add_annotation(
-                    x=j,
-                    y=i,
-                    text=str(int(channel_layout[i, j])),
-                    showarrow=False,
-                    font=dict(color=text_color, size=text_size)
-                )
+    # One layout update with all labels is much faster than one add_annotation call per channel
+    rows, columns = np.nonzero(~np.isnan(channel_layout))
+    fig.update_layout(annotations=[
+        dict(x=int(j), y=int(i), text=str(int(channel_layout[i, j])), showarrow=False,
+             font=dict(color=text_color, size=text_size))
+        for i, j in zip(rows, columns)
+    ])
     fig.update_xaxes(showticklabels=False)
     fig.update_yaxes(showticklabels=False)
 
     return fig
 
 
-def plot_spike_activity_heatmap(aggregated_spikes, title="Spike Activity Over Time"):
+def plot_spike_activity_heatmap(aggregated_spikes, title="Spike Activity Over Time", client_side=False):
     """
     Plots a heatmap of the spike activity over time.
 
     Parameters:
     aggregated_spikes (numpy.ndarray): The aggregated spike data.
     title (str, optional): The title of the plot. Defaults to "Spike Activity Over Time".
+    client_side (bool, optional): Whether to plot only the first frame, without animation frames and sliders,
+        for frames rendered in the browser from ``spike_activity_frame_data``. Defaults to False.
 
     Returns:
     plotly.graph_objects.Figure: The generated plotly figure.
@@ -155,16 +205,18 @@ def plot_spike_activity_heatmap(aggregated_spikes, title="Spike Activity Over Ti
         ),
         layout=go.Layout(
             title=title,
-            updatemenus=[{"type": "buttons", "buttons": [{"label": "Play",
-                                                          "method": "animate",
-                                                          "args": [None]}]}],
             height=500,
             width=500
         )
     )
-    
-    frames = [go.Frame(data=[go.Heatmap(z=make_grid_layout(aggregated_spikes[:, i]))], 
-                    name=str(i)) for i in range(aggregated_spikes.shape[1])]
+    if client_side:
+        return fig
+
+    fig.update_layout(updatemenus=[{"type": "buttons", "buttons": [{"label": "Play",
+                                                                    "method": "animate",
+                                                                    "args": [None]}]}])
+    frames = [go.Frame(data=[go.Heatmap(z=layout)], name=str(i))
+              for i, layout in enumerate(make_grid_layouts(aggregated_spikes))]
     fig.frames = frames
 
     sliders = [{
@@ -178,6 +230,31 @@ def plot_spike_activity_heatmap(aggregated_spikes, title="Spike Activity Over Ti
     fig.update_layout(sliders=sliders)
     return fig
 
+def spike_activity_frame_data(aggregated_spikes, title="Spike Activity Over Time"):
+    """
+    Packs the spike activity for rendering the heatmap frames in the browser.
+
+    The (buckets x channels) count matrix is sent once as a base64-encoded little-endian int32 array
+    together with the flat 8x8 grid position of every channel; a clientside callback scatters one row
+    into the grid per frame.
+
+    Parameters:
+    aggregated_spikes (numpy.ndarray): The aggregated spike data with shape (channels, buckets).
+    title (str, optional): The title of the plot. Defaults to "Spike Activity Over Time".
+
+    Returns:
+    dict: The frame data for a dcc.Store, including the base figure.
+    """
+    counts = np.ascontiguousarray(np.asarray(aggregated_spikes)[:GRID_FLAT_INDEX.size].T, dtype='<i4')
+    return {
+        'figure': plot_spike_activity_heatmap(aggregated_spikes, title=title, client_side=True),
+        'dtype': 'int32',
+        'shape': list(counts.shape),
+        'bdata': base64.b64encode(counts.tobytes()).decode('ascii'),
+        'grid_index': GRID_FLAT_INDEX.tolist(),
+        'grid_shape': list(GRID_SHAPE),
+    }
+
 def plot_correlation_matrix(electrode_correlation_matrix):
     """
     Plots the correlation matrix.
@@ -196,25 +273,87 @@ def plot_correlation_matrix(electrode_correlation_matrix):
             cbar = fig.colorbar(im)
         return fig
     
-def plot_average_spiking_rate(spikingRate, title='Average Spiking Rate'):
+def plot_correlation_heatmap(correlation_matrix, title='Channel Correlation', zmin=-1, zmax=1):
+    """
+    Plots a (channels x channels) correlation matrix as an interactive heatmap.
+
+    Parameters:
+    correlation_matrix (numpy.ndarray): The correlation matrix.
+    title (str, optional): The title of the plot. Defaults to "Channel Correlation".
+    zmin (float, optional): The minimum value for the color scale. Defaults to -1.
+    zmax (float, optional): The maximum value for the color scale. Defaults to 1.
+
+    Returns:
+    plotly.graph_objects.Figure: The generated plotly figure.
+    """
+    channels = np.arange(correlation_matrix.shape[0])
+    fig = go.Figure(data=go.Heatmap(
+        x=channels,
+        y=channels,
+        z=correlation_matrix,
+        zmin=zmin,
+        zmax=zmax,
+        colorscale='RdBu_r'
+    ))
+    fig.update_layout(
+        title=title,
+        xaxis_title='Channel',
+        yaxis=dict(title='Channel', autorange='reversed', scaleanchor='x'),
+        height=600,
+        width=650
+    )
+    return fig
+
+def plot_cross_correlogram(edges, counts, title='Cross-correlogram'):
+    """
+    Plots a cross-correlogram as a bar chart.
+
+    Parameters:
+    edges (numpy.ndarray): The bin edges of the lags in seconds.
+    counts (numpy.ndarray): The number of spike pairs per bin.
+    title (str, optional): The title of the plot. Defaults to "Cross-correlogram".
+
+    Returns:
+    plotly.graph_objects.Figure: The generated plotly figure.
+    """
+    centers = (edges[:-1] + edges[1:]) / 2
+    fig = go.Figure(data=go.Bar(x=centers * 1000, y=counts, width=np.diff(edges) * 1000, marker_line_width=0))
+    fig.update_layout(
+        title=title,
+        xaxis_title='Lag (ms)',
+        yaxis_title='Spike pairs',
+        bargap=0,
+        showlegend=False
+    )
+    return fig
+
+def plot_average_spiking_rate(spikingRate, title='Average Spiking Rate', envelope=None):
     """
     Plots the average spiking rate of a signal.
 
     Parameters:
     signal (numpy.ndarray): The input signal.
     title (str, optional): The title of the plot. Defaults to "Average Spiking Rate".
+    envelope (numpy.ndarray, optional): The minimum and maximum of the finer-grained rate within every second,
+    with shape (2, seconds), shaded around the rate. Defaults to None.
 
     Returns:
     plotly.graph_objects.Figure: The generated plotly figure.
     """
-    fig = go.Figure(data=go.Scatter(x=np.arange(len(spikingRate)), y=spikingRate))
+    time_vector = np.arange(len(spikingRate))
+    fig = go.Figure()
+    if envelope is not None and envelope.shape[1] == len(spikingRate):
+        fig.add_trace(go.Scatter(x=time_vector, y=envelope[1], mode='lines', line_width=0, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=time_vector, y=envelope[0], mode='lines', line_width=0, fill='tonexty',
+                                 fillcolor='rgba(99, 110, 250, 0.2)', hoverinfo='skip'))
+    fig.add_trace(go.Scatter(x=time_vector, y=spikingRate))
     fig.update_layout(title=title,
                       xaxis_title='Time (s)',
                       yaxis_title='Spikes',
                       showlegend=False)
     return fig
 
-def plot_firing_rate(firing_rate, time_vector, title='Aggregate Firing Rate'):
+def plot_firing_rate(firing_rate, time_vector, title='Aggregate Firing Rate', bursts=None):
     """
     Plots the firing rate over time.
 
@@ -222,6 +361,8 @@ def plot_firing_rate(firing_rate, time_vector, title='Aggregate Firing Rate'):
     time_vector (numpy.ndarray): The time vector.
     firing_rate (numpy.ndarray): The firing rate data.
     title (str, optional): The title of the plot. Defaults to "Aggregate Firing Rate".
+    bursts (numpy.ndarray, optional): The (start, stop) times in seconds of bursts shaded over the rate.
+    Defaults to None.
 
     Returns:
     plotly.graph_objects.Figure: The generated plotly figure.
@@ -233,9 +374,25 @@ def plot_firing_rate(firing_rate, time_vector, title='Aggregate Firing Rate'):
         yaxis_title='Firing Rate (spikes/second)',
         showlegend=False
     )
+    if bursts is not None and len(bursts):
+        # One layout update with all shapes is much faster than one add_vrect call per burst
+        fig.update_layout(shapes=[
+            dict(type='rect', xref='x', yref='paper', x0=start, x1=stop, y0=0, y1=1, fillcolor='orange',
+                 opacity=0.25, layer='below', line_width=0)
+            for start, stop in bursts
+        ])
     return fig
 
-def plot_psd(frequencies, pxx, center_frequency):
+def _psd_frequency_limit(frequencies, pxx, power_fraction=0.99):
+    # The frequency below which ``power_fraction`` of the (channel-summed) power lies, at least a few bins wide
+    power = np.nansum(np.atleast_2d(pxx), axis=0)
+    cumulative = np.cumsum(power)
+    if cumulative[-1] <= 0:
+        return frequencies[-1]
+    index = int(np.searchsorted(cumulative, power_fraction * cumulative[-1]))
+    return frequencies[min(max(index, 4), len(frequencies) - 1)]
+
+def plot_psd(frequencies, pxx, center_frequency, max_frequency=None):
     """
     Plots the power spectral density.
 
@@ -243,15 +400,23 @@ def plot_psd(frequencies, pxx, center_frequency):
     frequencies (numpy.ndarray): The frequency values.
     pxx (numpy.ndarray): The power spectral density values.
     center_frequency (float): The center frequency.
+    max_frequency (float, optional): The upper limit of the frequency axis. Defaults to the frequency below which
+    99% of the power lies.
 
     Returns:
     plotly.graph_objects.Figure: The generated plotly figure.
     """
-    max_pxx = np.max(pxx)
+    if max_frequency is None:
+        max_frequency = max(_psd_frequency_limit(frequencies, pxx), 2 * center_frequency)
+    pxx_db = 10 * np.log10(np.maximum(pxx, np.finfo(float).tiny))
+    shown = frequencies <= max_frequency
+    max_db = float(np.max(pxx_db[shown]))
+    min_db = float(np.min(pxx_db[shown]))
+    margin = max(0.05 * (max_db - min_db), 1)
     # Create traces
     trace0 = go.Scatter(
-        x = frequencies,
-        y = 10 * np.log10(pxx),
+        x = frequencies[shown],
+        y = pxx_db[shown],
         mode = 'lines',
         name = 'PSD',
         line = dict(width=1.8)
@@ -259,7 +424,7 @@ def plot_psd(frequencies, pxx, center_frequency):
 
     trace1 = go.Scatter(
         x = [center_frequency],
-        y = [10 * np.log10(max_pxx)],
+        y = [max_db],
         mode = 'markers',
         name = 'Peak',
         marker = dict(color='red', size=10)
@@ -267,7 +432,7 @@ def plot_psd(frequencies, pxx, center_frequency):
 
     trace2 = go.Scatter(
         x = [center_frequency, center_frequency],
-        y = [14, 10 * np.log10(max_pxx)],
+        y = [min_db - margin, max_db],
         mode = 'lines',
         name = 'Line',
         line = dict(color='black', width=2, dash='dash')
@@ -277,16 +442,49 @@ def plot_psd(frequencies, pxx, center_frequency):
         title='Welch Power Spectral Density for MEA',
         xaxis=dict(
             title='Frequency (Hz)',
-            range=[0, 2],
-            dtick=0.2
+            range=[0, max_frequency]
         ),
         yaxis=dict(
             title='Power/Frequency (dB/Hz)',
-            range=[14, 36],
-            dtick=2
+            range=[min_db - margin, max_db + margin]
         ),
         showlegend=False
     )
 
     fig = go.Figure(data=[trace0, trace1, trace2], layout=layout)
-    return fig
\ No newline at end of file
+    return fig
+
+def plot_channel_psd(frequencies, pxx, title='Power Spectral Density per Channel', max_frequency=None):
+    """
+    Plots the power spectral density of every channel as a (channels x frequencies) heatmap in dB.
+
+    Parameters:
+    frequencies (numpy.ndarray): The frequency values.
+    pxx (numpy.ndarray): The power spectral density with shape (channels, frequencies).
+    title (str, optional): The title of the plot. Defaults to "Power Spectral Density per Channel".
+    max_frequency (float, optional): The upper limit of the frequency axis. Defaults to the frequency below which
+    99% of the power of all channels lies.
+
+    Returns:
+    plotly.graph_objects.Figure: The generated plotly figure.
+    """
+    if max_frequency is None:
+        max_frequency = _psd_frequency_limit(frequencies, pxx)
+    shown = frequencies <= max_frequency
+    with np.errstate(divide='ignore'):
+        pxx_db = 10 * np.log10(pxx[:, shown])
+    pxx_db[~np.isfinite(pxx_db)] = np.nan
+    fig = go.Figure(data=go.Heatmap(
+        x=frequencies[shown],
+        y=np.arange(pxx.shape[0]),
+        z=pxx_db,
+        colorscale='Viridis',
+        colorbar=dict(title='dB/Hz')
+    ))
+    fig.update_layout(
+        title=title,
+        xaxis_title='Frequency (Hz)',
+        yaxis_title='Channel',
+        showlegend=False
+    )
+    return fig
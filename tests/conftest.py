@@ -0,0 +1,21 @@
+# third party imports
+import numpy as np
+import pytest
+
+from data_processing.spikes import SpikeTrains
+
+
+@pytest.fixture
+def raster():
+    """A small dense (channels, samples) spike raster; the last channel is silent."""
+    rng = np.random.default_rng(0)
+    raster = rng.random((6, 5003)) < 0.02
+    raster[-1] = False
+    return raster
+
+
+@pytest.fixture
+def spikes(raster):
+    """The spike store of ``raster``."""
+    return SpikeTrains.from_dense(raster)
+
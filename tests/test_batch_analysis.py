@@ -0,0 +1,42 @@
+# standard imports
+import os
+import time
+
+# third party imports
+import pytest
+
+import batch_analysis
+
+
+def fake_analysis(file_path, output_dir, *args, **kwargs):
+    # Stands in for _analyze_safely in forked workers; a 'crash' recording kills its worker
+    if 'crash' in file_path:
+        os._exit(1)
+    time.sleep(0.05)
+    return {'recording': file_path, 'status': 'ok', 'elapsed_s': 0.05}
+
+
+@pytest.fixture
+def fake_workers(monkeypatch):
+    monkeypatch.setattr(batch_analysis, '_analyze_safely', fake_analysis)
+
+
+def test_output_names_are_unique():
+    assert batch_analysis.output_names(['a/rec.mat', 'b/rec.mat', 'c/other.npy']) == ['rec', 'rec_2', 'other']
+
+
+def test_parse_size():
+    assert batch_analysis.parse_size('4G') == 4 * 2 ** 30
+    assert batch_analysis.parse_size('512mb') == 512 * 2 ** 20
+    assert batch_analysis.parse_size('1000') == 1000
+
+
+def test_dead_worker_only_fails_its_recording(fake_workers, tmp_path):
+    recordings = ['rec%d.mat' % i for i in range(6)]
+    recordings[2] = 'crash.mat'
+    # tasks_per_worker=0 keeps the default (fork) start method, so the workers see the fake analysis
+    rows, run = batch_analysis.run_batch(recordings, str(tmp_path), 1000, None, workers=2, tasks_per_worker=0)
+    assert [row['recording'] for row in rows] == recordings
+    assert [row['status'] for row in rows] == ['ok', 'ok', 'error', 'ok', 'ok', 'ok']
+    assert rows[2]['error'].startswith('BrokenProcessPool')
+    assert run['succeeded'] == 5 and run['failed'] == 1
@@ -0,0 +1,52 @@
+# third party imports
+import numpy as np
+import pytest
+
+from data_processing.binning import bin_spikes, num_bins
+
+
+def dense_bin_spikes(raster, bin_size, include_partial=False, output='count', n_samples=None):
+    # Reference: sample s falls into bin floor(s / bin_size), summed bin by bin over the dense raster
+    n_samples = raster.shape[1] if n_samples is None else n_samples
+    n_bins = int(n_samples // bin_size)
+    if include_partial and n_bins * bin_size < n_samples:
+        n_bins += 1
+    binned = np.zeros((raster.shape[0], n_bins), dtype=np.int64)
+    for b in range(n_bins):
+        start = int(np.ceil(b * bin_size))
+        stop = min(int(np.ceil((b + 1) * bin_size)), n_samples)
+        binned[:, b] = raster[:, start:stop].sum(axis=1)
+    return (binned > 0).astype(np.int64) if output == 'presence' else binned
+
+
+@pytest.mark.parametrize('bin_size', [1, 7, 100, 2.5, 333.3, 5003, 6000])
+@pytest.mark.parametrize('include_partial', [False, True])
+@pytest.mark.parametrize('output', ['count', 'presence'])
+def test_bin_spikes_matches_dense_reference(raster, spikes, bin_size, include_partial, output):
+    expected = dense_bin_spikes(raster, bin_size, include_partial, output)
+    assert np.array_equal(bin_spikes(spikes, bin_size, include_partial, output), expected)
+    assert np.array_equal(bin_spikes(raster, bin_size, include_partial, output), expected)
+
+
+@pytest.mark.parametrize('include_partial', [False, True])
+def test_bin_spikes_limits_samples(raster, spikes, include_partial):
+    expected = dense_bin_spikes(raster, 100, include_partial, n_samples=4950)
+    assert np.array_equal(bin_spikes(spikes, 100, include_partial, n_samples=4950), expected)
+    assert np.array_equal(bin_spikes(raster, 100, include_partial, n_samples=4950), expected)
+
+
+def test_bin_spikes_fractional_near_integer(raster, spikes):
+    # A float width like fs * seconds that is an integer up to rounding bins like the integer width
+    assert np.array_equal(bin_spikes(spikes, 3 * 33.333333333333336), bin_spikes(spikes, 100))
+    assert num_bins(5003, 3 * 33.333333333333336) == 50
+
+
+def test_bin_spikes_dtype(spikes):
+    assert bin_spikes(spikes, 10, dtype=np.int32).dtype == np.int32
+    assert bin_spikes(spikes, 10, output='presence', dtype=bool).dtype == bool
+
+
+@pytest.mark.parametrize('bin_size, output', [(0, 'count'), (-1.5, 'count'), (10, 'rate')])
+def test_bin_spikes_rejects_invalid_arguments(spikes, bin_size, output):
+    with pytest.raises(ValueError):
+        bin_spikes(spikes, bin_size, output=output)
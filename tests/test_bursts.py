@@ -0,0 +1,54 @@
+# third party imports
+import numpy as np
+import pytest
+
+from data_processing.bursts import detect_channel_bursts, detect_network_bursts, summarize_bursts
+from data_processing.spikes import SpikeTrains
+
+SAMPLING_RATE = 1000
+
+
+@pytest.fixture
+def burst_spikes():
+    """Spike trains with known bursts for a maximum inter-spike interval of 100 samples."""
+    trains = [
+        [100, 150, 200, 250, 300, 1000, 2000, 2100, 2200, 2300, 2400],
+        [120, 170, 220, 270, 320, 370, 3000, 3050],
+        [200, 210, 220, 230, 240],
+        [2100, 2150, 2200, 2250, 2300],
+        [],
+    ]
+    channels = np.repeat(np.arange(len(trains)), [len(train) for train in trains])
+    return SpikeTrains.from_channel_samples(channels, np.concatenate(trains).astype(np.int64), len(trains), 5000)
+
+
+def test_channel_bursts(burst_spikes):
+    bursts = detect_channel_bursts(burst_spikes, SAMPLING_RATE, max_isi=0.1, min_spikes=5)
+    assert bursts['channel'].tolist() == [0, 0, 1, 2, 3]
+    assert bursts['start'].tolist() == [100, 2000, 120, 200, 2100]
+    assert bursts['stop'].tolist() == [301, 2401, 371, 241, 2301]
+    assert bursts['n_spikes'].tolist() == [5, 5, 6, 5, 5]
+    assert bursts['rate'][0] == pytest.approx(5 / 0.201)
+
+
+def test_network_bursts_need_simultaneous_channels(burst_spikes):
+    channel_bursts = detect_channel_bursts(burst_spikes, SAMPLING_RATE, max_isi=0.1, min_spikes=5)
+    network = detect_network_bursts(burst_spikes, SAMPLING_RATE, channel_bursts, min_channels=3)
+    # The bursts around 2000 only overlap on two channels
+    assert network.size == 1
+    assert (network['start'][0], network['stop'][0]) == (100, 371)
+    assert network['channels'][0].tolist() == [True, True, True, False, False]
+    assert network['n_channels'][0] == 3 and network['n_spikes'][0] == 16
+    assert detect_network_bursts(burst_spikes, SAMPLING_RATE, channel_bursts, min_channels=2).size == 2
+    assert detect_network_bursts(burst_spikes, SAMPLING_RATE, channel_bursts[:0]).size == 0
+
+
+def test_summary_takes_intervals_within_channels(burst_spikes):
+    bursts = detect_channel_bursts(burst_spikes, SAMPLING_RATE, max_isi=0.1, min_spikes=5)
+    summary = summarize_bursts(bursts, SAMPLING_RATE, duration=5)
+    assert summary['n_bursts'] == 5 and summary['bursts_per_minute'] == 60
+    # Only channel 0 bursts twice
+    assert summary['mean_interval'] == pytest.approx(1.9)
+    assert np.isnan(summary['cv_interval'])
+    empty = summarize_bursts(bursts[:0], SAMPLING_RATE, duration=5)
+    assert empty['n_bursts'] == 0 and np.isnan(empty['mean_duration'])
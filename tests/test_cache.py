@@ -0,0 +1,78 @@
+# third party imports
+import numpy as np
+import pytest
+
+from data_processing.cache import AnalysisCache, cached_analysis, make_key
+
+
+class Analyses:
+    def __init__(self, max_bytes=2 ** 20):
+        self.cache = AnalysisCache(max_bytes)
+        self.calls = 0
+
+    @cached_analysis
+    def rate(self, time_value=1, total=False):
+        self.calls += 1
+        return np.full(4, time_value, dtype=np.float64)
+
+    @cached_analysis
+    def rate_while_cleared(self, time_value=1):
+        # The data changes while the result is computed
+        self.cache.clear()
+        return np.zeros(4)
+
+
+def test_key_binds_defaults_and_keywords():
+    analyses = Analyses()
+    first = analyses.rate(1)
+    assert analyses.rate(time_value=1) is first
+    assert analyses.rate(1, False) is first
+    assert analyses.calls == 1
+    analyses.rate(2)
+    assert analyses.calls == 2
+
+
+def test_key_of_arrays_depends_on_content_dtype_and_shape():
+    values = np.arange(6)
+    assert make_key('f', {'x': values}) == make_key('f', {'x': values.copy()})
+    assert make_key('f', {'x': values}) != make_key('f', {'x': values[::-1]})
+    assert make_key('f', {'x': values}) != make_key('f', {'x': values.astype(np.int32)})
+    assert make_key('f', {'x': values}) != make_key('f', {'x': values.reshape(2, 3)})
+    assert make_key('f', {'x': {'a': 1, 'b': 2}}) == make_key('f', {'x': {'b': 2, 'a': 1}})
+    assert make_key('f', {'x': np.int64(3)}) == make_key('f', {'x': 3})
+
+
+def test_results_are_read_only():
+    result = Analyses().rate()
+    with pytest.raises(ValueError):
+        result[0] = 5
+
+
+def test_least_recently_used_entries_are_evicted_by_bytes():
+    cache = AnalysisCache(max_bytes=3000)
+    for name in 'abc':
+        cache.put(name, np.zeros(100))
+    assert cache.get('a') is not None
+    cache.put('d', np.zeros(100))
+    assert 'b' not in cache and 'a' in cache and 'd' in cache
+    assert cache.nbytes == 2400
+    assert cache.stats()['evictions'] == 1
+
+
+def test_results_over_budget_are_not_stored():
+    cache = AnalysisCache(max_bytes=100)
+    assert cache.put('big', np.zeros(100)).shape == (100,)
+    assert 'big' not in cache and cache.nbytes == 0
+
+
+def test_results_computed_before_clear_are_not_stored():
+    analyses = Analyses()
+    analyses.rate_while_cleared()
+    assert len(analyses.cache) == 0
+    cache = AnalysisCache()
+    generation = cache.generation
+    cache.clear()
+    cache.put('stale', np.zeros(4), generation)
+    assert 'stale' not in cache
+    cache.put('fresh', np.zeros(4), cache.generation)
+    assert 'fresh' in cache
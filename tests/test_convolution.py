@@ -0,0 +1,69 @@
+# third party imports
+import numpy as np
+import pytest
+import scipy.signal as ssignal
+
+from data_processing.convolution import convolve_spike_trains
+
+
+def dense_convolve(raster, kernel, origin):
+    # Reference: every channel convolved with the full kernel; ``origin`` is the kernel tap aligned with a spike
+    return np.stack([np.convolve(train, kernel)[origin:origin + raster.shape[1]] for train in raster.astype(float)])
+
+
+def boxcar_reference(raster, width):
+    # The convolution of the original DataProcessor.convolve_signal, computed directly so the sums are exact
+    kernel = ssignal.windows.boxcar(width)
+    return np.stack([ssignal.convolve(train, kernel, mode='same', method='direct')
+                     for train in raster.astype(float)])
+
+
+def dual_exp_reference(raster, tau_decay, tau_rise, area):
+    n = np.arange(int(40 * tau_decay))
+    kernel = np.exp(-n / tau_decay) - np.exp(-n / tau_rise)
+    return dense_convolve(raster, kernel * area / kernel.sum(), 0)
+
+
+def gaussian_reference(raster, fwhm, area):
+    sigma = fwhm / (2 * np.sqrt(2 * np.log(2)))
+    half_width = max(int(np.ceil(4 * sigma)), 1)
+    lags = np.arange(-half_width, half_width + 1)
+    kernel = np.exp(-0.5 * (lags / sigma) ** 2)
+    return dense_convolve(raster, kernel * area / kernel.sum(), half_width)
+
+
+@pytest.mark.parametrize('width', [1, 2, 25, 100, 6000])
+def test_boxcar_matches_dense_reference(raster, spikes, width):
+    expected = boxcar_reference(raster, width)
+    assert np.array_equal(convolve_spike_trains(spikes, width), expected)
+    assert np.array_equal(convolve_spike_trains(spikes, width, sum_channels=True), expected.sum(axis=0))
+
+
+@pytest.mark.parametrize('width', [5, 40])
+def test_dual_exp_matches_dense_reference(raster, spikes, width):
+    expected = dual_exp_reference(raster, width, width / 10.0, width)
+    assert np.allclose(convolve_spike_trains(spikes, width, 'dual_exp'), expected, atol=1e-9)
+    assert np.allclose(convolve_spike_trains(spikes, width, 'dual_exp', tau_rise=2.0),
+                       dual_exp_reference(raster, width, 2.0, width), atol=1e-9)
+
+
+@pytest.mark.parametrize('width', [1, 10, 60])
+def test_gaussian_matches_dense_reference(raster, spikes, width):
+    expected = gaussian_reference(raster, width, width)
+    assert np.allclose(convolve_spike_trains(spikes, width, 'gaussian'), expected, atol=1e-9)
+    assert np.allclose(convolve_spike_trains(spikes, width, 'gaussian', sum_channels=True), expected.sum(axis=0),
+                       atol=1e-9)
+
+
+@pytest.mark.parametrize('conv_type', ['boxcar', 'dual_exp', 'gaussian'])
+def test_float32_output_is_close_to_float64(spikes, conv_type):
+    reference = convolve_spike_trains(spikes, 20, conv_type)
+    convolved = convolve_spike_trains(spikes, 20, conv_type, dtype=np.float32)
+    assert convolved.dtype == np.float32
+    assert np.allclose(convolved, reference, atol=1e-4 * reference.max())
+
+
+@pytest.mark.parametrize('width, conv_type', [(0, 'boxcar'), (10, 'triangle')])
+def test_convolve_rejects_invalid_arguments(spikes, width, conv_type):
+    with pytest.raises(ValueError):
+        convolve_spike_trains(spikes, width, conv_type)
@@ -0,0 +1,63 @@
+# third party imports
+import numpy as np
+import pytest
+
+from data_processing.binning import bin_spikes
+from data_processing.correlation import cross_correlogram, pearson_matrix, sttc_matrix
+
+
+def naive_sttc(a, b, dt, n_samples):
+    # Direct transcription of Cutts & Eglen (2014)
+    def tiling(train):
+        covered = np.zeros(n_samples, dtype=bool)
+        for spike in train:
+            covered[max(spike - dt, 0):min(spike + dt, n_samples)] = True
+        return covered.mean()
+
+    def fraction(x, y):
+        return np.mean([np.abs(y - spike).min() <= dt for spike in x])
+
+    p_a, p_b, t_a, t_b = fraction(a, b), fraction(b, a), tiling(a), tiling(b)
+    return 0.5 * ((p_a - t_b) / (1 - p_a * t_b) + (p_b - t_a) / (1 - p_b * t_a))
+
+
+def naive_correlogram(a, b, edges, bin_size, autocorrelation):
+    lags = (b[np.newaxis, :] - a[:, np.newaxis]).ravel()
+    lags = lags[(lags >= edges[0]) & (lags < edges[-1])]
+    if autocorrelation:
+        lags = lags[lags != 0]
+    return np.bincount((lags - edges[0]) // bin_size, minlength=edges.size - 1)
+
+
+def test_pearson_matches_corrcoef(spikes):
+    counts = bin_spikes(spikes, 50)
+    correlation = pearson_matrix(counts)
+    # The last channel is silent and has no variance
+    assert np.allclose(correlation[:-1, :-1], np.corrcoef(counts[:-1]))
+    assert np.isnan(correlation[-1]).all() and np.isnan(correlation[:, -1]).all()
+
+
+def test_sttc_matches_definition(spikes):
+    sttc = sttc_matrix(spikes, 20)
+    assert np.allclose(sttc, sttc.T, equal_nan=True)
+    for a in range(spikes.n_channels - 1):
+        for b in range(spikes.n_channels - 1):
+            expected = naive_sttc(spikes.channel(a), spikes.channel(b), 20, spikes.n_samples)
+            assert sttc[a, b] == pytest.approx(expected)
+    assert np.isnan(sttc[-1]).all()
+
+
+@pytest.mark.parametrize('bin_size, max_lag', [(1, 10), (7, 100), (25, 60)])
+def test_cross_correlogram_matches_all_pairs(spikes, bin_size, max_lag):
+    a, b = spikes.channel(0), spikes.channel(1)
+    edges, histogram = cross_correlogram(a, b, max_lag, bin_size, chunk_spikes=16)
+    assert edges[-1] >= max_lag and np.all(np.diff(edges) == bin_size)
+    assert np.array_equal(histogram, naive_correlogram(a, b, edges, bin_size, False))
+    edges, histogram = cross_correlogram(a, a, max_lag, bin_size, autocorrelation=True)
+    assert np.array_equal(histogram, naive_correlogram(a, a, edges, bin_size, True))
+
+
+def test_identical_channels_keep_synchronous_pairs(spikes):
+    train = spikes.channel(2)
+    edges, histogram = cross_correlogram(train, train, 5, 1)
+    assert histogram[np.flatnonzero(edges == 0)[0]] == train.size
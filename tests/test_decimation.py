@@ -0,0 +1,62 @@
+# standard imports
+import threading
+
+# third party imports
+import numpy as np
+import pytest
+
+from data_processing.decimation import MinMaxPyramid, minmax_envelope
+
+
+class BlockingSignal:
+    """A (channels, samples) signal whose reads of one channel wait for an event."""
+
+    def __init__(self, array, blocked_channel):
+        self.array = array
+        self.shape = array.shape
+        self.blocked_channel = blocked_channel
+        self.release = threading.Event()
+        self.reads = [0] * array.shape[0]
+
+    def __getitem__(self, key):
+        channel = key[0]
+        self.reads[channel] += 1
+        if channel == self.blocked_channel:
+            assert self.release.wait(timeout=10)
+        return self.array[key]
+
+
+@pytest.fixture
+def signal():
+    return np.random.default_rng(0).standard_normal((3, 10000))
+
+
+def test_levels_match_envelopes(signal):
+    pyramid = MinMaxPyramid(signal, base_bucket=16, factor=4)
+    levels = pyramid.levels(1)
+    for level, (mins, maxs) in enumerate(levels):
+        expected_mins, expected_maxs = minmax_envelope(signal[1], 16 * 4 ** level)
+        assert np.allclose(mins, expected_mins) and np.allclose(maxs, expected_maxs)
+    assert levels[-1][0].size <= 4
+    assert pyramid.levels(1) is levels
+
+
+def test_query_returns_full_resolution_for_short_ranges(signal):
+    positions, values = MinMaxPyramid(signal).query(0, 100, 300, n_points=200)
+    assert np.array_equal(positions, np.arange(100, 300)) and np.array_equal(values, signal[0, 100:300])
+
+
+def test_building_one_channel_does_not_block_others(signal):
+    source = BlockingSignal(signal, blocked_channel=0)
+    pyramid = MinMaxPyramid(source, base_bucket=16)
+    results = {}
+    threads = [threading.Thread(target=lambda: results.setdefault(0, pyramid.levels(0))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    # Channel 0 is still being built
+    results[1] = pyramid.levels(1)
+    source.release.set()
+    for thread in threads:
+        thread.join()
+    assert source.reads[0] == 1
+    assert np.allclose(results[0][0][0], minmax_envelope(signal[0], 16)[0])
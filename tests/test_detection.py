@@ -0,0 +1,56 @@
+# third party imports
+import numpy as np
+import pytest
+
+from data_processing.detection import detect_spikes, enforce_refractory_period, estimate_noise_levels
+
+SAMPLING_RATE = 10000
+
+
+@pytest.fixture
+def recording():
+    """Unit-variance noise with negative spikes of amplitude 20 at known samples; the last channel is flat."""
+    rng = np.random.default_rng(0)
+    signal = rng.standard_normal((3, 50000)).astype(np.float32)
+    signal[2] = 0
+    spike_samples = {0: [1000, 9998, 10003, 30000], 1: [5000, 5005, 45000]}
+    for channel, samples in spike_samples.items():
+        signal[channel, samples] = -20
+    return signal, spike_samples
+
+
+def test_noise_levels_estimate_the_standard_deviation(recording):
+    signal, _ = recording
+    noise = estimate_noise_levels(signal, SAMPLING_RATE)
+    assert np.allclose(noise[:2], 1, atol=0.05) and noise[2] == 0
+
+
+def test_detects_injected_spikes(recording):
+    signal, spike_samples = recording
+    # Spikes closer than the refractory period (5005 after 5000) are dropped
+    spikes = detect_spikes(signal, SAMPLING_RATE, refractory_period=0.001)
+    assert spikes.channel(0).tolist() == [1000, 9998, 30000]
+    assert spikes.channel(1).tolist() == [5000, 45000]
+    assert spikes.channel(2).size == 0
+
+
+@pytest.mark.parametrize('n_workers', [None, 2])
+def test_chunks_match_a_single_block(recording, n_workers):
+    signal, _ = recording
+    whole = detect_spikes(signal, SAMPLING_RATE, polarity='both', chunk_duration=10)
+    # Chunk boundaries at every 10000 samples fall between the spikes at 9998 and 10003
+    chunked = detect_spikes(signal, SAMPLING_RATE, polarity='both', chunk_duration=1, n_workers=n_workers)
+    assert np.array_equal(chunked.offsets, whole.offsets) and np.array_equal(chunked.indices, whole.indices)
+
+
+def test_positive_polarity_ignores_negative_spikes(recording):
+    signal, _ = recording
+    assert detect_spikes(signal, SAMPLING_RATE, polarity='positive').n_spikes == 0
+    with pytest.raises(ValueError):
+        detect_spikes(signal, SAMPLING_RATE, polarity='up')
+
+
+def test_refractory_period_resolves_chains():
+    channels, samples = enforce_refractory_period(np.array([0, 0, 0, 0, 1]), np.array([0, 3, 6, 9, 1]), 5)
+    # 3 is dropped for 0, so 6 is kept, and 9 is dropped for 6
+    assert channels.tolist() == [0, 0, 1] and samples.tolist() == [0, 6, 1]
@@ -0,0 +1,104 @@
+# standard imports
+import gc
+
+# third party imports
+import numpy as np
+import pytest
+
+from data_processing.lazy_signal import LazySignal, read_block
+from data_processing.utils import load_recording
+
+
+class CountingSource:
+    """An array-like source that counts the reads reaching it."""
+
+    def __init__(self, array):
+        self.array = array
+        self.shape = array.shape
+        self.dtype = array.dtype
+        self.reads = 0
+
+    def __getitem__(self, key):
+        self.reads += 1
+        return self.array[key]
+
+
+@pytest.fixture
+def signal():
+    return np.random.default_rng(0).standard_normal((8, 1000)).astype(np.float32)
+
+
+@pytest.fixture(params=['memmap', 'memmap-transposed', 'hdf5'])
+def lazy(request, signal, tmp_path):
+    if request.param == 'hdf5':
+        h5py = pytest.importorskip('h5py')
+        with h5py.File(tmp_path / 'signal.h5', 'w') as f:
+            f['signal'] = signal.T
+        h5_file = h5py.File(tmp_path / 'signal.h5', 'r')
+        yield LazySignal(h5_file['signal'], transposed=True, file=h5_file)
+        h5_file.close()
+        return
+    transposed = request.param == 'memmap-transposed'
+    np.save(tmp_path / 'signal.npy', signal.T if transposed else signal)
+    yield LazySignal(np.load(tmp_path / 'signal.npy', mmap_mode='r'), transposed=transposed)
+
+
+@pytest.mark.parametrize('channels, start, stop', [(range(8), 0, None), ([5, 1, 5, 0], 100, 400), ([7], 990, 2000),
+                                                   ([2, 3], 500, 500)])
+def test_read_matches_array(lazy, signal, channels, start, stop):
+    expected = signal[list(channels), start:stop]
+    assert np.array_equal(lazy.read(np.asarray(channels), start, stop), expected)
+    assert np.array_equal(read_block(lazy, start, stop or 1000, np.asarray(channels)), expected)
+
+
+def test_remapped_read_fills_missing_channels_with_zeros(lazy, signal):
+    remapped = lazy.remap([3, -1, 0, 3])
+    expected = np.stack([signal[3], np.zeros(1000, dtype=np.float32), signal[0], signal[3]])
+    assert np.array_equal(remapped.read(np.arange(4)), expected)
+    assert np.array_equal(remapped[1:3, 10:20], expected[1:3, 10:20])
+    assert np.array_equal(np.asarray(remapped), expected)
+
+
+@pytest.mark.parametrize('transposed', [False, True])
+def test_read_reads_the_source_once(signal, transposed):
+    source = CountingSource(signal.T if transposed else signal)
+    lazy = LazySignal(source, transposed=transposed).remap([7, 2, -1, 2, 0])
+    block = lazy.read(np.arange(5), 10, 60)
+    assert source.reads == 1
+    assert np.array_equal(block[3], signal[2, 10:60])
+
+
+@pytest.fixture
+def mat_file(signal, tmp_path):
+    h5py = pytest.importorskip('h5py')
+    path = tmp_path / 'recording.mat'
+    # A MATLAB v7.3 file is HDF5 with a 512-byte user block holding the MATLAB header
+    with h5py.File(path, 'w', userblock_size=512) as f:
+        f['filteredSignal'] = signal.T
+        f['spiketimestamps'] = np.zeros((3, signal.shape[0]))
+    with open(path, 'r+b') as f:
+        f.write(b'MATLAB 7.3 MAT-file')
+    return str(path)
+
+
+def test_close_releases_hdf5_file(mat_file, signal):
+    lazy, _ = load_recording(mat_file)
+    remapped = lazy.remap([1, 0])
+    assert np.array_equal(remapped.read([0]), signal[[1]])
+    dataset = lazy.source
+    lazy.close()
+    assert not dataset.id.valid
+    with pytest.raises(Exception):
+        remapped.read([0])
+
+
+def test_hdf5_file_is_closed_with_its_last_view(mat_file):
+    lazy, _ = load_recording(mat_file)
+    remapped = lazy.remap([1, 0])
+    dataset = lazy.source
+    del lazy
+    gc.collect()
+    assert dataset.id.valid
+    del remapped
+    gc.collect()
+    assert not dataset.id.valid
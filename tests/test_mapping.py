@@ -0,0 +1,67 @@
+# standard imports
+import json
+import os
+
+# third party imports
+import numpy as np
+import pytest
+
+from data_processing.lazy_signal import LazySignal
+from data_processing.mapping import ElectrodeMapping
+
+
+@pytest.fixture
+def mapping():
+    # Electrode 12 is on row 2, 21 on row 0, 34 on row 5 (beyond a 4-row recording)
+    return ElectrodeMapping({'12': 2, '21': 0, '34': 5}, n_electrodes=4)
+
+
+def test_gather_index_marks_missing_electrodes(mapping):
+    index, valid = mapping.gather_index(np.array([21, 0, 12, 99]))
+    assert index.tolist() == [0, -1, 2, -1]
+    assert valid.tolist() == [True, False, True, False]
+    index, valid = mapping.gather_index(np.array([34, 12, np.nan, 21]), n_source_channels=4)
+    assert index.tolist() == [-1, 2, -1, 0]
+
+
+def test_gather_index_is_cached_and_read_only(mapping):
+    channel_info = np.array([21, 0, 12, 34])
+    index, _ = mapping.gather_index(channel_info)
+    assert mapping.gather_index(channel_info.copy())[0] is index
+    with pytest.raises(ValueError):
+        index[0] = 1
+
+
+@pytest.mark.parametrize('entries', [{'12': 'floating'}, {'12': -1}, {'12': 1, '21': 1}])
+def test_invalid_mappings_are_rejected(entries):
+    with pytest.raises(ValueError):
+        ElectrodeMapping(entries)
+
+
+@pytest.mark.parametrize('dtype', [None, np.float32])
+def test_apply_gathers_rows(mapping, dtype):
+    data = np.arange(24, dtype=np.float64).reshape(4, 6)
+    rearranged = mapping.apply(data, np.array([21, 0, 12, 34]), dtype=dtype)
+    assert rearranged.dtype == (dtype or np.float64)
+    assert np.array_equal(rearranged, [data[0], np.zeros(6), data[2], np.zeros(6)])
+
+
+def test_apply_remaps_lazy_signals_without_reading(mapping):
+    data = np.arange(24, dtype=np.float32).reshape(4, 6)
+    remapped = mapping.apply(LazySignal(data), np.array([21, 0, 12, 34]))
+    assert isinstance(remapped, LazySignal)
+    assert np.array_equal(np.asarray(remapped), mapping.apply(data, np.array([21, 0, 12, 34])))
+
+
+def test_from_json_reloads_changed_configs(tmp_path):
+    path = str(tmp_path / 'mapping.json')
+    with open(path, 'w') as f:
+        json.dump({'amplifier_channel_map': {'12': 0}}, f)
+    first = ElectrodeMapping.from_json(path)
+    assert ElectrodeMapping.from_json(path) is first and first.n_electrodes == 60
+    with open(path, 'w') as f:
+        json.dump({'amplifier_channel_map': {'12': 1}, 'n_electrodes': 4}, f)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    second = ElectrodeMapping.from_json(path)
+    assert second.amplifier_channel_map == {12: 1} and second.n_electrodes == 4
@@ -0,0 +1,54 @@
+# third party imports
+import numpy as np
+import pytest
+
+from data_processing.data_processor import DataProcessor
+from data_processing.precision import PRECISION_POLICIES, get_precision_policy
+
+SAMPLING_RATE = 1000
+
+
+def make_processor(raster, precision):
+    signal = np.random.default_rng(0).standard_normal(raster.shape)
+    return DataProcessor(signal, raster, SAMPLING_RATE, np.arange(raster.shape[0]), remap=False,
+                         precision=precision)
+
+
+def test_policy_resolution(monkeypatch):
+    monkeypatch.delenv('MEADASH_PRECISION', raising=False)
+    assert get_precision_policy() is PRECISION_POLICIES['compact']
+    monkeypatch.setenv('MEADASH_PRECISION', 'float64')
+    assert get_precision_policy() is PRECISION_POLICIES['float64']
+    assert get_precision_policy(PRECISION_POLICIES['compact']) is PRECISION_POLICIES['compact']
+    with pytest.raises(ValueError):
+        get_precision_policy('float16')
+
+
+def test_integer_dtypes_widen_for_long_recordings():
+    compact = PRECISION_POLICIES['compact']
+    assert compact.index_dtype_for(2 ** 31 - 1) == np.int32
+    assert compact.index_dtype_for(2 ** 31) == np.int64
+    assert compact.count_dtype_for(2 ** 40) == np.int64
+    assert compact.signal_dtype_for(np.float64) == np.float32
+    assert compact.signal_dtype_for(np.int16) == np.int16
+
+
+def test_memory_mapped_signals_are_not_copied(tmp_path):
+    np.save(tmp_path / 'signal.npy', np.zeros((2, 10)))
+    signal = np.load(tmp_path / 'signal.npy', mmap_mode='r')
+    assert PRECISION_POLICIES['compact'].cast_signal(signal) is signal
+
+
+def test_compact_results_match_float64(raster):
+    compact, wide = make_processor(raster, 'compact'), make_processor(raster, 'float64')
+    assert compact.initial_signal.dtype == np.float32 and wide.initial_signal.dtype == np.float64
+    assert compact.spikes.indices.dtype == np.int32 and wide.spikes.indices.dtype == np.int64
+    assert compact.create_raster().dtype == np.bool_
+    assert np.array_equal(compact.create_raster(), wide.create_raster())
+    counts = compact.aggregate_raster_spike_counts(time_value=1)
+    assert counts.dtype == np.int32
+    assert np.array_equal(counts, wide.aggregate_raster_spike_counts(time_value=1))
+    rate = compact.convolve_signal(0.05, 'gaussian', sum_channels=True)
+    reference = wide.convolve_signal(0.05, 'gaussian', sum_channels=True)
+    assert rate.dtype == np.float32 and reference.dtype == np.float64
+    assert np.allclose(rate, reference, atol=1e-4 * reference.max())
@@ -0,0 +1,77 @@
+# standard imports
+import base64
+import os
+
+# third party imports
+import numpy as np
+import pytest
+
+from app.sessions import SAMPLING_RATE_RANGE, SessionRegistry, clamp_parameter, max_request_bytes, recording_spec
+
+
+@pytest.fixture
+def registry(tmp_path):
+    data_root = tmp_path / 'data'
+    data_root.mkdir()
+    (data_root / 'rec.npy').touch()
+    return SessionRegistry(np.arange(60), data_roots=[str(data_root)], upload_dir=str(tmp_path / 'uploads'),
+                           upload_max_bytes=1000)
+
+
+def data_url(data):
+    return 'data:application/octet-stream;base64,' + base64.b64encode(data).decode()
+
+
+def test_validate_returns_the_real_path_and_clamped_numbers(registry, tmp_path):
+    spec = registry.validate({'file_path': str(tmp_path / 'data' / 'sub' / '..' / 'rec.npy'),
+                              'sampling_rate': 1e9, 'threshold': '0.5'})
+    assert spec == recording_spec(os.path.realpath(tmp_path / 'data' / 'rec.npy'), SAMPLING_RATE_RANGE[1], 1.0)
+    assert registry.validate(None) == recording_spec()
+
+
+@pytest.mark.parametrize('relative', ['../secret.npy', 'sub/../../secret.npy', '../data-other/rec.npy'])
+def test_paths_outside_the_data_directories_are_rejected(registry, tmp_path, relative):
+    with pytest.raises(PermissionError):
+        registry.validate({'file_path': str(tmp_path / 'data' / relative), 'sampling_rate': 1000})
+
+
+def test_symlinks_out_of_the_data_directories_are_rejected(registry, tmp_path):
+    (tmp_path / 'secret.npy').touch()
+    os.symlink(tmp_path / 'secret.npy', tmp_path / 'data' / 'link.npy')
+    with pytest.raises(PermissionError):
+        registry.validate({'file_path': str(tmp_path / 'data' / 'link.npy'), 'sampling_rate': 1000})
+
+
+@pytest.mark.parametrize('spec', ['rec.npy', {'file_path': 5, 'sampling_rate': 1000},
+                                  {'file_path': 'rec.npy', 'sampling_rate': float('nan')}])
+def test_malformed_specs_are_rejected(registry, tmp_path, spec):
+    if isinstance(spec, dict) and spec['file_path'] == 'rec.npy':
+        spec = dict(spec, file_path=str(tmp_path / 'data' / 'rec.npy'))
+    with pytest.raises(ValueError):
+        registry.validate(spec)
+
+
+def test_clamp_parameter():
+    assert clamp_parameter('20', (1, 10)) == 10
+    assert clamp_parameter(-3, (1, 10)) == 1
+    with pytest.raises(ValueError):
+        clamp_parameter(float('inf'), (1, 10))
+
+
+def test_uploads_are_content_addressed_and_stay_in_the_upload_directory(registry, tmp_path):
+    path = registry.save_upload('../../escape.npy', data_url(b'abc'))
+    assert os.path.dirname(path) == str(tmp_path / 'uploads') and path.endswith('_escape.npy')
+    assert registry.save_upload('../../escape.npy', data_url(b'abc')) == path
+    assert registry.validate({'file_path': path, 'sampling_rate': 1000})['file_path'] == os.path.realpath(path)
+
+
+@pytest.mark.parametrize('contents', [data_url(b'x' * 1001), data_url(b'x' * 2000), 'not a data url',
+                                      'data:;base64,!!!'])
+def test_invalid_uploads_are_rejected(registry, contents):
+    with pytest.raises(ValueError):
+        registry.save_upload('rec.npy', contents)
+    assert not os.path.exists(registry.upload_dir) or os.listdir(registry.upload_dir) == []
+
+
+def test_request_limit_fits_the_largest_upload():
+    assert max_request_bytes(1000) >= len(data_url(b'x' * 1000))
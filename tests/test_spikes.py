@@ -0,0 +1,83 @@
+# third party imports
+import numpy as np
+import pytest
+
+from data_processing.data_processor import DataProcessor
+from data_processing.spikes import SpikeTrains
+
+
+def test_from_dense_matches_raster(raster, spikes):
+    assert spikes.n_channels == raster.shape[0]
+    assert spikes.n_samples == raster.shape[1]
+    assert spikes.n_spikes == raster.sum()
+    assert np.array_equal(spikes.counts(), raster.sum(axis=1))
+    assert np.array_equal(spikes.channel_ids(), np.nonzero(raster)[0])
+    for channel in range(raster.shape[0]):
+        assert np.array_equal(spikes.channel(channel), np.flatnonzero(raster[channel]))
+
+
+@pytest.mark.parametrize('start, stop', [(0, None), (3, 4001), (8, 16), (4990, 9000)])
+def test_to_dense_matches_raster(raster, spikes, start, stop):
+    assert np.array_equal(spikes.to_dense(start, stop, dtype=bool), raster[:, start:stop])
+
+
+def test_from_padded_round_trip(raster):
+    # Padded with 0 like the .mat files, so a spike at sample 0 is dropped
+    counts = raster.sum(axis=1)
+    padded = np.zeros((raster.shape[0], counts.max()))
+    for channel in range(raster.shape[0]):
+        padded[channel, :counts[channel]] = np.flatnonzero(raster[channel])
+    restored = SpikeTrains.from_padded(padded, raster.shape[1])
+    expected = raster.copy()
+    expected[:, 0] = False
+    assert np.array_equal(restored.to_dense(dtype=bool), expected)
+    assert np.array_equal(restored.channel_ids(), np.nonzero(expected)[0])
+
+
+def test_from_padded_drops_invalid_entries():
+    padded = np.array([[5, 5, 2, np.nan, -1, 0], [12, 9, 0, 0, 0, 0]])
+    spikes = SpikeTrains.from_padded(padded, 10)
+    assert spikes.channel(0).tolist() == [2, 5]
+    assert spikes.channel(1).tolist() == [9]
+
+
+def test_from_channel_samples_sorts_and_collapses_duplicates():
+    spikes = SpikeTrains.from_channel_samples(np.array([1, 0, 1, 1, 2]), np.array([7, 3, 2, 7, 0]), 3, 10)
+    assert spikes.offsets.tolist() == [0, 1, 3, 4]
+    assert spikes.indices.tolist() == [3, 2, 7, 0]
+
+
+@pytest.mark.parametrize('start, stop', [(0, None), (0, 5003), (100, 2000), (4999, 5003), (-50, 300), (4000, 9000),
+                                         (1234, 1234), (3000, 1000)])
+def test_window_matches_dense_slice(raster, spikes, start, stop):
+    window = spikes.window(start, stop)
+    clipped_stop = raster.shape[1] if stop is None else min(stop, raster.shape[1])
+    clipped_start = min(max(start, 0), clipped_stop)
+    expected = raster[:, clipped_start:clipped_stop]
+    assert window.n_samples == expected.shape[1]
+    assert np.array_equal(window.to_dense(dtype=bool), expected)
+    assert np.array_equal(window.counts(), expected.sum(axis=1))
+    for channel in range(raster.shape[0]):
+        assert np.array_equal(window.channel(channel), np.flatnonzero(expected[channel]))
+
+
+def test_window_of_window(raster, spikes):
+    assert np.array_equal(spikes.window(1000, 4000).window(500, 1500).to_dense(dtype=bool), raster[:, 1500:2500])
+
+
+@pytest.mark.parametrize('t_start, t_stop, expected', [(None, None, (0, 5003)), (1.2345, 2.0001, (1234, 2001)),
+                                                       (-1, 10, (0, 5003)), (4, 3, (3000, 3000))])
+def test_spike_window_of_a_time_range(raster, spikes, t_start, t_stop, expected):
+    processor = DataProcessor(np.zeros(raster.shape, dtype=np.float32), spikes, 1000, np.arange(6), remap=False)
+    assert processor.sample_range(t_start, t_stop) == expected
+    assert np.array_equal(processor.get_spike_window(t_start, t_stop).to_dense(dtype=bool),
+                          raster[:, slice(*expected)])
+
+
+@pytest.mark.parametrize('start, stop', [(0, None), (3, 4001), (8, 16), (5000, 9000), (200, 100)])
+def test_to_packed_matches_packbits(raster, spikes, start, stop):
+    expected = raster[:, start:stop]
+    packed = spikes.to_packed(start, stop)
+    assert packed.dtype == np.uint8
+    assert np.array_equal(packed, np.packbits(expected, axis=1))
+    assert np.array_equal(np.unpackbits(packed, axis=1, count=expected.shape[1]).astype(bool), expected)
@@ -0,0 +1,103 @@
+# standard imports
+import json
+import os
+import threading
+from pathlib import Path
+
+# third party imports
+import numpy as np
+import pytest
+
+from data_processing import store
+from data_processing.utils import load_channel_info_from_json
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+SAMPLING_RATE = 1000
+
+
+@pytest.fixture
+def channel_info(monkeypatch):
+    # The channel and electrode configuration is read relative to the repository root
+    monkeypatch.chdir(REPO_ROOT)
+    return load_channel_info_from_json()
+
+
+@pytest.fixture
+def recording(tmp_path):
+    """An NPY recording with its spike timestamp sidecar."""
+    signal = np.random.default_rng(0).standard_normal((60, 2000)).astype(np.float32)
+    np.save(tmp_path / 'rec.npy', signal)
+    np.save(tmp_path / 'rec_spiketimestamps.npy', np.tile([10., 20., 30.], (60, 1)))
+    return str(tmp_path / 'rec.npy')
+
+
+def rewrite_timestamps(recording, timestamps):
+    path = recording.replace('.npy', '_spiketimestamps.npy')
+    np.save(path, np.tile(timestamps, (60, 1)))
+    # Makes the rewrite visible on file systems with a coarse modification time
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_store_is_reused_and_follows_moves(recording, channel_info, tmp_path):
+    root = str(tmp_path / 'store')
+    first = store.open_recording(recording, SAMPLING_RATE, channel_info, root)
+    assert store.open_recording(recording, SAMPLING_RATE, channel_info, root).path == first.path
+    moved = str(tmp_path / 'moved.npy')
+    os.rename(recording, moved)
+    os.rename(recording.replace('.npy', '_spiketimestamps.npy'), moved.replace('.npy', '_spiketimestamps.npy'))
+    assert store.find_store(moved, channel_info, root) == first.path
+
+
+def test_rewritten_recording_gets_a_new_store(recording, channel_info, tmp_path):
+    root = str(tmp_path / 'store')
+    first = store.open_recording(recording, SAMPLING_RATE, channel_info, root)
+    rewrite_timestamps(recording, [10., 20., 40.])
+    assert store.find_store(recording, channel_info, root) is None
+    second = store.open_recording(recording, SAMPLING_RATE, channel_info, root)
+    assert second.path != first.path
+    assert second.spikes.channel(0).tolist() == [10, 20, 40]
+
+
+def test_stale_stores_of_the_recording_are_removed(recording, channel_info, tmp_path):
+    root = str(tmp_path / 'store')
+    other = str(tmp_path / 'other.npy')
+    np.save(other, np.zeros((60, 100), dtype=np.float32))
+    np.save(tmp_path / 'other_spiketimestamps.npy', np.zeros((60, 1)))
+    kept = store.convert_recording(other, SAMPLING_RATE, channel_info, root)
+    stale = store.convert_recording(recording, SAMPLING_RATE, channel_info, root)
+    rewrite_timestamps(recording, [10., 20., 40.])
+    current = store.convert_recording(recording, SAMPLING_RATE, channel_info, root)
+    assert not os.path.exists(stale) and not os.path.exists(stale + '.lock')
+    assert os.path.exists(current) and os.path.exists(kept)
+
+
+def test_existing_store_is_not_converted_again(recording, channel_info, tmp_path):
+    root = str(tmp_path / 'store')
+    store_path = store.convert_recording(recording, SAMPLING_RATE, channel_info, root)
+    signal_path = os.path.join(store_path, 'signal.npy')
+    mtime = os.stat(signal_path).st_mtime_ns
+    assert store.convert_recording(recording, SAMPLING_RATE, channel_info, root) == store_path
+    assert os.stat(signal_path).st_mtime_ns == mtime
+    assert store.convert_recording(recording, SAMPLING_RATE, channel_info, root, force=True) == store_path
+    assert json.load(open(os.path.join(store_path, 'meta.json')))['n_samples'] == 2000
+    assert [name for name in os.listdir(root) if name.startswith('.')] == []
+
+
+def test_concurrent_conversions_share_one_store(recording, channel_info, tmp_path):
+    root = str(tmp_path / 'store')
+    results, errors = [], []
+
+    def convert():
+        try:
+            results.append(store.convert_recording(recording, SAMPLING_RATE, channel_info, root, force=True))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=convert) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [] and len(set(results)) == 1
+    assert np.array_equal(store.open_store(results[0]).spikes.channel(0), [10, 20, 30])
@@ -0,0 +1,95 @@
+# third party imports
+import numpy as np
+import pytest
+
+from data_processing.detection import detect_spikes
+from data_processing.spikes import SpikeTrains
+from data_processing.streaming import RawFileSource, RingBuffer, StreamingProcessor
+
+SAMPLING_RATE = 10000
+
+
+class ArraySource:
+    """A source returning a recording in chunks of the given sizes."""
+
+    def __init__(self, signal, chunk_sizes):
+        self.signal = signal
+        self.chunk_sizes = list(chunk_sizes)
+        self.position = 0
+
+    def read(self, max_samples=None):
+        n = self.chunk_sizes.pop(0) if self.chunk_sizes else 0
+        block = self.signal[:, self.position:self.position + n]
+        self.position += block.shape[1]
+        return block
+
+
+@pytest.fixture
+def signal():
+    """Unit-variance noise with a negative spike of amplitude 20 every ~30 ms on every channel."""
+    rng = np.random.default_rng(0)
+    signal = rng.standard_normal((4, 40000)).astype(np.float32)
+    for channel in range(4):
+        signal[channel, rng.choice(40000, size=120, replace=False)] = -20
+    return signal
+
+
+def test_ring_buffer_keeps_the_latest_entries():
+    buffer = RingBuffer((2,), 5, dtype=np.int64)
+    entries = np.stack((np.arange(12), -np.arange(12)))
+    buffer.append(entries[:, :3])
+    buffer.append(entries[:, 3:7])
+    assert len(buffer) == 5 and buffer.start == 2
+    assert np.array_equal(buffer.latest(), entries[:, 2:7])
+    assert np.array_equal(buffer.latest(2), entries[:, 5:7])
+    first, data = buffer.since(0)
+    assert first == 2 and np.array_equal(data, entries[:, 2:7])
+    # A block larger than the buffer keeps its end
+    buffer.append(entries[:, 7:12])
+    buffer.append(entries[:, :0])
+    assert buffer.total == 12 and np.array_equal(buffer.latest(), entries[:, 7:12])
+    assert buffer.since(20)[1].shape == (2, 0)
+
+
+def test_streamed_spikes_match_offline_detection(signal):
+    noise_levels = np.ones(4, dtype=np.float32)
+    chunk_sizes = np.random.default_rng(1).integers(1, 3000, size=100)
+    stream = StreamingProcessor(ArraySource(signal, chunk_sizes), SAMPLING_RATE, np.arange(4), remap=False,
+                                noise_levels=noise_levels, bin_duration=0.5)
+    while stream.poll():
+        pass
+    offline = detect_spikes(signal, SAMPLING_RATE, noise_levels=noise_levels)
+    channels, samples = stream.spikes.latest()
+    streamed = SpikeTrains.from_channel_samples(channels, samples, 4, signal.shape[1])
+    # The last alignment window (0.5 ms) is not final until more samples arrive
+    expected = offline.window(0, signal.shape[1] - 5)
+    assert np.array_equal(streamed.window(0, expected.n_samples).indices, expected.indices)
+    assert np.array_equal(stream.spike_counts, expected.counts())
+    bins = stream.activity.latest()
+    assert bins.shape[1] == 7
+    assert np.array_equal(bins.sum(axis=1), expected.window(0, 35000).counts())
+
+
+def test_rate_is_a_trailing_boxcar(signal):
+    stream = StreamingProcessor(ArraySource(signal, [5000] * 8), SAMPLING_RATE, np.arange(4), remap=False,
+                                noise_levels=np.ones(4), rate_resolution=0.01, rate_window=0.05)
+    while stream.poll():
+        pass
+    channels, samples = stream.spikes.latest()
+    steps = np.bincount(samples // 100, minlength=stream.rate.total)[:stream.rate.total]
+    expected = np.convolve(steps, np.ones(5))[:steps.size] / 0.05
+    assert np.allclose(stream.rate.latest(), expected)
+
+
+def test_raw_file_source_reads_complete_frames(tmp_path):
+    path = str(tmp_path / 'live.bin')
+    frames = np.arange(12, dtype=np.float32).reshape(4, 3)
+    with open(path, 'wb') as f:
+        f.write(frames[:2].tobytes() + frames[2, :1].tobytes())
+    source = RawFileSource(path, 3)
+    assert np.array_equal(source.read(), frames[:2].T)
+    assert source.read().shape == (3, 0)
+    with open(path, 'ab') as f:
+        f.write(frames[2, 1:].tobytes() + frames[3].tobytes())
+    assert np.array_equal(source.read(max_samples=1), frames[2:3].T)
+    assert np.array_equal(source.read(), frames[3:].T)
@@ -0,0 +1,135 @@
+# third party imports
+import numpy as np
+import pytest
+
+from data_processing.data_processor import DataProcessor
+from data_processing.spikes import SpikeTrains
+
+SAMPLING_RATE = 1000
+
+
+@pytest.fixture
+def processor_raster():
+    """A 60-channel raster of 10.5 s at 1 kHz, so the last 1 s bin is partial."""
+    rng = np.random.default_rng(1)
+    rates = rng.uniform(0, 20, size=(60, 1)) / SAMPLING_RATE
+    raster = rng.random((60, 10500)) < rates
+    raster[:3] = False
+    return raster
+
+
+@pytest.fixture
+def make_processor(processor_raster):
+    """Builds DataProcessors over ``processor_raster`` without remapping."""
+    def make():
+        signal = np.zeros(processor_raster.shape, dtype=np.float32)
+        return DataProcessor(signal, SpikeTrains.from_dense(processor_raster), SAMPLING_RATE, np.arange(60),
+                             remap=False)
+    return make
+
+
+def dense_spike_counts(raster, sampling_rate, time_value=1, total=False):
+    # The original DataProcessor.aggregate_raster_spike_counts over a dense raster
+    if total:
+        return np.sum(raster, axis=1)
+    bucket_size = int(sampling_rate * time_value)
+    num_buckets = raster.shape[1] // bucket_size
+    aggregated_counts = np.zeros((raster.shape[0], num_buckets))
+    for bucket in range(num_buckets):
+        start = bucket * bucket_size
+        aggregated_counts[:, bucket] = np.sum(raster[:, start:start + bucket_size], axis=1)
+    return aggregated_counts
+
+
+@pytest.fixture
+def summarized(make_processor):
+    processor = make_processor()
+    processor.build_summary()
+    return processor
+
+
+# (time_value, total, t_start, t_stop); the first five are answered from the summary, the others are not covered
+COUNT_QUERIES = [
+    (1, False, None, None),
+    (1, True, None, None),
+    (1, False, 2, 7),
+    (1, True, 2, 7),
+    (1, True, 3, None),
+    (1, False, 2.5, 7),
+    (1, True, 2.5, 7),
+    (0.5, False, None, None),
+    (2, False, 1, 9),
+]
+
+
+@pytest.mark.parametrize('time_value, total, t_start, t_stop', COUNT_QUERIES)
+def test_spike_counts_match_dense_reference(summarized, processor_raster, time_value, total, t_start, t_stop):
+    start = 0 if t_start is None else int(t_start * SAMPLING_RATE)
+    stop = processor_raster.shape[1] if t_stop is None else int(t_stop * SAMPLING_RATE)
+    expected = dense_spike_counts(processor_raster[:, start:stop], SAMPLING_RATE, time_value, total)
+    counts = summarized.aggregate_raster_spike_counts(time_value, total, t_start=t_start, t_stop=t_stop)
+    assert np.array_equal(counts, expected)
+
+
+def test_spike_counts_are_answered_from_summary(summarized):
+    # Building the summary cached the counts it computed, so the cache is emptied first
+    summarized.cache.clear()
+    summary = summarized.summary
+    assert summarized.aggregate_raster_spike_counts() is summary.bin_counts
+    assert summarized.aggregate_raster_spike_counts(total=True) is summary.channel_counts
+    assert summary.counts(2500, 7000, SAMPLING_RATE) is None
+    assert summary.counts(0, 10500, SAMPLING_RATE, include_partial=True) is None
+
+
+def test_partial_bin_matches_spikes(summarized, make_processor):
+    expected = make_processor().aggregate_raster_spike_counts(include_partial=True)
+    assert expected.shape[1] == 11
+    assert np.array_equal(summarized.aggregate_raster_spike_counts(include_partial=True), expected)
+
+
+@pytest.mark.parametrize('threshold', [5, 50])
+def test_active_channels_match_dense_reference(summarized, processor_raster, threshold):
+    aggregate = dense_spike_counts(processor_raster, SAMPLING_RATE, total=True)
+    expected = np.array([i for i, channel in enumerate(aggregate) if np.mean(channel) >= threshold])
+    assert np.array_equal(summarized.get_active_channels(threshold), expected)
+
+
+def test_channel_psd_matches_spikes(summarized, make_processor):
+    summarized.cache.clear()
+    frequencies, pxx, peaks = summarized.estimate_channel_psd()
+    assert pxx is summarized.summary.psd
+    expected = make_processor().estimate_channel_psd()
+    assert np.array_equal(frequencies, expected[0])
+    assert np.allclose(pxx, expected[1])
+    assert np.array_equal(peaks, expected[2], equal_nan=True)
+    # A time range is not covered by the summary
+    partial = summarized.estimate_channel_psd(t_start=2, t_stop=8)
+    assert np.allclose(partial[1], make_processor().estimate_channel_psd(t_start=2, t_stop=8)[1])
+
+
+def test_rate_envelope_bounds_binned_rate(summarized, processor_raster):
+    rate_bin = int(summarized.summary.parameters['rate_bin_size'] * SAMPLING_RATE)
+    n_rate_bins = processor_raster.shape[1] // rate_bin
+    rate = processor_raster[:, :n_rate_bins * rate_bin].sum(axis=0).reshape(n_rate_bins, rate_bin).sum(axis=1)
+    rate = rate * SAMPLING_RATE / rate_bin
+    per_second = rate[:10 * (SAMPLING_RATE // rate_bin)].reshape(10, -1)
+    envelope = summarized.summary.envelope(0, processor_raster.shape[1])
+    assert np.allclose(envelope, np.stack((per_second.min(axis=1), per_second.max(axis=1))))
+
+
+def test_summary_is_stored_and_reloaded(make_processor, tmp_path):
+    processor = make_processor()
+    processor.store_path = str(tmp_path)
+    summary = processor.build_summary()
+    assert len(list(tmp_path.glob('summary-*.npz'))) == 1
+    reopened = make_processor()
+    reopened.store_path = str(tmp_path)
+    loaded = reopened.build_summary()
+    assert loaded.key == summary.key
+    for name in ('channel_counts', 'bin_counts', 'active_channels', 'rate_envelope', 'psd'):
+        assert np.array_equal(getattr(loaded, name), getattr(summary, name))
+
+
+def test_replaced_spikes_drop_summary(summarized):
+    summarized.detect_spikes(threshold=5)
+    assert summarized.summary is None
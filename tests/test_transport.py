@@ -0,0 +1,74 @@
+# standard imports
+import base64
+
+# third party imports
+import numpy as np
+import plotly.graph_objects as go
+import pytest
+from dash import Output, no_update
+
+from app.transport import encode_figure, enable_compression, send_figures, typed_array
+
+
+def decode(spec):
+    array = np.frombuffer(base64.b64decode(spec['bdata']), dtype='<' + spec['dtype'])
+    if 'shape' in spec:
+        array = array.reshape([int(n) for n in spec['shape'].split(',')])
+    return array
+
+
+@pytest.mark.parametrize('values, dtype', [
+    (np.linspace(0, 1, 50), 'f8'),
+    (np.linspace(0, 1, 50, dtype=np.float16), 'f4'),
+    (np.arange(100, dtype=np.int64), 'i1'),
+    (np.arange(0, 3 * 10 ** 9, 5 * 10 ** 7, dtype=np.int64), 'f8'),
+    (np.arange(40, dtype=np.uint64) * 1000, 'u2'),
+    (np.arange(40) % 2 == 0, 'u1'),
+    (np.arange(60, dtype=np.float32).reshape(6, 10), 'f4'),
+    (list(range(40)), 'i1'),
+])
+def test_typed_array_round_trip(values, dtype):
+    spec = typed_array(values)
+    assert spec['dtype'] == dtype
+    assert np.array_equal(decode(spec), np.asarray(values))
+
+
+@pytest.mark.parametrize('values', [list(range(10)), ['a'] * 40, [{'x': 1}] * 40, [[1, 2], [3]], np.zeros((2, 2, 10))])
+def test_non_numeric_or_short_values_stay_json(values):
+    assert typed_array(values) is None
+
+
+def test_encode_figure_only_encodes_traces():
+    x = np.arange(100)
+    figure = encode_figure(go.Figure(go.Scatter(x=x, y=x * 0.5, text=['a'] * 100),
+                                     layout={'xaxis': {'tickvals': list(range(50))}}))
+    trace = figure['data'][0]
+    assert np.array_equal(decode(trace['x']), x) and np.array_equal(decode(trace['y']), x * 0.5)
+    assert trace['text'] == ['a'] * 100
+    assert figure['layout']['xaxis']['tickvals'] == list(range(50))
+
+
+def test_send_figures_skips_figures_already_shown():
+    outputs = [Output('plot', 'figure'), Output('status', 'children')]
+    figure = go.Figure(go.Scatter(y=np.arange(100)))
+    sent, patch = send_figures([figure, 'done'], outputs, {})
+    assert sent[1] == 'done' and isinstance(sent[0], dict)
+    # The store patch records the digest under the output id
+    operations = patch.to_plotly_json()['operations']
+    hashes = {operation['location'][0]: operation['params']['value'] for operation in operations}
+    sent, patch = send_figures([figure, 'again'], outputs, hashes)
+    assert sent == [no_update, 'again'] and patch is no_update
+    sent, _ = send_figures([go.Figure(go.Scatter(y=np.arange(101))), no_update], outputs, hashes)
+    assert isinstance(sent[0], dict) and sent[1] is no_update
+
+
+def test_responses_are_compressed():
+    pytest.importorskip('flask_compress')
+    from flask import Flask
+    server = Flask(__name__)
+    server.add_url_rule('/big', 'big', lambda: 'x' * 10000)
+    server.add_url_rule('/small', 'small', lambda: 'x' * 10)
+    assert enable_compression(server, algorithms=['gzip'])
+    client = server.test_client()
+    assert client.get('/big', headers={'Accept-Encoding': 'gzip'}).headers.get('Content-Encoding') == 'gzip'
+    assert client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers.get('Content-Encoding') is None